@@ -0,0 +1,24 @@
+_base_ = ['./resnet50_8xb32_in1k_centroids.py']
+
+# the workers only decode and pad to a common size, the random
+# augmentations and the normalization run batched on the training device.
+# The long side is resized to 500, the size of most ImageNet images, and
+# the crops are drawn within the unpadded "valid_shape" of every image, as
+# the CPU RandomResizedCrop draws them on the whole image
+img_norm_cfg = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+model = dict(
+    train_cfg=dict(batch_pipeline=[
+        dict(type='RandomResizedCrop', size=224),
+        dict(type='RandomFlip', flip_prob=0.5, direction='horizontal'),
+        dict(type='Normalize', **img_norm_cfg)
+    ]))
+train_pipeline = [
+    dict(type='LoadImageFromFile', reduced_decode=True),
+    dict(type='Resize', size=(500, -1), adaptive_side='long'),
+    dict(type='Pad', size=(500, 500)),
+    dict(type='ImageToTensor', keys=['img']),
+    dict(type='ToTensor', keys=['gt_label', 'valid_shape']),
+    dict(type='Collect', keys=['img', 'gt_label', 'valid_shape'])
+]
+data = dict(train=dict(pipeline=train_pipeline))
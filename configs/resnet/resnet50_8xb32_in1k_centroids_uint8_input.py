@@ -0,0 +1,20 @@
+_base_ = ['./resnet50_8xb32_in1k_centroids.py']
+
+# the workers send uint8 images, which are normalized on the device
+img_norm_cfg = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+model = dict(data_preprocessor=[dict(type='Normalize', **img_norm_cfg)])
+train_pipeline = [
+    dict(type='LoadImageFromFile'),
+    dict(type='RandomResizedCrop', size=224),
+    dict(type='CropFlipToTensor', flip_prob=0.5, direction='horizontal')
+]
+test_pipeline = [
+    dict(type='LoadImageFromFile'),
+    dict(type='Resize', size=(256, -1)),
+    dict(type='CropFlipToTensor', keys=['img'], crop_size=224)
+]
+data = dict(
+    train=dict(pipeline=train_pipeline),
+    val=dict(pipeline=test_pipeline),
+    test=dict(pipeline=test_pipeline))
@@ -1,9 +1,12 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-from .inference import inference_model, init_model, show_result_pyplot
-from .test import multi_gpu_test, single_gpu_test
+from .inference import (build_test_pipeline, inference_batch,
+                        inference_batch_iter, inference_model, init_model,
+                        show_result_pyplot)
+from .test import multi_gpu_test, single_gpu_test, streaming_test
 from .train import set_random_seed, train_model
 
 __all__ = [
     'set_random_seed', 'train_model', 'init_model', 'inference_model',
-    'multi_gpu_test', 'single_gpu_test', 'show_result_pyplot'
+    'inference_batch', 'inference_batch_iter', 'build_test_pipeline',
+    'multi_gpu_test', 'single_gpu_test', 'streaming_test', 'show_result_pyplot'
 ]
@@ -1,5 +1,8 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import mmcv
 import numpy as np
@@ -66,14 +69,10 @@ def inference_model(model, img):
     device = next(model.parameters()).device  # model device
     # build the data pipeline
     if isinstance(img, str):
-        if cfg.data.test.pipeline[0]['type'] != 'LoadImageFromFile':
-            cfg.data.test.pipeline.insert(0, dict(type='LoadImageFromFile'))
         data = dict(img_info=dict(filename=img), img_prefix=None)
     else:
-        if cfg.data.test.pipeline[0]['type'] == 'LoadImageFromFile':
-            cfg.data.test.pipeline.pop(0)
         data = dict(img=img)
-    test_pipeline = Compose(cfg.data.test.pipeline)
+    test_pipeline = build_test_pipeline(cfg, isinstance(img, str))
     data = test_pipeline(data)
     data = collate([data], samples_per_gpu=1)
     if next(model.parameters()).is_cuda:
@@ -90,6 +89,174 @@ def inference_model(model, img):
     return result
 
 
+def build_test_pipeline(cfg, from_file=True):
+    """Build the test pipeline of the config for images loaded from files or
+    for loaded images, without changing the config, so that the models can be
+    used by several threads.
+
+    Args:
+        cfg (:obj:`mmcv.Config`): The config of the model.
+        from_file (bool): Whether the pipeline starts by
+            ``LoadImageFromFile``. Defaults to True.
+
+    Returns:
+        :obj:`Compose`: The test pipeline.
+    """
+    pipeline = list(cfg.data.test.pipeline)
+    if from_file and pipeline[0]['type'] != 'LoadImageFromFile':
+        pipeline.insert(0, dict(type='LoadImageFromFile'))
+    elif not from_file and pipeline[0]['type'] == 'LoadImageFromFile':
+        pipeline.pop(0)
+    return Compose(pipeline)
+
+
+def _preprocess(pipelines, img):
+    if isinstance(img, str):
+        return pipelines[0](dict(img_info=dict(filename=img), img_prefix=None))
+    return pipelines[1](dict(img=img))
+
+
+def _preprocessed(imgs, preprocess, executor, window):
+    """Yield the preprocessed images in order, with up to ``window`` images
+    preprocessed ahead by the executor."""
+    if executor is None:
+        for img in imgs:
+            yield preprocess(img)
+        return
+    futures = deque()
+    for img in imgs:
+        futures.append(executor.submit(preprocess, img))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def _batches(samples, batch_size):
+    """Collate the samples by batches of a fixed size, padding the last one
+    by its last sample, and yield them with the number of their samples."""
+    batch = []
+    for sample in samples:
+        batch.append(sample)
+        if len(batch) == batch_size:
+            yield collate(batch, samples_per_gpu=batch_size), batch_size
+            batch = []
+    if len(batch) != 0:
+        num_samples = len(batch)
+        batch += batch[-1:] * (batch_size - num_samples)
+        yield collate(batch, samples_per_gpu=batch_size), num_samples
+
+
+def _topk_results(model, pred_score, pred_label, num_samples):
+    pred_score = pred_score[:num_samples].cpu().numpy()
+    pred_label = pred_label[:num_samples].cpu().numpy()
+    classes = getattr(model, 'CLASSES', None)
+    for scores, labels in zip(pred_score, pred_label):
+        if len(labels) == 1:
+            result = {
+                'pred_label': int(labels[0]),
+                'pred_score': float(scores[0])
+            }
+            if classes is not None:
+                result['pred_class'] = classes[labels[0]]
+        else:
+            result = {
+                'pred_label': labels.tolist(),
+                'pred_score': scores.tolist()
+            }
+            if classes is not None:
+                result['pred_class'] = [classes[label] for label in labels]
+        yield result
+
+
+def inference_batch_iter(model,
+                         imgs,
+                         batch_size=32,
+                         topk=1,
+                         num_workers=4,
+                         executor=None):
+    """Inference images with the classifier by batches, yielding the results
+    in the order of the images.
+
+    The test pipelines are built once. The images are preprocessed ahead by a
+    pool of workers, collated by batches of a fixed size, the last one being
+    padded, and on GPU the copy of a batch to the device overlaps the
+    inference of the previous one. The top k predictions are selected on the
+    device.
+
+    Args:
+        model (nn.Module): The loaded classifier.
+        imgs (Iterable[str | ndarray]): The image filenames or loaded images.
+        batch_size (int): The number of images of a batch. Defaults to 32.
+        topk (int): The number of predictions of an image. Defaults to 1.
+        num_workers (int): The number of preprocessing threads, 0 to
+            preprocess in the calling thread. Only used without
+            ``executor``. Defaults to 4.
+        executor (:obj:`concurrent.futures.Executor`, optional): The executor
+            of the preprocessing, e.g. a ``ProcessPoolExecutor``. Defaults to
+            None, i.e. a pool of ``num_workers`` threads.
+
+    Yields:
+        dict: The classification result of an image, with the
+        `pred_label`, `pred_score` and `pred_class` of :func:`inference_model`
+        for ``topk=1``, else with the lists of the top k ones.
+    """
+    cfg = model.cfg
+    device = next(model.parameters()).device
+    pipelines = (build_test_pipeline(cfg,
+                                     True), build_test_pipeline(cfg, False))
+    own_executor = executor is None and num_workers > 0
+    if own_executor:
+        executor = ThreadPoolExecutor(num_workers)
+    copy_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+    try:
+        samples = _preprocessed(imgs, partial(_preprocess, pipelines),
+                                executor, 2 * batch_size)
+        pending = None
+        for data, num_samples in _batches(samples, batch_size):
+            if copy_stream is not None:
+                with torch.cuda.stream(copy_stream):
+                    img = data['img'].pin_memory().to(
+                        device, non_blocking=True)
+            else:
+                img = data['img'].to(device)
+            # the results of the previous batch wait for its inference, while
+            # the copy of this batch goes on
+            if pending is not None:
+                yield from _topk_results(model, *pending)
+            if copy_stream is not None:
+                current_stream = torch.cuda.current_stream(device)
+                current_stream.wait_stream(copy_stream)
+                img.record_stream(current_stream)
+            with torch.no_grad():
+                scores = model(
+                    img=img,
+                    img_metas=data['img_metas'].data[0],
+                    return_loss=False,
+                    post_process=False)
+                pending = (*scores.topk(min(topk, scores.size(1)), dim=1),
+                           num_samples)
+        if pending is not None:
+            yield from _topk_results(model, *pending)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def inference_batch(model, imgs, **kwargs):
+    """Inference images with the classifier by batches.
+
+    Args:
+        model (nn.Module): The loaded classifier.
+        imgs (Iterable[str | ndarray]): The image filenames or loaded images.
+        **kwargs: The options of :func:`inference_batch_iter`.
+
+    Returns:
+        list[dict]: The classification results of the images.
+    """
+    return list(inference_batch_iter(model, imgs, **kwargs))
+
+
 def show_result_pyplot(model,
                        img,
                        result,
@@ -11,6 +11,9 @@ import torch
 import torch.distributed as dist
 from mmcv.image import tensor2imgs
 from mmcv.runner import get_dist_info
+from torch.utils.data import DistributedSampler
+
+from mmcls.datasets import ShardedSampler
 
 
 def single_gpu_test(model,
@@ -69,7 +72,12 @@ def single_gpu_test(model,
     return results
 
 
-def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
+def multi_gpu_test(model,
+                   data_loader,
+                   tmpdir=None,
+                   gpu_collect=False,
+                   tensor_collect=False,
+                   collect_topk=None):
     """Test model with multiple gpus.
 
     This method tests model with multiple gpus and collects the results
@@ -78,15 +86,30 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     collection. On cpu mode it saves the results on different gpus to 'tmpdir'
     and collects them by the rank 0 worker.
 
+    With ``tensor_collect=True``, both modes are replaced by
+    :func:`collect_results_tensor`: the prediction rows of a rank are written
+    to one preallocated tensor, tagged with their dataset indices, which is
+    gathered by a single collective of the process group and ordered by the
+    indices, without pickling nor a shared directory.
+
     Args:
         model (nn.Module): Model to be tested.
         data_loader (nn.Dataloader): Pytorch data loader.
         tmpdir (str): Path of directory to save the temporary results from
             different gpus under cpu mode.
         gpu_collect (bool): Option to use either gpu or cpu to collect results.
+        tensor_collect (bool): Whether to collect the results as tensors.
+            The model must return one row of scores per sample. Defaults to
+            False.
+        collect_topk (int, optional): Collect only the top k scores of every
+            sample and their labels, which is enough for the accuracy up to
+            top-k, the precision, the recall, the f1 score and the support.
+            The other scores of the results are ``-inf``. Only used with
+            ``tensor_collect=True``. Defaults to None, i.e. all the scores.
 
     Returns:
-        list: The prediction results.
+        list | np.ndarray: The prediction results, or an array of shape
+        (N, C) with ``tensor_collect=True``.
     """
     model.eval()
     results = []
@@ -94,16 +117,30 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
     rank, world_size = get_dist_info()
     if rank == 0:
         # Check if tmpdir is valid for cpu_collect
-        if (not gpu_collect) and (tmpdir is not None and osp.exists(tmpdir)):
+        if (not gpu_collect) and (not tensor_collect) and (
+                tmpdir is not None and osp.exists(tmpdir)):
             raise OSError((f'The tmpdir {tmpdir} already exists.',
                            ' Since tmpdir will be deleted after testing,',
                            ' please make sure you specify an empty one.'))
         prog_bar = mmcv.ProgressBar(len(dataset))
+    if tensor_collect:
+        indices = sampled_indices(data_loader)
+        result_part = None
+        num_classes = 0
+        num_results = 0
     time.sleep(2)  # This line can prevent deadlock problem in some cases.
     for i, data in enumerate(data_loader):
         with torch.no_grad():
             result = model(return_loss=False, **data)
-        if isinstance(result, list):
+        if tensor_collect:
+            scores = torch.from_numpy(np.stack(result))
+            if result_part is None:
+                num_classes = scores.size(1)
+                result_part = _init_result_part(indices, num_classes,
+                                                collect_topk)
+            _write_result_part(result_part, num_results, scores, collect_topk)
+            num_results += len(scores)
+        elif isinstance(result, list):
             results.extend(result)
         else:
             results.append(result)
@@ -114,13 +151,206 @@ def multi_gpu_test(model, data_loader, tmpdir=None, gpu_collect=False):
                 prog_bar.update()
 
     # collect results from all ranks
-    if gpu_collect:
+    if tensor_collect:
+        assert num_results == len(indices), \
+            f'Got {num_results} results of {len(indices)} sampled indices.'
+        # a rank without samples has no scores, and sends an empty part
+        num_classes = torch.tensor(num_classes, device=_collect_device())
+        dist.all_reduce(num_classes, op=dist.ReduceOp.MAX)
+        num_classes = int(num_classes)
+        if result_part is None:
+            result_part = _init_result_part(indices, num_classes, collect_topk)
+        results = collect_results_tensor(result_part, len(dataset),
+                                         num_classes, collect_topk)
+    elif gpu_collect:
         results = collect_results_gpu(results, len(dataset))
     else:
         results = collect_results_cpu(results, len(dataset), tmpdir)
     return results
 
 
+def streaming_test(model,
+                   data_loader,
+                   tmpdir=None,
+                   gpu_collect=False,
+                   group=None,
+                   show_progress=True,
+                   **eval_kwargs):
+    """Test model with one or multiple gpus, accumulating the metrics batch by
+    batch instead of keeping the prediction results.
+
+    The scores of a batch stay on the device of the model, i.e. the heads are
+    called with ``post_process=False``, and update the accumulators of the
+    ``build_streaming_evaluator`` of the dataset with the ground truth of the
+    sampled indices, skipping the samples padded by a distributed sampler.
+    The accumulators of the ranks are then merged by one all-reduce, so that
+    the memory is independent of the number of samples.
+
+    Args:
+        model (nn.Module): Model to be tested.
+        data_loader (nn.Dataloader): Pytorch data loader.
+        tmpdir (str): Unused, for the interface of :func:`multi_gpu_test`,
+            e.g. as the ``test_fn`` of the eval hooks.
+        gpu_collect (bool): Unused, see ``tmpdir``.
+        group (ProcessGroup, optional): The process group of the all-reduce.
+            Defaults to None, i.e. the default process group.
+        show_progress (bool): Whether to show a progress bar on rank 0.
+            Defaults to True.
+        **eval_kwargs: The ``metric`` and ``metric_options`` of the
+            evaluation.
+
+    Returns:
+        :obj:`StreamingEvaluator`: The accumulated metrics of all the ranks,
+        to be passed to the ``evaluate`` of the dataset with the same
+        ``eval_kwargs``.
+    """
+    model.eval()
+    dataset = data_loader.dataset
+    evaluator = dataset.build_streaming_evaluator(**eval_kwargs)
+    gt_labels = dataset.get_gt_labels()
+    indices = np.array(sampled_indices(data_loader), dtype=np.int64)
+    padded = sampled_padding(data_loader, len(indices))
+    rank, world_size = get_dist_info()
+    show_progress = show_progress and rank == 0
+    if show_progress:
+        prog_bar = mmcv.ProgressBar(len(dataset))
+    num_results = 0
+    for data in data_loader:
+        with torch.no_grad():
+            result = model(return_loss=False, post_process=False, **data)
+        batch = slice(num_results, num_results + len(result))
+        num_results += len(result)
+        keep = ~padded[batch]
+        if not keep.all():
+            result = result[torch.from_numpy(keep).to(result.device)]
+        evaluator.update(result, gt_labels[indices[batch][keep]])
+
+        if show_progress:
+            batch_size = data['img'].size(0)
+            for _ in range(batch_size * world_size):
+                prog_bar.update()
+
+    assert num_results == len(indices), \
+        f'Got {num_results} results of {len(indices)} sampled indices.'
+    evaluator.all_reduce(group)
+    return evaluator
+
+
+def sampled_indices(data_loader):
+    """The dataset indices of the samples of a rank, in the loading order."""
+    if data_loader.batch_sampler is not None:
+        return [idx for batch in data_loader.batch_sampler for idx in batch]
+    return list(data_loader.sampler)
+
+
+def sampled_padding(data_loader, num_samples):
+    """Whether the samples of a rank, in the loading order, are repeated by
+    the distributed sampler to even the ranks, i.e. the global position of a
+    sample in the sampled indices of all the ranks is over the dataset."""
+    sampler = data_loader.sampler
+    padded = np.zeros(num_samples, dtype=bool)
+    if not isinstance(sampler, DistributedSampler) or \
+            not getattr(sampler, 'round_up', True):
+        return padded
+    positions = np.arange(num_samples)
+    if isinstance(sampler, ShardedSampler) and sampler.shuffle:
+        positions += sampler.rank * sampler.num_samples
+    else:
+        positions = sampler.rank + positions * sampler.num_replicas
+    padded[positions >= len(data_loader.dataset)] = True
+    return padded
+
+
+def _collect_device():
+    return 'cuda' if dist.get_backend() == 'nccl' else 'cpu'
+
+
+def _init_result_part(indices, num_classes, collect_topk=None):
+    """Allocate the rows of a rank for :func:`collect_results_tensor`, on the
+    device of the collective.
+
+    A row is the dataset index of the sample, as the bits of two float32,
+    followed by the scores, or by the top k scores and their labels.
+    """
+    if collect_topk is not None:
+        # the labels are exact in float32
+        assert num_classes <= 1 << 24
+        width = 2 * min(collect_topk, num_classes)
+    else:
+        width = num_classes
+    device = _collect_device()
+    result_part = torch.empty(
+        len(indices), 2 + width, dtype=torch.float32, device=device)
+    result_part[:, :2] = torch.tensor(
+        indices, dtype=torch.int64).view(torch.float32).view(-1, 2)
+    return result_part
+
+
+def _write_result_part(result_part, start, scores, collect_topk=None):
+    rows = result_part[start:start + len(scores), 2:]
+    scores = scores.to(rows.device)
+    if collect_topk is None:
+        rows.copy_(scores)
+    else:
+        k = rows.size(1) // 2
+        topk_scores, topk_labels = scores.topk(k, dim=1)
+        rows[:, :k] = topk_scores
+        rows[:, k:] = topk_labels
+
+
+def collect_results_tensor(result_part, size, num_classes, collect_topk=None):
+    """Collect the results of all ranks by a single all_gather of tensors.
+
+    The parts of the ranks are padded to the largest one, gathered on the
+    device of the backend of the process group, i.e. on the GPU for nccl and
+    on the CPU for gloo, and the rows are written to their dataset indices,
+    so that the samples padded by the sampler are dropped.
+
+    Args:
+        result_part (torch.Tensor): The rows of the rank, as written by
+            :func:`multi_gpu_test`.
+        size (int): Size of the dataset.
+        num_classes (int): Number of the scores of a sample.
+        collect_topk (int, optional): Whether the rows hold the top k scores
+            and their labels. Defaults to None.
+
+    Returns:
+        np.ndarray | None: The scores of shape (N, C) on rank 0, else None.
+    """
+    rank, world_size = get_dist_info()
+    device = _collect_device()
+    part_send = result_part.to(device)
+    # gather the number of rows of the ranks
+    shape_tensor = torch.tensor([len(part_send)], device=device)
+    shape_list = [shape_tensor.clone() for _ in range(world_size)]
+    dist.all_gather(shape_list, shape_tensor)
+    shape_max = int(torch.stack(shape_list).max())
+    if len(part_send) < shape_max:
+        part_send = torch.cat([
+            part_send,
+            part_send.new_zeros(shape_max - len(part_send), part_send.size(1))
+        ])
+    part_recv_list = [torch.empty_like(part_send) for _ in range(world_size)]
+    dist.all_gather(part_recv_list, part_send)
+
+    if rank != 0:
+        return None
+    results = np.full((size, num_classes),
+                      -np.inf if collect_topk is not None else 0,
+                      dtype=np.float32)
+    for recv, shape in zip(part_recv_list, shape_list):
+        part = recv[:int(shape)].cpu()
+        indices = part[:, :2].contiguous().view(torch.int64).view(-1).numpy()
+        rows = part[:, 2:].numpy()
+        if collect_topk is None:
+            results[indices] = rows
+        else:
+            k = rows.shape[1] // 2
+            results[indices[:, None], rows[:, k:].astype(np.int64)] = \
+                rows[:, :k]
+    return results
+
+
 def collect_results_cpu(result_part, size, tmpdir=None):
     rank, world_size = get_dist_info()
     # create a tmp dir if it is not specified
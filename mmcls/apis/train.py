@@ -1,6 +1,7 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import random
 import warnings
+from functools import partial
 
 import numpy as np
 import torch
@@ -8,7 +9,7 @@ from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import DistSamplerSeedHook, build_optimizer, build_runner
 
 from mmcls.core import DistOptimizerHook
-from mmcls.datasets import build_dataloader, build_dataset
+from mmcls.datasets import ShardedSampler, build_dataloader, build_dataset
 from mmcls.utils import get_root_logger
 
 # TODO import eval hooks from mmcv and delete them from mmcls
@@ -135,7 +136,12 @@ def train_model(model,
         cfg.log_config,
         cfg.get('momentum_config', None),
         custom_hooks_config=cfg.get('custom_hooks', None))
-    if distributed and cfg.runner['type'] == 'EpochBasedRunner':
+    # the shard order of a ShardedSampler changes with the epoch, even in
+    # non-distributed training
+    sharded = any(
+        isinstance(data_loader.sampler, ShardedSampler)
+        for data_loader in data_loaders)
+    if (distributed or sharded) and cfg.runner['type'] == 'EpochBasedRunner':
         runner.register_hook(DistSamplerSeedHook())
 
     # register eval hooks
@@ -150,7 +156,28 @@ def train_model(model,
             round_up=True)
         eval_cfg = cfg.get('evaluation', {})
         eval_cfg['by_epoch'] = cfg.runner['type'] != 'IterBasedRunner'
-        eval_hook = DistEvalHook if distributed else EvalHook
+        # the options of the result collection of `multi_gpu_test`
+        tensor_collect = eval_cfg.pop('tensor_collect', False)
+        collect_topk = eval_cfg.pop('collect_topk', None)
+        if eval_cfg.pop('streaming', False):
+            # accumulate the metrics instead of collecting the results
+            from .test import streaming_test
+            eval_cfg['test_fn'] = partial(
+                streaming_test, **{
+                    key: eval_cfg[key]
+                    for key in ('metric', 'metric_options') if key in eval_cfg
+                })
+        elif distributed and tensor_collect:
+            from .test import multi_gpu_test
+            eval_cfg['test_fn'] = partial(
+                multi_gpu_test, tensor_collect=True, collect_topk=collect_topk)
+        if eval_cfg.get('async_eval', False):
+            # the asynchronous evaluation is implemented by the hooks of mmcls
+            from mmcls.core import DistEvalHook as MMClsDistEvalHook
+            from mmcls.core import EvalHook as MMClsEvalHook
+            eval_hook = MMClsDistEvalHook if distributed else MMClsEvalHook
+        else:
+            eval_hook = DistEvalHook if distributed else EvalHook
         # `EvalHook` needs to be executed after `IterTimerHook`.
         # Otherwise, it will cause a bug if use `IterBasedRunner`.
         # Refers to https://github.com/open-mmlab/mmcv/issues/1261
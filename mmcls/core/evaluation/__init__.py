@@ -1,12 +1,22 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .eval_hooks import DistEvalHook, EvalHook
 from .eval_metrics import (calculate_confusion_matrix, f1_score, precision,
-                           precision_recall_f1, recall, support)
+                           precision_recall_f1, recall, single_label_metrics,
+                           support, topk_accuracy, topk_numpy)
 from .mean_ap import average_precision, mAP
 from .multilabel_eval_metrics import average_performance
+from .streaming_metrics import (StreamingAccuracy, StreamingConfusionMatrix,
+                                StreamingEvaluator, StreamingMAP,
+                                StreamingMetric,
+                                StreamingMultiLabelPerformance,
+                                StreamingPrecisionRecallF1)
 
 __all__ = [
     'DistEvalHook', 'EvalHook', 'precision', 'recall', 'f1_score', 'support',
     'average_precision', 'mAP', 'average_performance',
-    'calculate_confusion_matrix', 'precision_recall_f1'
+    'calculate_confusion_matrix', 'precision_recall_f1',
+    'single_label_metrics', 'topk_numpy', 'topk_accuracy', 'StreamingMetric',
+    'StreamingAccuracy', 'StreamingPrecisionRecallF1',
+    'StreamingConfusionMatrix', 'StreamingMAP',
+    'StreamingMultiLabelPerformance', 'StreamingEvaluator'
 ]
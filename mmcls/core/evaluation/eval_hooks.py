@@ -1,20 +1,56 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
 import os.path as osp
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 
-from mmcv.runner import Hook
+import numpy as np
+import torch
+import torch.distributed as dist
+from mmcv.parallel import MMDataParallel, is_module_wrapper
+from mmcv.runner import EMAHook, Hook, get_dist_info
 from torch.utils.data import DataLoader
 
 
 class EvalHook(Hook):
     """Evaluation hook.
 
+    With ``async_eval=True``, the weights are copied to a snapshot of the
+    model at the evaluation interval, which is evaluated by
+    :func:`mmcls.apis.streaming_test` in a background thread while the
+    training goes on, and the metrics are logged once they are ready. The
+    intermediate evaluations may use a subset of the dataset, while the last
+    epoch or iteration is always evaluated on the whole dataset, waiting for
+    the metrics.
+
     Args:
         dataloader (DataLoader): A PyTorch dataloader.
         interval (int): Evaluation interval (by epochs). Default: 1.
+        test_fn (callable, optional): Test a model with the dataloader, e.g.
+            :func:`mmcls.apis.streaming_test`. Default: None, i.e.
+            :func:`mmcls.apis.single_gpu_test`.
+        async_eval (bool): Whether to evaluate a snapshot of the weights in
+            the background. The dataset must support the streaming
+            evaluation. Default: False.
+        snapshot (str): The weights evaluated in the background, 'current'
+            or 'ema' for the averages of the ``EMAHook`` of mmcv.
+            Default: 'current'.
+        subsample (float, optional): The fraction of the dataset of the
+            intermediate evaluations in the background, i.e. every
+            ``round(1 / subsample)``-th sample. Default: None, i.e. the whole
+            dataset.
     """
 
-    def __init__(self, dataloader, interval=1, by_epoch=True, **eval_kwargs):
+    def __init__(self,
+                 dataloader,
+                 interval=1,
+                 by_epoch=True,
+                 test_fn=None,
+                 async_eval=False,
+                 snapshot='current',
+                 subsample=None,
+                 **eval_kwargs):
         warnings.warn(
             'DeprecationWarning: EvalHook and DistEvalHook in mmcls will be '
             'deprecated, please install mmcv through master branch.')
@@ -25,33 +61,169 @@ class EvalHook(Hook):
         self.interval = interval
         self.eval_kwargs = eval_kwargs
         self.by_epoch = by_epoch
+        if test_fn is None:
+            from mmcls.apis import single_gpu_test
+            test_fn = single_gpu_test
+        self.test_fn = test_fn
+        self._init_async(async_eval, snapshot, subsample)
+
+    def _init_async(self, async_eval, snapshot, subsample):
+        if snapshot not in ['current', 'ema']:
+            raise ValueError(f'Unsupported snapshot {snapshot}.')
+        self.async_eval = async_eval
+        self.snapshot = snapshot
+        self.subsample = subsample
+        self._pending = None
+
+    def before_run(self, runner):
+        if not self.async_eval:
+            return
+        model = runner.model
+        if is_module_wrapper(model):
+            model = model.module
+        device = next(model.parameters()).device
+        self._eval_model = MMDataParallel(
+            copy.deepcopy(model),
+            device_ids=[device.index] if device.type == 'cuda' else None)
+        # the samples of the rank, without the padding of the samplers
+        rank, world_size = get_dist_info()
+        indices = np.arange(len(self.dataloader.dataset))
+        self._full_loader = self._build_loader(indices[rank::world_size])
+        if self.subsample is not None:
+            indices = indices[::max(1, round(1 / self.subsample))]
+            self._fast_loader = self._build_loader(indices[rank::world_size])
+        else:
+            self._fast_loader = self._full_loader
+        # the collective of the evaluation runs along the ones of training
+        self._group = dist.new_group(
+            backend='gloo') if world_size > 1 else None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _build_loader(self, indices):
+        return DataLoader(
+            self.dataloader.dataset,
+            batch_size=self.dataloader.batch_size,
+            sampler=indices.tolist(),
+            num_workers=self.dataloader.num_workers,
+            collate_fn=self.dataloader.collate_fn,
+            pin_memory=self.dataloader.pin_memory)
+
+    def after_run(self, runner):
+        if not self.async_eval:
+            return
+        self._collect(runner, wait=True)
+        self._executor.shutdown()
 
     def after_train_epoch(self, runner):
+        if self.async_eval:
+            if self.by_epoch and (self.every_n_epochs(runner, self.interval)
+                                  or self.is_last_epoch(runner)):
+                self._evaluate_async(runner, self.is_last_epoch(runner))
+            return
         if not self.by_epoch or not self.every_n_epochs(runner, self.interval):
             return
-        from mmcls.apis import single_gpu_test
-        results = single_gpu_test(runner.model, self.dataloader, show=False)
+        results = self.test_fn(runner.model, self.dataloader)
         self.evaluate(runner, results)
 
     def after_train_iter(self, runner):
+        if self.async_eval:
+            self._collect(runner, wait=False)
+            if not self.by_epoch and (self.every_n_iters(
+                    runner, self.interval) or self.is_last_iter(runner)):
+                self._evaluate_async(runner, self.is_last_iter(runner))
+            return
         if self.by_epoch or not self.every_n_iters(runner, self.interval):
             return
-        from mmcls.apis import single_gpu_test
         runner.log_buffer.clear()
-        results = single_gpu_test(runner.model, self.dataloader, show=False)
+        results = self.test_fn(runner.model, self.dataloader)
         self.evaluate(runner, results)
 
+    def _load_snapshot(self, runner):
+        model = runner.model
+        if is_module_wrapper(model):
+            model = model.module
+        state_dict = model.state_dict()
+        # the EMAHook swaps the parameters and their averages at the end of
+        # the epochs, before the hooks of lower priority
+        hooks = runner.hooks
+        swapped = self.by_epoch and any(
+            isinstance(hook, EMAHook) for hook in hooks[:hooks.index(self)])
+        if (self.snapshot == 'ema') != swapped:
+            for name, _ in model.named_parameters():
+                ema_name = f"ema_{name.replace('.', '_')}"
+                if ema_name not in state_dict:
+                    raise RuntimeError(
+                        'The EMA snapshot needs the EMAHook of mmcv.')
+                state_dict[name] = state_dict[ema_name]
+        self._eval_model.module.load_state_dict(state_dict)
+
+    def _evaluate_async(self, runner, full):
+        """Evaluate a snapshot of the weights in the background, after the
+        previous evaluation, so that the ranks run the collectives of the
+        evaluations in the same order."""
+        self._collect(runner, wait=True)
+        self._load_snapshot(runner)
+        stream = None
+        device = next(self._eval_model.module.parameters()).device
+        if device.type == 'cuda':
+            # the evaluation waits for the copy of the snapshot
+            stream = torch.cuda.Stream(device)
+            stream.wait_stream(torch.cuda.current_stream(device))
+        data_loader = self._full_loader if full else self._fast_loader
+        future = self._executor.submit(self._streaming_test, data_loader,
+                                       stream)
+        tag = f'epoch {runner.epoch + 1}' if self.by_epoch else \
+            f'iter {runner.iter + 1}'
+        self._pending = (tag, future)
+        if full:
+            self._collect(runner, wait=True)
+
+    def _streaming_test(self, data_loader, stream):
+        from mmcls.apis import streaming_test
+        metric_kwargs = {
+            key: self.eval_kwargs[key]
+            for key in ('metric', 'metric_options') if key in self.eval_kwargs
+        }
+        with torch.cuda.stream(stream) if stream is not None else \
+                nullcontext():
+            return streaming_test(
+                self._eval_model,
+                data_loader,
+                group=self._group,
+                show_progress=False,
+                **metric_kwargs)
+
+    def _collect(self, runner, wait):
+        """Log the metrics of the pending evaluation if it is done, or after
+        waiting for it."""
+        if self._pending is None:
+            return
+        tag, future = self._pending
+        if not wait and not future.done():
+            return
+        self._pending = None
+        evaluator = future.result()
+        if runner.rank == 0:
+            eval_res = self.evaluate(runner, evaluator)
+            runner.logger.info(f'Evaluation of the weights of {tag}: '
+                               f'{eval_res}')
+
     def evaluate(self, runner, results):
         eval_res = self.dataloader.dataset.evaluate(
             results, logger=runner.logger, **self.eval_kwargs)
         for name, val in eval_res.items():
             runner.log_buffer.output[name] = val
         runner.log_buffer.ready = True
+        return eval_res
 
 
 class DistEvalHook(EvalHook):
     """Distributed evaluation hook.
 
+    With ``async_eval=True``, every rank evaluates its part of the dataset in
+    the background, see :class:`EvalHook`, and the metrics are merged by an
+    all-reduce in a gloo process group apart from the one of training.
+
     Args:
         dataloader (DataLoader): A PyTorch dataloader.
         interval (int): Evaluation interval (by epochs). Default: 1.
@@ -59,6 +231,13 @@ class DistEvalHook(EvalHook):
             processes. Default: None.
         gpu_collect (bool): Whether to use gpu or cpu to collect results.
             Default: False.
+        test_fn (callable, optional): Test a model with the dataloader, e.g.
+            :func:`mmcls.apis.multi_gpu_test` with ``tensor_collect=True`` or
+            :func:`mmcls.apis.streaming_test`.
+            Default: None, i.e. :func:`mmcls.apis.multi_gpu_test`.
+        async_eval (bool): See :class:`EvalHook`. Default: False.
+        snapshot (str): See :class:`EvalHook`. Default: 'current'.
+        subsample (float, optional): See :class:`EvalHook`. Default: None.
     """
 
     def __init__(self,
@@ -66,6 +245,10 @@ class DistEvalHook(EvalHook):
                  interval=1,
                  gpu_collect=False,
                  by_epoch=True,
+                 test_fn=None,
+                 async_eval=False,
+                 snapshot='current',
+                 subsample=None,
                  **eval_kwargs):
         warnings.warn(
             'DeprecationWarning: EvalHook and DistEvalHook in mmcls will be '
@@ -77,13 +260,19 @@ class DistEvalHook(EvalHook):
         self.interval = interval
         self.gpu_collect = gpu_collect
         self.by_epoch = by_epoch
+        if test_fn is None:
+            from mmcls.apis import multi_gpu_test
+            test_fn = multi_gpu_test
+        self.test_fn = test_fn
         self.eval_kwargs = eval_kwargs
+        self._init_async(async_eval, snapshot, subsample)
 
     def after_train_epoch(self, runner):
+        if self.async_eval:
+            return super().after_train_epoch(runner)
         if not self.by_epoch or not self.every_n_epochs(runner, self.interval):
             return
-        from mmcls.apis import multi_gpu_test
-        results = multi_gpu_test(
+        results = self.test_fn(
             runner.model,
             self.dataloader,
             tmpdir=osp.join(runner.work_dir, '.eval_hook'),
@@ -93,11 +282,12 @@ class DistEvalHook(EvalHook):
             self.evaluate(runner, results)
 
     def after_train_iter(self, runner):
+        if self.async_eval:
+            return super().after_train_iter(runner)
         if self.by_epoch or not self.every_n_iters(runner, self.interval):
             return
-        from mmcls.apis import multi_gpu_test
         runner.log_buffer.clear()
-        results = multi_gpu_test(
+        results = self.test_fn(
             runner.model,
             self.dataloader,
             tmpdir=osp.join(runner.work_dir, '.eval_hook'),
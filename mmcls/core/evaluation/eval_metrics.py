@@ -5,6 +5,133 @@ import numpy as np
 import torch
 
 
+def _to_numpy(pred, target):
+    if isinstance(pred, torch.Tensor):
+        pred = pred.numpy()
+    if isinstance(target, torch.Tensor):
+        target = target.numpy()
+    assert (isinstance(pred, np.ndarray) and isinstance(target, np.ndarray)),\
+        (f'pred and target should be torch.Tensor or np.ndarray, '
+         f'but got {type(pred)} and {type(target)}.')
+    return pred, target.reshape(-1).astype(np.int64)
+
+
+def _as_thrs(thrs):
+    if isinstance(thrs, Number):
+        return (thrs, ), True
+    elif isinstance(thrs, tuple):
+        return thrs, False
+    else:
+        raise TypeError(
+            f'thrs should be a number or tuple, but got {type(thrs)}.')
+
+
+def topk_numpy(pred, k):
+    """Select the top k predictions of every sample.
+
+    The classes are selected by ``np.argpartition`` in chunks of samples, so
+    that only the k selected ones are sorted and the temporary index arrays
+    stay small for many classes.
+
+    Args:
+        pred (np.array): The model prediction with shape (N, C).
+        k (int): Number of the selected predictions, at most C.
+
+    Returns:
+        tuple[np.array]: The scores and the labels of the top k predictions
+        with shape (N, k), in descending order of the scores.
+    """
+    num_classes = pred.shape[1]
+    k = min(k, num_classes)
+    if k == 1:
+        pred_label = pred.argmax(axis=1)[:, None]
+        return np.take_along_axis(pred, pred_label, axis=1), pred_label
+
+    pred_label = np.empty((len(pred), k), dtype=np.int64)
+    chunk = max(1, (1 << 22) // num_classes)
+    for i in range(0, len(pred), chunk):
+        if k < num_classes:
+            pred_label[i:i + chunk] = np.argpartition(
+                pred[i:i + chunk], num_classes - k, axis=1)[:, -k:]
+        else:
+            pred_label[i:i + chunk] = np.arange(num_classes)
+    pred_score = np.take_along_axis(pred, pred_label, axis=1)
+    order = np.argsort(-pred_score, axis=1, kind='stable')
+    return (np.take_along_axis(pred_score, order, axis=1),
+            np.take_along_axis(pred_label, order, axis=1))
+
+
+def topk_accuracy(pred_score, pred_label, target, topk, thrs):
+    """Calculate accuracy from the top k predictions of :func:`topk_numpy`.
+
+    Args:
+        pred_score (np.array): The top k scores with shape (N, k).
+        pred_label (np.array): The top k labels with shape (N, k).
+        target (np.array): The target of each prediction with shape (N, ).
+        topk (tuple[int]): The accuracies to calculate, each at most k.
+        thrs (tuple[Number]): Predictions with scores under the thresholds
+            are considered negative.
+
+    Returns:
+        list[list[np.float64]]: Accuracy, the first dim is ``topk`` and the
+        second dim is ``thrs``.
+    """
+    num, maxk = pred_label.shape
+    # the rank of the target in the top k, or k, and its score
+    correct = pred_label == target.reshape(-1, 1)
+    rank = np.where(correct.any(axis=1), correct.argmax(axis=1), maxk)
+    score = pred_score[np.arange(num), np.minimum(rank, maxk - 1)]
+    res = []
+    for k in topk:
+        res_thr = []
+        for thr in thrs:
+            # Only prediction values larger than thr are counted as correct
+            _correct = (rank < k) & (score > thr)
+            res_thr.append(_correct.sum() * 100. / num)
+        res.append(res_thr)
+    return res
+
+
+def _label_counts(pred_score, pred_label, target, num_classes, thrs):
+    """Count the true positive and positive predictions of every class for
+    every threshold, and the ground truth of every class, by ``bincount``
+    instead of (N, C) masks."""
+    gt_count = np.bincount(target, minlength=num_classes)
+    correct = pred_label == target
+    tp_counts, pred_counts = [], []
+    for thr in thrs:
+        # Only prediction values larger than thr are counted as positive
+        positive = ~(pred_score <= thr) if thr is not None else \
+            np.ones_like(correct)
+        pred_counts.append(
+            np.bincount(pred_label[positive], minlength=num_classes))
+        tp_counts.append(
+            np.bincount(target[positive & correct], minlength=num_classes))
+    return tp_counts, pred_counts, gt_count
+
+
+def _precision_recall_f1(tp_count, pred_count, gt_count, average_mode):
+    precision = tp_count / np.maximum(pred_count, 1) * 100
+    recall = tp_count / np.maximum(gt_count, 1) * 100
+    f1_score = 2 * precision * recall / np.maximum(precision + recall, 1e-20)
+    if average_mode == 'macro':
+        precision = float(precision.mean())
+        recall = float(recall.mean())
+        f1_score = float(f1_score.mean())
+    return precision, recall, f1_score
+
+
+def _support(gt_count, average_mode):
+    res = gt_count.astype(np.float32)
+    if average_mode == 'macro':
+        res = float(res.sum())
+    elif average_mode == 'none':
+        pass
+    else:
+        raise ValueError(f'Unsupport type of averaging {average_mode}.')
+    return res
+
+
 def calculate_confusion_matrix(pred, target):
     """Calculate confusion matrix according to the prediction and target.
 
@@ -28,15 +155,14 @@ def calculate_confusion_matrix(pred, target):
          f'but got {type(pred)} and {type(target)}.')
 
     num_classes = pred.size(1)
-    _, pred_label = pred.topk(1, dim=1)
-    pred_label = pred_label.view(-1)
-    target_label = target.view(-1)
-    assert len(pred_label) == len(target_label)
-    confusion_matrix = torch.zeros(num_classes, num_classes)
     with torch.no_grad():
-        for t, p in zip(target_label, pred_label):
-            confusion_matrix[t.long(), p.long()] += 1
-    return confusion_matrix
+        pred_label = pred.argmax(dim=1).view(-1)
+        target_label = target.view(-1).long()
+        assert len(pred_label) == len(target_label)
+        confusion_matrix = torch.bincount(
+            target_label * num_classes + pred_label,
+            minlength=num_classes**2).view(num_classes, num_classes)
+    return confusion_matrix.float()
 
 
 def precision_recall_f1(pred, target, average_mode='macro', thrs=0.):
@@ -68,60 +194,86 @@ def precision_recall_f1(pred, target, average_mode='macro', thrs=0.):
         | ``average_mode`` = "none"  | np.array           | list[np.array]    |
         +----------------------------+--------------------+-------------------+
     """
+    res = single_label_metrics(
+        pred,
+        target,
+        metrics=('precision', 'recall', 'f1_score'),
+        average_mode=average_mode,
+        thrs=thrs)
+    return res['precision'], res['recall'], res['f1_score']
+
+
+def single_label_metrics(pred,
+                         target,
+                         metrics=('accuracy', 'precision', 'recall',
+                                  'f1_score', 'support'),
+                         topk=1,
+                         thrs=0.,
+                         average_mode='macro'):
+    """Calculate several single label metrics in one pass.
+
+    The top k predictions are selected once for all the metrics, and the
+    precision, recall, f1 score and support are derived from per class
+    counts, so that the cost is dominated by one pass over the prediction.
 
-    allowed_average_mode = ['macro', 'none']
-    if average_mode not in allowed_average_mode:
-        raise ValueError(f'Unsupport type of averaging {average_mode}.')
-
-    if isinstance(pred, torch.Tensor):
-        pred = pred.numpy()
-    if isinstance(target, torch.Tensor):
-        target = target.numpy()
-    assert (isinstance(pred, np.ndarray) and isinstance(target, np.ndarray)),\
-        (f'pred and target should be torch.Tensor or np.ndarray, '
-         f'but got {type(pred)} and {type(target)}.')
-
-    if isinstance(thrs, Number):
-        thrs = (thrs, )
-        return_single = True
-    elif isinstance(thrs, tuple):
-        return_single = False
-    else:
-        raise TypeError(
-            f'thrs should be a number or tuple, but got {type(thrs)}.')
-
-    label = np.indices(pred.shape)[1]
-    pred_label = np.argsort(pred, axis=1)[:, -1]
-    pred_score = np.sort(pred, axis=1)[:, -1]
+    Args:
+        pred (torch.Tensor | np.array): The model prediction with shape (N, C).
+        target (torch.Tensor | np.array): The target of each prediction with
+            shape (N, 1) or (N,).
+        metrics (Sequence[str]): The metrics, among 'accuracy', 'precision',
+            'recall', 'f1_score' and 'support'. Defaults to all of them.
+        topk (int | tuple[int]): The k of the accuracy. Defaults to 1.
+        thrs (Number | tuple[Number], optional): Predictions with scores under
+            the thresholds are considered negative. Default to 0.
+        average_mode (str): The type of averaging of precision, recall, f1
+            score and support, see :func:`precision_recall_f1` and
+            :func:`support`. Defaults to 'macro'.
 
-    precisions = []
-    recalls = []
-    f1_scores = []
-    for thr in thrs:
-        # Only prediction values larger than thr are counted as positive
-        _pred_label = pred_label.copy()
-        if thr is not None:
-            _pred_label[pred_score <= thr] = -1
-        pred_positive = label == _pred_label.reshape(-1, 1)
-        gt_positive = label == target.reshape(-1, 1)
-        precision = (pred_positive & gt_positive).sum(0) / np.maximum(
-            pred_positive.sum(0), 1) * 100
-        recall = (pred_positive & gt_positive).sum(0) / np.maximum(
-            gt_positive.sum(0), 1) * 100
-        f1_score = 2 * precision * recall / np.maximum(precision + recall,
-                                                       1e-20)
-        if average_mode == 'macro':
-            precision = float(precision.mean())
-            recall = float(recall.mean())
-            f1_score = float(f1_score.mean())
-        precisions.append(precision)
-        recalls.append(recall)
-        f1_scores.append(f1_score)
-
-    if return_single:
-        return precisions[0], recalls[0], f1_scores[0]
+    Returns:
+        dict: The value of each metric, in the format of its function, e.g.
+        ``mmcls.models.losses.accuracy`` and :func:`precision`.
+    """
+    pred, target = _to_numpy(pred, target)
+    thrs, return_single = _as_thrs(thrs)
+    if isinstance(topk, int):
+        topk, topk_single = (topk, ), True
     else:
-        return precisions, recalls, f1_scores
+        topk_single = False
+    num_classes = pred.shape[1]
+    assert len(pred) == len(target)
+
+    res = {}
+    precision_recall_f1_keys = ['precision', 'recall', 'f1_score']
+    use_topk = 'accuracy' in metrics or len(
+        set(metrics) & set(precision_recall_f1_keys)) != 0
+    if use_topk:
+        maxk = max(topk) if 'accuracy' in metrics else 1
+        pred_score, pred_label = topk_numpy(pred, maxk)
+
+    if 'accuracy' in metrics:
+        acc = topk_accuracy(pred_score, pred_label, target, topk, thrs)
+        if return_single:
+            acc = [a[0] for a in acc]
+        res['accuracy'] = acc[0] if topk_single else acc
+
+    if len(set(metrics) & set(precision_recall_f1_keys)) != 0:
+        allowed_average_mode = ['macro', 'none']
+        if average_mode not in allowed_average_mode:
+            raise ValueError(f'Unsupport type of averaging {average_mode}.')
+        tp_counts, pred_counts, gt_count = _label_counts(
+            pred_score[:, 0], pred_label[:, 0], target, num_classes, thrs)
+        values = [
+            _precision_recall_f1(tp_count, pred_count, gt_count, average_mode)
+            for tp_count, pred_count in zip(tp_counts, pred_counts)
+        ]
+        for key, value in zip(precision_recall_f1_keys, zip(*values)):
+            if key in metrics:
+                res[key] = value[0] if return_single else list(value)
+
+    if 'support' in metrics:
+        res['support'] = _support(
+            np.bincount(target, minlength=num_classes), average_mode)
+    return res
 
 
 def precision(pred, target, average_mode='macro', thrs=0.):
@@ -236,13 +388,6 @@ def support(pred, target, average_mode='macro'):
             - If the ``average_mode`` is set to none, the function returns
               a np.array with shape C.
     """
-    confusion_matrix = calculate_confusion_matrix(pred, target)
-    with torch.no_grad():
-        res = confusion_matrix.sum(1)
-        if average_mode == 'macro':
-            res = float(res.sum().numpy())
-        elif average_mode == 'none':
-            res = res.numpy()
-        else:
-            raise ValueError(f'Unsupport type of averaging {average_mode}.')
-    return res
+    return single_label_metrics(
+        pred, target, metrics=('support', ),
+        average_mode=average_mode)['support']
@@ -0,0 +1,383 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import warnings
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from .eval_metrics import _as_thrs, _precision_recall_f1, _support
+
+
+class StreamingMetric:
+    """Base class of the metrics accumulated batch by batch.
+
+    A metric keeps its state in tensors of counts, whose sizes depend on the
+    number of classes but not on the number of samples, so that the scores of
+    a batch are dropped after :meth:`update`. The states live on the device of
+    the scores and the states of several ranks are merged by summation, see
+    :class:`StreamingEvaluator`. The states of a metric with ``lazy_states``
+    are created by the first batch.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.lazy_states = False
+
+    def add_state(self, name, *shape):
+        # float64 counts are exact up to 2**53 and share the dtype of the
+        # flat buffer of the all-reduce
+        self.states[name] = torch.zeros(shape, dtype=torch.float64)
+
+    def to(self, device):
+        for name, state in self.states.items():
+            self.states[name] = state.to(device)
+        return self
+
+    def reset(self):
+        for state in self.states.values():
+            state.zero_()
+
+    def update(self, pred, target):
+        """Accumulate a batch.
+
+        Args:
+            pred (torch.Tensor): The model prediction with shape (B, C).
+            target (torch.Tensor): The target of each prediction, on the
+                device of ``pred``.
+        """
+        raise NotImplementedError
+
+    def compute(self):
+        """dict: The value of each metric."""
+        raise NotImplementedError
+
+
+class StreamingAccuracy(StreamingMetric):
+    """Top-k accuracy, as ``mmcls.models.losses.accuracy``.
+
+    Args:
+        topk (int | tuple[int]): The k of the accuracy. Defaults to 1.
+        thrs (Number | tuple[Number]): Predictions with scores under the
+            thresholds are considered negative. Defaults to 0.
+    """
+
+    def __init__(self, topk=1, thrs=0.):
+        super().__init__()
+        if isinstance(topk, int):
+            self.topk, self.topk_single = (topk, ), True
+        else:
+            self.topk, self.topk_single = tuple(topk), False
+        self.thrs, self.thrs_single = _as_thrs(thrs)
+        self.add_state('correct', len(self.topk), len(self.thrs))
+        self.add_state('num', 1)
+
+    def update(self, pred, target):
+        maxk = min(max(self.topk), pred.size(1))
+        pred_score, pred_label = pred.topk(maxk, dim=1)
+        # the rank of the target in the top k, or k, and its score
+        correct = pred_label == target.view(-1, 1)
+        rank = torch.where(
+            correct.any(dim=1),
+            correct.to(torch.uint8).argmax(dim=1),
+            correct.new_full((len(pred), ), maxk, dtype=torch.int64))
+        score = pred_score.gather(1, rank.clamp(max=maxk - 1)[:, None])
+        ks = torch.tensor(self.topk, device=pred.device)
+        thrs = torch.tensor(self.thrs, device=pred.device)
+        # Only prediction values larger than thr are counted as correct
+        self.states['correct'] += ((rank[:, None, None] < ks[:, None])
+                                   & (score[:, None] > thrs)).sum(dim=0)
+        self.states['num'] += len(pred)
+
+    def compute(self):
+        num = self.states['num'].item()
+        acc = [[np.float64(c) * 100. / num for c in correct_thr]
+               for correct_thr in self.states['correct'].tolist()]
+        if self.thrs_single:
+            acc = [a[0] for a in acc]
+        return dict(accuracy=acc[0] if self.topk_single else acc)
+
+
+class StreamingPrecisionRecallF1(StreamingMetric):
+    """Precision, recall, f1 score and support from per class counts, as
+    :func:`mmcls.core.evaluation.single_label_metrics`.
+
+    Args:
+        num_classes (int, optional): Number of classes. Defaults to None, i.e.
+            the number of the scores of the first batch.
+        thrs (Number | tuple[Number]): Predictions with scores under the
+            thresholds are considered negative. Defaults to 0.
+        average_mode (str): The type of averaging, 'macro' or 'none'.
+            Defaults to 'macro'.
+        metrics (Sequence[str]): The metrics among 'precision', 'recall',
+            'f1_score' and 'support'. Defaults to all of them.
+    """
+
+    def __init__(self,
+                 num_classes=None,
+                 thrs=0.,
+                 average_mode='macro',
+                 metrics=('precision', 'recall', 'f1_score', 'support')):
+        super().__init__()
+        if average_mode not in ['macro', 'none']:
+            raise ValueError(f'Unsupport type of averaging {average_mode}.')
+        self.thrs, self.thrs_single = _as_thrs(thrs)
+        self.average_mode = average_mode
+        self.metrics = metrics
+        self.num_classes = None
+        self.lazy_states = num_classes is None
+        if num_classes is not None:
+            self._add_states(num_classes)
+
+    def _add_states(self, num_classes):
+        self.num_classes = num_classes
+        self.add_state('tp_counts', len(self.thrs), num_classes)
+        self.add_state('pred_counts', len(self.thrs), num_classes)
+        self.add_state('gt_count', num_classes)
+
+    def update(self, pred, target):
+        if self.num_classes is None:
+            self._add_states(pred.size(1))
+            self.to(pred.device)
+        pred_score, pred_label = pred.max(dim=1)
+        correct = pred_label == target
+        for i, thr in enumerate(self.thrs):
+            # Only prediction values larger than thr are counted as positive
+            positive = ~(pred_score <= thr)
+            self.states['pred_counts'][i] += torch.bincount(
+                pred_label[positive], minlength=self.num_classes)
+            self.states['tp_counts'][i] += torch.bincount(
+                target[positive & correct], minlength=self.num_classes)
+        self.states['gt_count'] += torch.bincount(
+            target, minlength=self.num_classes)
+
+    def compute(self):
+        gt_count = self.states['gt_count'].cpu().numpy()
+        values = [
+            _precision_recall_f1(tp_count, pred_count, gt_count,
+                                 self.average_mode)
+            for tp_count, pred_count in zip(
+                self.states['tp_counts'].cpu().numpy(),
+                self.states['pred_counts'].cpu().numpy())
+        ]
+        res = {}
+        for key, value in zip(['precision', 'recall', 'f1_score'],
+                              zip(*values)):
+            if key in self.metrics:
+                res[key] = value[0] if self.thrs_single else list(value)
+        if 'support' in self.metrics:
+            res['support'] = _support(gt_count, self.average_mode)
+        return res
+
+
+class StreamingConfusionMatrix(StreamingMetric):
+    """Confusion matrix, as
+    :func:`mmcls.core.evaluation.calculate_confusion_matrix`.
+
+    Args:
+        num_classes (int, optional): Number of classes. Defaults to None, i.e.
+            the number of the scores of the first batch.
+    """
+
+    def __init__(self, num_classes=None):
+        super().__init__()
+        self.num_classes = None
+        self.lazy_states = num_classes is None
+        if num_classes is not None:
+            self._add_states(num_classes)
+
+    def _add_states(self, num_classes):
+        self.num_classes = num_classes
+        self.add_state('confusion_matrix', num_classes, num_classes)
+
+    def update(self, pred, target):
+        if self.num_classes is None:
+            self._add_states(pred.size(1))
+            self.to(pred.device)
+        pred_label = pred.argmax(dim=1)
+        self.states['confusion_matrix'] += torch.bincount(
+            target * self.num_classes + pred_label,
+            minlength=self.num_classes**2).view(self.num_classes,
+                                                self.num_classes)
+
+    def compute(self):
+        return dict(confusion_matrix=self.states['confusion_matrix'].float())
+
+
+class StreamingMAP(StreamingMetric):
+    """Mean average precision of multi-label scores in [0, 1], from per class
+    histograms of the scores of the positive and the negative labels.
+
+    The labels of a bin of scores are ranked as ties, i.e. the positive ones
+    get the precision at the end of the bin, and the result converges to
+    :func:`mmcls.core.evaluation.mAP` with the number of bins. Difficult
+    labels, i.e. -1, are ignored like in :func:`mAP`.
+
+    Args:
+        num_classes (int): Number of classes.
+        num_bins (int): Number of the bins of the scores. Defaults to 1000.
+    """
+
+    def __init__(self, num_classes, num_bins=1000):
+        super().__init__()
+        self.num_classes = num_classes
+        self.num_bins = num_bins
+        self.add_state('pos_hist', num_classes, num_bins)
+        self.add_state('neg_hist', num_classes, num_bins)
+
+    def update(self, pred, target):
+        bins = (pred * self.num_bins).long().clamp_(0, self.num_bins - 1)
+        bins += torch.arange(
+            self.num_classes, device=pred.device)[None] * self.num_bins
+        for name, label in [('pos_hist', 1), ('neg_hist', 0)]:
+            self.states[name] += torch.bincount(
+                bins[target == label],
+                minlength=self.num_classes * self.num_bins).view(
+                    self.num_classes, self.num_bins)
+
+    def compute(self):
+        eps = np.finfo(np.float32).eps
+        # in descending order of the scores
+        pos_hist = self.states['pos_hist'].flip(1).cpu().numpy()
+        neg_hist = self.states['neg_hist'].flip(1).cpu().numpy()
+        tp = np.cumsum(pos_hist, axis=1)
+        pn = np.cumsum(pos_hist + neg_hist, axis=1)
+        precision = tp / np.maximum(pn, eps)
+        ap = (pos_hist * precision).sum(axis=1) / np.maximum(tp[:, -1], eps)
+        return dict(mAP=ap.mean() * 100.0)
+
+
+class StreamingMultiLabelPerformance(StreamingMetric):
+    """CP, CR, CF1, OP, OR and OF1 from per class counts, as
+    :func:`mmcls.core.evaluation.average_performance`.
+
+    Args:
+        num_classes (int): Number of classes.
+        thr (float): The confidence threshold. Defaults to None.
+        k (int): Top-k performance. Note that if thr and k are both given, k
+            will be ignored. Defaults to None.
+    """
+
+    def __init__(self, num_classes, thr=None, k=None):
+        super().__init__()
+        if thr is None and k is None:
+            thr = 0.5
+            warnings.warn('Neither thr nor k is given, set thr as 0.5 by '
+                          'default.')
+        elif thr is not None and k is not None:
+            warnings.warn('Both thr and k are given, use threshold in favor '
+                          'of top-k.')
+        self.thr = thr
+        self.k = k
+        self.add_state('counts', 3, num_classes)
+
+    def update(self, pred, target):
+        if self.thr is not None:
+            # a label is predicted positive if the confidence is no lower
+            # than thr
+            pos_inds = pred >= self.thr
+        else:
+            # top-k labels will be predicted positive for any example
+            pos_inds = torch.zeros_like(pred, dtype=torch.bool)
+            pos_inds.scatter_(1, pred.topk(self.k, dim=1)[1], True)
+        # difficult examples are negative
+        gt_inds = target == 1
+        self.states['counts'] += torch.stack([(pos_inds & gt_inds).sum(dim=0),
+                                              (pos_inds & ~gt_inds).sum(dim=0),
+                                              (~pos_inds & gt_inds).sum(dim=0)
+                                              ])
+
+    def compute(self):
+        eps = np.finfo(np.float32).eps
+        tp, fp, fn = self.states['counts'].cpu().numpy()
+        precision_class = tp / np.maximum(tp + fp, eps)
+        recall_class = tp / np.maximum(tp + fn, eps)
+        CP = precision_class.mean() * 100.0
+        CR = recall_class.mean() * 100.0
+        CF1 = 2 * CP * CR / np.maximum(CP + CR, eps)
+        OP = tp.sum() / np.maximum(tp.sum() + fp.sum(), eps) * 100.0
+        OR = tp.sum() / np.maximum(tp.sum() + fn.sum(), eps) * 100.0
+        OF1 = 2 * OP * OR / np.maximum(OP + OR, eps)
+        return dict(CP=CP, CR=CR, CF1=CF1, OP=OP, OR=OR, OF1=OF1)
+
+
+class StreamingEvaluator:
+    """A group of streaming metrics updated by the same batches.
+
+    The evaluator is usually built by the ``build_streaming_evaluator`` of a
+    dataset, updated by :func:`mmcls.apis.streaming_test`, and passed to the
+    ``evaluate`` of the dataset in place of the results. The memory is O(C)
+    for the accuracy, the precision, the recall and the f1 score, and O(C^2)
+    for the confusion matrix, instead of O(N * C) for the scores.
+
+    Args:
+        metrics (list[:obj:`StreamingMetric`]): The metrics.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def update(self, pred, target):
+        """Accumulate a batch in all the metrics.
+
+        Args:
+            pred (torch.Tensor | np.ndarray | list[np.ndarray]): The model
+                prediction with shape (B, C), e.g. the output of a head with
+                ``post_process=False``, or its rows.
+            target (torch.Tensor | np.ndarray): The target of each prediction.
+        """
+        if isinstance(pred, list):
+            pred = np.stack(pred)
+        pred = torch.as_tensor(pred)
+        target = torch.as_tensor(target, device=pred.device).long()
+        for metric in self.metrics:
+            metric.to(pred.device).update(pred, target)
+
+    def all_reduce(self, group=None):
+        """Sum the states of all the ranks by one all-reduce of a flat
+        tensor, after the one of the numbers of classes of the metrics with
+        ``lazy_states``.
+
+        Args:
+            group (ProcessGroup, optional): The process group of the ranks.
+                Defaults to None, i.e. the default process group.
+        """
+        if not (dist.is_available() and dist.is_initialized()) or \
+                dist.get_world_size(group) == 1:
+            return
+        device = 'cuda' if dist.get_backend(group) == 'nccl' else 'cpu'
+        # the ranks without batches create the states sized by the first
+        # batch of the others, so that the flat tensors match
+        lazy_metrics = [
+            metric for metric in self.metrics if metric.lazy_states
+        ]
+        if len(lazy_metrics) != 0:
+            num_classes = torch.tensor(
+                [metric.num_classes or 0 for metric in lazy_metrics],
+                device=device)
+            dist.all_reduce(num_classes, op=dist.ReduceOp.MAX, group=group)
+            for metric, num in zip(lazy_metrics, num_classes.tolist()):
+                if metric.num_classes is None and num > 0:
+                    metric._add_states(num)
+        states = [
+            state for metric in self.metrics
+            for state in metric.states.values()
+        ]
+        flat = torch.cat([state.reshape(-1).to(device) for state in states])
+        dist.all_reduce(flat, group=group)
+        start = 0
+        for state in states:
+            state.copy_(flat[start:start + state.numel()].view_as(state))
+            start += state.numel()
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def compute(self):
+        """dict: The value of each metric, in the format of the function of
+        the metric, e.g. :func:`mmcls.core.evaluation.single_label_metrics`.
+        """
+        res = {}
+        for metric in self.metrics:
+            res.update(metric.compute())
+        return res
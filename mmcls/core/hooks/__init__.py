@@ -0,0 +1,4 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+from .head_profiler_hook import HeadProfilerHook
+
+__all__ = ['HeadProfilerHook']
@@ -0,0 +1,54 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import os.path as osp
+
+from mmcv.runner import HOOKS, Hook, get_dist_info
+
+
+@HOOKS.register_module()
+class HeadProfilerHook(Hook):
+    """Report the ``HeadProfiler`` statistics of the model heads.
+
+    After every training iteration the statistics of every submodule with an
+    enabled ``profiler`` are moved to the runner log buffer, where the logger
+    hooks average and print them. It has to run before the logger hooks,
+    which the default ``'NORMAL'`` priority of custom hooks ensures.
+
+    Args:
+        trace_file (str, optional): If given, the Chrome trace of every
+            profiler is written to this file in ``runner.work_dir`` after the
+            run, suffixed with the rank in distributed runs. The profilers
+            need ``trace=True``. Defaults to None.
+    """
+
+    def __init__(self, trace_file=None):
+        self.trace_file = trace_file
+
+    @staticmethod
+    def profilers(runner):
+        model = runner.model
+        if hasattr(model, 'module'):
+            model = model.module
+        for name, module in model.named_modules():
+            profiler = getattr(module, 'profiler', None)
+            if profiler is not None and profiler.enabled:
+                yield name, profiler
+
+    def after_train_iter(self, runner):
+        for _, profiler in self.profilers(runner):
+            stats = profiler.pop_stats()
+            if stats:
+                runner.log_buffer.update(stats)
+
+    def after_run(self, runner):
+        if self.trace_file is None:
+            return
+        rank, world_size = get_dist_info()
+        for name, profiler in self.profilers(runner):
+            root, ext = osp.splitext(self.trace_file)
+            if name:
+                root = f'{root}_{name}'
+            if world_size > 1:
+                root = f'{root}_rank{rank}'
+            path = osp.join(runner.work_dir, root + ext)
+            profiler.export_chrome_trace(path)
+            runner.logger.info(f'Saved the head trace to {path}')
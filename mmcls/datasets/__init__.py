@@ -1,4 +1,6 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+from .annotations import (ArrayAnnotations, ColumnarAnnotations,
+                          PackedAnnotations)
 from .base_dataset import BaseDataset
 from .builder import DATASETS, PIPELINES, build_dataloader, build_dataset
 from .cifar import CIFAR10, CIFAR100
@@ -8,12 +10,15 @@ from .imagenet import ImageNet
 from .imagenet21k import ImageNet21k
 from .mnist import MNIST, FashionMNIST
 from .multi_label import MultiLabelDataset
-from .samplers import DistributedSampler
+from .samplers import DistributedSampler, ShardedSampler
+from .sharded import ShardedDataset, write_shards
 from .voc import VOC
 
 __all__ = [
     'BaseDataset', 'ImageNet', 'CIFAR10', 'CIFAR100', 'MNIST', 'FashionMNIST',
     'VOC', 'MultiLabelDataset', 'build_dataloader', 'build_dataset',
     'DistributedSampler', 'ConcatDataset', 'RepeatDataset',
-    'ClassBalancedDataset', 'DATASETS', 'PIPELINES', 'ImageNet21k'
+    'ClassBalancedDataset', 'DATASETS', 'PIPELINES', 'ImageNet21k',
+    'PackedAnnotations', 'ShardedDataset', 'ShardedSampler', 'write_shards',
+    'ArrayAnnotations', 'ColumnarAnnotations'
 ]
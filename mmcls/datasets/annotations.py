@@ -0,0 +1,127 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import numpy as np
+
+
+class ColumnarAnnotations(object):
+    """Base of the annotation stores that keep a whole dataset in arrays.
+
+    A store holds the labels in the int64 array ``gt_labels`` and builds a
+    fresh annotation dict in the format of ``BaseDataset.data_infos`` on
+    every access, so that it can be used in place of the list and its items
+    need no copy before entering the pipeline.
+    """
+
+    def __len__(self):
+        return len(self.gt_labels)
+
+    def _check_index(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f'index {idx} is out of range')
+        return idx
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class PackedAnnotations(ColumnarAnnotations):
+    """Columnar store of single-label image annotations.
+
+    A list of per-image dicts costs a few hundred bytes of Python objects per
+    image, and every DataLoader worker gradually unshares the pages holding
+    them as reference counting and garbage collection touch the objects.
+    Here the labels live in one int64 array and the file names in one utf-8
+    byte buffer indexed by an offsets array, so the annotations of a dataset
+    are three NumPy arrays whatever its size.
+
+    Args:
+        filenames (Sequence[str]): File name of every image, relative to
+            ``img_prefix``.
+        gt_labels (Sequence[int] | np.ndarray): Label of every image.
+        img_prefix (str, optional): The ``img_prefix`` of every image.
+            Defaults to None.
+    """
+
+    def __init__(self, filenames, gt_labels, img_prefix=None):
+        encoded = [filename.encode('utf-8') for filename in filenames]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=self.offsets[1:])
+        self.paths = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self.gt_labels = np.array(gt_labels, dtype=np.int64)
+        self.gt_labels.flags.writeable = False
+        self.img_prefix = img_prefix
+        assert len(self.gt_labels) == len(encoded), \
+            'The numbers of file names and labels differ.'
+
+    @classmethod
+    def from_arrays(cls, paths, offsets, gt_labels, img_prefix=None):
+        """Build the store from the arrays of another one, e.g. loaded from
+        disk, without going through Python strings."""
+        annotations = cls([], [], img_prefix)
+        annotations.paths = np.asarray(paths, dtype=np.uint8)
+        annotations.offsets = np.asarray(offsets, dtype=np.int64)
+        annotations.gt_labels = np.array(gt_labels, dtype=np.int64)
+        annotations.gt_labels.flags.writeable = False
+        assert len(annotations.offsets) == len(annotations.gt_labels) + 1, \
+            'The numbers of file names and labels differ.'
+        return annotations
+
+    def get_filename(self, idx):
+        """File name of image ``idx``."""
+        idx = self._check_index(idx)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.paths[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, idx):
+        idx = self._check_index(idx)
+        return {
+            'img_prefix': self.img_prefix,
+            'img_info': {
+                'filename': self.get_filename(idx)
+            },
+            'gt_label': np.array(self.gt_labels[idx], dtype=np.int64)
+        }
+
+
+class ArrayAnnotations(ColumnarAnnotations):
+    """Store of single-label images held in one array.
+
+    The item of an image is a view of ``imgs``, which is typically a
+    read-only memory map of an ``.npy`` cache: DataLoader workers then share
+    the pages of the cache and a sample costs no copy until a transform
+    writes a new image. Transforms must not modify the image in place. A
+    pickled store maps the cache again instead of copying its content.
+
+    Args:
+        imgs (np.ndarray): The uint8 images, of shape (N, H, W) or
+            (N, H, W, C).
+        gt_labels (Sequence[int] | np.ndarray): Label of every image.
+    """
+
+    def __init__(self, imgs, gt_labels):
+        self.imgs = imgs
+        self.gt_labels = np.array(gt_labels, dtype=np.int64)
+        self.gt_labels.flags.writeable = False
+        assert len(self.imgs) == len(self.gt_labels), \
+            'The numbers of images and labels differ.'
+
+    def __getitem__(self, idx):
+        idx = self._check_index(idx)
+        return {
+            'img': np.asarray(self.imgs[idx]),
+            'gt_label': np.array(self.gt_labels[idx], dtype=np.int64)
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self.imgs, np.memmap) and self.imgs.filename:
+            state['imgs'] = self.imgs.filename
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state['imgs'], str):
+            state['imgs'] = np.load(state['imgs'], mmap_mode='r')
+        self.__dict__.update(state)
@@ -7,8 +7,10 @@ import mmcv
 import numpy as np
 from torch.utils.data import Dataset
 
-from mmcls.core.evaluation import precision_recall_f1, support
-from mmcls.models.losses import accuracy
+from mmcls.core.evaluation import (StreamingAccuracy, StreamingEvaluator,
+                                   StreamingPrecisionRecallF1,
+                                   single_label_metrics)
+from .annotations import ColumnarAnnotations
 from .pipelines import Compose
 
 
@@ -23,6 +25,11 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
             the subclass is expected to read from the ann_file. When ann_file
             is None, the subclass is expected to read according to data_prefix
         test_mode (bool): in train mode or test mode
+
+    ``load_annotations`` returns either a list of dicts or a
+    :class:`ColumnarAnnotations` store like :class:`PackedAnnotations`, for
+    which the labels are read from its array and the annotations of a sample
+    are not copied.
     """
 
     CLASSES = None
@@ -62,6 +69,8 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
             list[int]: categories for all images.
         """
 
+        if isinstance(self.data_infos, ColumnarAnnotations):
+            return self.data_infos.gt_labels
         gt_labels = np.array([data['gt_label'] for data in self.data_infos])
         return gt_labels
 
@@ -75,10 +84,16 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
             cat_ids (List[int]): Image category of specified index.
         """
 
+        if isinstance(self.data_infos, ColumnarAnnotations):
+            return [int(self.data_infos.gt_labels[idx])]
         return [int(self.data_infos[idx]['gt_label'])]
 
     def prepare_data(self, idx):
-        results = copy.deepcopy(self.data_infos[idx])
+        if isinstance(self.data_infos, ColumnarAnnotations):
+            # the store builds a new dict on every access
+            results = self.data_infos[idx]
+        else:
+            results = copy.deepcopy(self.data_infos[idx])
         return self.pipeline(results)
 
     def __len__(self):
@@ -122,7 +137,10 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
         """Evaluate the dataset.
 
         Args:
-            results (list): Testing results of the dataset.
+            results (list | :obj:`StreamingEvaluator`): Testing results of the
+                dataset, or the evaluator of :meth:`build_streaming_evaluator`
+                accumulated over the dataset with the same metrics and
+                options.
             metric (str | list[str]): Metrics to be evaluated.
                 Default value is `accuracy`.
             metric_options (dict, optional): Options for calculating metrics.
@@ -143,11 +161,6 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
             'accuracy', 'precision', 'recall', 'f1_score', 'support'
         ]
         eval_results = {}
-        results = np.vstack(results)
-        gt_labels = self.get_gt_labels()
-        num_imgs = len(results)
-        assert len(gt_labels) == num_imgs, 'dataset testing results should '\
-            'be of the same length as gt_labels.'
 
         invalid_metrics = set(metrics) - set(allowed_metrics)
         if len(invalid_metrics) != 0:
@@ -157,11 +170,26 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
         thrs = metric_options.get('thrs')
         average_mode = metric_options.get('average_mode', 'macro')
 
+        if isinstance(results, StreamingEvaluator):
+            values = results.compute()
+        else:
+            results = np.vstack(results)
+            gt_labels = self.get_gt_labels()
+            num_imgs = len(results)
+            assert len(gt_labels) == num_imgs, 'dataset testing results '\
+                'should be of the same length as gt_labels.'
+
+            # all the metrics are calculated from one top k selection
+            values = single_label_metrics(
+                results,
+                gt_labels,
+                metrics=metrics,
+                topk=topk,
+                thrs=thrs if thrs is not None else 0.,
+                average_mode=average_mode)
+
         if 'accuracy' in metrics:
-            if thrs is not None:
-                acc = accuracy(results, gt_labels, topk=topk, thrs=thrs)
-            else:
-                acc = accuracy(results, gt_labels, topk=topk)
+            acc = values['accuracy']
             if isinstance(topk, tuple):
                 eval_results_ = {
                     f'accuracy_top-{k}': a
@@ -170,38 +198,72 @@ class BaseDataset(Dataset, metaclass=ABCMeta):
             else:
                 eval_results_ = {'accuracy': acc}
             if isinstance(thrs, tuple):
-                for key, values in eval_results_.items():
+                for key, values_ in eval_results_.items():
                     eval_results.update({
                         f'{key}_thr_{thr:.2f}': value.item()
-                        for thr, value in zip(thrs, values)
+                        for thr, value in zip(thrs, values_)
                     })
             else:
-                eval_results.update(
-                    {k: v.item()
-                     for k, v in eval_results_.items()})
+                eval_results.update({
+                    k: v.item()
+                    for k, v in eval_results_.items()
+                })
 
         if 'support' in metrics:
-            support_value = support(
-                results, gt_labels, average_mode=average_mode)
-            eval_results['support'] = support_value
-
-        precision_recall_f1_keys = ['precision', 'recall', 'f1_score']
-        if len(set(metrics) & set(precision_recall_f1_keys)) != 0:
-            if thrs is not None:
-                precision_recall_f1_values = precision_recall_f1(
-                    results, gt_labels, average_mode=average_mode, thrs=thrs)
-            else:
-                precision_recall_f1_values = precision_recall_f1(
-                    results, gt_labels, average_mode=average_mode)
-            for key, values in zip(precision_recall_f1_keys,
-                                   precision_recall_f1_values):
-                if key in metrics:
-                    if isinstance(thrs, tuple):
-                        eval_results.update({
-                            f'{key}_thr_{thr:.2f}': value
-                            for thr, value in zip(thrs, values)
-                        })
-                    else:
-                        eval_results[key] = values
+            eval_results['support'] = values['support']
+
+        for key in ['precision', 'recall', 'f1_score']:
+            if key in metrics:
+                if isinstance(thrs, tuple):
+                    eval_results.update({
+                        f'{key}_thr_{thr:.2f}': value
+                        for thr, value in zip(thrs, values[key])
+                    })
+                else:
+                    eval_results[key] = values[key]
 
         return eval_results
+
+    def build_streaming_evaluator(self,
+                                  metric='accuracy',
+                                  metric_options=None):
+        """Build the accumulators of the metrics of :meth:`evaluate`.
+
+        The evaluator is updated batch by batch with the scores and the
+        ground truth labels, e.g. by :func:`mmcls.apis.streaming_test`, and
+        passed to :meth:`evaluate` in place of the results, with the same
+        metrics and options.
+
+        Args:
+            metric (str | list[str]): Metrics to be evaluated.
+                Default value is `accuracy`.
+            metric_options (dict, optional): Options for calculating metrics,
+                see :meth:`evaluate`. Defaults to None.
+
+        Returns:
+            :obj:`StreamingEvaluator`: The evaluator of the metrics.
+        """
+        if metric_options is None:
+            metric_options = {'topk': (1, 5)}
+        if isinstance(metric, str):
+            metrics = [metric]
+        else:
+            metrics = metric
+        thrs = metric_options.get('thrs')
+        thrs = thrs if thrs is not None else 0.
+
+        streaming_metrics = []
+        if 'accuracy' in metrics:
+            streaming_metrics.append(
+                StreamingAccuracy(metric_options.get('topk', (1, 5)), thrs))
+        counted_metrics = set(metrics) & {
+            'precision', 'recall', 'f1_score', 'support'
+        }
+        if len(counted_metrics) != 0:
+            streaming_metrics.append(
+                StreamingPrecisionRecallF1(
+                    len(self.CLASSES) if self.CLASSES is not None else None,
+                    thrs,
+                    metric_options.get('average_mode', 'macro'),
+                    metrics=counted_metrics))
+        return StreamingEvaluator(streaming_metrics)
@@ -10,7 +10,7 @@ from mmcv.runner import get_dist_info
 from mmcv.utils import Registry, build_from_cfg, digit_version
 from torch.utils.data import DataLoader
 
-from .samplers import DistributedSampler
+from .samplers import DistributedSampler, ShardedSampler
 
 if platform.system() != 'Windows':
     # https://github.com/pytorch/pytorch/issues/973
@@ -56,6 +56,8 @@ def build_dataloader(dataset,
 
     In distributed training, each GPU/process has a dataloader.
     In non-distributed training, there is only one dataloader for all GPUs.
+    Datasets with ``shard_offsets``, like ``ShardedDataset``, are sampled by
+    :class:`ShardedSampler` in both cases.
 
     Args:
         dataset (Dataset): A PyTorch dataset.
@@ -82,14 +84,26 @@ def build_dataloader(dataset,
         DataLoader: A PyTorch dataloader.
     """
     rank, world_size = get_dist_info()
-    if dist:
+    if getattr(dataset, 'shard_offsets', None) is not None:
+        # read the shards sequentially
+        if dist:
+            sampler = ShardedSampler(
+                dataset, world_size, rank, shuffle=shuffle, round_up=round_up)
+        else:
+            sampler = ShardedSampler(
+                dataset, 1, 0, shuffle=shuffle, round_up=False)
+        shuffle = False
+    elif dist:
         sampler = DistributedSampler(
             dataset, world_size, rank, shuffle=shuffle, round_up=round_up)
         shuffle = False
+    else:
+        sampler = None
+
+    if dist:
         batch_size = samples_per_gpu
         num_workers = workers_per_gpu
     else:
-        sampler = None
         batch_size = num_gpus * samples_per_gpu
         num_workers = num_gpus * workers_per_gpu
 
@@ -7,9 +7,11 @@ import numpy as np
 import torch.distributed as dist
 from mmcv.runner import get_dist_info
 
+from .annotations import ArrayAnnotations
 from .base_dataset import BaseDataset
 from .builder import DATASETS
-from .utils import check_integrity, download_and_extract_archive
+from .utils import (check_integrity, download_and_extract_archive,
+                    load_image_cache)
 
 
 @DATASETS.register_module()
@@ -18,6 +20,10 @@ class CIFAR10(BaseDataset):
 
     This implementation is modified from
     https://github.com/pytorch/vision/blob/master/torchvision/datasets/cifar.py
+
+    The images are unpickled once into a uint8 ``.npy`` cache next to the
+    batches, ``<split>_cache_imgs.npy``, which is then memory mapped and
+    shared by the DataLoader workers.
     """  # noqa: E501
 
     base_folder = 'cifar-10-batches-py'
@@ -63,32 +69,34 @@ class CIFAR10(BaseDataset):
         else:
             downloaded_list = self.test_list
 
-        self.imgs = []
-        self.gt_labels = []
-
-        # load the picked numpy arrays
-        for file_name, checksum in downloaded_list:
-            file_path = os.path.join(self.data_prefix, self.base_folder,
-                                     file_name)
-            with open(file_path, 'rb') as f:
-                entry = pickle.load(f, encoding='latin1')
-                self.imgs.append(entry['data'])
-                if 'labels' in entry:
-                    self.gt_labels.extend(entry['labels'])
-                else:
-                    self.gt_labels.extend(entry['fine_labels'])
-
-        self.imgs = np.vstack(self.imgs).reshape(-1, 3, 32, 32)
-        self.imgs = self.imgs.transpose((0, 2, 3, 1))  # convert to HWC
+        file_paths = [
+            os.path.join(self.data_prefix, self.base_folder, file_name)
+            for file_name, _ in downloaded_list
+        ]
+
+        def build():
+            imgs, gt_labels = [], []
+            # load the picked numpy arrays
+            for file_path in file_paths:
+                with open(file_path, 'rb') as f:
+                    entry = pickle.load(f, encoding='latin1')
+                    imgs.append(entry['data'])
+                    if 'labels' in entry:
+                        gt_labels.extend(entry['labels'])
+                    else:
+                        gt_labels.extend(entry['fine_labels'])
+            imgs = np.vstack(imgs).reshape(-1, 3, 32, 32)
+            imgs = imgs.transpose((0, 2, 3, 1))  # convert to HWC
+            return imgs, gt_labels
+
+        split = 'test' if self.test_mode else 'train'
+        self.imgs, self.gt_labels = load_image_cache(
+            os.path.join(self.data_prefix, self.base_folder, f'{split}_cache'),
+            build, file_paths)
 
         self._load_meta()
 
-        data_infos = []
-        for img, gt_label in zip(self.imgs, self.gt_labels):
-            gt_label = np.array(gt_label, dtype=np.int64)
-            info = {'img': img, 'gt_label': gt_label}
-            data_infos.append(info)
-        return data_infos
+        return ArrayAnnotations(self.imgs, self.gt_labels)
 
     def _load_meta(self):
         path = os.path.join(self.data_prefix, self.base_folder,
@@ -0,0 +1,247 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import hashlib
+import json
+import os
+import os.path as osp
+import pickle
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch.distributed as dist
+from mmcv.runner import get_dist_info
+
+from .annotations import PackedAnnotations
+
+# bump when the layout or the content of the cached index changes
+INDEX_VERSION = 1
+
+
+def _has_extension(filename, extensions, case_sensitive):
+    if not case_sensitive:
+        filename = filename.lower()
+    return filename.endswith(extensions)
+
+
+def _scan_folder(root, folder, extensions, recursive, case_sensitive):
+    """Sorted image files of one class folder and the modification time of
+    every directory visited."""
+    files, dirs = [], []
+
+    def _scan(rel_dir):
+        path = osp.join(root, rel_dir)
+        subdirs = []
+        dirs.append((rel_dir, os.stat(path).st_mtime_ns))
+        names = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_file():
+                    if _has_extension(entry.name, extensions, case_sensitive):
+                        names.append(entry.name)
+                elif recursive and entry.is_dir():
+                    subdirs.append(entry.name)
+        files.extend(osp.join(rel_dir, name) for name in sorted(names))
+        for name in sorted(subdirs):
+            _scan(osp.join(rel_dir, name))
+
+    _scan(folder)
+    return files, dirs
+
+
+def build_folder_index(root,
+                       extensions,
+                       recursive=True,
+                       case_sensitive=False,
+                       num_threads=16):
+    """Scan a directory with one sub folder of images per class.
+
+    The class folders are scanned in parallel on a thread pool, which hides
+    the latency of the many small metadata requests on network file systems.
+
+    Args:
+        root (str): Directory of the class folders.
+        extensions (tuple[str]): Allowed image extensions.
+        recursive (bool): Whether to include the images in the sub folders
+            of a class folder. Defaults to True.
+        case_sensitive (bool): Whether the extensions are matched case
+            sensitively. Defaults to False.
+        num_threads (int): Number of scanning threads. Defaults to 16.
+
+    Returns:
+        dict: The index, a dict of arrays: the sorted class ``folders``, the
+            ``paths`` buffer, ``offsets`` and ``gt_labels`` of a
+            :class:`PackedAnnotations`, and the visited directories ``dirs``
+            with their modification times ``mtimes``.
+    """
+    root = osp.expanduser(root)
+    if not case_sensitive:
+        extensions = tuple(ext.lower() for ext in extensions)
+    with os.scandir(root) as entries:
+        folders = sorted(entry.name for entry in entries if entry.is_dir())
+
+    def scan(folder):
+        return _scan_folder(root, folder, extensions, recursive,
+                            case_sensitive)
+
+    with ThreadPoolExecutor(max(num_threads, 1)) as executor:
+        results = list(executor.map(scan, folders))
+
+    filenames, gt_labels, dirs = [], [], [('', os.stat(root).st_mtime_ns)]
+    for gt_label, (files, folder_dirs) in enumerate(results):
+        filenames.extend(files)
+        gt_labels.extend([gt_label] * len(files))
+        dirs.extend(folder_dirs)
+
+    annotations = PackedAnnotations(filenames, gt_labels)
+    return dict(
+        folders=np.array(folders, dtype=str),
+        paths=annotations.paths,
+        offsets=annotations.offsets,
+        gt_labels=annotations.gt_labels,
+        dirs=np.array([rel_dir for rel_dir, _ in dirs], dtype=str),
+        mtimes=np.array([mtime for _, mtime in dirs], dtype=np.int64))
+
+
+def _index_meta(root, extensions, recursive, case_sensitive):
+    return json.dumps(
+        dict(
+            version=INDEX_VERSION,
+            root=osp.abspath(osp.expanduser(root)),
+            extensions=list(extensions),
+            recursive=recursive,
+            case_sensitive=case_sensitive))
+
+
+def _is_fresh(root, index, num_threads):
+    """Whether no visited directory has been modified since the index was
+    built. Adding or removing files or folders changes the modification
+    time of their parent directory."""
+
+    def mtime(rel_dir):
+        try:
+            return os.stat(osp.join(root, str(rel_dir))).st_mtime_ns
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max(num_threads, 1)) as executor:
+        mtimes = list(executor.map(mtime, index['dirs']))
+    return mtimes == index['mtimes'].tolist()
+
+
+def default_index_cache(root, extensions, recursive, case_sensitive):
+    """Path of the cached index of ``root`` in the user cache directory."""
+    meta = _index_meta(root, extensions, recursive, case_sensitive)
+    name = hashlib.sha1(meta.encode('utf-8')).hexdigest()
+    return osp.join(
+        osp.expanduser('~'), '.cache', 'mmcls', 'folder_index', name + '.npz')
+
+
+def _load_or_build(root, extensions, recursive, case_sensitive, num_threads,
+                   cache_file):
+    meta = _index_meta(root, extensions, recursive, case_sensitive)
+    root = osp.expanduser(root)
+    if cache_file is not None and osp.isfile(cache_file):
+        try:
+            with np.load(cache_file) as data:
+                index = {key: data[key] for key in data.files}
+            if str(index.pop('meta')) == meta and _is_fresh(
+                    root, index, num_threads):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_folder_index(root, extensions, recursive, case_sensitive,
+                               num_threads)
+    if cache_file is not None:
+        try:
+            cache_dir = osp.dirname(osp.abspath(cache_file))
+            os.makedirs(cache_dir, exist_ok=True)
+            # write next to the cache and rename, so that readers never see
+            # a partial file
+            with tempfile.NamedTemporaryFile(
+                    dir=cache_dir, suffix='.npz', delete=False) as f:
+                np.savez(f, meta=np.array(meta), **index)
+            os.replace(f.name, cache_file)
+        except OSError:
+            pass
+    return index
+
+
+def _picklable(error):
+    """``error``, or a RuntimeError with its message if it cannot be sent to
+    the other ranks."""
+    try:
+        pickle.dumps(error)
+    except Exception:
+        return RuntimeError(f'{type(error).__name__}: {error}')
+    return error
+
+
+def load_folder_index(root,
+                      extensions,
+                      recursive=True,
+                      case_sensitive=False,
+                      num_threads=16,
+                      cache=True,
+                      cache_file=None):
+    """Index the images of a directory with one sub folder per class.
+
+    The index is cached on disk together with the modification times of the
+    scanned directories, and rebuilt by :func:`build_folder_index` only if
+    one of them changed. In distributed runs only rank 0 validates, builds
+    or loads the index and broadcasts it to the other ranks, or the error it
+    raised, which every rank then raises.
+
+    Args:
+        root (str): Directory of the class folders.
+        extensions (tuple[str]): Allowed image extensions.
+        recursive (bool): Whether to include the images in the sub folders
+            of a class folder. Defaults to True.
+        case_sensitive (bool): Whether the extensions are matched case
+            sensitively. Defaults to False.
+        num_threads (int): Number of scanning threads. Defaults to 16.
+        cache (bool): Whether to use the on-disk cache. Defaults to True.
+        cache_file (str, optional): Path of the cache, see
+            :func:`default_index_cache` for the default.
+
+    Returns:
+        tuple[dict, PackedAnnotations]: The map from folder name to class
+            index and the annotations, whose ``img_prefix`` is ``root``.
+    """
+    extensions = tuple(extensions)
+    if cache and cache_file is None:
+        cache_file = default_index_cache(root, extensions, recursive,
+                                         case_sensitive)
+    if not cache:
+        cache_file = None
+
+    rank, world_size = get_dist_info()
+    index = error = None
+    if rank == 0:
+        try:
+            index = _load_or_build(root, extensions, recursive,
+                                   case_sensitive, num_threads, cache_file)
+        except Exception as e:
+            if world_size == 1:
+                raise
+            error = e
+    if world_size > 1:
+        # the other ranks would otherwise wait forever for a failed index
+        objects = [index, None if error is None else _picklable(error)]
+        dist.broadcast_object_list(objects, src=0)
+        index = objects[0]
+        if error is not None:
+            raise error
+        if objects[1] is not None:
+            raise objects[1]
+
+    folder_to_idx = {
+        str(folder): i
+        for i, folder in enumerate(index['folders'].tolist())
+    }
+    annotations = PackedAnnotations.from_arrays(index['paths'],
+                                                index['offsets'],
+                                                index['gt_labels'], root)
+    return folder_to_idx, annotations
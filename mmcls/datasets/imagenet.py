@@ -1,10 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import os
 
-import numpy as np
-
+from .annotations import PackedAnnotations
 from .base_dataset import BaseDataset
 from .builder import DATASETS
+from .folder_index import load_folder_index
 
 
 def has_file_allowed_extension(filename, extensions):
@@ -67,6 +67,18 @@ class ImageNet(BaseDataset):
 
     This implementation is modified from
     https://github.com/pytorch/vision/blob/master/torchvision/datasets/imagenet.py
+
+    Args:
+        data_prefix (str): the prefix of data path
+        pipeline (list): a list of dict, where each element represents
+            a operation defined in `mmcls.datasets.pipelines`
+        classes (Sequence[str] | str | None): the class names
+        ann_file (str | None): the annotation file. When ann_file is None,
+            the class folders of data_prefix are scanned
+        test_mode (bool): in train mode or test mode
+        scan_cfg (dict, optional): options of :func:`load_folder_index`
+            used to scan data_prefix, e.g. ``num_threads``, ``cache`` and
+            ``cache_file``. Defaults to None.
     """  # noqa: E501
 
     IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif')
@@ -1073,31 +1085,35 @@ class ImageNet(BaseDataset):
         'toilet tissue, toilet paper, bathroom tissue'
     ]
 
+    def __init__(self,
+                 data_prefix,
+                 pipeline,
+                 classes=None,
+                 ann_file=None,
+                 test_mode=False,
+                 scan_cfg=None):
+        self.scan_cfg = dict() if scan_cfg is None else scan_cfg
+        super(ImageNet, self).__init__(data_prefix, pipeline, classes,
+                                       ann_file, test_mode)
+
     def load_annotations(self):
         if self.ann_file is None:
-            folder_to_idx = find_folders(self.data_prefix)
-            samples = get_samples(
-                self.data_prefix,
-                folder_to_idx,
-                extensions=self.IMG_EXTENSIONS)
-            if len(samples) == 0:
+            folder_to_idx, data_infos = load_folder_index(
+                self.data_prefix, self.IMG_EXTENSIONS, **self.scan_cfg)
+            if len(data_infos) == 0:
                 raise (RuntimeError('Found 0 files in subfolders of: '
                                     f'{self.data_prefix}. '
                                     'Supported extensions are: '
                                     f'{",".join(self.IMG_EXTENSIONS)}'))
 
             self.folder_to_idx = folder_to_idx
+            return data_infos
         elif isinstance(self.ann_file, str):
             with open(self.ann_file) as f:
                 samples = [x.strip().rsplit(' ', 1) for x in f.readlines()]
         else:
             raise TypeError('ann_file must be a str or None')
-        self.samples = samples
 
-        data_infos = []
-        for filename, gt_label in self.samples:
-            info = {'img_prefix': self.data_prefix}
-            info['img_info'] = {'filename': filename}
-            info['gt_label'] = np.array(gt_label, dtype=np.int64)
-            data_infos.append(info)
-        return data_infos
+        filenames = [filename for filename, _ in samples]
+        gt_labels = [int(gt_label) for _, gt_label in samples]
+        return PackedAnnotations(filenames, gt_labels, self.data_prefix)
@@ -1,24 +1,12 @@
 # Copyright (c) OpenMMLab. All rights reserved.
-import os
 import warnings
-from typing import List
 
 import numpy as np
-from mmcv.utils import scandir
 
+from .annotations import PackedAnnotations
 from .base_dataset import BaseDataset
 from .builder import DATASETS
-from .imagenet import find_folders
-
-
-class ImageInfo():
-    """class to  store image info, using slots will save memory than using
-    dict."""
-    __slots__ = ['path', 'gt_label']
-
-    def __init__(self, path, gt_label):
-        self.path = path
-        self.gt_label = gt_label
+from .folder_index import load_folder_index
 
 
 @DATASETS.register_module()
@@ -31,10 +19,8 @@ class ImageNet21k(BaseDataset):
      required :
 
         - Delete the samples attribute
-        - using 'slots' create a Data_item tp replace dict
-        - Modify setting `info` dict from function `load_annotations` to
-          function `prepare_data`
-        - using int instead of np.array(..., np.int64)
+        - Store the annotations in a :class:`PackedAnnotations` instead of
+          a list of dicts, which builds the `info` dict in `prepare_data`
 
     Args:
     data_prefix (str): the prefix of data path
@@ -47,6 +33,9 @@ class ImageNet21k(BaseDataset):
     multi_label (bool): use multi label or not.
     recursion_subdir(bool): whether to use sub-directory pictures, which
         are meet the conditions in the folder under category directory.
+    scan_cfg (dict, optional): options of :func:`load_folder_index` used to
+        scan data_prefix, e.g. ``num_threads``, ``cache`` and
+        ``cache_file``. Defaults to None.
     """
 
     IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.ppm', '.bmp', '.pgm', '.tif',
@@ -60,35 +49,16 @@ class ImageNet21k(BaseDataset):
                  ann_file=None,
                  multi_label=False,
                  recursion_subdir=False,
-                 test_mode=False):
+                 test_mode=False,
+                 scan_cfg=None):
         self.recursion_subdir = recursion_subdir
+        self.scan_cfg = dict() if scan_cfg is None else scan_cfg
         if multi_label:
             raise NotImplementedError('Multi_label have not be implemented.')
         self.multi_lable = multi_label
         super(ImageNet21k, self).__init__(data_prefix, pipeline, classes,
                                           ann_file, test_mode)
 
-    def get_cat_ids(self, idx: int) -> List[int]:
-        """Get category id by index.
-
-        Args:
-            idx (int): Index of data.
-
-        Returns:
-            cat_ids (List[int]): Image category of specified index.
-        """
-
-        return [self.data_infos[idx].gt_label]
-
-    def prepare_data(self, idx):
-        info = self.data_infos[idx]
-        results = {
-            'img_prefix': self.data_prefix,
-            'img_info': dict(filename=info.path),
-            'gt_label': np.array(info.gt_label, dtype=np.int64)
-        }
-        return self.pipeline(results)
-
     def load_annotations(self):
         """load dataset annotations."""
         if self.ann_file is None:
@@ -108,29 +78,21 @@ class ImageNet21k(BaseDataset):
 
         return data_infos
 
-    def _find_allowed_files(self, root, folder_name):
-        """find all the allowed files in a folder, including sub folder if
-        recursion_subdir is true."""
-        _dir = os.path.join(root, folder_name)
-        infos_pre_class = []
-        for path in scandir(_dir, self.IMG_EXTENSIONS, self.recursion_subdir):
-            path = os.path.join(folder_name, path)
-            item = ImageInfo(path, self.folder_to_idx[folder_name])
-            infos_pre_class.append(item)
-        return infos_pre_class
-
     def _load_annotations_from_dir(self):
         """load annotations from self.data_prefix directory."""
-        data_infos, empty_classes = [], []
-        folder_to_idx = find_folders(self.data_prefix)
+        folder_to_idx, data_infos = load_folder_index(
+            self.data_prefix,
+            self.IMG_EXTENSIONS,
+            recursive=self.recursion_subdir,
+            case_sensitive=True,
+            **self.scan_cfg)
         self.folder_to_idx = folder_to_idx
-        root = os.path.expanduser(self.data_prefix)
-        for folder_name in folder_to_idx.keys():
-            infos_pre_class = self._find_allowed_files(root, folder_name)
-            if len(infos_pre_class) == 0:
-                empty_classes.append(folder_name)
-            data_infos.extend(infos_pre_class)
 
+        counts = np.bincount(
+            data_infos.gt_labels, minlength=len(folder_to_idx))
+        empty_classes = [
+            folder for folder, idx in folder_to_idx.items() if counts[idx] == 0
+        ]
         if len(empty_classes) != 0:
             msg = 'Found no valid file for the classes ' + \
                 f"{', '.join(sorted(empty_classes))} "
@@ -142,13 +104,13 @@ class ImageNet21k(BaseDataset):
 
     def _load_annotations_from_file(self):
         """load annotations from self.ann_file."""
-        data_infos = []
+        filenames, gt_labels = [], []
         with open(self.ann_file) as f:
             for line in f.readlines():
                 if line == '':
                     continue
                 filepath, gt_label = line.strip().rsplit(' ', 1)
-                info = ImageInfo(filepath, int(gt_label))
-                data_infos.append(info)
+                filenames.append(filepath)
+                gt_labels.append(int(gt_label))
 
-        return data_infos
+        return PackedAnnotations(filenames, gt_labels, self.data_prefix)
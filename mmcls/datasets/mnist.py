@@ -8,9 +8,10 @@ import torch
 import torch.distributed as dist
 from mmcv.runner import get_dist_info, master_only
 
+from .annotations import ArrayAnnotations
 from .base_dataset import BaseDataset
 from .builder import DATASETS
-from .utils import download_and_extract_archive, rm_suffix
+from .utils import download_and_extract_archive, load_image_cache, rm_suffix
 
 
 @DATASETS.register_module()
@@ -19,6 +20,10 @@ class MNIST(BaseDataset):
 
     This implementation is modified from
     https://github.com/pytorch/vision/blob/master/torchvision/datasets/mnist.py
+
+    The images of a split are decoded once into a uint8 ``.npy`` cache in
+    ``data_prefix``, ``<split>_cache_imgs.npy``, which is then memory mapped
+    and shared by the DataLoader workers.
     """  # noqa: E501
 
     resource_prefix = 'http://yann.lecun.com/exdb/mnist/'
@@ -62,22 +67,20 @@ class MNIST(BaseDataset):
                 'Shared storage seems unavailable. Please download dataset ' \
                 f'manually through {self.resource_prefix}.'
 
-        train_set = (read_image_file(train_image_file),
-                     read_label_file(train_label_file))
-        test_set = (read_image_file(test_image_file),
-                    read_label_file(test_label_file))
-
         if not self.test_mode:
-            imgs, gt_labels = train_set
+            image_file, label_file = train_image_file, train_label_file
         else:
-            imgs, gt_labels = test_set
-
-        data_infos = []
-        for img, gt_label in zip(imgs, gt_labels):
-            gt_label = np.array(gt_label, dtype=np.int64)
-            info = {'img': img.numpy(), 'gt_label': gt_label}
-            data_infos.append(info)
-        return data_infos
+            image_file, label_file = test_image_file, test_label_file
+
+        def build():
+            return (read_image_file(image_file).numpy(),
+                    read_label_file(label_file).numpy())
+
+        split = 'test' if self.test_mode else 'train'
+        imgs, gt_labels = load_image_cache(
+            osp.join(self.data_prefix, f'{split}_cache'), build,
+            [image_file, label_file])
+        return ArrayAnnotations(imgs, gt_labels)
 
     @master_only
     def download(self):
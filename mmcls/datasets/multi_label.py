@@ -5,6 +5,8 @@ from typing import List
 import numpy as np
 
 from mmcls.core import average_performance, mAP
+from mmcls.core.evaluation import (StreamingEvaluator, StreamingMAP,
+                                   StreamingMultiLabelPerformance)
 from .base_dataset import BaseDataset
 
 
@@ -33,7 +35,10 @@ class MultiLabelDataset(BaseDataset):
         """Evaluate the dataset.
 
         Args:
-            results (list): Testing results of the dataset.
+            results (list | :obj:`StreamingEvaluator`): Testing results of the
+                dataset, or the evaluator of :meth:`build_streaming_evaluator`
+                accumulated over the dataset with the same metrics and
+                options.
             metric (str | list[str]): Metrics to be evaluated.
                 Default value is 'mAP'. Options are 'mAP', 'CP', 'CR', 'CF1',
                 'OP', 'OR' and 'OF1'.
@@ -60,16 +65,21 @@ class MultiLabelDataset(BaseDataset):
             metrics = metric
         allowed_metrics = ['mAP', 'CP', 'CR', 'CF1', 'OP', 'OR', 'OF1']
         eval_results = {}
+
+        invalid_metrics = set(metrics) - set(allowed_metrics)
+        if len(invalid_metrics) != 0:
+            raise ValueError(f'metric {invalid_metrics} is not supported.')
+
+        if isinstance(results, StreamingEvaluator):
+            values = results.compute()
+            return {k: values[k] for k in metrics}
+
         results = np.vstack(results)
         gt_labels = self.get_gt_labels()
         num_imgs = len(results)
         assert len(gt_labels) == num_imgs, 'dataset testing results should '\
             'be of the same length as gt_labels.'
 
-        invalid_metrics = set(metrics) - set(allowed_metrics)
-        if len(invalid_metrics) != 0:
-            raise ValueError(f'metric {invalid_metrics} is not supported.')
-
         if 'mAP' in metrics:
             mAP_value = mAP(results, gt_labels)
             eval_results['mAP'] = mAP_value
@@ -82,3 +92,35 @@ class MultiLabelDataset(BaseDataset):
                     eval_results[k] = v
 
         return eval_results
+
+    def build_streaming_evaluator(self, metric='mAP', metric_options=None):
+        """Build the accumulators of the metrics of :meth:`evaluate`.
+
+        The mAP is approximated from histograms of the scores, see
+        :class:`mmcls.core.evaluation.StreamingMAP`.
+
+        Args:
+            metric (str | list[str]): Metrics to be evaluated.
+                Default value is 'mAP'.
+            metric_options (dict, optional): Options for calculating metrics.
+                Allowed keys are 'k' and 'thr'. Defaults to None
+
+        Returns:
+            :obj:`StreamingEvaluator`: The evaluator of the metrics.
+        """
+        if metric_options is None:
+            metric_options = {'thr': 0.5}
+        if isinstance(metric, str):
+            metrics = [metric]
+        else:
+            metrics = metric
+
+        # the ground truth labels are of shape (N, C)
+        num_classes = self.get_gt_labels().shape[1]
+        streaming_metrics = []
+        if 'mAP' in metrics:
+            streaming_metrics.append(StreamingMAP(num_classes))
+        if len(set(metrics) - {'mAP'}) != 0:
+            streaming_metrics.append(
+                StreamingMultiLabelPerformance(num_classes, **metric_options))
+        return StreamingEvaluator(streaming_metrics)
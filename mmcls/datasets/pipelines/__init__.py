@@ -2,11 +2,12 @@
 from .auto_augment import (AutoAugment, AutoContrast, Brightness,
                            ColorTransform, Contrast, Cutout, Equalize, Invert,
                            Posterize, RandAugment, Rotate, Sharpness, Shear,
-                           Solarize, SolarizeAdd, Translate)
+                           Solarize, SolarizeAdd, Translate, apply_ops)
+from .cache import CachedTransforms, FileLRUCache
 from .compose import Compose
-from .formatting import (Collect, ImageToTensor, ToNumpy, ToPIL, ToTensor,
-                         Transpose, to_tensor)
-from .loading import LoadImageFromFile
+from .formatting import (Collect, CropFlipToTensor, ImageToTensor, ToNumpy,
+                         ToPIL, ToTensor, Transpose, to_tensor)
+from .loading import LoadImageFromFile, LoadImageFromShard
 from .transforms import (CenterCrop, ColorJitter, Lighting, Normalize, Pad,
                          RandomCrop, RandomErasing, RandomFlip,
                          RandomGrayscale, RandomResizedCrop, Resize)
@@ -18,5 +19,7 @@ __all__ = [
     'RandomGrayscale', 'Shear', 'Translate', 'Rotate', 'Invert',
     'ColorTransform', 'Solarize', 'Posterize', 'AutoContrast', 'Equalize',
     'Contrast', 'Brightness', 'Sharpness', 'AutoAugment', 'SolarizeAdd',
-    'Cutout', 'RandAugment', 'Lighting', 'ColorJitter', 'RandomErasing', 'Pad'
+    'Cutout', 'RandAugment', 'Lighting', 'ColorJitter', 'RandomErasing', 'Pad',
+    'LoadImageFromShard', 'CachedTransforms', 'FileLRUCache', 'apply_ops',
+    'CropFlipToTensor'
 ]
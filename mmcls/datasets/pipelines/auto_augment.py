@@ -6,11 +6,13 @@ from math import ceil
 from numbers import Number
 from typing import Sequence
 
+import cv2
 import mmcv
 import numpy as np
+from mmcv.image.geometric import cv2_interp_codes
+from mmcv.utils import build_from_cfg
 
 from ..builder import PIPELINES
-from .compose import Compose
 
 # Default hyperparameters for all Ops
 _HPARAMS_DEFAULT = dict(pad_val=128)
@@ -43,6 +45,120 @@ def merge_hparams(policy: dict, hparams: dict):
     return policy
 
 
+def _fusable(img):
+    return img.dtype == np.uint8 and img.ndim == 3 and img.shape[2] == 3
+
+
+def _apply_affine_run(img, matrices, pad_val, interpolation):
+    """Warp ``img`` once by the product of the affine ``matrices``."""
+    matrix = matrices[0]
+    for m in matrices[1:]:
+        matrix = np.vstack([m, [0, 0, 1]]) @ np.vstack([matrix, [0, 0, 1]])
+        matrix = matrix[:2]
+    height, width = img.shape[:2]
+    return cv2.warpAffine(
+        img,
+        matrix, (width, height),
+        borderValue=pad_val,
+        flags=cv2_interp_codes[interpolation])
+
+
+def _apply_lut_run(img, luts):
+    """Map ``img`` once by the composition of the lookup tables ``luts``.
+
+    An element of ``luts`` is a table of shape (256, ) or (3, 256), or an op
+    whose table depends on the histogram of the image it gets, which is
+    computed from the histogram of ``img`` and the tables before it.
+    """
+    table = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+    hist = None
+    for lut in luts:
+        if not isinstance(lut, np.ndarray):
+            if hist is None:
+                hist = np.stack([
+                    np.bincount(img[..., c].ravel(), minlength=256)
+                    for c in range(3)
+                ])
+            cur_hist = np.stack([
+                np.bincount(table[c], weights=hist[c], minlength=256)
+                for c in range(3)
+            ])
+            lut = lut.get_lut(cur_hist)
+        lut = np.broadcast_to(lut, (3, 256))
+        table = np.take_along_axis(lut, table.astype(np.intp), axis=1)
+    return cv2.LUT(img, np.ascontiguousarray(table.T).reshape(256, 1, 3))
+
+
+def apply_ops(ops, results, fuse_ops=True, magnitudes=None):
+    """Apply augmentation ops in order, with runs of them fused.
+
+    The ops with ``fuse_type = 'affine'`` (``Shear``, ``Translate``,
+    ``Rotate``) that are applied one after another with the same ``pad_val``
+    and ``interpolation`` are composed into a single ``cv2.warpAffine``, and
+    the ops with ``fuse_type = 'lut'`` (``Posterize``, ``Solarize``,
+    ``SolarizeAdd``, ``Invert``, ``AutoContrast``) into a single lookup table
+    pass. The random numbers are drawn in the same order as by applying the
+    ops one by one, and a lookup table run gives the same images. An affine
+    run interpolates once, so it is sharper than the ops one by one, and keeps
+    the content that an op moves out of the image and a later op moves back.
+
+    Args:
+        ops (list[callable]): The augmentation ops.
+        results (dict): Result dict from the previous transform.
+        fuse_ops (bool): Whether to fuse the runs. Defaults to True.
+        magnitudes (list[tuple[str, Number] | None], optional): The attribute
+            and value of the magnitude set to each op before it is applied.
+            Defaults to None.
+
+    Returns:
+        dict: The result dict.
+    """
+    img_fields = results.get('img_fields', ['img'])
+    fusable = fuse_ops and all(_fusable(results[key]) for key in img_fields)
+    run, run_type = [], None
+
+    def flush():
+        if len(run) == 0:
+            return
+        for key in img_fields:
+            if run_type == 'lut':
+                results[key] = _apply_lut_run(results[key], run)
+            else:
+                results[key] = _apply_affine_run(
+                    results[key], [matrices[key] for matrices in run],
+                    *run_type[1:])
+        run.clear()
+
+    for i, op in enumerate(ops):
+        if magnitudes is not None and magnitudes[i] is not None:
+            setattr(op, *magnitudes[i])
+        fuse_type = getattr(op, 'fuse_type', None) if fusable else None
+        if fuse_type is None:
+            flush()
+            results = op(results)
+            continue
+        if np.random.rand() > op.prob:
+            continue
+
+        if fuse_type == 'affine':
+            fuse_type = ('affine', op.pad_val, op.interpolation)
+            magnitude = op.random_magnitude()
+            item = {
+                key: op.get_matrix(magnitude, results[key].shape)
+                for key in img_fields
+            }
+        else:
+            # the histogram based table is computed when the run is applied
+            item = op if getattr(op, 'lut_uses_hist', False) else \
+                op.get_lut()
+        if fuse_type != run_type:
+            flush()
+            run_type = fuse_type
+        run.append(item)
+    flush()
+    return results
+
+
 @PIPELINES.register_module()
 class AutoAugment(object):
     """Auto augmentation.
@@ -59,9 +175,11 @@ class AutoAugment(object):
         hparams (dict): Configs of hyperparameters. Hyperparameters will be
             used in policies that require these arguments if these arguments
             are not set in policy dicts. Defaults to use _HPARAMS_DEFAULT.
+        fuse_ops (bool): Whether to fuse the runs of affine ops and of lookup
+            table ops of a policy, see :func:`apply_ops`. Defaults to True.
     """
 
-    def __init__(self, policies, hparams=_HPARAMS_DEFAULT):
+    def __init__(self, policies, hparams=_HPARAMS_DEFAULT, fuse_ops=True):
         assert isinstance(policies, list) and len(policies) > 0, \
             'Policies must be a non-empty list.'
         for policy in policies:
@@ -73,17 +191,20 @@ class AutoAugment(object):
                     ' "type".'
 
         self.hparams = hparams
+        self.fuse_ops = fuse_ops
         policies = copy.deepcopy(policies)
         self.policies = []
         for sub in policies:
             merged_sub = [merge_hparams(policy, hparams) for policy in sub]
             self.policies.append(merged_sub)
 
-        self.sub_policy = [Compose(policy) for policy in self.policies]
+        # the ops are built once and shared by all the calls
+        self.sub_policy = [[build_from_cfg(cfg, PIPELINES) for cfg in policy]
+                           for policy in self.policies]
 
     def __call__(self, results):
         sub_policy = random.choice(self.sub_policy)
-        return sub_policy(results)
+        return apply_ops(sub_policy, results, fuse_ops=self.fuse_ops)
 
     def __repr__(self):
         repr_str = self.__class__.__name__
@@ -125,6 +246,9 @@ class RandAugment(object):
         hparams (dict): Configs of hyperparameters. Hyperparameters will be
             used in policies that require these arguments if these arguments
             are not set in policy dicts. Defaults to use _HPARAMS_DEFAULT.
+        fuse_ops (bool): Whether to fuse the runs of affine ops and of lookup
+            table ops among the selected policies, see :func:`apply_ops`.
+            Defaults to True.
 
     Note:
         `magnitude_std` will introduce some randomness to policy, modified by
@@ -144,7 +268,8 @@ class RandAugment(object):
                  magnitude_level,
                  magnitude_std=0.,
                  total_level=30,
-                 hparams=_HPARAMS_DEFAULT):
+                 hparams=_HPARAMS_DEFAULT,
+                 fuse_ops=True):
         assert isinstance(num_policies, int), 'Number of policies must be ' \
             f'of int type, got {type(num_policies)} instead.'
         assert isinstance(magnitude_level, (int, float)), \
@@ -172,10 +297,22 @@ class RandAugment(object):
         self.magnitude_std = magnitude_std
         self.total_level = total_level
         self.hparams = hparams
+        self.fuse_ops = fuse_ops
         policies = copy.deepcopy(policies)
         self._check_policies(policies)
         self.policies = [merge_hparams(policy, hparams) for policy in policies]
 
+        # the ops are built once, with the magnitude of ``magnitude_level``,
+        # and a random magnitude is set to an op right before it is applied
+        self.ops = []
+        for policy in self.policies:
+            cfg = copy.deepcopy(policy)
+            magnitude_key = cfg.pop('magnitude_key', None)
+            if magnitude_key is not None:
+                cfg[magnitude_key] = self._get_magnitude(
+                    self.magnitude_level, *cfg.pop('magnitude_range'))
+            self.ops.append(build_from_cfg(cfg, PIPELINES))
+
     def _check_policies(self, policies):
         for policy in policies:
             assert isinstance(policy, dict) and 'type' in policy, \
@@ -192,36 +329,39 @@ class RandAugment(object):
                     f'`magnitude_range` of RandAugment policy {type_name} ' \
                     f'should be a Sequence with two numbers.'
 
-    def _process_policies(self, policies):
-        processed_policies = []
-        for policy in policies:
-            processed_policy = copy.deepcopy(policy)
-            magnitude_key = processed_policy.pop('magnitude_key', None)
-            if magnitude_key is not None:
-                magnitude = self.magnitude_level
-                # if magnitude_std is positive number or 'inf', move
-                # magnitude_value randomly.
-                if self.magnitude_std == 'inf':
-                    magnitude = random.uniform(0, magnitude)
-                elif self.magnitude_std > 0:
-                    magnitude = random.gauss(magnitude, self.magnitude_std)
-                    magnitude = min(self.total_level, max(0, magnitude))
-
-                val1, val2 = processed_policy.pop('magnitude_range')
-                magnitude = (magnitude / self.total_level) * (val2 -
-                                                              val1) + val1
-
-                processed_policy.update({magnitude_key: magnitude})
-            processed_policies.append(processed_policy)
-        return processed_policies
+    def _get_magnitude(self, magnitude, val1, val2):
+        return (magnitude / self.total_level) * (val2 - val1) + val1
+
+    def _random_magnitude(self, policy):
+        """The attribute and random magnitude of an op, or None if its
+        magnitude does not change."""
+        magnitude_key = policy.get('magnitude_key', None)
+        if magnitude_key is None or not (self.magnitude_std == 'inf'
+                                         or self.magnitude_std > 0):
+            return None
+        magnitude = self.magnitude_level
+        # if magnitude_std is positive number or 'inf', move
+        # magnitude_value randomly.
+        if self.magnitude_std == 'inf':
+            magnitude = random.uniform(0, magnitude)
+        else:
+            magnitude = random.gauss(magnitude, self.magnitude_std)
+            magnitude = min(self.total_level, max(0, magnitude))
+        return magnitude_key, self._get_magnitude(magnitude,
+                                                  *policy['magnitude_range'])
 
     def __call__(self, results):
         if self.num_policies == 0:
             return results
-        sub_policy = random.choices(self.policies, k=self.num_policies)
-        sub_policy = self._process_policies(sub_policy)
-        sub_policy = Compose(sub_policy)
-        return sub_policy(results)
+        indices = random.choices(
+            range(len(self.policies)), k=self.num_policies)
+        magnitudes = [
+            self._random_magnitude(self.policies[i]) for i in indices
+        ]
+        return apply_ops([self.ops[i] for i in indices],
+                         results,
+                         fuse_ops=self.fuse_ops,
+                         magnitudes=magnitudes)
 
     def __repr__(self):
         repr_str = self.__class__.__name__
@@ -251,6 +391,8 @@ class Shear(object):
             'bilinear', 'bicubic', 'area', 'lanczos'. Defaults to 'bicubic'.
     """
 
+    fuse_type = 'affine'
+
     def __init__(self,
                  magnitude,
                  pad_val=128,
@@ -283,10 +425,19 @@ class Shear(object):
         self.random_negative_prob = random_negative_prob
         self.interpolation = interpolation
 
+    def random_magnitude(self):
+        return random_negative(self.magnitude, self.random_negative_prob)
+
+    def get_matrix(self, magnitude, img_shape):
+        """The 2x3 affine matrix of the shear by ``magnitude``."""
+        if self.direction == 'horizontal':
+            return np.float32([[1, magnitude, 0], [0, 1, 0]])
+        return np.float32([[1, 0, 0], [magnitude, 1, 0]])
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
-        magnitude = random_negative(self.magnitude, self.random_negative_prob)
+        magnitude = self.random_magnitude()
         for key in results.get('img_fields', ['img']):
             img = results[key]
             img_sheared = mmcv.imshear(
@@ -331,6 +482,8 @@ class Translate(object):
             'bilinear', 'bicubic', 'area', 'lanczos'. Defaults to 'nearest'.
     """
 
+    fuse_type = 'affine'
+
     def __init__(self,
                  magnitude,
                  pad_val=128,
@@ -363,10 +516,21 @@ class Translate(object):
         self.random_negative_prob = random_negative_prob
         self.interpolation = interpolation
 
+    def random_magnitude(self):
+        return random_negative(self.magnitude, self.random_negative_prob)
+
+    def get_matrix(self, magnitude, img_shape):
+        """The 2x3 affine matrix of the translation by ``magnitude`` of an
+        image of ``img_shape``."""
+        height, width = img_shape[:2]
+        if self.direction == 'horizontal':
+            return np.float32([[1, 0, magnitude * width], [0, 1, 0]])
+        return np.float32([[1, 0, 0], [0, 1, magnitude * height]])
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
-        magnitude = random_negative(self.magnitude, self.random_negative_prob)
+        magnitude = self.random_magnitude()
         for key in results.get('img_fields', ['img']):
             img = results[key]
             height, width = img.shape[:2]
@@ -416,6 +580,8 @@ class Rotate(object):
             'bilinear', 'bicubic', 'area', 'lanczos'. Defaults to 'nearest'.
     """
 
+    fuse_type = 'affine'
+
     def __init__(self,
                  angle,
                  center=None,
@@ -456,10 +622,22 @@ class Rotate(object):
         self.random_negative_prob = random_negative_prob
         self.interpolation = interpolation
 
+    def random_magnitude(self):
+        return random_negative(self.angle, self.random_negative_prob)
+
+    def get_matrix(self, angle, img_shape):
+        """The 2x3 affine matrix of the rotation by ``angle`` of an image of
+        ``img_shape``, as in ``mmcv.imrotate``."""
+        height, width = img_shape[:2]
+        center = self.center
+        if center is None:
+            center = ((width - 1) * 0.5, (height - 1) * 0.5)
+        return cv2.getRotationMatrix2D(center, -angle, self.scale)
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
-        angle = random_negative(self.angle, self.random_negative_prob)
+        angle = self.random_magnitude()
         for key in results.get('img_fields', ['img']):
             img = results[key]
             img_rotated = mmcv.imrotate(
@@ -493,12 +671,28 @@ class AutoContrast(object):
              be in range [0, 1]. Defaults to 0.5.
     """
 
+    fuse_type = 'lut'
+    lut_uses_hist = True
+
     def __init__(self, prob=0.5):
         assert 0 <= prob <= 1.0, 'The prob should be in range [0,1], ' \
             f'got {prob} instead.'
 
         self.prob = prob
 
+    def get_lut(self, hist):
+        """The (3, 256) lookup table of ``mmcv.auto_contrast`` for an image
+        whose channels have the (3, 256) histogram ``hist``."""
+        lut = np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+        for c in range(3):
+            nonzero = np.nonzero(hist[c])[0]
+            low, high = nonzero[0], nonzero[-1]
+            if low >= high:
+                continue
+            scale = 255.0 / (high - low)
+            lut[c] = np.clip(np.arange(256) * scale - low * scale, 0, 255)
+        return lut
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
@@ -523,12 +717,18 @@ class Invert(object):
              be in range [0, 1]. Defaults to 0.5.
     """
 
+    fuse_type = 'lut'
+
     def __init__(self, prob=0.5):
         assert 0 <= prob <= 1.0, 'The prob should be in range [0,1], ' \
             f'got {prob} instead.'
 
         self.prob = prob
 
+    def get_lut(self):
+        """The lookup table of the op on uint8 images."""
+        return mmcv.iminvert(np.arange(256, dtype=np.uint8))
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
@@ -585,6 +785,8 @@ class Solarize(object):
             range [0, 1]. Defaults to 0.5.
     """
 
+    fuse_type = 'lut'
+
     def __init__(self, thr, prob=0.5):
         assert isinstance(thr, (int, float)), 'The thr type must '\
             f'be int or float, but got {type(thr)} instead.'
@@ -594,6 +796,10 @@ class Solarize(object):
         self.thr = thr
         self.prob = prob
 
+    def get_lut(self):
+        """The lookup table of the op on uint8 images."""
+        return mmcv.solarize(np.arange(256, dtype=np.uint8), thr=self.thr)
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
@@ -622,6 +828,8 @@ class SolarizeAdd(object):
             range [0, 1]. Defaults to 0.5.
     """
 
+    fuse_type = 'lut'
+
     def __init__(self, magnitude, thr=128, prob=0.5):
         assert isinstance(magnitude, (int, float)), 'The thr magnitude must '\
             f'be int or float, but got {type(magnitude)} instead.'
@@ -634,15 +842,20 @@ class SolarizeAdd(object):
         self.thr = thr
         self.prob = prob
 
+    def _solarize_add(self, img):
+        img_solarized = np.where(img < self.thr,
+                                 np.minimum(img + self.magnitude, 255), img)
+        return img_solarized.astype(img.dtype)
+
+    def get_lut(self):
+        """The lookup table of the op on uint8 images."""
+        return self._solarize_add(np.arange(256, dtype=np.uint8))
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
         for key in results.get('img_fields', ['img']):
-            img = results[key]
-            img_solarized = np.where(img < self.thr,
-                                     np.minimum(img + self.magnitude, 255),
-                                     img)
-            results[key] = img_solarized.astype(img.dtype)
+            results[key] = self._solarize_add(results[key])
         return results
 
     def __repr__(self):
@@ -664,15 +877,29 @@ class Posterize(object):
             range [0, 1]. Defaults to 0.5.
     """
 
+    fuse_type = 'lut'
+
     def __init__(self, bits, prob=0.5):
         assert bits <= 8, f'The bits must be less than 8, got {bits} instead.'
         assert 0 <= prob <= 1.0, 'The prob should be in range [0,1], ' \
             f'got {prob} instead.'
 
-        # To align timm version, we need to round up to integer here.
-        self.bits = ceil(bits)
+        self.bits = bits
         self.prob = prob
 
+    @property
+    def bits(self):
+        return self._bits
+
+    @bits.setter
+    def bits(self, bits):
+        # To align timm version, we need to round up to integer here.
+        self._bits = ceil(bits)
+
+    def get_lut(self):
+        """The lookup table of the op on uint8 images."""
+        return mmcv.posterize(np.arange(256, dtype=np.uint8), bits=self.bits)
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
@@ -884,14 +1111,6 @@ class Cutout(object):
     """
 
     def __init__(self, shape, pad_val=128, prob=0.5):
-        if isinstance(shape, float):
-            shape = int(shape)
-        elif isinstance(shape, tuple):
-            shape = tuple(int(i) for i in shape)
-        elif not isinstance(shape, int):
-            raise TypeError(
-                'shape must be of '
-                f'type int, float or tuple, got {type(shape)} instead')
         if isinstance(pad_val, int):
             pad_val = tuple([pad_val] * 3)
         elif isinstance(pad_val, Sequence):
@@ -904,6 +1123,22 @@ class Cutout(object):
         self.pad_val = tuple(pad_val)
         self.prob = prob
 
+    @property
+    def shape(self):
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape):
+        if isinstance(shape, float):
+            shape = int(shape)
+        elif isinstance(shape, tuple):
+            shape = tuple(int(i) for i in shape)
+        elif not isinstance(shape, int):
+            raise TypeError(
+                'shape must be of '
+                f'type int, float or tuple, got {type(shape)} instead')
+        self._shape = shape
+
     def __call__(self, results):
         if np.random.rand() > self.prob:
             return results
@@ -0,0 +1,259 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import errno
+import hashlib
+import json
+import os
+import os.path as osp
+import pickle
+import tempfile
+
+from ..builder import PIPELINES
+from .compose import Compose
+
+# errors of a full device, on which the entries are not cached
+NO_SPACE_ERRNOS = (errno.ENOSPC, errno.EDQUOT)
+
+# transforms whose output is not a function of their input
+RANDOM_TRANSFORMS = ('ColorJitter', 'Lighting', 'AutoAugment', 'RandAugment',
+                     'Albu')
+
+
+def _is_random(transform):
+    name = type(transform).__name__
+    return name.startswith('Random') or name in RANDOM_TRANSFORMS or \
+        getattr(transform, 'prob', 1) < 1
+
+
+class FileLRUCache(object):
+    """Size-bounded least recently used store of byte strings in a directory.
+
+    Every entry is a file, written to a temporary file and renamed, so that
+    any number of processes, e.g. DataLoader workers and the ranks of a node,
+    can share the directory. The modification time of an entry is refreshed
+    when it is read and the least recently used entries are evicted once the
+    directory exceeds ``max_size``. Since every process only counts its own
+    writes, the directory is checked each time a process has written
+    ``max_size / 16`` bytes, and may exceed the bound by that much per
+    process in between. If the device is full, the entries are not stored.
+
+    Args:
+        cache_dir (str): Directory of the entries.
+        max_size (int): Bound of the total size of the entries in bytes.
+    """
+
+    SUFFIX = '.pkl'
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._written = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return osp.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key):
+        """The bytes stored under ``key``, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        return data
+
+    def put(self, key, data):
+        """Store ``data`` under ``key``."""
+        if len(data) > self.max_size:
+            return
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(
+                    dir=self.cache_dir, suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            if e.errno not in NO_SPACE_ERRNOS:
+                raise
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+        self._written += len(data)
+        if self._written * 16 >= self.max_size:
+            self._written = 0
+            self.evict()
+
+    def evict(self, low_watermark=0.9):
+        """Remove the least recently used entries if the store exceeds
+        ``max_size``, down to ``low_watermark * max_size``."""
+        entries, total = [], 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(self.SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size * low_watermark:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # already removed by another process
+                pass
+            total -= size
+
+
+@PIPELINES.register_module()
+class CachedTransforms(object):
+    """Cache the output of deterministic transforms across epochs.
+
+    The wrapped transforms, typically the loading, resizing and center
+    cropping at the start of a test pipeline, run once per image, and the
+    fields they add or replace, e.g. ``img``, ``img_shape`` and
+    ``ori_shape``, are pickled in a :class:`FileLRUCache` shared by the
+    DataLoader workers and the later epochs, which then skip the decoding.
+    A cached entry updates the incoming dict, whose other fields, like
+    ``gt_label``, are kept. An entry is keyed by the image path, its
+    modification time and size, and a hash of the configs of the transforms,
+    so that pipelines sharing a cache directory do not mix and modified
+    images are not served stale. Samples without ``img_info.filename``
+    bypass the cache.
+
+    The transforms must be deterministic, so the cache goes before any
+    random transform: a transform named ``Random*``, one of
+    ``RANDOM_TRANSFORMS`` or with a ``prob`` below 1 raises an error.
+
+    Args:
+        transforms (list[dict | callable]): The deterministic transforms.
+        backend (str): ``'disk'``, or ``'shm'`` to keep the cache in shared
+            memory, i.e. in a directory of ``/dev/shm``, which takes RAM of
+            the node. Defaults to ``'disk'``.
+        cache_dir (str, optional): Directory of the cache. Defaults to
+            ``~/.cache/mmcls/pipeline_cache`` for the ``'disk'`` backend and
+            ``/dev/shm/mmcls_pipeline_cache`` for ``'shm'``.
+        max_size (float, optional): Bound of the size of the cache in MiB,
+            see :class:`FileLRUCache`. It must be given for the ``'shm'``
+            backend. Defaults to 4096 for ``'disk'``.
+
+    Example:
+        >>> test_pipeline = [
+        >>>     dict(type='CachedTransforms', transforms=[
+        >>>         dict(type='LoadImageFromFile'),
+        >>>         dict(type='Resize', size=(256, -1)),
+        >>>         dict(type='CenterCrop', crop_size=224)]),
+        >>>     dict(type='Normalize', **img_norm_cfg),
+        >>>     dict(type='ImageToTensor', keys=['img']),
+        >>>     dict(type='Collect', keys=['img'])
+        >>> ]
+    """
+
+    def __init__(self,
+                 transforms,
+                 backend='disk',
+                 cache_dir=None,
+                 max_size=None):
+        assert backend in ('shm', 'disk'), \
+            f'Unsupported cache backend {backend}.'
+        if max_size is None:
+            if backend == 'shm':
+                raise ValueError('max_size must be given for the shm '
+                                 'backend, whose cache takes RAM.')
+            max_size = 4096
+        self.transforms = Compose(transforms)
+        for transform in self.transforms.transforms:
+            if _is_random(transform):
+                raise ValueError(f'{type(transform).__name__} is random and '
+                                 'cannot be cached.')
+        if cache_dir is None:
+            if backend == 'shm':
+                shm_dir = '/dev/shm'
+                if not osp.isdir(shm_dir):
+                    shm_dir = tempfile.gettempdir()
+                cache_dir = osp.join(shm_dir, 'mmcls_pipeline_cache')
+            else:
+                cache_dir = osp.join(
+                    osp.expanduser('~'), '.cache', 'mmcls', 'pipeline_cache')
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+        configs = [t if isinstance(t, dict) else repr(t) for t in transforms]
+        self.config_hash = hashlib.sha1(
+            json.dumps(configs, sort_keys=True,
+                       default=repr).encode('utf-8')).hexdigest()
+        self.cache = None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, results):
+        img_info = results.get('img_info')
+        if not isinstance(img_info, dict) or 'filename' not in img_info:
+            return None
+        path = img_info['filename']
+        if results.get('img_prefix') is not None:
+            path = osp.join(results['img_prefix'], path)
+        try:
+            stat = os.stat(path)
+            version = f'{stat.st_mtime_ns}:{stat.st_size}'
+        except OSError:
+            # e.g. the paths of a file client other than the local disk
+            version = ''
+        return hashlib.sha1(f'{self.config_hash}:{path}:{version}'.encode(
+            'utf-8')).hexdigest()
+
+    def __call__(self, results):
+        key = self._key(results)
+        if key is None:
+            return self.transforms(results)
+        if self.cache is None:
+            # created lazily, in the DataLoader workers
+            self.cache = FileLRUCache(self.cache_dir,
+                                      int(self.max_size * (1 << 20)))
+
+        data = self.cache.get(key)
+        if data is not None:
+            self.hits += 1
+            produced, removed = pickle.loads(data)
+            for name in removed:
+                results.pop(name, None)
+            results.update(produced)
+            return results
+        self.misses += 1
+        inputs = dict(results)
+        results = self.transforms(results)
+        if results is not None:
+            # the fields added or replaced by the transforms
+            produced = {
+                name: value
+                for name, value in results.items()
+                if name not in inputs or value is not inputs[name]
+            }
+            removed = [name for name in inputs if name not in results]
+            self.cache.put(
+                key,
+                pickle.dumps((produced, removed),
+                             protocol=pickle.HIGHEST_PROTOCOL))
+        return results
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(transforms={self.transforms}, '
+        repr_str += f"backend='{self.backend}', "
+        repr_str += f"cache_dir='{self.cache_dir}', "
+        repr_str += f'max_size={self.max_size})'
+        return repr_str
@@ -27,6 +27,11 @@ class Compose(object):
             else:
                 raise TypeError('transform must be callable or a dict, but got'
                                 f' {type(transform)}')
+        # let the loading plan its decoding for the next transform
+        for transform, next_transform in zip(self.transforms[:-1],
+                                             self.transforms[1:]):
+            if hasattr(transform, 'plan_decode'):
+                transform.plan_decode(next_transform)
 
     def __call__(self, data):
         for t in self.transforms:
@@ -1,10 +1,32 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import io
+import math
+import os
 import os.path as osp
+from collections import OrderedDict
 
+import cv2
 import mmcv
 import numpy as np
+from PIL import Image
 
 from ..builder import PIPELINES
+from .transforms import RandomResizedCrop, Resize
+
+# DCT scales of reduced JPEG decoding and their OpenCV flags per color type
+REDUCED_DECODE_FLAGS = {
+    'color': {
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8
+    },
+    'grayscale': {
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+    }
+}
+EXIF_ORIENTATION = 0x0112
 
 
 @PIPELINES.register_module()
@@ -15,6 +37,19 @@ class LoadImageFromFile(object):
     key "filename"). Added or updated keys are "filename", "img", "img_shape",
     "ori_shape" (same as `img_shape`) and "img_norm_cfg" (means=0 and stds=1).
 
+    With ``reduced_decode``, a JPEG followed by a downscaling transform is
+    decoded at the smallest DCT scale of 1/2, 1/4 or 1/8 that keeps enough
+    pixels for it, which :class:`Compose` tells by :meth:`plan_decode`:
+
+    - ``Resize``: the resized side(s) keep at least the target size.
+    - ``RandomResizedCrop``: the crop is sampled here from the size in the
+      JPEG header, the image decoded at the scale that keeps the crop at
+      least as large as the output, and cropped. ``RandomResizedCrop`` then
+      only resizes, which "draft_crop" tells it.
+
+    "decode_scale" then holds the scale and "ori_shape" the full size.
+    Other images, transforms and color types are decoded at full size.
+
     Args:
         to_float32 (bool): Whether to convert the loaded image to a float32
             numpy array. If set to False, the loaded image is an uint8 array.
@@ -24,18 +59,89 @@ class LoadImageFromFile(object):
         file_client_args (dict): Arguments to instantiate a FileClient.
             See :class:`mmcv.fileio.FileClient` for details.
             Defaults to ``dict(backend='disk')``.
+        reduced_decode (bool): Whether to decode JPEGs at a reduced size for
+            the next transform. Defaults to False.
     """
 
     def __init__(self,
                  to_float32=False,
                  color_type='color',
-                 file_client_args=dict(backend='disk')):
+                 file_client_args=dict(backend='disk'),
+                 reduced_decode=False):
         self.to_float32 = to_float32
         self.color_type = color_type
         self.file_client_args = file_client_args.copy()
         self.file_client = None
+        self.reduced_decode = reduced_decode
+        self.next_transform = None
 
-    def __call__(self, results):
+    def plan_decode(self, transform):
+        """Decode for ``transform``, the next transform of the pipeline."""
+        self.next_transform = transform
+
+    def _max_scale(self, height, width, bbox=None):
+        """Largest downscaling of an image of the given size that the next
+        transform allows."""
+        transform = self.next_transform
+        if isinstance(transform, RandomResizedCrop):
+            ymin, xmin, ymax, xmax = bbox
+            return min((ymax - ymin + 1) / transform.size[0],
+                       (xmax - xmin + 1) / transform.size[1])
+        if not transform.adaptive_resize:
+            return min(height / transform.size[0], width / transform.size[1])
+        side = dict(
+            short=min(height, width),
+            long=max(height, width),
+            height=height,
+            width=width)[transform.adaptive_side]
+        return side / transform.size[0]
+
+    def _decode(self, img_bytes, results):
+        """Decode the image, at a reduced size if possible."""
+        if not self.reduced_decode or \
+                self.color_type not in REDUCED_DECODE_FLAGS or \
+                not isinstance(self.next_transform,
+                               (Resize, RandomResizedCrop)) or \
+                img_bytes[:2] != b'\xff\xd8':
+            return mmcv.imfrombytes(img_bytes, flag=self.color_type), None
+
+        # only the header is parsed
+        header = Image.open(io.BytesIO(img_bytes))
+        width, height = header.size
+        if header.getexif().get(EXIF_ORIENTATION, 1) > 4:
+            # rotated by 90 degrees when decoded
+            width, height = height, width
+        bbox = None
+        if isinstance(self.next_transform, RandomResizedCrop):
+            bbox = self.next_transform.sample_bbox(
+                np.empty((height, width, 0), dtype=np.uint8))
+        max_scale = self._max_scale(height, width, bbox)
+        scale = max([1] + [
+            scale for scale in REDUCED_DECODE_FLAGS[self.color_type]
+            if scale <= max_scale
+        ])
+        if scale == 1:
+            img = mmcv.imfrombytes(img_bytes, flag=self.color_type)
+        else:
+            img = cv2.imdecode(
+                np.frombuffer(img_bytes, dtype=np.uint8),
+                REDUCED_DECODE_FLAGS[self.color_type][scale])
+        results['decode_scale'] = scale
+        results['ori_shape'] = (height, width) + img.shape[2:]
+        if bbox is not None:
+            # the crop in the coordinates of the decoded image
+            ymin, xmin, ymax, xmax = bbox
+            reduced_bbox = np.array([
+                xmin // scale, ymin // scale,
+                min(math.ceil((xmax + 1) / scale), img.shape[1]) - 1,
+                min(math.ceil((ymax + 1) / scale), img.shape[0]) - 1
+            ])
+            img = mmcv.imcrop(img, bboxes=reduced_bbox)
+            results['draft_crop'] = bbox
+        return img, scale
+
+    def _read(self, results):
+        """Path and encoded bytes of the image."""
         if self.file_client is None:
             self.file_client = mmcv.FileClient(**self.file_client_args)
 
@@ -44,9 +150,11 @@ class LoadImageFromFile(object):
                                 results['img_info']['filename'])
         else:
             filename = results['img_info']['filename']
+        return filename, self.file_client.get(filename)
 
-        img_bytes = self.file_client.get(filename)
-        img = mmcv.imfrombytes(img_bytes, flag=self.color_type)
+    def __call__(self, results):
+        filename, img_bytes = self._read(results)
+        img, scale = self._decode(img_bytes, results)
         if self.to_float32:
             img = img.astype(np.float32)
 
@@ -54,7 +162,8 @@ class LoadImageFromFile(object):
         results['ori_filename'] = results['img_info']['filename']
         results['img'] = img
         results['img_shape'] = img.shape
-        results['ori_shape'] = img.shape
+        if scale is None:
+            results['ori_shape'] = img.shape
         num_channels = 1 if len(img.shape) < 3 else img.shape[2]
         results['img_norm_cfg'] = dict(
             mean=np.zeros(num_channels, dtype=np.float32),
@@ -68,3 +177,79 @@ class LoadImageFromFile(object):
                     f"color_type='{self.color_type}', "
                     f'file_client_args={self.file_client_args})')
         return repr_str
+
+
+@PIPELINES.register_module()
+class LoadImageFromShard(LoadImageFromFile):
+    """Load an image from a shard of ``ShardedDataset``.
+
+    Required keys are "img_prefix" and "img_info" (a dict that must contain
+    the keys "filename", "shard", "offset" and "size"). The image is read
+    with one positioned read from the shard, which stays open in a per
+    process cache. Added or updated keys are the same as
+    :class:`LoadImageFromFile`, "filename" being the path of the shard joined
+    with the file name of the image.
+
+    Args:
+        to_float32 (bool): Whether to convert the loaded image to a float32
+            numpy array. If set to False, the loaded image is an uint8 array.
+            Defaults to False.
+        color_type (str): The flag argument for :func:`mmcv.imfrombytes()`.
+            Defaults to 'color'.
+        max_open_files (int): Number of shards kept open. Defaults to 16.
+    """
+
+    def __init__(self,
+                 to_float32=False,
+                 color_type='color',
+                 max_open_files=16):
+        super(LoadImageFromShard, self).__init__(
+            to_float32=to_float32, color_type=color_type)
+        self.max_open_files = max_open_files
+        self._files = OrderedDict()
+
+    def _open(self, path):
+        fd = self._files.get(path)
+        if fd is None:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            self._files[path] = fd
+            if len(self._files) > self.max_open_files:
+                os.close(self._files.popitem(last=False)[1])
+        else:
+            self._files.move_to_end(path)
+        return fd
+
+    def _read(self, results):
+        img_info = results['img_info']
+        path = img_info['shard']
+        if results['img_prefix'] is not None:
+            path = osp.join(results['img_prefix'], path)
+        fd = self._open(path)
+        if hasattr(os, 'pread'):
+            # a positioned read leaves the file offset alone, which forked
+            # workers share
+            img_bytes = os.pread(fd, img_info['size'], img_info['offset'])
+        else:
+            os.lseek(fd, img_info['offset'], os.SEEK_SET)
+            img_bytes = os.read(fd, img_info['size'])
+        if len(img_bytes) != img_info['size']:
+            raise IOError(f'{path} is truncated at {img_info["offset"]}')
+        return osp.join(path, img_info['filename']), img_bytes
+
+    def __getstate__(self):
+        # the descriptors are not inherited by pickled copies
+        state = self.__dict__.copy()
+        state['_files'] = OrderedDict()
+        return state
+
+    def __del__(self):
+        for fd in self._files.values():
+            os.close(fd)
+        self._files.clear()
+
+    def __repr__(self):
+        repr_str = (f'{self.__class__.__name__}('
+                    f'to_float32={self.to_float32}, '
+                    f"color_type='{self.color_type}', "
+                    f'max_open_files={self.max_open_files})')
+        return repr_str
@@ -344,28 +344,33 @@ class RandomResizedCrop(object):
 
         return ymin, xmin, ymax, xmax
 
+    def sample_bbox(self, img):
+        """Sample the crop (ymin, xmin, ymax, xmax) of ``img``, of which only
+        the shape is used."""
+        if self.efficientnet_style:
+            return self.get_params_efficientnet_style(
+                img=img,
+                size=self.size,
+                scale=self.scale,
+                ratio=self.ratio,
+                max_attempts=self.max_attempts,
+                min_covered=self.min_covered,
+                crop_padding=self.crop_padding)
+        return self.get_params(
+            img=img,
+            scale=self.scale,
+            ratio=self.ratio,
+            max_attempts=self.max_attempts)
+
     def __call__(self, results):
+        # LoadImageFromFile with reduced_decode already cropped the image
+        draft_cropped = results.pop('draft_crop', None) is not None
         for key in results.get('img_fields', ['img']):
             img = results[key]
-            if self.efficientnet_style:
-                get_params_func = self.get_params_efficientnet_style
-                get_params_args = dict(
-                    img=img,
-                    size=self.size,
-                    scale=self.scale,
-                    ratio=self.ratio,
-                    max_attempts=self.max_attempts,
-                    min_covered=self.min_covered,
-                    crop_padding=self.crop_padding)
-            else:
-                get_params_func = self.get_params
-                get_params_args = dict(
-                    img=img,
-                    scale=self.scale,
-                    ratio=self.ratio,
-                    max_attempts=self.max_attempts)
-            ymin, xmin, ymax, xmax = get_params_func(**get_params_args)
-            img = mmcv.imcrop(img, bboxes=np.array([xmin, ymin, xmax, ymax]))
+            if not (draft_cropped and key == 'img'):
+                ymin, xmin, ymax, xmax = self.sample_bbox(img)
+                img = mmcv.imcrop(
+                    img, bboxes=np.array([xmin, ymin, xmax, ymax]))
             results[key] = mmcv.imresize(
                 img,
                 tuple(self.size[::-1]),
@@ -582,6 +587,9 @@ class RandomErasing(object):
             if np.random.rand() > self.erase_prob:
                 continue
             img = results[key]
+            if not img.flags.writeable:
+                # a read-only view of the images of the dataset
+                img = img.copy()
             img_h, img_w = img.shape[:2]
 
             # convert to log aspect to ensure equal probability of aspect ratio
@@ -616,6 +624,9 @@ class RandomErasing(object):
 class Pad(object):
     """Pad images.
 
+    The images are padded at the bottom and on the right, and their
+    (height, width) before padding is recorded in "valid_shape".
+
     Args:
         size (tuple[int] | None): Expected padding size (h, w). Conflicts with
                 pad_to_square. Defaults to None.
@@ -647,6 +658,7 @@ class Pad(object):
                     max(img.shape[0], img.shape[1]) for _ in range(2))
             else:
                 target_size = self.size
+            results['valid_shape'] = img.shape[:2]
             img = mmcv.impad(
                 img,
                 shape=target_size,
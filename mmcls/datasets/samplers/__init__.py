@@ -1,4 +1,5 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .distributed_sampler import DistributedSampler
+from .sharded_sampler import ShardedSampler
 
-__all__ = ['DistributedSampler']
+__all__ = ['DistributedSampler', 'ShardedSampler']
@@ -0,0 +1,86 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import torch
+
+from .distributed_sampler import DistributedSampler
+
+
+class ShardedSampler(DistributedSampler):
+    """Sampler reading the shards of a dataset one after the other.
+
+    The dataset gives the sample boundaries of its shards in
+    ``shard_offsets``, the samples of a shard being contiguous. Each epoch
+    the order of the shards is shuffled and the samples of a shard are only
+    shuffled within windows of ``shuffle_window`` consecutive samples, so
+    that the reads of a shard stay close to each other. The concatenated
+    indices are split into one contiguous chunk per rank, hence a rank reads
+    whole shards apart from at most two partial ones.
+
+    Without shuffling, e.g. for the evaluation, the indices are split with
+    a stride like :class:`DistributedSampler`, so that the results collected
+    from the ranks by ``multi_gpu_test`` follow the dataset order.
+
+    Args:
+        dataset (Dataset): A dataset with ``shard_offsets``.
+        num_replicas (int, optional): Number of ranks.
+        rank (int, optional): Rank of this process.
+        shuffle (bool): Whether to shuffle the shards and the windows.
+            Defaults to True.
+        round_up (bool): Whether to repeat samples so that every rank gets
+            the same number of them. Defaults to True.
+        shuffle_window (int): Number of consecutive samples of a shard
+            shuffled together. Defaults to 1024.
+    """
+
+    def __init__(self,
+                 dataset,
+                 num_replicas=None,
+                 rank=None,
+                 shuffle=True,
+                 round_up=True,
+                 shuffle_window=1024):
+        super().__init__(
+            dataset,
+            num_replicas=num_replicas,
+            rank=rank,
+            shuffle=shuffle,
+            round_up=round_up)
+        self.shuffle_window = shuffle_window
+
+    def __iter__(self):
+        if not self.shuffle:
+            # the shards are in the dataset order
+            return super().__iter__()
+        shard_offsets = torch.as_tensor(self.dataset.shard_offsets)
+        num_shards = len(shard_offsets) - 1
+        # deterministically shuffle based on epoch
+        g = torch.Generator()
+        g.manual_seed(self.epoch)
+        order = torch.randperm(num_shards, generator=g).tolist()
+
+        indices = []
+        for shard in order:
+            start = int(shard_offsets[shard])
+            end = int(shard_offsets[shard + 1])
+            shard_indices = torch.arange(start, end)
+            if self.shuffle_window > 1:
+                # sort by window first, then by a random key
+                keys = torch.rand(
+                    end - start, generator=g, dtype=torch.float64)
+                keys += torch.arange(end - start) // self.shuffle_window
+                shard_indices = shard_indices[keys.argsort()]
+            indices.extend(shard_indices.tolist())
+
+        if self.round_up:
+            # add extra samples to make it evenly divisible
+            indices = (
+                indices *
+                int(self.total_size / len(indices) + 1))[:self.total_size]
+            assert len(indices) == self.total_size
+            start = self.rank * self.num_samples
+            indices = indices[start:start + self.num_samples]
+        else:
+            start = len(indices) * self.rank // self.num_replicas
+            end = len(indices) * (self.rank + 1) // self.num_replicas
+            indices = indices[start:end]
+
+        return iter(indices)
@@ -0,0 +1,156 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import io
+import os
+import os.path as osp
+import tarfile
+
+import numpy as np
+
+from .annotations import PackedAnnotations
+from .base_dataset import BaseDataset
+from .builder import DATASETS
+
+# bump when the layout of the shard index changes
+SHARD_INDEX_VERSION = 1
+
+
+def write_shards(samples,
+                 out_dir,
+                 shard_size=1 << 30,
+                 prefix='shard',
+                 classes=None,
+                 index_file='index.npz'):
+    """Pack encoded images into tar shards with an offset index.
+
+    Every shard is a plain tar file holding the images under their original
+    file names, so that it can be inspected or extracted with ``tar``. The
+    index records the shard, byte offset and size of every image, which lets
+    :class:`ShardedDataset` read it with a single positioned read. The images
+    are written in the given order, which should already be shuffled since
+    the shards are read sequentially.
+
+    Args:
+        samples (Iterable[tuple[str, bytes, int]]): The file name, encoded
+            bytes and label of every image.
+        out_dir (str): Output directory of the shards and the index.
+        shard_size (int): A new shard is started once the next image would
+            make the current one exceed this many bytes. Defaults to 1 GiB.
+        prefix (str): Prefix of the shard names ``<prefix>-00000.tar``.
+            Defaults to ``'shard'``.
+        classes (Sequence[str], optional): Class names saved in the index.
+            Defaults to None.
+        index_file (str): Name of the index in ``out_dir``.
+            Defaults to ``'index.npz'``.
+
+    Returns:
+        str: Path of the index.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    shards, shard_offsets = [], [0]
+    filenames, gt_labels, data_offsets, data_sizes = [], [], [], []
+    tar = None
+    for filename, img_bytes, gt_label in samples:
+        if tar is not None and len(filenames) > shard_offsets[-1] and \
+                tar.offset + len(img_bytes) + tarfile.BLOCKSIZE > shard_size:
+            tar.close()
+            tar = None
+            shard_offsets.append(len(filenames))
+        if tar is None:
+            shards.append(f'{prefix}-{len(shards):05d}.tar')
+            tar = tarfile.open(osp.join(out_dir, shards[-1]), 'w')
+
+        info = tarfile.TarInfo(filename)
+        info.size = len(img_bytes)
+        info.mode = 0o644
+        tar.addfile(info, io.BytesIO(img_bytes))
+        # the data is padded to whole blocks after the header(s)
+        padded_size = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        data_offsets.append(tar.offset - padded_size)
+        data_sizes.append(info.size)
+        filenames.append(filename)
+        gt_labels.append(gt_label)
+    if tar is not None:
+        tar.close()
+        shard_offsets.append(len(filenames))
+
+    annotations = PackedAnnotations(filenames, gt_labels)
+    index_path = osp.join(out_dir, index_file)
+    np.savez(
+        index_path,
+        version=np.array(SHARD_INDEX_VERSION),
+        classes=np.array(list(classes or []), dtype=str),
+        shards=np.array(shards, dtype=str),
+        shard_offsets=np.array(shard_offsets, dtype=np.int64),
+        data_offsets=np.array(data_offsets, dtype=np.int64),
+        data_sizes=np.array(data_sizes, dtype=np.int64),
+        paths=annotations.paths,
+        path_offsets=annotations.offsets,
+        gt_labels=annotations.gt_labels)
+    return index_path
+
+
+@DATASETS.register_module()
+class ShardedDataset(BaseDataset):
+    """Single-label dataset packed into tar shards by ``write_shards``.
+
+    Reading one file per sample costs a random read and a metadata lookup,
+    which bounds the throughput on spinning disks and network file systems.
+    Here the images of a shard are contiguous and the index gives their
+    offsets, so that ``LoadImageFromShard`` reads a sample with one
+    positioned read and ``ShardedSampler``, which ``build_dataloader`` picks
+    for this dataset, walks the shards in order.
+
+    Args:
+        data_prefix (str): Directory of the shards.
+        pipeline (list): a list of dict, where each element represents
+            a operation defined in `mmcls.datasets.pipelines`
+        classes (Sequence[str] | str | None): the class names. Defaults to
+            the names saved in the index.
+        ann_file (str | None): Path of the index. Defaults to ``index.npz``
+            in ``data_prefix``.
+        test_mode (bool): in train mode or test mode
+    """
+
+    def __init__(self,
+                 data_prefix,
+                 pipeline,
+                 classes=None,
+                 ann_file=None,
+                 test_mode=False):
+        super(ShardedDataset, self).__init__(
+            data_prefix,
+            pipeline,
+            classes=classes,
+            ann_file=ann_file,
+            test_mode=test_mode)
+        if self.CLASSES is None and len(self.index_classes) > 0:
+            self.CLASSES = self.index_classes
+
+    def load_annotations(self):
+        ann_file = self.ann_file
+        if ann_file is None:
+            ann_file = osp.join(self.data_prefix, 'index.npz')
+        with np.load(ann_file) as index:
+            assert int(index['version']) == SHARD_INDEX_VERSION, \
+                f'{ann_file} has an unsupported shard index version.'
+            self.index_classes = index['classes'].tolist()
+            self.shards = index['shards'].tolist()
+            self.shard_offsets = index['shard_offsets']
+            self.data_offsets = index['data_offsets']
+            self.data_sizes = index['data_sizes']
+            data_infos = PackedAnnotations.from_arrays(index['paths'],
+                                                       index['path_offsets'],
+                                                       index['gt_labels'],
+                                                       self.data_prefix)
+        self.shard_ids = np.repeat(
+            np.arange(len(self.shards), dtype=np.int32),
+            np.diff(self.shard_offsets))
+        return data_infos
+
+    def prepare_data(self, idx):
+        results = self.data_infos[idx]
+        results['img_info'].update(
+            shard=self.shards[self.shard_ids[idx]],
+            offset=int(self.data_offsets[idx]),
+            size=int(self.data_sizes[idx]))
+        return self.pipeline(results)
@@ -5,11 +5,19 @@ import os
 import os.path
 import shutil
 import tarfile
+import tempfile
 import urllib.error
 import urllib.request
 import zipfile
 
-__all__ = ['rm_suffix', 'check_integrity', 'download_and_extract_archive']
+import numpy as np
+import torch.distributed as dist
+from mmcv.runner import get_dist_info
+
+__all__ = [
+    'rm_suffix', 'check_integrity', 'download_and_extract_archive',
+    'load_image_cache'
+]
 
 
 def rm_suffix(s, suffix=None):
@@ -151,3 +159,66 @@ def download_and_extract_archive(url,
     archive = os.path.join(download_root, filename)
     print(f'Extracting {archive} to {extract_root}')
     extract_archive(archive, extract_root, remove_finished)
+
+
+def _is_fresh_cache(cache_files, sources):
+    if not all(os.path.isfile(path) for path in cache_files):
+        return False
+    built = min(os.stat(path).st_mtime_ns for path in cache_files)
+    return all(os.stat(path).st_mtime_ns <= built for path in sources)
+
+
+def _save_array(path, array):
+    # write next to the cache and rename, so that readers never see a partial
+    # file
+    with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(os.path.abspath(path)),
+            suffix='.npy',
+            delete=False) as f:
+        np.save(f, array)
+    os.replace(f.name, path)
+
+
+def load_image_cache(cache_prefix, build, sources=()):
+    """Load the images of a dataset from a uint8 ``.npy`` cache.
+
+    The images are memory mapped read-only from ``<cache_prefix>_imgs.npy``
+    and the labels loaded from ``<cache_prefix>_labels.npy``. The cache is
+    rebuilt by ``build`` when it is missing or older than one of the
+    ``sources``. In distributed runs only rank 0 builds it. If the cache
+    cannot be written, e.g. on read-only storage, the built arrays are
+    returned instead.
+
+    Args:
+        cache_prefix (str): Path prefix of the cache files.
+        build (callable): Return the images, a uint8 array of shape
+            (N, H, W) or (N, H, W, C), and the labels of the dataset.
+        sources (Sequence[str]): Files the cache is built from.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The images and the int64 labels.
+    """
+    cache_files = (f'{cache_prefix}_imgs.npy', f'{cache_prefix}_labels.npy')
+
+    def _build():
+        imgs, gt_labels = build()
+        return (np.ascontiguousarray(imgs, dtype=np.uint8),
+                np.asarray(gt_labels, dtype=np.int64))
+
+    rank, world_size = get_dist_info()
+    built = None
+    if rank == 0 and not _is_fresh_cache(cache_files, sources):
+        built = _build()
+        try:
+            # the labels are saved last, which marks a complete cache
+            for path, array in zip(cache_files, built):
+                _save_array(path, array)
+        except OSError:
+            pass
+    if world_size > 1:
+        dist.barrier()
+
+    if _is_fresh_cache(cache_files, sources):
+        return (np.load(cache_files[0],
+                        mmap_mode='r'), np.load(cache_files[1]))
+    return built if built is not None else _build()
@@ -3,7 +3,7 @@ import copy
 import warnings
 
 from ..builder import CLASSIFIERS, build_backbone, build_head, build_neck
-from ..utils.augment import Augments
+from ..utils.augment import Augments, BatchPipeline
 from .base import BaseClassifier
 
 warnings.simplefilter('once')
@@ -11,6 +11,24 @@ warnings.simplefilter('once')
 
 @CLASSIFIERS.register_module()
 class ImageClassifier(BaseClassifier):
+    """Image classifier of a backbone, an optional neck and a head.
+
+    Args:
+        backbone (dict): Config of the backbone.
+        neck (dict, optional): Config of the neck. Defaults to None.
+        head (dict, optional): Config of the head. Defaults to None.
+        pretrained (str, optional): Deprecated, use ``init_cfg`` instead.
+        train_cfg (dict, optional): Training settings, e.g. the
+            ``batch_pipeline`` applied to the training batches on their
+            device and the batch ``augments``. Defaults to None.
+        init_cfg (dict, optional): Initialization config. Defaults to None.
+        data_preprocessor (list[dict], optional): Batch transforms, see
+            :class:`mmcls.models.utils.BatchPipeline`, applied to the
+            batches on their device in both training and testing, typically
+            ``[dict(type='Normalize', **img_norm_cfg)]`` for the uint8
+            batches of ``CropFlipToTensor``. In training, they follow the
+            ``batch_pipeline``. Defaults to None.
+    """
 
     def __init__(self,
                  backbone,
@@ -18,7 +36,8 @@ class ImageClassifier(BaseClassifier):
                  head=None,
                  pretrained=None,
                  train_cfg=None,
-                 init_cfg=None):
+                 init_cfg=None,
+                 data_preprocessor=None):
         super(ImageClassifier, self).__init__(init_cfg)
 
         if pretrained is not None:
@@ -41,8 +60,17 @@ class ImageClassifier(BaseClassifier):
         if head is not None:
             self.head = build_head(head)
 
+        self.data_preprocessor = None
+        if data_preprocessor is not None:
+            self.data_preprocessor = BatchPipeline(data_preprocessor)
+
+        self.batch_pipeline = None
         self.augments = None
         if train_cfg is not None:
+            batch_pipeline_cfg = train_cfg.get('batch_pipeline', None)
+            if batch_pipeline_cfg is not None:
+                self.batch_pipeline = BatchPipeline(batch_pipeline_cfg)
+
             augments_cfg = train_cfg.get('augments', None)
             if augments_cfg is not None:
                 self.augments = Augments(augments_cfg)
@@ -97,9 +125,16 @@ class ImageClassifier(BaseClassifier):
                 ground-truth label of input images for single label task. It
                 shoulf be of shape (N, C) encoding the ground-truth label
                 of input images for multi-labels task.
+            valid_shape (Tensor, optional): The (height, width) of every
+                image before it was padded, of shape (N, 2), which the
+                ``batch_pipeline`` crops within.
         Returns:
             dict[str, Tensor]: a dictionary of loss components
         """
+        if self.batch_pipeline is not None:
+            img = self.batch_pipeline(img, kwargs.get('valid_shape'))
+        if self.data_preprocessor is not None:
+            img = self.data_preprocessor(img)
         if self.augments is not None:
             img, gt_label = self.augments(img, gt_label)
 
@@ -122,12 +157,18 @@ class ImageClassifier(BaseClassifier):
 
         return losses
 
-    def simple_test(self, img, img_metas):
-        """Test without augmentation."""
+    def simple_test(self, img, img_metas=None, **kwargs):
+        """Test without augmentation.
+
+        The keyword arguments, e.g. ``post_process=False`` to keep the scores
+        as a tensor, are passed to the ``simple_test`` of the head.
+        """
+        if self.data_preprocessor is not None:
+            img = self.data_preprocessor(img)
         x = self.extract_feat(img)
 
         try:
-            res = self.head.simple_test(x)
+            res = self.head.simple_test(x, **kwargs)
         except TypeError as e:
             if 'not tuple' in str(e) and self.return_tuple:
                 return TypeError(
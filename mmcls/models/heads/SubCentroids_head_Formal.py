@@ -1,15 +1,14 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import logging
 import math
 
-from sklearn.metrics import silhouette_score
-
 from ..builder import HEADS
+from ..utils import HeadProfiler, log_apdagd, log_sinkhorn
 from .cls_head import ClsHead
 import torch.distributed as dist
 from mmcv.cnn import ConvModule
-import numpy as np
 from einops import repeat
 from timm.models.layers import trunc_normal_
 
@@ -60,7 +59,7 @@ def approx_ot(M, max_iter=10):
     indexes = torch.argmax(B, dim=1)
     G = gumbel_softmax(B, tau=0.5, hard=True)
     if torch.isnan(G).int().sum() > 0:
-        print('output has nan, use self_gambel_softmax')
+        HeadProfiler.log('output has nan, use self_gambel_softmax', logging.WARNING)
 
     return G.to(torch.float32), indexes
 
@@ -70,10 +69,10 @@ def sinkhorn_knopp(a, b, M, reg=0.05, max_iter=10):
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
     if len(a) == 0:
-        print('ERROR-- should have a value as input')
+        HeadProfiler.log('ERROR-- should have a value as input', logging.ERROR)
         a = torch.ones((M.shape[0],), dtype=torch.float64) / M.shape[0]
     if len(b) == 0:
-        print('ERROR-- should have b value as input')
+        HeadProfiler.log('ERROR-- should have b value as input', logging.ERROR)
         b = torch.ones((M.shape[1],), dtype=torch.float64) / M.shape[1]
 
     # init data
@@ -238,6 +237,369 @@ def agd_torch_no_grad_gpu(M, max_iter=20, eps=0.05):
     return G.to(torch.float32), indexs  # change into G as well
 
 
+@torch.no_grad()
+def sort_by_label(labels, num_classes):
+    """Sort samples by label once so that every class is a contiguous slice.
+
+    Args:
+        labels (torch.Tensor): Class label of every sample (N,).
+        num_classes (int): Number of classes.
+    Returns:
+        torch.Tensor: Permutation that sorts the samples by label (N,).
+        torch.Tensor: Number of samples of every class (C,).
+        torch.Tensor: Start offset of every class in the sorted order (C+1,).
+    """
+    order = torch.argsort(labels)
+    counts = torch.bincount(labels, minlength=num_classes)
+    offsets = torch.zeros(num_classes + 1, dtype=torch.long, device=labels.device)
+    offsets[1:] = torch.cumsum(counts, dim=0)
+    return order, counts, offsets
+
+
+@torch.no_grad()
+def pad_by_label(values, sorted_labels, offsets, num_classes, max_count):
+    """Scatter label-sorted samples into a zero-padded per-class tensor.
+
+    Args:
+        values (torch.Tensor): Per-sample values sorted by label (N, ...).
+        sorted_labels (torch.Tensor): Labels sorted in ascending order (N,),
+            shifted so that the first class of the batch is 0.
+        offsets (torch.Tensor): Start offset of every class (C+1,).
+        num_classes (int): Number of classes C in the padded output.
+        max_count (int): Padded length N_max.
+    Returns:
+        torch.Tensor: Padded values (C, N_max, ...).
+        torch.Tensor: Validity mask (C, N_max).
+        torch.Tensor: Slot of every sample inside its class (N,).
+    """
+    slots = torch.arange(values.shape[0], device=values.device) - offsets[sorted_labels]
+    padded = values.new_zeros((num_classes, max_count) + tuple(values.shape[1:]))
+    padded[sorted_labels, slots] = values
+    valid = torch.zeros((num_classes, max_count), dtype=torch.bool, device=values.device)
+    valid[sorted_labels, slots] = True
+    return padded, valid, slots
+
+
+# C * N_max * K as input
+@torch.no_grad()
+def batched_agd_no_grad(M, sample_mask, centroid_mask, eps=0.05):
+    """Solve ``agd_torch_no_grad_gpu`` for many classes in one pass.
+
+    Since the dual iterates of ``agd_torch_no_grad_gpu`` never leave zero, its
+    transport plan is the softmax of ``-M / gamma`` over the whole per-class
+    block with ``gamma = eps / (3 * log(N))``. Here every class is solved at
+    once on a padded batch; padded samples and inactive sub-centroids are
+    masked out. A class with a single sample gets a uniform plan.
+
+    Args:
+        M (torch.Tensor): Sample to sub-centroid similarities (C, N_max, K).
+        sample_mask (torch.Tensor): Valid samples of every class (C, N_max).
+        centroid_mask (torch.Tensor): Active sub-centroids of every class
+            (C, K).
+        eps (float): Entropic regularization. Default: 0.05.
+    Returns:
+        torch.Tensor: Hard one-hot assignments (C, N_max, K).
+        torch.Tensor: Assigned sub-centroid index of every sample (C, N_max).
+    """
+    num_classes = M.shape[0]
+    valid = sample_mask[:, :, None] & centroid_mask[:, None, :]
+
+    num_samples = sample_mask.sum(dim=1).to(torch.float64)
+    gamma = eps / (3 * torch.log(num_samples.clamp(min=1)))
+
+    logits = -M.to(torch.float64) / gamma[:, None, None]
+    logits = logits.masked_fill(~valid, float('-inf'))
+    # classes without samples would be all -inf; any finite row works there
+    logits = logits.masked_fill((num_samples == 0)[:, None, None], 0)
+    X = torch.softmax(logits.view(num_classes, -1), dim=1).view_as(logits)
+    X = X.masked_fill(~valid, 0)
+
+    indexs = torch.argmax(X.masked_fill(~valid, float('-inf')), dim=2)
+
+    gumbel_logits = X.masked_fill(~centroid_mask[:, None, :], float('-inf'))
+    gumbel_logits = gumbel_logits.masked_fill(~sample_mask[:, :, None], 0)
+    G = F.gumbel_softmax(gumbel_logits, tau=0.5, hard=True)
+    G = G * sample_mask[:, :, None]
+
+    return G.to(torch.float32), indexs
+
+
+@torch.no_grad()
+def batched_cosine_silhouette(features, cluster_labels, num_clusters, sample_size=None,
+                              generator=None):
+    """Cosine silhouette scores of several clusterings of the same samples.
+
+    A torch port of ``sklearn.metrics.silhouette_score(metric='cosine')``
+    that stays on the device of ``features``. The pairwise distance matrix is
+    computed once and shared by all clusterings.
+
+    Args:
+        features (torch.Tensor): Feature embeddings (N x D).
+        cluster_labels (torch.Tensor): Cluster assignments of every
+            clustering (P x N), with values in ``[0, num_clusters)``.
+        num_clusters (int): Upper bound of the cluster indices.
+        sample_size (int, optional): If given and smaller than N, the scores
+            are estimated on a random subset of this many samples, which
+            bounds the O(N^2) cost for large classes. Default: None.
+        generator (torch.Generator, optional): CPU generator of the random
+            subset, e.g. seeded identically on all ranks. Default: None.
+    Returns:
+        torch.Tensor: Silhouette score of every clustering (P,). Clusterings
+            with less than 2 non-empty clusters score 0.
+    """
+    if sample_size is not None and features.shape[0] > sample_size:
+        indices = torch.randperm(features.shape[0], generator=generator)[:sample_size]
+        indices = indices.to(features.device)
+        features = features[indices]
+        cluster_labels = cluster_labels[:, indices]
+
+    features = F.normalize(features.float(), p=2, dim=-1)
+    dist = torch.mm(features, features.t()).neg_().add_(1).clamp_(0, 2)
+    dist.fill_diagonal_(0)
+
+    one_hot = F.one_hot(cluster_labels, num_clusters).to(dist.dtype)  # P x N x K
+    counts = one_hot.sum(dim=1)  # P x K
+    dist_sums = torch.matmul(dist, one_hot)  # P x N x K
+
+    # mean distance to the other members of the own cluster
+    own_counts = counts.gather(1, cluster_labels)
+    a = dist_sums.gather(2, cluster_labels[:, :, None]).squeeze(2) / (own_counts - 1).clamp(min=1)
+
+    # smallest mean distance to any other non-empty cluster
+    other = dist_sums / counts[:, None, :].clamp(min=1)
+    other = other.masked_fill(one_hot.bool() | (counts == 0)[:, None, :], float('inf'))
+    b = other.min(dim=2)[0]
+
+    sil = torch.nan_to_num((b - a) / torch.max(a, b))
+    sil = sil.masked_fill(own_counts <= 1, 0)
+    scores = sil.mean(dim=1)
+    return scores.masked_fill((counts > 0).sum(dim=1) < 2, 0)
+
+
+class MemoryBank(object):
+    """Fixed-capacity, device-resident buffer of features and labels.
+
+    The storage is allocated once on the device of the first enqueued batch.
+    Batches are written behind each other and :meth:`flush` hands out views
+    of the filled part and rewinds the write pointer, so neither enqueueing
+    nor flushing allocates. The bank is full once the next batch of the
+    largest size seen so far would no longer fit.
+
+    Args:
+        num_samples (int, optional): Capacity in samples.
+        num_bytes (int, optional): Capacity in bytes of the feature and label
+            storage. Ignored if ``num_samples`` is given.
+        num_batches (int, optional): Capacity in batches of the size of the
+            first enqueued batch. Used if neither of the above is given.
+        dtype (str, optional): Storage dtype of the features, e.g.
+            ``'float16'`` or ``'bfloat16'``. Defaults to the dtype of the
+            first enqueued batch.
+    """
+
+    def __init__(self, num_samples=None, num_bytes=None, num_batches=None, dtype=None):
+        assert num_samples is not None or num_bytes is not None or num_batches is not None, \
+            'The capacity of the memory bank must be given.'
+        self.num_samples = num_samples
+        self.num_bytes = num_bytes
+        self.num_batches = num_batches
+        self.dtype = getattr(torch, dtype) if isinstance(dtype, str) else dtype
+
+        self.features = None
+        self.labels = None
+        self.ptr = 0
+        self.max_batch = 0
+
+    @property
+    def capacity(self):
+        return 0 if self.features is None else self.features.shape[0]
+
+    def _allocate(self, features, labels):
+        dtype = features.dtype if self.dtype is None else self.dtype
+        if self.num_samples is not None:
+            capacity = self.num_samples
+        elif self.num_bytes is not None:
+            sample_bytes = (features.shape[1] * torch.finfo(dtype).bits // 8
+                            + torch.iinfo(labels.dtype).bits // 8)
+            capacity = self.num_bytes // sample_bytes
+        else:
+            capacity = self.num_batches * features.shape[0]
+        assert capacity >= features.shape[0], \
+            f'The memory bank ({capacity} samples) cannot hold a batch of {features.shape[0]}.'
+
+        self.features = features.new_empty((capacity, features.shape[1]), dtype=dtype)
+        self.labels = labels.new_empty((capacity, ))
+
+    def __len__(self):
+        return self.ptr
+
+    @torch.no_grad()
+    def enqueue(self, features, labels):
+        """Append a batch; samples beyond the capacity are dropped."""
+        if self.features is None:
+            self._allocate(features, labels)
+        num = min(features.shape[0], self.capacity - self.ptr)
+        self.features[self.ptr:self.ptr + num].copy_(features[:num])
+        self.labels[self.ptr:self.ptr + num].copy_(labels[:num])
+        self.ptr += num
+        self.max_batch = max(self.max_batch, features.shape[0])
+
+    def is_full(self):
+        return self.features is not None and self.capacity - self.ptr < self.max_batch
+
+    def flush(self):
+        """Return views of the stored features and labels and rewind.
+
+        The views are only valid until the next :meth:`enqueue`.
+        """
+        num = self.ptr
+        self.ptr = 0
+        return self.features[:num], self.labels[:num]
+
+
+class PackedSubCentroids(nn.Module):
+    """Active subcentroids of every class packed into a ``[sum_k, D]`` matrix.
+
+    Class ``c`` owns the rows ``offsets[c]:offsets[c] + counts[c]``. The
+    classes are laid out in ascending order of their subcentroid number, so
+    the classes sharing a number ``k`` form one contiguous block and the
+    segmented max over the similarities reduces to a reshape and ``amax``
+    per distinct ``k``. Only tensor ops with static shapes are used, so the
+    module traces to TorchScript and ONNX.
+
+    As with the dense masked prototypes, the zeroed inactive subcentroids of
+    a class with fewer than ``max_subcentroids`` contribute a similarity of
+    0 to its max, which ``floor`` restores.
+
+    Args:
+        prototypes (Tensor): Normalized prototypes (C, max_subcentroids, D).
+        num_subcentroids (list[int]): Number of active subcentroids of every
+            class.
+    """
+
+    def __init__(self, prototypes, num_subcentroids):
+        super(PackedSubCentroids, self).__init__()
+        num_classes, max_subcentroids, _ = prototypes.shape
+        counts = [min(max(int(k), 0), max_subcentroids) for k in num_subcentroids]
+        order = sorted(range(num_classes), key=lambda c: counts[c])
+
+        # (k, number of classes) of every block
+        self.groups = []
+        for c in order:
+            if self.groups and self.groups[-1][0] == counts[c]:
+                self.groups[-1][1] += 1
+            else:
+                self.groups.append([counts[c], 1])
+        self.groups = [tuple(group) for group in self.groups]
+
+        device = prototypes.device
+        order = torch.tensor(order, dtype=torch.long, device=device)
+        sorted_counts = torch.tensor(counts, dtype=torch.long, device=device)[order]
+        rows = torch.arange(max_subcentroids, device=device)[None, :] < sorted_counts[:, None]
+        weight = prototypes.detach()[order][rows]
+
+        starts = torch.cumsum(sorted_counts, dim=0) - sorted_counts
+        offsets = torch.empty_like(starts)
+        offsets[order] = starts
+        inverse = torch.empty_like(order)
+        inverse[order] = torch.arange(num_classes, device=device)
+        floor = torch.full((num_classes, ), float('-inf'), dtype=weight.dtype, device=device)
+        floor[sorted_counts[inverse] < max_subcentroids] = 0
+
+        self.register_buffer('weight', weight)
+        self.register_buffer('counts', sorted_counts[inverse])
+        self.register_buffer('offsets', offsets)
+        self.register_buffer('inverse', inverse)
+        self.register_buffer('floor', floor)
+
+    def forward(self, x):
+        """Class scores (N x C) of the normalized features."""
+        sims = torch.mm(x, self.weight.t())
+        scores = []
+        start = 0
+        for k, num in self.groups:
+            if k == 0:
+                scores.append(sims.new_zeros((x.shape[0], num)))
+                continue
+            block = sims[:, start:start + k * num]
+            scores.append(torch.amax(block.reshape(x.shape[0], num, k), dim=2))
+            start += k * num
+        scores = torch.cat(scores, dim=1).index_select(1, self.inverse)
+        return torch.max(scores, self.floor)
+
+
+class FeatureGatherer(object):
+    """Gathers the features and labels of all GPUs with one collective.
+
+    The labels are packed as an extra column behind the features, so a
+    single ``all_gather`` moves both. It writes into views of a preallocated
+    ``[world_size * B, D + 1]`` buffer instead of ``world_size`` fresh
+    tensors. The packed dtype is the feature dtype when it represents every
+    label exactly, float32 otherwise. Two buffers are used in turn, so the
+    result of one gather stays valid while the next one is in flight.
+
+    Args:
+        num_classes (int): Number of classes, bounds the labels.
+        async_op (bool): Whether :meth:`start` returns before the gather has
+            finished, letting it overlap with the backward pass. Defaults to
+            False.
+    """
+
+    def __init__(self, num_classes, async_op=False):
+        self.num_classes = num_classes
+        self.async_op = async_op
+        self.buffers = [None, None]
+        self.slot = 0
+        self.pending = None
+
+    def _buffers(self, features, world_size):
+        dtype = features.dtype
+        if self.num_classes > 2 / torch.finfo(dtype).eps:
+            dtype = torch.float32
+        batch_size, channels = features.shape
+        buffers = self.buffers[self.slot]
+        if (buffers is None or buffers[0].shape != (batch_size, channels + 1)
+                or buffers[0].dtype != dtype or buffers[0].device != features.device):
+            send = features.new_empty((batch_size, channels + 1), dtype=dtype)
+            recv = features.new_empty((world_size * batch_size, channels + 1), dtype=dtype)
+            buffers = (send, recv)
+            self.buffers[self.slot] = buffers
+        return buffers
+
+    @torch.no_grad()
+    def start(self, features, labels):
+        """Launch the gather of one batch."""
+        assert self.pending is None, 'The previous gather was not waited for.'
+        if not (dist.is_available() and dist.is_initialized()):
+            self.pending = (None, features.detach(), labels.detach())
+            return
+
+        send, recv = self._buffers(features, dist.get_world_size())
+        self.slot = 1 - self.slot
+        send[:, :-1].copy_(features)
+        send[:, -1].copy_(labels)
+        work = dist.all_gather(list(recv.chunk(dist.get_world_size())), send,
+                               async_op=self.async_op)
+        self.pending = (work, recv, None)
+
+    def wait(self):
+        """Finish the launched gather.
+
+        Returns:
+            tuple[Tensor, Tensor] | None: The gathered features, a view into
+                the buffer valid until the next but one :meth:`start`, and
+                labels, or None if no gather was launched.
+        """
+        if self.pending is None:
+            return None
+        work, recv, labels = self.pending
+        self.pending = None
+        if labels is not None:
+            return recv, labels
+        if work is not None:
+            work.wait()
+        return recv[:, :-1], recv[:, -1].long()
+
+
 @HEADS.register_module()
 class SubCentroids_Head_Formal(ClsHead):
     """Linear classifier head.
@@ -248,6 +610,53 @@ class SubCentroids_Head_Formal(ClsHead):
         in_channels (int): Number of channels in the input feature map.
         init_cfg (dict | optional): The extra init config of layers.
             Defaults to use dict(type='Normal', layer='Linear', std=0.01).
+        batched_clustering (bool): Whether to cluster all classes of a flushed
+            memory bank at once on a padded ``[C, N_max, D]`` batch instead of
+            looping over the classes. Defaults to True.
+        silhouette_sample_size (int, optional): If given, the silhouette
+            scores of classes with more samples than this are estimated on a
+            random subset of this size. Defaults to None.
+        search_cfg (dict, optional): Schedule of the sub-centroid count
+            search. ``interval`` runs the search every ``interval`` flushes
+            of the memory bank, ``classes_per_flush`` only searches a window
+            of that many classes that rotates over all classes from flush to
+            flush, and ``patience`` freezes a class once ``patience``
+            consecutive searches improved its best silhouette by no more
+            than ``tol``. The defaults search every class on every flush,
+            which matches the exhaustive search exactly. A frozen class
+            keeps its count, so its choice may only differ from the
+            exhaustive search by a candidate whose score would have kept
+            improving by at most ``tol`` per search before freezing.
+            Defaults to None.
+        memory_bank_cfg (dict, optional): Capacity and storage of the memory
+            bank, see :class:`MemoryBank`. The bank holds
+            ``batch_size_num_limit`` gathered batches by default.
+        stream_cfg (dict, optional): If given, the memory bank is not used.
+            Instead the subcentroid statistics of every gathered batch are
+            accumulated and the prototypes are momentum updated with
+            ``momentum`` every ``interval`` steps, which also run the count
+            search. Defaults to None.
+        ot_cfg (dict, optional): Solver of the subcentroid assignments.
+            ``type='agd'`` is the closed form of ``agd_torch_no_grad_gpu``,
+            ``'sinkhorn'`` and ``'apdagd'`` use the log-domain solvers
+            :func:`log_sinkhorn` and :func:`log_apdagd`, whose remaining keys
+            are passed on (``dtype`` may be given as a string). Defaults to
+            ``dict(type='agd')``.
+        comm_cfg (dict, optional): Distributed communication of the head.
+            ``async_gather`` lets the gather of the features and labels of a
+            batch overlap with its backward pass; they then reach the memory
+            bank or the streaming update one step later. ``sparse_sync``
+            only averages the subcentroids that changed on some GPU and
+            ``sync_dtype`` (e.g. ``'float16'``) is the dtype they are
+            averaged in. Defaults to
+            ``dict(async_gather=False, sparse_sync=True, sync_dtype=None)``.
+        profile_cfg (dict, optional): If given, the head is instrumented by a
+            :class:`HeadProfiler` built from it, see ``HeadProfilerHook``
+            for reporting. It times the regions ``gather``, ``flush``,
+            ``stream_update``, ``clustering``, ``search`` (once per searched
+            class), ``ot`` and ``sync`` and records ``bank_occupancy`` and,
+            for the iterative solvers, ``ot_iters`` and ``ot_error``.
+            Defaults to None.
     """
 
     def __init__(self,
@@ -257,15 +666,29 @@ class SubCentroids_Head_Formal(ClsHead):
                  norm_cfg=None,
                  act_cfg=dict(type='ReLU'),
                  init_cfg=dict(type='Normal', layer='Linear', std=0.01),
+                 batched_clustering=True,
+                 silhouette_sample_size=None,
+                 search_cfg=None,
+                 memory_bank_cfg=None,
+                 stream_cfg=None,
+                 ot_cfg=None,
+                 comm_cfg=None,
+                 profile_cfg=None,
                  *args,
                  **kwargs):
         super(SubCentroids_Head_Formal, self).__init__(init_cfg=init_cfg, *args, **kwargs)
         self.conv_cfg = conv_cfg
         self.norm_cfg = norm_cfg
         self.act_cfg = act_cfg
+        self.batched_clustering = batched_clustering
+        self.silhouette_sample_size = silhouette_sample_size
+        self.search_cfg = dict(interval=1, classes_per_flush=None, patience=None, tol=1e-3)
+        if search_cfg is not None:
+            self.search_cfg.update(search_cfg)
 
         self.temperature = 0.1
         self.update_subcentroids = True
+        self.search_subcentroids = True
         self.gamma = 0.999
         self.pretrain_subcentroids = False
         self.use_subcentroids = True
@@ -275,12 +698,37 @@ class SubCentroids_Head_Formal(ClsHead):
         self.num_classes = num_classes
 
         self.is_only_cross_entropy = True
-        self.memory_bank = []
-        self.memory_bank_label = []
+
+        if profile_cfg is not None:
+            self.profiler = HeadProfiler(**dict(dict(enabled=True), **profile_cfg))
+        else:
+            self.profiler = HeadProfiler()
 
         # 500 for swin-T # ResNet for 1000 # for swin-B 300 # 400 for swin-s #1000 for mobilenet-v2
         self.batch_size_num_limit = 1000
-        print('batch size limit', self.batch_size_num_limit)
+        if memory_bank_cfg is None:
+            memory_bank_cfg = dict(num_batches=self.batch_size_num_limit)
+            self.profiler.log(f'batch size limit {self.batch_size_num_limit}')
+        self.memory_bank = MemoryBank(**memory_bank_cfg)
+
+        self.stream_cfg = None
+        if stream_cfg is not None:
+            self.stream_cfg = dict(interval=1, momentum=self.gamma)
+            self.stream_cfg.update(stream_cfg)
+        self.stream_sums = None
+        self.ot_cfg = dict(type='agd') if ot_cfg is None else dict(ot_cfg)
+        if isinstance(self.ot_cfg.get('dtype'), str):
+            self.ot_cfg['dtype'] = getattr(torch, self.ot_cfg['dtype'])
+        assert self.ot_cfg['type'] in ('agd', 'sinkhorn', 'apdagd'), \
+            f'Unsupported ot_cfg type {self.ot_cfg["type"]}'
+        self.stream_counts = None
+        self.stream_steps = 0
+        self.comm_cfg = dict(async_gather=False, sparse_sync=True, sync_dtype=None)
+        if comm_cfg is not None:
+            self.comm_cfg.update(comm_cfg)
+        if isinstance(self.comm_cfg['sync_dtype'], str):
+            self.comm_cfg['sync_dtype'] = getattr(torch, self.comm_cfg['sync_dtype'])
+        self.gatherer = FeatureGatherer(num_classes, self.comm_cfg['async_gather'])
 
         if self.num_classes <= 0:
             raise ValueError(
@@ -319,6 +767,23 @@ class SubCentroids_Head_Formal(ClsHead):
                                             requires_grad=False)
         self.best_silhouette.data.fill_(-1.0)  # Initialize with -1
 
+        # Track the search schedule: flush counter, start of the rotating
+        # class window and number of searches without improvement per class
+        self.search_flushes = nn.Parameter(torch.zeros(1), requires_grad=False)
+        self.search_cursor = nn.Parameter(torch.zeros(1), requires_grad=False)
+        self.search_stale = nn.Parameter(torch.zeros(self.num_classes),
+                                         requires_grad=False)
+
+        # Cache of the masked prototypes used by forward, rebuilt only when
+        # the prototypes or the optimal subcentroid numbers change
+        self.prototypes_version = 0
+        self._packed_key = None
+        self._packed_prototypes = None
+        # Same for the variable-k layout used by inference, kept as a
+        # (key, layout) tuple so that it is not registered as a submodule
+        self._packed_subcentroids = (None, None)
+        self.deploy = False
+
         # CK times embedding_dim
         self.feat_norm = nn.LayerNorm(embedding_dim)
         self.mask_norm = nn.LayerNorm(self.num_classes)
@@ -369,58 +834,78 @@ class SubCentroids_Head_Formal(ClsHead):
     def momentum_update(old_value, new_value, momentum, debug=False):
         update = momentum * old_value + (1 - momentum) * new_value
         if debug:
-            print("old prot: {:.3f} x |{:.3f}|, new val: {:.3f} x |{:.3f}|, result= |{:.3f}|".format(
+            HeadProfiler.log("old prot: {:.3f} x |{:.3f}|, new val: {:.3f} x |{:.3f}|, result= |{:.3f}|".format(
                 momentum, torch.norm(old_value, p=2), (1 - momentum), torch.norm(new_value, p=2),
                 torch.norm(update, p=2)))
         return update
 
     @staticmethod
-    def compute_silhouette(features, cluster_labels):
+    def compute_silhouette(features, cluster_labels, sample_size=None):
         """Compute silhouette score for clustering evaluation.
 
         Args:
             features (torch.Tensor): Feature embeddings (N x D)
             cluster_labels (torch.Tensor): Cluster assignments (N,)
+            sample_size (int, optional): Number of samples used to estimate
+                the score of large clusterings. Default: None.
         Returns:
             float: Silhouette score between -1 and 1
         """
-        # Convert to numpy for sklearn
-        features_np = features.detach().cpu().numpy()
-        labels_np = cluster_labels.detach().cpu().numpy()
+        cluster_labels = cluster_labels.long()
+        score = batched_cosine_silhouette(
+            features, cluster_labels[None], int(cluster_labels.max().item()) + 1, sample_size)
+        return score.item()
 
-        # Compute silhouette score if we have at least 2 clusters with data
-        unique_labels = np.unique(labels_np)
-        if len(unique_labels) > 1:
-            score = silhouette_score(features_np, labels_np, metric='cosine')
-            return score
-        return 0.0
+    def is_searchable(self, num_samples):
+        """Whether a class with ``num_samples`` samples has enough of them to
+        search its number of subcentroids."""
+        return num_samples > max(self.candidate_subcentroids)
 
     def find_optimal_subcentroids(self, features, class_idx):
         """Find optimal number of subcentroids based on silhouette score.
 
+        All candidate numbers are clustered and scored in one batch.
+
         Args:
             features (torch.Tensor): Feature embeddings for one class
             class_idx (int): Class index
         Returns:
-            int: Optimal number of subcentroids
-            float: Best silhouette score
+            tuple[int, float] | None: Optimal number of subcentroids and best
+                silhouette score, or None if the class has too few samples to
+                be searched.
         """
+        # Only proceed if we have enough samples
+        if not self.is_searchable(features.shape[0]):
+            return None
+
         best_score = -1
         best_k = 4  # Default value
 
-        # Only proceed if we have enough samples
-        if features.shape[0] > max(self.candidate_subcentroids):
-            for k in self.candidate_subcentroids:
-                # Try clustering with k subcentroids
-                init_q = torch.mm(features, self.prototypes[class_idx, :k, :].t())
-                q, indexs = agd_torch_no_grad_gpu(init_q)
-
-                # Compute silhouette score
-                score = self.compute_silhouette(features, indexs)
-
-                if score > best_score:
-                    best_score = score
-                    best_k = k
+        num_candidates = len(self.candidate_subcentroids)
+        max_k = max(self.candidate_subcentroids)
+        candidates = torch.tensor(self.candidate_subcentroids, device=features.device)
+
+        # Try clustering with every candidate number of subcentroids
+        init_q = torch.mm(features, self.prototypes[class_idx, :max_k, :].t())
+        init_q = init_q[None].expand(num_candidates, -1, -1)
+        sample_mask = torch.ones(init_q.shape[:2], dtype=torch.bool, device=features.device)
+        centroid_mask = torch.arange(max_k, device=features.device)[None, :] < candidates[:, None]
+        _, indexs = self.solve_assignments(init_q, sample_mask, centroid_mask)
+
+        # Compute silhouette scores, on the same subset on every rank since
+        # the ranks search on the same gathered features and must agree on
+        # optimal_subcentroids and best_silhouette
+        generator = None
+        if self.silhouette_sample_size is not None:
+            seed = int(self.search_flushes.item()) * self.num_classes + class_idx
+            generator = torch.Generator().manual_seed(seed)
+        scores = batched_cosine_silhouette(features, indexs, max_k, self.silhouette_sample_size,
+                                           generator)
+
+        for k, score in zip(self.candidate_subcentroids, scores.tolist()):
+            if score > best_score:
+                best_score = score
+                best_k = k
         return best_k, best_score
 
     def subcentroids_learning(self, _c, out_seg, gt_seg, masks):
@@ -437,16 +922,130 @@ class SubCentroids_Head_Formal(ClsHead):
         # clustering for each class
         centroids = self.prototypes.data.clone()
 
+        search_classes = self.select_search_classes()
+
+        with self.profiler.region('clustering'):
+            if self.batched_clustering:
+                self.batched_subcentroids_update(_c, gt_seg, masks, mask, centroids, centroid_target,
+                                                 search_classes)
+            else:
+                self.per_class_subcentroids_update(_c, gt_seg, masks, mask, centroids, centroid_target,
+                                                   search_classes)
+
+        self.set_prototypes(centroids)
+
+        return centroid_logits, centroid_target
+
+    def set_prototypes(self, centroids):
+        """Replace the prototypes by the normalized ``centroids``, averaged
+        over all GPUs."""
+        changed = (centroids != self.prototypes.data).any(dim=-1)
+        centroids = F.normalize(centroids, p=2, dim=-1)
+
+        # Sync across GPUs
+        if self.use_subcentroids and dist.is_available() and dist.is_initialized():
+            with self.profiler.region('sync'):
+                self.sync_prototypes(centroids, changed)
+
+        # Update prototypes
+        self.prototypes = nn.Parameter(centroids, requires_grad=self.pretrain_subcentroids)
+        self.prototypes_version += 1
+
+    @torch.no_grad()
+    def sync_prototypes(self, centroids, changed):
+        """Average ``centroids`` over all GPUs in place.
+
+        With ``comm_cfg['sparse_sync']`` only the subcentroids changed on at
+        least one GPU are reduced, the others still hold the same value on
+        every GPU. Agreeing on them costs one all_reduce of a
+        ``C x max_subcentroids`` byte mask.
+        """
+        world_size = dist.get_world_size()
+        dtype = self.comm_cfg['sync_dtype'] or centroids.dtype
+        flat = centroids.view(-1, centroids.shape[-1])
+        index = None
+        if self.comm_cfg['sparse_sync']:
+            changed = changed.to(torch.uint8)
+            dist.all_reduce(changed, op=dist.ReduceOp.MAX)
+            index = changed.view(-1).nonzero(as_tuple=False).squeeze(1)
+            if index.numel() == 0:
+                return
+
+        # gathering most of the rows costs more than it saves
+        if index is None or index.numel() > flat.shape[0] // 2:
+            reduced = centroids.to(dtype)
+            dist.all_reduce(reduced.div_(world_size))
+            centroids.copy_(reduced)
+            return
+
+        reduced = flat.index_select(0, index).to(dtype)
+        dist.all_reduce(reduced.div_(world_size))
+        flat.index_copy_(0, index, reduced.to(flat.dtype))
+
+    def select_search_classes(self):
+        """Pick the classes whose number of subcentroids is searched in the
+        current flush according to ``search_cfg``.
+
+        Returns:
+            set[int]: Indices of the classes to search.
+        """
+        if not self.search_subcentroids:
+            return set()
+
+        flush = int(self.search_flushes.item())
+        self.search_flushes.data.add_(1)
+        if flush % self.search_cfg['interval'] != 0:
+            return set()
+
+        classes = range(self.num_classes)
+        classes_per_flush = self.search_cfg['classes_per_flush']
+        if classes_per_flush is not None and classes_per_flush < self.num_classes:
+            start = int(self.search_cursor.item())
+            classes = [(start + i) % self.num_classes for i in range(classes_per_flush)]
+            self.search_cursor.data.fill_((start + classes_per_flush) % self.num_classes)
+
+        patience = self.search_cfg['patience']
+        if patience is not None:
+            stale = self.search_stale.tolist()
+            classes = [k for k in classes if stale[k] < patience]
+        return set(classes)
+
+    def update_optimal_subcentroids(self, c_k, k):
+        """Run the sub-centroid count search for class ``k`` and keep the best
+        count found so far.
+
+        A class with too few samples is not searched and keeps its count and
+        its schedule state.
+        """
+        with self.profiler.region('search'):
+            result = self.find_optimal_subcentroids(c_k, k)
+        if result is None:
+            return
+        optimal_k, score = result
+        if score > self.best_silhouette[k] + self.search_cfg['tol']:
+            self.search_stale[k] = 0
+        else:
+            self.search_stale[k] += 1
+        if score > self.best_silhouette[k]:
+            self.optimal_subcentroids[k] = torch.tensor(optimal_k)
+            self.best_silhouette[k] = torch.tensor(score)
+
+    def per_class_subcentroids_update(self, _c, gt_seg, masks, mask, centroids, centroid_target,
+                                      search_classes=()):
+        """Cluster the samples of every class one class at a time.
+
+        ``centroids`` and ``centroid_target`` are updated in place. The number
+        of subcentroids is searched first for the classes in
+        ``search_classes``.
+        """
         for k in range(self.num_classes):
             # Get features for this class
             c_k = _c[gt_seg == k, ...]
             if c_k.shape[0] == 0:
                 continue
 
-            optimal_k, score = self.find_optimal_subcentroids(c_k, k)
-            if score > self.best_silhouette[k]:
-                self.optimal_subcentroids[k] = torch.tensor(optimal_k)
-                self.best_silhouette[k] = torch.tensor(score)
+            if k in search_classes and self.is_searchable(c_k.shape[0]):
+                self.update_optimal_subcentroids(c_k, k)
 
             # Use optimal number of subcentroids for this class
             num_k = self.optimal_subcentroids[k]
@@ -456,7 +1055,11 @@ class SubCentroids_Head_Formal(ClsHead):
             init_q = masks[gt_seg == k, :num_k, k]
 
             # clustering
-            q, indexes = agd_torch_no_grad_gpu(init_q)
+            if self.ot_cfg['type'] == 'agd':
+                q, indexes = agd_torch_no_grad_gpu(init_q)
+            else:
+                q, indexes = self.solve_assignments(init_q[None])
+                q, indexes = q[0], indexes[0]
 
             m_k = mask[gt_seg == k]
             m_k_tile = repeat(m_k, 'n -> n tile', tile=num_k)
@@ -480,44 +1083,197 @@ class SubCentroids_Head_Formal(ClsHead):
             # Update target indices
             centroid_target[gt_seg == k] = indexes.float() + (num_k * k)
 
-        # Update prototypes
-        self.prototypes = nn.Parameter(F.normalize(centroids, p=2, dim=-1),
-                                       requires_grad=self.pretrain_subcentroids)
+    def batched_subcentroids_update(self, _c, gt_seg, masks, mask, centroids, centroid_target,
+                                    search_classes=()):
+        """Cluster the samples of all classes at once.
+
+        The memory bank is sorted by label once and padded into per-class
+        ``[C, N_max, ...]`` tensors, so the assignments and the momentum
+        update of every class are solved by a handful of batched ops. Gives
+        the same prototypes as :meth:`per_class_subcentroids_update`.
+        ``centroids`` and ``centroid_target`` are updated in place. The number
+        of subcentroids is searched first for the classes in
+        ``search_classes``.
+        """
+        f, n, target = self.batched_subcentroids_statistics(_c, gt_seg, masks, mask, search_classes)
 
-        # Sync across GPUs
-        if self.use_subcentroids and dist.is_available() and dist.is_initialized():
-            centroids = self.prototypes.data.clone()
-            dist.all_reduce(centroids.div_(dist.get_world_size()))
-            self.prototypes = nn.Parameter(centroids, requires_grad=self.pretrain_subcentroids)
+        if self.update_subcentroids:
+            self.apply_subcentroids_statistics(centroids, f, n, self.gamma)
 
-        return centroid_logits, centroid_target
+        # Update target indices
+        centroid_target.copy_(target)
+
+    def batched_subcentroids_statistics(self, _c, gt_seg, masks, mask, search_classes=()):
+        """Assign the samples of all classes to their subcentroids at once.
+
+        Returns:
+            torch.Tensor: Assignment-weighted feature sums of the correctly
+                classified samples (C x max_subcentroids x D).
+            torch.Tensor: Number of correctly classified samples assigned to
+                every subcentroid (C x max_subcentroids).
+            torch.Tensor: Flattened subcentroid target of every sample (N,).
+        """
+        order, counts, offsets = sort_by_label(gt_seg, self.num_classes)
+        sorted_labels = gt_seg[order]
+        c_sorted = _c[order]
+
+        # the count search only touches the classes with enough samples in
+        # the bank
+        if search_classes:
+            searchable = counts > max(self.candidate_subcentroids)
+            searchable = torch.nonzero(searchable, as_tuple=False).view(-1).tolist()
+            offsets_list = offsets.tolist()
+            for k in searchable:
+                if k not in search_classes:
+                    continue
+                self.update_optimal_subcentroids(c_sorted[offsets_list[k]:offsets_list[k + 1]], k)
+
+        num_k = self.optimal_subcentroids.long()
+        max_count = int(counts.max().item())
+        centroid_mask = (torch.arange(self.max_subcentroids, device=_c.device)[None, :]
+                         < num_k[:, None])
+
+        # similarities of every sample to the sub-centroids of its own class
+        own_q = masks[order, :, sorted_labels]
+        init_q, sample_mask, slots = pad_by_label(own_q, sorted_labels, offsets,
+                                                  self.num_classes, max_count)
+        c_pad, _, _ = pad_by_label(c_sorted, sorted_labels, offsets, self.num_classes, max_count)
+        m_pad, _, _ = pad_by_label(mask[order], sorted_labels, offsets, self.num_classes, max_count)
+
+        # clustering
+        q, indexes = self.solve_assignments(init_q, sample_mask, centroid_mask)
+
+        m_q = q * m_pad[:, :, None]
+        c_q = c_pad * m_pad[:, :, None]
+
+        f = torch.einsum('cnk,cnd->ckd', m_q, c_q)
+        n = torch.sum(m_q, dim=1)
+
+        target = torch.empty_like(gt_seg, dtype=torch.float)
+        target[order] = (indexes[sorted_labels, slots] + num_k[sorted_labels] * sorted_labels).float()
+        return f, n, target
+
+    def solve_assignments(self, init_q, sample_mask=None, centroid_mask=None):
+        """Hard subcentroid assignments of a batch of problems with the
+        solver selected by ``ot_cfg``.
+
+        Args:
+            init_q (torch.Tensor): Sample to subcentroid similarities
+                (B x N x K).
+            sample_mask (torch.Tensor, optional): Valid samples (B x N).
+            centroid_mask (torch.Tensor, optional): Active subcentroids (B x K).
+        Returns:
+            torch.Tensor: One-hot assignments (B x N x K).
+            torch.Tensor: Assigned subcentroid of every sample (B x N).
+        """
+        if sample_mask is None:
+            sample_mask = init_q.new_ones(init_q.shape[:2], dtype=torch.bool)
+        if centroid_mask is None:
+            centroid_mask = init_q.new_ones((init_q.shape[0], init_q.shape[2]), dtype=torch.bool)
+
+        cfg = dict(self.ot_cfg)
+        solver = cfg.pop('type')
+        if solver == 'agd':
+            with self.profiler.region('ot'):
+                return batched_agd_no_grad(init_q, sample_mask, centroid_mask)
+
+        solve = log_sinkhorn if solver == 'sinkhorn' else log_apdagd
+        with self.profiler.region('ot'):
+            plan, num_iter, err = solve(init_q, sample_mask, centroid_mask, **cfg)
+        self.profiler.record('ot_iters', num_iter)
+        if self.profiler.enabled:
+            self.profiler.record('ot_error', err.max())
+        indexes = torch.argmax(plan.masked_fill(~centroid_mask[:, None, :], -1), dim=2)
+        q = F.one_hot(indexes, init_q.shape[2]).float() * sample_mask[:, :, None]
+        return q, indexes
+
+    def apply_subcentroids_statistics(self, centroids, f, n, momentum):
+        """Momentum update of the active subcentroids that were assigned at
+        least one sample, in place."""
+        centroid_mask = (torch.arange(self.max_subcentroids, device=centroids.device)[None, :]
+                         < self.optimal_subcentroids.long()[:, None])
+        f = F.normalize(f, p=2, dim=-1)
+        new_value = self.momentum_update(
+            old_value=centroids,
+            new_value=f,
+            momentum=momentum
+        )
+        updated = (n != 0) & centroid_mask
+        centroids.copy_(torch.where(updated[:, :, None], new_value, centroids))
+
+    @torch.no_grad()
+    def streaming_subcentroids_learning(self, inputs, gt_label):
+        """Accumulate the subcentroid statistics of one gathered batch and
+        apply the momentum update every ``stream_cfg['interval']`` steps.
+
+        Only the per-class sums and counts are kept between steps, so the
+        memory is O(C x max_subcentroids x D) whatever the interval. The
+        count search runs on the steps that apply the update, which take the
+        place of the flushes in ``search_cfg``, on the features of the
+        current batch. Only the classes with more samples in the batch than
+        the largest candidate count are searched.
+        """
+        x = F.normalize(self.feat_norm(inputs), p=2, dim=-1)
+        masks, out_cls = self.compute_masks(x)
+        mask = (gt_label == torch.max(out_cls, 1)[1])
+
+        search_classes = set()
+        if (self.stream_steps + 1) % self.stream_cfg['interval'] == 0:
+            search_classes = self.select_search_classes()
+        f, n, _ = self.batched_subcentroids_statistics(x, gt_label, masks, mask, search_classes)
+
+        if self.stream_sums is None:
+            self.stream_sums = torch.zeros_like(f)
+            self.stream_counts = torch.zeros_like(n)
+        self.stream_sums += f
+        self.stream_counts += n
+        self.stream_steps += 1
+
+        if self.stream_steps % self.stream_cfg['interval'] != 0 or not self.update_subcentroids:
+            return
+
+        centroids = self.prototypes.data.clone()
+        self.apply_subcentroids_statistics(centroids, self.stream_sums, self.stream_counts,
+                                           self.stream_cfg['momentum'])
+        self.stream_sums.zero_()
+        self.stream_counts.zero_()
+
+        self.set_prototypes(centroids)
 
     def forward_train(self, x, gt_label, **kwargs):
         inputs = self.pre_logits(x)  # (batch_size x 512)
 
         batch_size = inputs.shape[0]
 
+        if self.stream_cfg is not None:
+            seg_logits = self.forward(inputs)
+            losses = self.loss(seg_logits, gt_label, **kwargs)
+            if not self.pretrain_subcentroids and self.use_subcentroids:
+                gathered = self.gather_features(inputs, gt_label)
+                if gathered is not None:
+                    with self.profiler.region('stream_update'):
+                        self.streaming_subcentroids_learning(*gathered)
+            return losses
+
         if self.is_only_cross_entropy:
             # Save to memory bank
-            batch_size_num = self.dequeue_and_enqueue(inputs, gt_label, batch_size)
+            self.dequeue_and_enqueue(inputs, gt_label, batch_size)
 
-            if batch_size_num >= self.batch_size_num_limit:
+            if self.memory_bank.is_full():
                 self.is_only_cross_entropy = False
             else:
                 seg_logits = self.forward(inputs, gt_label)
                 losses = self.loss(seg_logits, gt_label)
 
         if not self.pretrain_subcentroids and self.use_subcentroids and not self.is_only_cross_entropy:
-            # concat data from memory_bank
-            inputs = torch.cat(self.memory_bank, 0)
-            gt_label = torch.cat(self.memory_bank_label, 0)
+            with self.profiler.region('flush'):
+                # views of the data in memory_bank, reduced precision storage
+                # is cast back to the dtype of the features
+                bank_inputs, gt_label = self.memory_bank.flush()
+                inputs = bank_inputs.to(inputs.dtype)
 
-            seg_logits, contrast_logits, contrast_target = self.forward(inputs, gt_label=gt_label)
-            losses = self.loss(seg_logits, gt_label, **kwargs)
-
-            # release memory bank space
-            self.memory_bank = []
-            self.memory_bank_label = []
+                seg_logits, contrast_logits, contrast_target = self.forward(inputs, gt_label=gt_label)
+                losses = self.loss(seg_logits, gt_label, **kwargs)
 
             if self.centroid_contrast_loss is True and self.is_only_cross_entropy is False:  # changes here: and self.isOnlyCE is False: # Only happens apply once.
                 loss_centroid_contrast = F.cross_entropy(contrast_logits, contrast_target.long(), ignore_index=255)
@@ -531,23 +1287,12 @@ class SubCentroids_Head_Formal(ClsHead):
         x = self.feat_norm(x)
         x = F.normalize(x, p=2, dim=-1)
 
-        self.prototypes.data.copy_(F.normalize(self.prototypes, p=2, dim=-1))
+        if self.deploy or (not self.training and gt_label is None):
+            # inference only needs the class scores, which the packed layout
+            # computes from the active subcentroids alone
+            return self.mask_norm(self.packed_subcentroids()(x))
 
-        # Create mask for optimal subcentroids
-        optimal_mask = torch.zeros_like(self.prototypes)
-        for k in range(self.num_classes):
-            num_k = int(self.optimal_subcentroids[k].item())
-            optimal_mask[k, :num_k, :] = 1.0
-
-        # Apply mask to prototypes
-        masked_prototypes = self.prototypes * optimal_mask
-
-        # Compute masks using masked prototypes
-        masks = torch.einsum('nd,kmd->nmk', x, masked_prototypes)  # originally nmk
-
-        out_cls = torch.amax(masks, dim=1)
-
-        out_cls = self.mask_norm(out_cls)
+        masks, out_cls = self.compute_masks(x)
 
         if not self.pretrain_subcentroids and self.use_subcentroids and gt_label is not None and not self.is_only_cross_entropy:
             contrast_logits, contrast_target = self.subcentroids_learning(x, out_cls, gt_label, masks)
@@ -555,12 +1300,109 @@ class SubCentroids_Head_Formal(ClsHead):
         else:
             return out_cls
 
-    def dequeue_and_enqueue(self, inputs, gt_label, batch_size):
-        inputs_all = concat_all_gather(inputs)
-        label_all = concat_all_gather(gt_label)
+    def compute_masks(self, x):
+        """Similarities of the normalized features to the active subcentroids
+        (N x max_subcentroids x C) and the class scores."""
+        packed = self.packed_prototypes()
+
+        # one matmul against all subcentroids, then the max of every class
+        masks = torch.mm(x, packed.t()).view(x.shape[0], self.num_classes, self.max_subcentroids)
+        out_cls = torch.amax(masks, dim=2)
+        masks = masks.permute(0, 2, 1)  # originally nmk
+
+        out_cls = self.mask_norm(out_cls)
+        return masks, out_cls
+
+    def packed_prototypes(self):
+        """Normalized prototypes with the inactive subcentroids zeroed,
+        flattened to ``(C * max_subcentroids) x D``.
+
+        The result is cached and only rebuilt when the prototypes are
+        replaced (``prototypes_version``), moved or modified in place, or
+        when ``optimal_subcentroids`` changes, so that forward neither loops
+        over the classes nor synchronizes with the device.
+        """
+        key = self.prototypes_key()
+        if key == self._packed_key and not self.prototypes.requires_grad:
+            return self._packed_prototypes
+
+        self.prototypes.data.copy_(F.normalize(self.prototypes, p=2, dim=-1))
 
-        self.memory_bank.append(inputs_all)
-        self.memory_bank_label.append(label_all)
+        # Create mask for optimal subcentroids
+        optimal_mask = (torch.arange(self.max_subcentroids, device=self.prototypes.device)[None, :]
+                        < self.optimal_subcentroids[:, None])
+
+        # Apply mask to prototypes
+        masked_prototypes = self.prototypes * optimal_mask[:, :, None]
+        packed = masked_prototypes.view(-1, self.prototypes.shape[-1])
+
+        self._packed_key = key
+        self._packed_prototypes = packed.detach()
+        return packed
+
+    def prototypes_key(self):
+        return (self.prototypes_version,
+                self.prototypes.data_ptr(), self.prototypes._version,
+                self.optimal_subcentroids.data_ptr(), self.optimal_subcentroids._version)
+
+    def packed_subcentroids(self):
+        """The :class:`PackedSubCentroids` of the current prototypes.
+
+        Only the active subcentroids are packed, so the inference matmul and
+        max scale with the chosen numbers of subcentroids rather than with
+        ``max_subcentroids``. Like :meth:`packed_prototypes`, the layout is
+        cached; rebuilding it reads ``optimal_subcentroids`` on the host.
+        After :meth:`switch_to_deploy` the baked layout is always used.
+        """
+        if self.deploy:
+            return self.deploy_subcentroids
+
+        key = self.prototypes_key()
+        cached_key, packed = self._packed_subcentroids
+        if key != cached_key or self.prototypes.requires_grad:
+            packed = PackedSubCentroids(
+                F.normalize(self.prototypes.detach(), p=2, dim=-1),
+                self.optimal_subcentroids.tolist())
+            self._packed_subcentroids = (key, packed)
+        return packed
+
+    def switch_to_deploy(self):
+        """Bake the packed variable-k layout into the head for export.
+
+        The layout becomes the ``deploy_subcentroids`` submodule and forward
+        always returns the class scores computed from it, so the traced
+        TorchScript and ONNX models carry ``[sum_k, D]`` rather than
+        ``[C * max_subcentroids, D]`` prototypes.
+        """
+        if self.deploy:
+            return
+        self.deploy_subcentroids = self.packed_subcentroids()
+        self._packed_subcentroids = (None, None)
+        self.deploy = True
+
+    def gather_features(self, inputs, gt_label):
+        """Features and labels of all GPUs, see :class:`FeatureGatherer`.
+
+        With ``comm_cfg['async_gather']`` the gather of this batch is only
+        launched and the one of the previous batch is returned, None at the
+        first step.
+        """
+        with self.profiler.region('gather'):
+            if self.comm_cfg['async_gather']:
+                gathered = self.gatherer.wait()
+                self.gatherer.start(inputs, gt_label)
+            else:
+                self.gatherer.start(inputs, gt_label)
+                gathered = self.gatherer.wait()
+        if gathered is None:
+            return None
+        return gathered[0].to(inputs.dtype), gathered[1]
+
+    def dequeue_and_enqueue(self, inputs, gt_label, batch_size):
+        gathered = self.gather_features(inputs, gt_label)
+        if gathered is not None:
+            self.memory_bank.enqueue(*gathered)
+            self.profiler.record('bank_occupancy', len(self.memory_bank) / self.memory_bank.capacity)
 
         return len(self.memory_bank)
 
@@ -574,14 +1416,3 @@ def init_weights(m):
         nn.init.constant_(m.bias, 0)
         nn.init.constant_(m.weight, 1.0)
 
-
-@torch.no_grad()
-def concat_all_gather(tensor):
-    """
-    Performs all_gather operation on the provided tensors.
-    *** Warning ***: torch.distributed.all_gather has no gradient.
-    """
-    tensors_gather = [torch.ones_like(tensor) for _ in range(torch.distributed.get_world_size())]
-    torch.distributed.all_gather(tensors_gather, tensor, async_op=False)
-    output = torch.cat(tensors_gather, dim=0)
-    return output
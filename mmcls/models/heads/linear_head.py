@@ -35,7 +35,7 @@ class LinearClsHead(ClsHead):
 
         self.fc = nn.Linear(self.in_channels, self.num_classes)
 
-    def simple_test(self, x):
+    def simple_test(self, x, post_process=True):
         """Test without augmentation."""
         if isinstance(x, tuple):
             x = x[-1]
@@ -44,7 +44,10 @@ class LinearClsHead(ClsHead):
             cls_score = sum(cls_score) / float(len(cls_score))
         pred = F.softmax(cls_score, dim=1) if cls_score is not None else None
 
-        return self.post_process(pred)
+        if post_process:
+            return self.post_process(pred)
+        else:
+            return pred
 
     def forward_train(self, x, gt_label, **kwargs):
         if isinstance(x, tuple):
@@ -47,14 +47,17 @@ class MultiLabelClsHead(BaseHead):
         losses = self.loss(cls_score, gt_label, **kwargs)
         return losses
 
-    def simple_test(self, x):
+    def simple_test(self, x, post_process=True):
         if isinstance(x, tuple):
             x = x[-1]
         if isinstance(x, list):
             x = sum(x) / float(len(x))
         pred = F.sigmoid(x) if x is not None else None
 
-        return self.post_process(pred)
+        if post_process:
+            return self.post_process(pred)
+        else:
+            return pred
 
     def post_process(self, pred):
         on_trace = is_tracing()
@@ -47,7 +47,7 @@ class MultiLabelLinearClsHead(MultiLabelClsHead):
         losses = self.loss(cls_score, gt_label, **kwargs)
         return losses
 
-    def simple_test(self, x):
+    def simple_test(self, x, post_process=True):
         """Test without augmentation."""
         if isinstance(x, tuple):
             x = x[-1]
@@ -56,4 +56,7 @@ class MultiLabelLinearClsHead(MultiLabelClsHead):
             cls_score = sum(cls_score) / float(len(cls_score))
         pred = F.sigmoid(cls_score) if cls_score is not None else None
 
-        return self.post_process(pred)
+        if post_process:
+            return self.post_process(pred)
+        else:
+            return pred
@@ -114,7 +114,7 @@ class StackedLinearClsHead(ClsHead):
     def init_weights(self):
         self.layers.init_weights()
 
-    def simple_test(self, x):
+    def simple_test(self, x, post_process=True):
         """Test without augmentation."""
         if isinstance(x, tuple):
             x = x[-1]
@@ -125,7 +125,10 @@ class StackedLinearClsHead(ClsHead):
             cls_score = sum(cls_score) / float(len(cls_score))
         pred = F.softmax(cls_score, dim=1) if cls_score is not None else None
 
-        return self.post_process(pred)
+        if post_process:
+            return self.post_process(pred)
+        else:
+            return pred
 
     def forward_train(self, x, gt_label, **kwargs):
         if isinstance(x, tuple):
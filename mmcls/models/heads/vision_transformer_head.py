@@ -68,7 +68,7 @@ class VisionTransformerClsHead(ClsHead):
                 std=math.sqrt(1 / self.layers.pre_logits.in_features))
             nn.init.zeros_(self.layers.pre_logits.bias)
 
-    def simple_test(self, x):
+    def simple_test(self, x, post_process=True):
         """Test without augmentation."""
         x = x[-1]
         _, cls_token = x
@@ -77,7 +77,10 @@ class VisionTransformerClsHead(ClsHead):
             cls_score = sum(cls_score) / float(len(cls_score))
         pred = F.softmax(cls_score, dim=1) if cls_score is not None else None
 
-        return self.post_process(pred)
+        if post_process:
+            return self.post_process(pred)
+        else:
+            return pred
 
     def forward_train(self, x, gt_label, **kwargs):
         x = x[-1]
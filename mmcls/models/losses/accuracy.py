@@ -5,6 +5,8 @@ import numpy as np
 import torch
 import torch.nn as nn
 
+from mmcls.core.evaluation.eval_metrics import topk_accuracy, topk_numpy
+
 
 def accuracy_numpy(pred, target, topk=1, thrs=0.):
     if isinstance(thrs, Number):
@@ -16,24 +18,10 @@ def accuracy_numpy(pred, target, topk=1, thrs=0.):
         raise TypeError(
             f'thrs should be a number or tuple, but got {type(thrs)}.')
 
-    res = []
-    maxk = max(topk)
-    num = pred.shape[0]
-    pred_label = pred.argsort(axis=1)[:, -maxk:][:, ::-1]
-    pred_score = np.sort(pred, axis=1)[:, -maxk:][:, ::-1]
-
-    for k in topk:
-        correct_k = pred_label[:, :k] == target.reshape(-1, 1)
-        res_thr = []
-        for thr in thrs:
-            # Only prediction values larger than thr are counted as correct
-            _correct_k = correct_k & (pred_score[:, :k] > thr)
-            _correct_k = np.logical_or.reduce(_correct_k, axis=1)
-            res_thr.append(_correct_k.sum() * 100. / num)
-        if res_single:
-            res.append(res_thr[0])
-        else:
-            res.append(res_thr)
+    pred_score, pred_label = topk_numpy(pred, max(topk))
+    res = topk_accuracy(pred_score, pred_label, target.reshape(-1), topk, thrs)
+    if res_single:
+        res = [res_thr[0] for res_thr in res]
     return res
 
 
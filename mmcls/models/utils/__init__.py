@@ -1,16 +1,20 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .attention import MultiheadAttention, ShiftWindowMSA
 from .augment.augments import Augments
+from .augment.batch_transforms import BatchPipeline
 from .channel_shuffle import channel_shuffle
 from .embed import HybridEmbed, PatchEmbed, PatchMerging
 from .helpers import is_tracing, to_2tuple, to_3tuple, to_4tuple, to_ntuple
 from .inverted_residual import InvertedResidual
 from .make_divisible import make_divisible
+from .optimal_transport import log_apdagd, log_sinkhorn
+from .profiler import HeadProfiler
 from .se_layer import SELayer
 
 __all__ = [
     'channel_shuffle', 'make_divisible', 'InvertedResidual', 'SELayer',
     'to_ntuple', 'to_2tuple', 'to_3tuple', 'to_4tuple', 'PatchEmbed',
-    'PatchMerging', 'HybridEmbed', 'Augments', 'ShiftWindowMSA', 'is_tracing',
-    'MultiheadAttention'
+    'PatchMerging', 'HybridEmbed', 'Augments', 'BatchPipeline',
+    'ShiftWindowMSA', 'is_tracing', 'MultiheadAttention', 'log_sinkhorn',
+    'log_apdagd', 'HeadProfiler'
 ]
@@ -1,7 +1,14 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 from .augments import Augments
+from .batch_transforms import (BatchColorJitter, BatchLighting, BatchNormalize,
+                               BatchPipeline, BatchRandomErasing,
+                               BatchRandomFlip, BatchRandomResizedCrop)
 from .cutmix import BatchCutMixLayer
 from .identity import Identity
 from .mixup import BatchMixupLayer
 
-__all__ = ['Augments', 'BatchCutMixLayer', 'Identity', 'BatchMixupLayer']
+__all__ = [
+    'Augments', 'BatchCutMixLayer', 'Identity', 'BatchMixupLayer',
+    'BatchPipeline', 'BatchRandomResizedCrop', 'BatchRandomFlip',
+    'BatchColorJitter', 'BatchLighting', 'BatchRandomErasing', 'BatchNormalize'
+]
@@ -0,0 +1,531 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import math
+from numbers import Number
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from .builder import BATCH_PIPELINES, build_batch_transform
+
+# weights of the B, G and R channels in ``mmcv.bgr2gray``
+BGR2GRAY_WEIGHTS = (0.114, 0.587, 0.299)
+
+
+def _uniform(low, high, size, device):
+    return torch.rand(size, device=device) * (high - low) + low
+
+
+def _per_sample(value, num, device):
+    """Broadcast ``value``, a number or a tensor of shape (N, ), to a float
+    tensor of shape (N, )."""
+    return torch.as_tensor(
+        value, dtype=torch.float32, device=device).expand(num)
+
+
+def _color_affine(img, matrix, bias):
+    """Map the color ``x`` of every pixel to ``matrix @ x + bias`` in one
+    batched matrix product, where ``matrix`` is of shape (N, C, C) or
+    (1, C, C) and ``bias`` of shape (N, C) or (1, C)."""
+    num, channels = img.shape[:2]
+    out = torch.baddbmm(
+        bias.expand(num, channels)[:, :, None],
+        matrix.expand(num, channels, channels), img.reshape(num, channels, -1))
+    return out.view(img.shape)
+
+
+class BatchPipeline(object):
+    """Apply pipeline transforms to a whole batch on its device.
+
+    The transforms take the config dicts of their counterparts in
+    ``mmcls.datasets.pipelines``, but run on a collated batch of shape
+    (N, C, H, W), on the training device and with random parameters drawn
+    per sample, so that the DataLoader workers are left to decode the images
+    and bring them to a common size. The batch, typically uint8 images from
+    ``ImageToTensor``, is converted to float32 with values in [0, 255], and
+    the output is float32, or the dtype of a floating point input. The
+    transforms get this float32 copy and may modify it in place.
+
+    Supported transforms are ``RandomResizedCrop``, ``RandomFlip``,
+    ``ColorJitter``, ``Lighting``, ``RandomErasing`` and ``Normalize``.
+
+    The workers may pad the images to the common size, as ``Pad`` does at
+    the bottom and on the right. The unpadded size of every sample, the
+    "valid_shape" that ``Pad`` records, is then passed with the batch and
+    the first transform must be a ``RandomResizedCrop``, which only crops
+    within it.
+
+    Args:
+        transforms (list[dict]): Config dicts of the transforms.
+
+    Example:
+        >>> pipeline = BatchPipeline([
+        >>>     dict(type='RandomResizedCrop', size=224),
+        >>>     dict(type='RandomFlip', flip_prob=0.5),
+        >>>     dict(type='Normalize', mean=[123.675, 116.28, 103.53],
+        >>>          std=[58.395, 57.12, 57.375], to_rgb=True)])
+        >>> imgs = torch.randint(0, 256, (16, 3, 256, 256), dtype=torch.uint8)
+        >>> pipeline(imgs).shape
+        torch.Size([16, 3, 224, 224])
+    """
+
+    def __init__(self, transforms):
+        if isinstance(transforms, dict):
+            transforms = [transforms]
+        self.transforms = [build_batch_transform(cfg) for cfg in transforms]
+
+    def __call__(self, img, valid_shape=None):
+        """
+        Args:
+            img (Tensor): The batch of shape (N, C, H, W).
+            valid_shape (Tensor, optional): The (height, width) of the top
+                left region of every image that is not padding, of shape
+                (N, 2). Defaults to None, the whole images.
+
+        Returns:
+            Tensor: The transformed batch.
+        """
+        assert img.dim() == 4, \
+            f'Expect a batch of shape (N, C, H, W), got {tuple(img.shape)}.'
+        transforms = self.transforms
+        dtype = img.dtype
+        img = img.clone() if dtype == torch.float32 else img.float()
+        if valid_shape is not None:
+            assert len(transforms) > 0 and \
+                isinstance(transforms[0], BatchRandomResizedCrop), \
+                'Padded batches must be cropped by RandomResizedCrop first.'
+            img = transforms[0](img, valid_shape)
+            transforms = transforms[1:]
+        for transform in transforms:
+            img = transform(img)
+        if dtype.is_floating_point:
+            img = img.to(dtype)
+        return img
+
+    def __repr__(self):
+        format_string = self.__class__.__name__ + '('
+        for t in self.transforms:
+            format_string += f'\n    {t}'
+        format_string += '\n)'
+        return format_string
+
+
+@BATCH_PIPELINES.register_module(name='RandomResizedCrop')
+class BatchRandomResizedCrop(object):
+    """Batched :class:`mmcls.datasets.RandomResizedCrop`.
+
+    The crop of every sample is drawn as by the CPU transform, with all the
+    ``max_attempts`` draws of the batch made at once, and is cropped and
+    resized in a single ``grid_sample`` that follows the pixel centers of
+    ``cv2.resize``. The ``'area'`` and ``'lanczos'`` interpolations are not
+    available on the device and ``backend`` is only kept for compatibility
+    with the CPU configs. If the images are padded, the crops are drawn
+    within the unpadded size of every sample, as for the unpadded images.
+    """
+
+    def __init__(self,
+                 size,
+                 scale=(0.08, 1.0),
+                 ratio=(3. / 4., 4. / 3.),
+                 max_attempts=10,
+                 efficientnet_style=False,
+                 min_covered=0.1,
+                 crop_padding=32,
+                 interpolation='bilinear',
+                 backend='cv2'):
+        if efficientnet_style:
+            assert isinstance(size, int)
+            assert crop_padding >= 0
+        if isinstance(size, (tuple, list)):
+            self.size = tuple(size)
+        else:
+            self.size = (size, size)
+        if (scale[0] > scale[1]) or (ratio[0] > ratio[1]):
+            raise ValueError('range should be of kind (min, max). '
+                             f'But received scale {scale} and rato {ratio}.')
+        assert isinstance(max_attempts, int) and max_attempts >= 0, \
+            'max_attempts mush be int and no less than 0.'
+        assert interpolation in ('nearest', 'bilinear', 'bicubic'), \
+            f'Interpolation {interpolation} is not supported on the device.'
+
+        self.scale = scale
+        self.ratio = ratio
+        self.max_attempts = max_attempts
+        self.efficientnet_style = efficientnet_style
+        self.min_covered = min_covered
+        self.crop_padding = crop_padding
+        self.interpolation = interpolation
+
+    def _attempts(self, num, height, width, device):
+        """Draw ``max_attempts`` crops (height, width) per sample of the
+        images of size ``height`` x ``width``, tensors of shape (N, 1), and
+        whether they are valid."""
+        size = (num, self.max_attempts)
+        area = height * width
+        if not self.efficientnet_style:
+            target_area = _uniform(*self.scale, size, device) * area
+            log_ratio = (math.log(self.ratio[0]), math.log(self.ratio[1]))
+            aspect_ratio = torch.exp(_uniform(*log_ratio, size, device))
+            target_w = torch.round(torch.sqrt(target_area * aspect_ratio))
+            target_h = torch.round(torch.sqrt(target_area / aspect_ratio))
+            valid = (target_w > 0) & (target_w <= width) & \
+                (target_h > 0) & (target_h <= height)
+            return target_h, target_w, valid
+
+        min_target_area = self.scale[0] * area
+        max_target_area = self.scale[1] * area
+        aspect_ratio = _uniform(*self.ratio, size, device)
+        min_target_h = torch.round(torch.sqrt(min_target_area / aspect_ratio))
+        max_target_h = torch.round(torch.sqrt(max_target_area / aspect_ratio))
+        max_target_h = torch.where(
+            max_target_h * aspect_ratio > width,
+            torch.floor((width + 0.5 - 1e-7) / aspect_ratio), max_target_h)
+        max_target_h = torch.where(max_target_h * aspect_ratio > width,
+                                   max_target_h - 1, max_target_h)
+        max_target_h = torch.minimum(max_target_h, height)
+        min_target_h = torch.minimum(max_target_h, min_target_h)
+        target_h = torch.round(
+            torch.rand(size, device=device) * (max_target_h - min_target_h) +
+            min_target_h)
+        target_w = torch.round(target_h * aspect_ratio)
+        target_area = target_h * target_w
+        valid = (target_area >= min_target_area) & \
+            (target_area <= max_target_area) & \
+            (target_w > 0) & (target_w <= width) & (target_h <= height) & \
+            (target_area >= self.min_covered * area)
+        return target_h, target_w, valid
+
+    def _fallback(self, height, width):
+        """The central crops (ymin, xmin, ymax, xmax) of the images of size
+        ``height`` x ``width``, tensors of shape (N, ), used when no attempt
+        is valid."""
+        if self.efficientnet_style:
+            crop_ratio = self.size[0] / (self.size[0] + self.crop_padding)
+            crop_size = crop_ratio * torch.minimum(height, width)
+            ymin = torch.round((height - crop_size) / 2.).clamp(min=0)
+            xmin = torch.round((width - crop_size) / 2.).clamp(min=0)
+            ymax = torch.minimum(height, ymin + crop_size) - 1
+            xmax = torch.minimum(width, xmin + crop_size) - 1
+            return torch.stack([ymin, xmin, ymax, xmax], dim=1).floor()
+
+        in_ratio = width / height
+        target_height = torch.where(in_ratio < min(self.ratio),
+                                    torch.round(width / min(self.ratio)),
+                                    height)
+        target_width = torch.where(in_ratio > max(self.ratio),
+                                   torch.round(height * max(self.ratio)),
+                                   width)
+        ymin = torch.floor((height - target_height) / 2)
+        xmin = torch.floor((width - target_width) / 2)
+        ymax = ymin + target_height - 1
+        xmax = xmin + target_width - 1
+        return torch.stack([ymin, xmin, ymax, xmax], dim=1)
+
+    def sample_bboxes(self, num, height, width, device):
+        """Sample the crops (ymin, xmin, ymax, xmax) of ``num`` images of
+        ``height`` x ``width`` as an (N, 4) float tensor of whole pixels.
+
+        ``height`` and ``width`` are numbers, or tensors of shape (N, ) with
+        the size of every image.
+        """
+        height = _per_sample(height, num, device)
+        width = _per_sample(width, num, device)
+        bboxes = self._fallback(height, width)
+        if self.max_attempts == 0:
+            return bboxes
+        target_h, target_w, valid = self._attempts(num, height[:, None],
+                                                   width[:, None], device)
+        # the first valid attempt of every sample
+        first = valid.float().argmax(dim=1, keepdim=True)
+        found = valid.any(dim=1)
+        target_h = target_h.gather(1, first).squeeze(1)
+        target_w = target_w.gather(1, first).squeeze(1)
+        ymin = torch.floor(
+            torch.rand(num, device=device) * (height - target_h + 1))
+        xmin = torch.floor(
+            torch.rand(num, device=device) * (width - target_w + 1))
+        sampled = torch.stack(
+            [ymin, xmin, ymin + target_h - 1, xmin + target_w - 1], dim=1)
+        return torch.where(found[:, None], sampled, bboxes)
+
+    def __call__(self, img, valid_shape=None):
+        num, _, height, width = img.shape
+        if valid_shape is None:
+            bboxes = self.sample_bboxes(num, height, width, img.device)
+        else:
+            valid_shape = valid_shape.to(img.device, torch.float32)
+            bboxes = self.sample_bboxes(num, valid_shape[:, 0],
+                                        valid_shape[:, 1], img.device)
+        ymin, xmin, ymax, xmax = bboxes.unbind(1)
+        crop_h = ymax - ymin + 1
+        crop_w = xmax - xmin + 1
+        # maps the normalized coordinates of the output pixel centers to the
+        # ones of the crop in the input, as cv2.resize does
+        theta = torch.zeros(num, 2, 3, device=img.device)
+        theta[:, 0, 0] = crop_w / width
+        theta[:, 0, 2] = (2 * xmin + crop_w) / width - 1
+        theta[:, 1, 1] = crop_h / height
+        theta[:, 1, 2] = (2 * ymin + crop_h) / height - 1
+        grid = F.affine_grid(
+            theta, (num, img.size(1), *self.size), align_corners=False)
+        if valid_shape is not None:
+            # repeats the last valid pixels rather than the padding, as the
+            # border padding does for the whole images
+            last = (2 * valid_shape.flip(1) - 1) / grid.new_tensor(
+                [width, height]) - 1
+            grid = torch.minimum(grid, last[:, None, None, :])
+        img = F.grid_sample(
+            img,
+            grid,
+            mode=self.interpolation,
+            padding_mode='border',
+            align_corners=False)
+        if self.interpolation == 'bicubic':
+            img = img.clamp(0, 255)
+        return img
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__ + f'(size={self.size}'
+        repr_str += f', scale={tuple(round(s, 4) for s in self.scale)}'
+        repr_str += f', ratio={tuple(round(r, 4) for r in self.ratio)}'
+        repr_str += f', max_attempts={self.max_attempts}'
+        repr_str += f', efficientnet_style={self.efficientnet_style}'
+        repr_str += f', min_covered={self.min_covered}'
+        repr_str += f', crop_padding={self.crop_padding}'
+        repr_str += f', interpolation={self.interpolation})'
+        return repr_str
+
+
+@BATCH_PIPELINES.register_module(name='RandomFlip')
+class BatchRandomFlip(object):
+    """Batched :class:`mmcls.datasets.RandomFlip`."""
+
+    def __init__(self, flip_prob=0.5, direction='horizontal'):
+        assert 0 <= flip_prob <= 1
+        assert direction in ['horizontal', 'vertical']
+        self.flip_prob = flip_prob
+        self.direction = direction
+
+    def __call__(self, img):
+        num = img.size(0)
+        dim = 3 if self.direction == 'horizontal' else 2
+        length = img.size(dim)
+        flip = torch.rand(num, 1, device=img.device) < self.flip_prob
+        # a single gather, with the reversed indices for the flipped samples
+        index = torch.arange(length, device=img.device).expand(num, length)
+        index = torch.where(flip, length - 1 - index, index)
+        shape = [num, 1, 1, 1]
+        shape[dim] = length
+        return img.gather(dim, index.view(shape).expand_as(img))
+
+    def __repr__(self):
+        return self.__class__.__name__ + f'(flip_prob={self.flip_prob})'
+
+
+@BATCH_PIPELINES.register_module(name='ColorJitter')
+class BatchColorJitter(object):
+    """Batched :class:`mmcls.datasets.ColorJitter`.
+
+    Every sample gets its own factors and its own order of the brightness,
+    contrast and saturation adjustments. Each of them is a per-sample affine
+    map of the colors, e.g. a blend with the gray image for the saturation,
+    so that each of the three steps is a single batched matrix product.
+    Unlike the CPU transform, the intermediate images are not rounded to
+    uint8.
+    """
+
+    def __init__(self, brightness, contrast, saturation):
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+
+    def __call__(self, img):
+        num, device = img.size(0), img.device
+        magnitudes = torch.rand(
+            num, 3, device=device) * torch.tensor(
+                [self.brightness, self.contrast, self.saturation],
+                device=device)
+        negative = torch.rand(num, 3, device=device) < 0.5
+        factors = 1 + torch.where(negative, -magnitudes, magnitudes)
+        # 0: brightness, 1: contrast, 2: saturation
+        orders = torch.rand(num, 3, device=device).argsort(dim=1)
+        weights = img.new_tensor(BGR2GRAY_WEIGHTS)
+        eye = torch.eye(3, device=device)
+        for step in range(3):
+            op = orders[:, step, None]
+            factor = factors.gather(1, op)
+            # f * I + (1 - f) * 1 w^T blends with the gray image
+            matrix = factor[:, :, None] * eye + \
+                ((1 - factor) * (op == 2))[:, :, None] * weights
+            # (1 - f) * mean blends with the mean gray level
+            mean = torch.round(img.mean(dim=(2, 3)) @ weights)[:, None]
+            bias = (1 - factor) * (op == 1) * mean
+            img = _color_affine(img, matrix, bias).clamp_(0, 255)
+        return img
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(brightness={self.brightness}, '
+        repr_str += f'contrast={self.contrast}, '
+        repr_str += f'saturation={self.saturation})'
+        return repr_str
+
+
+@BATCH_PIPELINES.register_module(name='Lighting')
+class BatchLighting(object):
+    """Batched :class:`mmcls.datasets.Lighting`.
+
+    As the CPU transform, ``to_rgb`` leaves the images in RGB order.
+    """
+
+    def __init__(self, eigval, eigvec, alphastd=0.1, to_rgb=True):
+        assert isinstance(eigval, list), \
+            f'eigval must be of type list, got {type(eigval)} instead.'
+        assert isinstance(eigvec, list), \
+            f'eigvec must be of type list, got {type(eigvec)} instead.'
+        for vec in eigvec:
+            assert isinstance(vec, list) and len(vec) == len(eigvec[0]), \
+                'eigvec must contains lists with equal length.'
+        self.eigval = np.array(eigval)
+        self.eigvec = np.array(eigvec)
+        self.alphastd = alphastd
+        self.to_rgb = to_rgb
+
+    def __call__(self, img):
+        eigval = img.new_tensor(self.eigval)
+        eigvec = img.new_tensor(self.eigvec)
+        alpha = torch.randn(
+            img.size(0), len(eigval), device=img.device) * self.alphastd
+        alter = (eigvec[None] * (alpha * eigval)[:, None, :]).sum(dim=2)
+        matrix = torch.eye(3, device=img.device)
+        if self.to_rgb:
+            # reverses the channels
+            matrix = matrix.flip(1)
+        return _color_affine(img, matrix[None], alter)
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(eigval={self.eigval.tolist()}, '
+        repr_str += f'eigvec={self.eigvec.tolist()}, '
+        repr_str += f'alphastd={self.alphastd}, '
+        repr_str += f'to_rgb={self.to_rgb})'
+        return repr_str
+
+
+@BATCH_PIPELINES.register_module(name='RandomErasing')
+class BatchRandomErasing(object):
+    """Batched :class:`mmcls.datasets.RandomErasing`.
+
+    The erased rectangles are drawn per sample and applied with one masked
+    fill of the batch. In the ``'rand'`` mode, the random colors are only
+    drawn for the samples that are erased.
+    """
+
+    def __init__(self,
+                 erase_prob=0.5,
+                 min_area_ratio=0.02,
+                 max_area_ratio=0.4,
+                 aspect_range=(3 / 10, 10 / 3),
+                 mode='const',
+                 fill_color=(128, 128, 128),
+                 fill_std=None):
+        assert isinstance(erase_prob, float) and 0. <= erase_prob <= 1.
+        assert isinstance(min_area_ratio, float) and 0. <= min_area_ratio <= 1.
+        assert isinstance(max_area_ratio, float) and 0. <= max_area_ratio <= 1.
+        assert min_area_ratio <= max_area_ratio, \
+            'min_area_ratio should be smaller than max_area_ratio'
+        if isinstance(aspect_range, float):
+            aspect_range = min(aspect_range, 1 / aspect_range)
+            aspect_range = (aspect_range, 1 / aspect_range)
+        assert len(aspect_range) == 2 and all(x > 0 for x in aspect_range) \
+            and aspect_range[0] <= aspect_range[1], \
+            'aspect_range should be a positive float or (min, max).'
+        assert mode in ['const', 'rand']
+        if isinstance(fill_color, Number):
+            fill_color = [fill_color] * 3
+        assert len(fill_color) == 3, \
+            'fill_color should be a float or Sequence with three int.'
+        if isinstance(fill_std, Number):
+            fill_std = [fill_std] * 3
+
+        self.erase_prob = erase_prob
+        self.min_area_ratio = min_area_ratio
+        self.max_area_ratio = max_area_ratio
+        self.aspect_range = aspect_range
+        self.mode = mode
+        self.fill_color = fill_color
+        self.fill_std = fill_std
+
+    def _random_pixels(self, img):
+        if self.fill_std is None:
+            return torch.floor(torch.rand_like(img) * 256)
+        mean = img.new_tensor(self.fill_color).view(1, 3, 1, 1)
+        std = img.new_tensor(self.fill_std).view(1, 3, 1, 1)
+        patch = torch.addcmul(mean, torch.randn_like(img), std)
+        return torch.trunc(patch).clamp_(0, 255)
+
+    def __call__(self, img):
+        num, _, img_h, img_w = img.shape
+        device = img.device
+        erase = torch.rand(num, device=device) <= self.erase_prob
+        log_aspect_range = np.log(np.array(self.aspect_range))
+        aspect_ratio = torch.exp(_uniform(*log_aspect_range, num, device))
+        area = img_h * img_w * _uniform(self.min_area_ratio,
+                                        self.max_area_ratio, num, device)
+        h = torch.round(torch.sqrt(area * aspect_ratio)).clamp(max=img_h)
+        w = torch.round(torch.sqrt(area / aspect_ratio)).clamp(max=img_w)
+        top = torch.floor(torch.rand(num, device=device) * (img_h - h))
+        left = torch.floor(torch.rand(num, device=device) * (img_w - w))
+
+        rows = torch.arange(img_h, device=device).view(1, img_h)
+        cols = torch.arange(img_w, device=device).view(1, img_w)
+        in_rows = (rows >= top[:, None]) & (rows < (top + h)[:, None])
+        in_cols = (cols >= left[:, None]) & (cols < (left + w)[:, None])
+        mask = (in_rows[:, :, None] & in_cols[:, None, :])[:, None]
+        if self.mode == 'const':
+            # the CPU transform fills a uint8 patch
+            fill_color = np.array(self.fill_color, dtype=np.uint8)
+            fill_color = img.new_tensor(fill_color).view(1, 3, 1, 1)
+            return torch.where(
+                erase.view(num, 1, 1, 1) & mask, fill_color, img)
+        erased = erase.nonzero(as_tuple=True)[0]
+        img[erased] = torch.where(mask[erased],
+                                  self._random_pixels(img[erased]),
+                                  img[erased])
+        return img
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(erase_prob={self.erase_prob}, '
+        repr_str += f'min_area_ratio={self.min_area_ratio}, '
+        repr_str += f'max_area_ratio={self.max_area_ratio}, '
+        repr_str += f'aspect_range={self.aspect_range}, '
+        repr_str += f'mode={self.mode}, '
+        repr_str += f'fill_color={self.fill_color}, '
+        repr_str += f'fill_std={self.fill_std})'
+        return repr_str
+
+
+@BATCH_PIPELINES.register_module(name='Normalize')
+class BatchNormalize(object):
+    """Batched :class:`mmcls.datasets.Normalize`."""
+
+    def __init__(self, mean, std, to_rgb=True):
+        self.mean = np.array(mean, dtype=np.float32)
+        self.std = np.array(std, dtype=np.float32)
+        self.to_rgb = to_rgb
+
+    def __call__(self, img):
+        # (img - mean) / std, with the channels reversed by the matrix
+        matrix = torch.diag(img.new_tensor(1 / self.std))
+        if self.to_rgb:
+            matrix = matrix.flip(1)
+        bias = img.new_tensor(-self.mean / self.std)
+        return _color_affine(img, matrix[None], bias[None])
+
+    def __repr__(self):
+        repr_str = self.__class__.__name__
+        repr_str += f'(mean={list(self.mean)}, '
+        repr_str += f'std={list(self.std)}, '
+        repr_str += f'to_rgb={self.to_rgb})'
+        return repr_str
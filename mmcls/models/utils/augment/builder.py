@@ -6,3 +6,10 @@ AUGMENT = Registry('augment')
 
 def build_augment(cfg, default_args=None):
     return build_from_cfg(cfg, AUGMENT, default_args)
+
+
+BATCH_PIPELINES = Registry('batch pipeline')
+
+
+def build_batch_transform(cfg, default_args=None):
+    return build_from_cfg(cfg, BATCH_PIPELINES, default_args)
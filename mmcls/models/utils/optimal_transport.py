@@ -0,0 +1,195 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import math
+
+import torch
+
+# log-domain stand-in for -inf, small enough for exp() to underflow to 0 in
+# float32 and bfloat16 while keeping every update finite
+MASK_VALUE = -1e4
+
+
+def _prepare(M, sample_mask, centroid_mask, dtype):
+    """Cast the costs and build the masks and log marginals shared by the
+    solvers."""
+    M = M.to(dtype)
+    B, N, K = M.shape
+    if sample_mask is None:
+        sample_mask = M.new_ones((B, N), dtype=torch.bool)
+    if centroid_mask is None:
+        centroid_mask = M.new_ones((B, K), dtype=torch.bool)
+    valid = sample_mask[:, :, None] & centroid_mask[:, None, :]
+    # problems without samples or sub-centroids transport no mass
+    empty = ~(sample_mask.any(dim=1) & centroid_mask.any(dim=1))
+
+    num_samples = sample_mask.sum(dim=1).clamp(min=1).to(dtype)
+    num_centroids = centroid_mask.sum(dim=1).clamp(min=1).to(dtype)
+    log_a = (-torch.log(num_samples))[:, None].expand(B, N)
+    log_a = log_a.masked_fill(~sample_mask | empty[:, None], MASK_VALUE)
+    log_b = (-torch.log(num_centroids))[:, None].expand(B, K)
+    log_b = log_b.masked_fill(~centroid_mask | empty[:, None], MASK_VALUE)
+    return M, valid, num_samples, log_a, log_b
+
+
+def _marginal_error(plan, log_a, log_b):
+    """L1 distance of the plan marginals to the target marginals (B,)."""
+    return ((plan.sum(dim=2) - log_a.exp()).abs().sum(dim=1) +
+            (plan.sum(dim=1) - log_b.exp()).abs().sum(dim=1))
+
+
+@torch.no_grad()
+def log_sinkhorn(M,
+                 sample_mask=None,
+                 centroid_mask=None,
+                 reg=0.05,
+                 max_iter=100,
+                 tol=1e-3,
+                 check_interval=10,
+                 dtype=torch.float32):
+    """Entropic optimal transport by Sinkhorn iterations in the log domain.
+
+    Solves a batch of problems at once. Every problem transports uniform
+    mass over its valid samples to uniform mass over its valid
+    sub-centroids. The potentials are updated with ``logsumexp``, so small
+    ``reg`` neither overflows nor underflows, and the loop writes every
+    problem-sized tensor into buffers allocated before it.
+
+    Args:
+        M (torch.Tensor): Transport costs (B, N, K).
+        sample_mask (torch.Tensor, optional): Valid samples (B, N).
+        centroid_mask (torch.Tensor, optional): Valid sub-centroids (B, K).
+        reg (float): Entropic regularization. Default: 0.05.
+        max_iter (int): Maximum number of iterations. Default: 100.
+        tol (float, optional): Stop once the L1 marginal error of every
+            problem is below ``tol``. None runs ``max_iter`` iterations.
+            Default: 1e-3.
+        check_interval (int): Iterations between two convergence checks,
+            each of which synchronizes with the device. Default: 10.
+        dtype (torch.dtype): Compute dtype. Default: torch.float32.
+
+    Returns:
+        tuple[Tensor, int, Tensor]: The transport plans (B, N, K), the number
+            of iterations run and the final marginal error of every problem.
+    """
+    M, valid, _, log_a, log_b = _prepare(M, sample_mask, centroid_mask, dtype)
+
+    log_K = torch.div(M, -reg).masked_fill_(~valid, MASK_VALUE)
+    f = torch.zeros_like(log_a)
+    g = torch.zeros_like(log_b)
+    buf = torch.empty_like(log_K)
+    lse_n = torch.empty_like(log_a)
+    lse_k = torch.empty_like(log_b)
+
+    num_iter = 0
+    for num_iter in range(1, max_iter + 1):
+        torch.add(log_K, g[:, None, :], out=buf)
+        torch.logsumexp(buf, dim=2, out=lse_n)
+        torch.sub(log_a, lse_n, out=f)
+        torch.add(log_K, f[:, :, None], out=buf)
+        torch.logsumexp(buf, dim=1, out=lse_k)
+        torch.sub(log_b, lse_k, out=g)
+
+        if tol is not None and num_iter % check_interval == 0:
+            # the column marginals are exact right after the g update
+            torch.add(log_K, g[:, None, :], out=buf)
+            torch.logsumexp(buf, dim=2, out=lse_n)
+            row_error = (torch.exp(lse_n.add_(f)) - log_a.exp()).abs()
+            if row_error.sum(dim=1).max().item() < tol:
+                break
+
+    torch.add(log_K, f[:, :, None], out=buf)
+    plan = buf.add_(g[:, None, :]).exp_().masked_fill_(~valid, 0)
+    return plan, num_iter, _marginal_error(plan, log_a, log_b)
+
+
+@torch.no_grad()
+def log_apdagd(M,
+               sample_mask=None,
+               centroid_mask=None,
+               eps=0.05,
+               max_iter=100,
+               tol=1e-3,
+               check_interval=10,
+               dtype=torch.float32):
+    """Entropic optimal transport by the primal-dual accelerated gradient
+    descent (APDAGD) of Dvurechensky et al. (2018).
+
+    The adaptive line search of APDAGD is replaced by the fixed Lipschitz
+    constant ``2 / gamma`` of the dual gradient, so the steps need no device
+    synchronization. This bound is conservative and the solver needs far
+    more iterations than :func:`log_sinkhorn` for the same marginal error.
+    As in ``agd_torch_no_grad_gpu``, ``gamma = eps / (3 * log(N))``. The
+    dual softmax is evaluated in the log domain over every problem of the
+    batch at once and the loop writes every problem-sized tensor into buffers
+    allocated before it. With a half precision ``dtype`` only the dual
+    softmax runs in it; the averaged plan and the duals are accumulated in
+    float32, since the ever smaller steps would round away otherwise.
+    Arguments and outputs follow :func:`log_sinkhorn`.
+    """
+    M, valid, num_samples, log_a, log_b = _prepare(M, sample_mask,
+                                                   centroid_mask, dtype)
+    B, N, K = M.shape
+    acc_dtype = torch.float32 if M.element_size() < 4 else dtype
+
+    gamma = eps / (3 * torch.log(num_samples.to(acc_dtype)).clamp(
+        min=math.log(2)))
+    lipschitz = 2 / gamma
+    marginals = torch.cat([log_a, log_b], dim=1).to(acc_dtype).exp_()
+
+    # eta: gradient sequence, zeta: mirror descent sequence, lamb: the point
+    # at which the gradient is taken; the first N duals are the samples'
+    eta = torch.zeros_like(marginals)
+    zeta = torch.zeros_like(marginals)
+    lamb = torch.empty_like(marginals)
+    grad = torch.empty_like(marginals)
+    grad_n, grad_k = grad[:, :N], grad[:, N:]
+    A = torch.zeros_like(gamma)
+    alpha = torch.empty_like(gamma)
+    tau = torch.empty_like(gamma)
+    one_minus_tau = torch.empty_like(gamma)
+    t, t_x = tau[:, None], tau[:, None, None]
+    s, s_x = one_minus_tau[:, None], one_minus_tau[:, None, None]
+    X = torch.empty_like(M)
+    lse = M.new_empty(B)
+    invalid = ~valid
+    # the duals in the compute dtype, a copy for half precision
+    lamb_x = lamb if dtype == acc_dtype else torch.empty_like(
+        lamb, dtype=dtype)
+    plan = torch.zeros_like(M, dtype=acc_dtype)
+    neg_M = torch.neg(M)
+    gamma_x = gamma.to(dtype)[:, None, None]
+
+    num_iter = 0
+    for num_iter in range(1, max_iter + 1):
+        # alpha solves L * alpha^2 = A + alpha
+        torch.mul(A, 4 * lipschitz, out=alpha)
+        alpha.add_(1).sqrt_().add_(1).div_(2 * lipschitz)
+        A.add_(alpha)
+        torch.div(alpha, A, out=tau)
+        torch.neg(tau, out=one_minus_tau).add_(1)
+
+        torch.sub(zeta, eta, out=lamb)
+        lamb.mul_(t).add_(eta)
+
+        # X(lamb) = softmax((-M - lamb_n - lamb_k) / gamma) over the block
+        if lamb_x is not lamb:
+            lamb_x.copy_(lamb)
+        torch.sub(neg_M, lamb_x[:, :N, None], out=X)
+        X.sub_(lamb_x[:, None, N:]).div_(gamma_x)
+        X.masked_fill_(invalid, MASK_VALUE)
+        torch.logsumexp(X.view(B, -1), dim=1, out=lse)
+        X.sub_(lse[:, None, None]).exp_()
+        X.masked_fill_(invalid, 0)
+
+        torch.sum(X, dim=2, dtype=acc_dtype, out=grad_n)
+        torch.sum(X, dim=1, dtype=acc_dtype, out=grad_k)
+        grad.neg_().add_(marginals)
+
+        zeta.addcmul_(grad, alpha[:, None], value=-1)
+        eta.mul_(s).addcmul_(zeta, t)
+        plan.mul_(s_x).addcmul_(X, t_x)
+
+        if tol is not None and num_iter % check_interval == 0:
+            if _marginal_error(plan, log_a, log_b).max().item() < tol:
+                break
+
+    return plan, num_iter, _marginal_error(plan, log_a, log_b)
@@ -0,0 +1,129 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import torch
+from mmcv.utils import print_log
+
+
+class HeadProfiler(object):
+    """Opt-in instrumentation of a head.
+
+    Named timing regions and scalar records are aggregated until
+    :meth:`pop_stats` hands them out, which ``HeadProfilerHook`` does after
+    every training iteration to put them in the runner log buffer. While
+    disabled, regions and records cost nothing but the call, and only
+    :meth:`log` has an effect.
+
+    Args:
+        enabled (bool): Whether to record anything. Defaults to False.
+        synchronize (bool): Whether to synchronize CUDA at the boundaries of
+            a region so that it is charged for its kernels. Defaults to True.
+        trace (bool): Whether to keep the regions and records as Chrome
+            trace events for :meth:`export_chrome_trace`. Defaults to False.
+        max_trace_events (int): Trace events kept at most, later ones are
+            dropped. Defaults to 1000000.
+        prefix (str): Prefix of the keys returned by :meth:`pop_stats`.
+            Defaults to ``'head'``.
+    """
+
+    def __init__(self,
+                 enabled=False,
+                 synchronize=True,
+                 trace=False,
+                 max_trace_events=1000000,
+                 prefix='head'):
+        self.enabled = enabled
+        self.synchronize = synchronize
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.prefix = prefix
+
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.values = {}
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def _sync(self):
+        if self.synchronize and torch.cuda.is_available() \
+                and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    def _add_event(self, event):
+        if self.trace and len(self.events) < self.max_trace_events:
+            event.update(pid=os.getpid(), tid=0)
+            self.events.append(event)
+
+    def _timestamp(self, t):
+        return (t - self._origin) * 1e6
+
+    @contextmanager
+    def region(self, name):
+        """Time the enclosed code as region ``name``."""
+        if not self.enabled:
+            yield
+            return
+        self._sync()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sync()
+            end = time.perf_counter()
+            self.times[name] += end - start
+            self.calls[name] += 1
+            self._add_event(
+                dict(
+                    name=name,
+                    ph='X',
+                    ts=self._timestamp(start),
+                    dur=(end - start) * 1e6))
+
+    def record(self, name, value):
+        """Record the latest ``value`` of the scalar ``name``."""
+        if not self.enabled:
+            return
+        value = float(value)
+        self.values[name] = value
+        self._add_event(
+            dict(
+                name=name,
+                ph='C',
+                ts=self._timestamp(time.perf_counter()),
+                args={name: value}))
+
+    @staticmethod
+    def log(msg, level=logging.INFO):
+        """Send a message to the mmcls logger, whether enabled or not."""
+        print_log(msg, logger='mmcls', level=level)
+
+    def pop_stats(self):
+        """Statistics gathered since the last call.
+
+        Returns:
+            dict: The mean time in ms (``<prefix>/<name>_time``) and number
+                of calls (``<prefix>/<name>_calls``) of every region and the
+                latest value of every record (``<prefix>/<name>``).
+        """
+        stats = {}
+        for name, total in self.times.items():
+            stats[f'{self.prefix}/{name}_time'] = \
+                total * 1000 / self.calls[name]
+            stats[f'{self.prefix}/{name}_calls'] = self.calls[name]
+        for name, value in self.values.items():
+            stats[f'{self.prefix}/{name}'] = value
+        self.times.clear()
+        self.calls.clear()
+        self.values.clear()
+        return stats
+
+    def export_chrome_trace(self, path):
+        """Write the trace events in the Chrome trace format, viewable in
+        ``chrome://tracing`` or Perfetto."""
+        with open(path, 'w') as f:
+            json.dump(dict(traceEvents=self.events), f)
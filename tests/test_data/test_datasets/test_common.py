@@ -1,13 +1,22 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import os
+import pickle
+import socket
+import tarfile
 import tempfile
 from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pytest
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 
-from mmcls.datasets import (DATASETS, BaseDataset, ImageNet21k,
-                            MultiLabelDataset)
+from mmcls.datasets import (CIFAR10, DATASETS, MNIST, ArrayAnnotations,
+                            BaseDataset, ImageNet, ImageNet21k,
+                            MultiLabelDataset, PackedAnnotations,
+                            ShardedDataset, ShardedSampler, build_dataloader,
+                            write_shards)
 
 
 @pytest.mark.parametrize('dataset_name', [
@@ -136,6 +145,18 @@ def test_dataset_evaluation():
         metric_options={'topk': 1})
     assert eval_results_ == eval_results
 
+    # test the metrics accumulated by the streaming evaluator
+    evaluator = dataset.build_streaming_evaluator(
+        metric=['precision', 'recall', 'f1_score', 'support', 'accuracy'],
+        metric_options={'topk': 1})
+    evaluator.update(fake_results[:4], dataset.get_gt_labels()[:4])
+    evaluator.update(fake_results[4:], dataset.get_gt_labels()[4:])
+    eval_results_ = dataset.evaluate(
+        evaluator,
+        metric=['precision', 'recall', 'f1_score', 'support', 'accuracy'],
+        metric_options={'topk': 1})
+    assert eval_results_ == pytest.approx(eval_results)
+
     # test thr
     eval_results = dataset.evaluate(
         fake_results,
@@ -266,6 +287,13 @@ def test_dataset_evaluation():
     assert 'OF1' in eval_results.keys()
     assert 'CF1' not in eval_results.keys()
 
+    # the streaming evaluator gives the same keys
+    evaluator = dataset.build_streaming_evaluator(metric=metric)
+    evaluator.update(fake_results, dataset.get_gt_labels())
+    eval_results_ = dataset.evaluate(evaluator, metric=metric)
+    assert eval_results_.keys() == eval_results.keys()
+    assert eval_results_['CR'] == pytest.approx(eval_results['CR'])
+
 
 def test_dataset_imagenet21k():
     base_dataset_cfg = dict(
@@ -310,3 +338,241 @@ def test_dataset_imagenet21k():
     dataset = ImageNet21k(**dataset_cfg)
     assert len(dataset) == 3
     assert isinstance(dataset[0], dict)
+
+
+def test_packed_annotations():
+    annotations = PackedAnnotations(['a/1.JPG', 'b/ü.jpeg', 'c/3.png'],
+                                    [0, 1, 2],
+                                    img_prefix='prefix')
+    assert len(annotations) == 3
+    assert annotations.paths.dtype == np.uint8
+    assert annotations.get_filename(1) == 'b/ü.jpeg'
+    assert annotations[-1] == dict(
+        img_prefix='prefix',
+        img_info=dict(filename='c/3.png'),
+        gt_label=np.array(2, dtype=np.int64))
+    assert [info['gt_label'] for info in annotations] == [0, 1, 2]
+    with pytest.raises(IndexError):
+        annotations[3]
+    with pytest.raises(ValueError):
+        annotations.gt_labels[0] = 1
+
+    # the dataset reads the labels from the store and does not copy
+    # the annotations of a sample
+    dataset = ImageNet(data_prefix='tests/data/dataset', pipeline=[])
+    assert isinstance(dataset.data_infos, PackedAnnotations)
+    assert dataset.get_gt_labels() is dataset.data_infos.gt_labels
+    assert dataset.get_cat_ids(1) == [1]
+    with patch('copy.deepcopy') as deepcopy:
+        results = dataset[1]
+    deepcopy.assert_not_called()
+    assert results['img_info']['filename'] == 'b/2.jpeg'
+    assert results['img_prefix'] == 'tests/data/dataset'
+
+    dataset = ImageNet(
+        data_prefix='tests/data/dataset',
+        ann_file='tests/data/dataset/ann.txt',
+        pipeline=[])
+    assert dataset.get_gt_labels().tolist() == [0, 1, 1]
+
+
+def test_folder_index(tmp_path):
+    from mmcls.datasets import folder_index
+
+    root = tmp_path / 'data'
+    for path in ['b/2.jpg', 'b/sub/3.JPG', 'b/1.png', 'a/0.jpeg', 'a/x.txt']:
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b'')
+    (root / 'c').mkdir()
+    cache_file = str(tmp_path / 'index.npz')
+
+    folder_to_idx, annotations = folder_index.load_folder_index(
+        str(root), ('.jpg', '.jpeg', '.png'), cache_file=cache_file)
+    assert folder_to_idx == dict(a=0, b=1, c=2)
+    assert [info['img_info']['filename'] for info in annotations] == \
+        ['a/0.jpeg', 'b/1.png', 'b/2.jpg', 'b/sub/3.JPG']
+    assert annotations.gt_labels.tolist() == [0, 1, 1, 1]
+    assert annotations.img_prefix == str(root)
+
+    # the cached index is reused while no directory changes
+    with patch.object(folder_index, 'build_folder_index') as build:
+        _, cached = folder_index.load_folder_index(
+            str(root), ('.jpg', '.jpeg', '.png'), cache_file=cache_file)
+    build.assert_not_called()
+    assert np.array_equal(cached.paths, annotations.paths)
+
+    # and rebuilt once a file is added, also in a sub folder
+    (root / 'b/sub/4.jpg').write_bytes(b'')
+    # file systems may only keep coarse modification times
+    os.utime(root / 'b/sub', ns=(1, 1))
+    _, annotations = folder_index.load_folder_index(
+        str(root), ('.jpg', '.jpeg', '.png'), cache_file=cache_file)
+    assert annotations.get_filename(-1) == 'b/sub/4.jpg'
+
+    # other scan options do not share the cache
+    _, annotations = folder_index.load_folder_index(
+        str(root), ('.jpg', '.jpeg', '.png'),
+        recursive=False,
+        case_sensitive=True,
+        cache_file=cache_file)
+    assert len(annotations) == 3
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _load_missing_folder_index(rank, world_size, port, root, queue):
+    from mmcls.datasets import folder_index
+
+    dist.init_process_group(
+        'gloo',
+        init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank,
+        world_size=world_size)
+    try:
+        folder_index.load_folder_index(root, ('.jpg', ), cache=False)
+    except FileNotFoundError:
+        queue.put(rank)
+    finally:
+        dist.destroy_process_group()
+
+
+def test_folder_index_dist_error(tmp_path):
+    # the error of rank 0 is raised on every rank instead of a hang
+    ctx = mp.get_context('spawn')
+    queue = ctx.SimpleQueue()
+    mp.spawn(
+        _load_missing_folder_index,
+        args=(2, _free_port(), str(tmp_path / 'missing'), queue),
+        nprocs=2)
+    assert sorted([queue.get(), queue.get()]) == [0, 1]
+
+
+def test_sharded_dataset(tmp_path):
+    samples = [(f'{i % 3}/{i}.jpg', bytes([i]) * (100 + i * 50), i % 3)
+               for i in range(10)]
+    index_path = write_shards(
+        samples, str(tmp_path), shard_size=2048, classes=['a', 'b', 'c'])
+    assert index_path == str(tmp_path / 'index.npz')
+
+    dataset = ShardedDataset(data_prefix=str(tmp_path), pipeline=[])
+    assert len(dataset) == 10
+    assert dataset.CLASSES == ['a', 'b', 'c']
+    assert dataset.get_gt_labels().tolist() == [i % 3 for i in range(10)]
+    assert len(dataset.shards) > 2
+    assert dataset.shard_offsets[0] == 0 and dataset.shard_offsets[-1] == 10
+
+    # the shards are plain tar files and the index points at their members
+    for idx, (filename, img_bytes, _) in enumerate(samples):
+        results = dataset[idx]
+        img_info = results['img_info']
+        assert img_info['filename'] == filename
+        with tarfile.open(tmp_path / img_info['shard']) as tar:
+            member = tar.getmember(filename)
+            assert member.offset_data == img_info['offset']
+            assert tar.extractfile(member).read() == img_bytes
+        assert img_info['size'] == len(img_bytes)
+
+    # the shards are walked one after the other and split into contiguous
+    # chunks, the samples of a shard being shuffled within windows
+    def epoch_indices(epoch):
+        indices = []
+        for rank in range(2):
+            sampler = ShardedSampler(dataset, 2, rank, shuffle_window=2)
+            sampler.set_epoch(epoch)
+            indices.extend(sampler)
+        return indices
+
+    indices = epoch_indices(1)
+    assert sorted(indices) == list(range(10))
+    shard_ids = dataset.shard_ids[indices]
+    assert (np.diff(shard_ids) != 0).sum() == len(dataset.shards) - 1
+    windows = (indices - dataset.shard_offsets[shard_ids]) // 2
+    assert all(np.diff(windows)[np.diff(shard_ids) == 0] >= 0)
+    assert epoch_indices(2) != indices
+
+    # the unshuffled order is the dataset order, split with a stride for the
+    # collection of the results
+    sampler = ShardedSampler(dataset, 3, 2, shuffle=False)
+    assert list(sampler) == [2, 5, 8, 1]
+    sampler = ShardedSampler(dataset, 3, 2, shuffle=False, round_up=False)
+    assert list(sampler) == [2, 5, 8]
+
+    # build_dataloader picks it for the dataset
+    data_loader = build_dataloader(
+        dataset, 2, 0, dist=False, persistent_workers=False)
+    assert isinstance(data_loader.sampler, ShardedSampler)
+    assert len(list(data_loader.sampler)) == 10
+
+
+def test_image_cache(tmp_path):
+    rng = np.random.default_rng(0)
+    # CIFAR10 batches of channel first images
+    data = rng.integers(0, 256, size=(6, 3 * 32 * 32), dtype=np.uint8)
+    folder = tmp_path / 'cifar' / CIFAR10.base_folder
+    folder.mkdir(parents=True)
+    for i, (name, _) in enumerate(CIFAR10.train_list + CIFAR10.test_list):
+        with open(folder / name, 'wb') as f:
+            pickle.dump(dict(data=data[i:i + 1], labels=[i]), f, protocol=2)
+
+    def build_cifar(test_mode=False):
+        with patch.object(CIFAR10, '_check_integrity', return_value=True), \
+                patch.object(CIFAR10, '_load_meta'):
+            return CIFAR10(
+                data_prefix=str(tmp_path / 'cifar'),
+                pipeline=[],
+                test_mode=test_mode)
+
+    dataset = build_cifar()
+    assert isinstance(dataset.data_infos, ArrayAnnotations)
+    assert len(dataset) == 5
+    assert dataset.get_gt_labels().tolist() == [0, 1, 2, 3, 4]
+    expected = data[:5].reshape(-1, 3, 32, 32).transpose(0, 2, 3, 1)
+    np.testing.assert_equal(dataset.imgs, expected)
+    assert (folder / 'train_cache_imgs.npy').exists()
+
+    # the cache is memory mapped without unpickling the batches
+    with patch('pickle.load') as load:
+        dataset = build_cifar()
+    load.assert_not_called()
+    assert isinstance(dataset.imgs, np.memmap)
+    results = dataset[3]
+    np.testing.assert_equal(results['img'], expected[3])
+    assert np.shares_memory(results['img'], dataset.imgs)
+    assert not results['img'].flags.writeable
+    assert results['gt_label'] == 3
+    # workers map the cache again
+    data_infos = pickle.loads(pickle.dumps(dataset.data_infos))
+    assert isinstance(data_infos.imgs, np.memmap)
+    np.testing.assert_equal(data_infos[3]['img'], expected[3])
+
+    # the test split has its own cache
+    dataset = build_cifar(test_mode=True)
+    np.testing.assert_equal(dataset.imgs[0],
+                            data[5].reshape(3, 32, 32).transpose(1, 2, 0))
+
+    # a rebuilt source invalidates the cache
+    os.utime(folder / 'test_batch', ns=(2**62, 2**62))
+    with patch('pickle.load', wraps=pickle.load) as load:
+        build_cifar(test_mode=True)
+    load.assert_called_once()
+
+    # MNIST idx files
+    imgs = rng.integers(0, 256, size=(4, 28, 28), dtype=np.uint8)
+    labels = np.array([3, 1, 4, 1], dtype=np.uint8)
+    for split in ['train', 't10k']:
+        with open(tmp_path / f'{split}-images-idx3-ubyte', 'wb') as f:
+            f.write(np.array([0x803, 4, 28, 28], dtype='>i4').tobytes())
+            f.write(imgs.tobytes())
+        with open(tmp_path / f'{split}-labels-idx1-ubyte', 'wb') as f:
+            f.write(np.array([0x801, 4], dtype='>i4').tobytes())
+            f.write(labels.tobytes())
+    dataset = MNIST(data_prefix=str(tmp_path), pipeline=[])
+    assert (tmp_path / 'train_cache_imgs.npy').exists()
+    dataset = MNIST(data_prefix=str(tmp_path), pipeline=[])
+    assert isinstance(dataset.data_infos.imgs, np.memmap)
+    assert dataset.get_gt_labels().tolist() == [3, 1, 4, 1]
+    np.testing.assert_equal(dataset[2]['img'], imgs[2])
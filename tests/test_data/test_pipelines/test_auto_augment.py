@@ -8,6 +8,7 @@ import pytest
 from mmcv.utils import build_from_cfg
 
 from mmcls.datasets.builder import PIPELINES
+from mmcls.datasets.pipelines import apply_ops
 
 
 def construct_toy_data():
@@ -1239,3 +1240,125 @@ def test_cutout():
                           dtype=np.uint8)
     img_cutout = np.stack([img_cutout, img_cutout, img_cutout], axis=-1)
     assert (results['img'] == img_cutout).all()
+
+
+def _random_toy_data(seed, shape=(32, 40, 3)):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(20, 200, size=shape, dtype=np.uint8)
+    return dict(img=img, img2=img[::-1].copy(), img_fields=['img', 'img2'])
+
+
+def _apply_ops(ops, seed, fuse_ops):
+    results = _random_toy_data(seed)
+    random.seed(seed)
+    np.random.seed(seed)
+    results = apply_ops(ops, results, fuse_ops=fuse_ops)
+    # the random state after the ops is the same with and without fusion
+    return results, np.random.rand()
+
+
+def _apply_ops_copy(ops, results, fuse_ops):
+    return apply_ops(ops, copy.deepcopy(results), fuse_ops=fuse_ops)['img']
+
+
+def test_fuse_lut_ops():
+    ops = [
+        dict(type='Posterize', bits=4, prob=1.),
+        dict(type='AutoContrast', prob=1.),
+        dict(type='SolarizeAdd', magnitude=60, thr=160, prob=0.7),
+        dict(type='Solarize', thr=100, prob=0.7),
+        dict(type='AutoContrast', prob=0.7),
+        dict(type='Invert', prob=0.7),
+    ]
+    ops = [build_from_cfg(op, PIPELINES) for op in ops]
+    for seed in range(10):
+        fused, state = _apply_ops(ops, seed, True)
+        sequential, sequential_state = _apply_ops(ops, seed, False)
+        assert state == sequential_state
+        for key in ['img', 'img2']:
+            assert fused[key].dtype == np.uint8
+            np.testing.assert_array_equal(fused[key], sequential[key])
+
+    # a run interrupted by an op that is not fused
+    ops.insert(3, build_from_cfg(dict(type='Equalize', prob=1.), PIPELINES))
+    fused, _ = _apply_ops(ops, 0, True)
+    sequential, _ = _apply_ops(ops, 0, False)
+    np.testing.assert_array_equal(fused['img'], sequential['img'])
+
+
+def test_fuse_affine_ops():
+    # a single op is not changed by the fusion
+    for op in [
+            dict(type='Shear', magnitude=0.2, prob=1.),
+            dict(type='Translate', magnitude=0.1, prob=1.),
+            dict(type='Rotate', angle=20., prob=1.)
+    ]:
+        op = build_from_cfg(op, PIPELINES)
+        for seed in range(3):
+            fused, state = _apply_ops([op], seed, True)
+            sequential, sequential_state = _apply_ops([op], seed, False)
+            assert state == sequential_state
+            np.testing.assert_array_equal(fused['img'], sequential['img'])
+
+    # a run is close to the ops one by one, away from the borders
+    ops = [
+        dict(
+            type='Shear',
+            magnitude=0.1,
+            direction='vertical',
+            interpolation='bilinear',
+            prob=1.),
+        dict(type='Rotate', angle=10., interpolation='bilinear', prob=1.),
+        dict(
+            type='Translate',
+            magnitude=0.05,
+            interpolation='bilinear',
+            prob=1.),
+    ]
+    ops = [build_from_cfg(op, PIPELINES) for op in ops]
+    results = dict(
+        img=np.tile(np.linspace(0, 255, 64, dtype=np.uint8), (64, 1)))
+    results['img'] = np.stack([results['img']] * 3, axis=-1)
+    np.random.seed(0)
+    fused = _apply_ops_copy(ops, results, True)
+    np.random.seed(0)
+    sequential = _apply_ops_copy(ops, results, False)
+    diff = np.abs(fused.astype(int) - sequential.astype(int))[16:48, 16:48]
+    assert diff.max() <= 3
+
+    # the ops with different pad values are not fused
+    ops[1].pad_val = (0, 0, 0)
+    np.random.seed(0)
+    fused = _apply_ops_copy(ops[:2], results, True)
+    np.random.seed(0)
+    sequential = _apply_ops_copy(ops[:2], results, False)
+    np.testing.assert_array_equal(fused, sequential)
+
+
+def test_rand_augment_fuse_ops():
+    policies = [
+        dict(type='Posterize', magnitude_key='bits', magnitude_range=(4, 0)),
+        dict(type='Solarize', magnitude_key='thr', magnitude_range=(256, 0)),
+        dict(type='Invert'),
+        dict(type='AutoContrast'),
+        dict(type='Equalize'),
+        dict(type='Cutout', magnitude_key='shape', magnitude_range=(0, 10)),
+    ]
+    transforms = [
+        build_from_cfg(
+            dict(
+                type='RandAugment',
+                policies=policies,
+                num_policies=3,
+                magnitude_level=7,
+                magnitude_std=0.5,
+                fuse_ops=fuse_ops), PIPELINES) for fuse_ops in (True, False)
+    ]
+    for seed in range(10):
+        outputs = []
+        for transform in transforms:
+            results = _random_toy_data(seed)
+            random.seed(seed)
+            np.random.seed(seed)
+            outputs.append(transform(results)['img'])
+        np.testing.assert_array_equal(outputs[0], outputs[1])
@@ -1,10 +1,16 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import copy
+import io
 import os.path as osp
+import random
 
+import mmcv
 import numpy as np
+from PIL import Image
 
-from mmcls.datasets.pipelines import LoadImageFromFile
+from mmcls.datasets import ShardedDataset, write_shards
+from mmcls.datasets.pipelines import (Compose, LoadImageFromFile,
+                                      LoadImageFromShard)
 
 
 class TestLoading(object):
@@ -57,3 +63,83 @@ class TestLoading(object):
         assert results['img'].dtype == np.uint8
         np.testing.assert_equal(results['img_norm_cfg']['mean'],
                                 np.zeros(1, dtype=np.float32))
+
+    def test_load_img_from_shard(self, tmp_path):
+        samples = []
+        for i, filename in enumerate(['color.jpg', 'gray.jpg']):
+            with open(osp.join(self.data_prefix, filename), 'rb') as f:
+                samples.append((filename, f.read(), i))
+        write_shards(samples, str(tmp_path), shard_size=1)
+        transform = LoadImageFromShard(max_open_files=1)
+        dataset = ShardedDataset(data_prefix=str(tmp_path), pipeline=[])
+
+        for idx in [0, 1, 0]:
+            results = transform(dataset.prepare_data(idx))
+            expected = LoadImageFromFile()(
+                dict(
+                    img_prefix=self.data_prefix,
+                    img_info=dict(filename=samples[idx][0])))
+            np.testing.assert_equal(results['img'], expected['img'])
+            assert results['filename'] == osp.join(
+                str(tmp_path), f'shard-{idx:05d}.tar', samples[idx][0])
+            assert results['ori_filename'] == samples[idx][0]
+            assert results['img_shape'] == expected['img_shape']
+        # the least recently used shard is closed
+        assert list(
+            transform._files) == [osp.join(str(tmp_path), 'shard-00000.tar')]
+        assert repr(transform) == transform.__class__.__name__ + \
+            "(to_float32=False, color_type='color', max_open_files=1)"
+
+    def test_reduced_decode(self, tmp_path):
+        ys, xs = np.mgrid[0:800, 0:1200]
+        img = np.stack([xs % 256, ys % 256, (xs + ys) % 256],
+                       -1).astype(np.uint8)
+        mmcv.imwrite(img, str(tmp_path / 'big.jpg'))
+        mmcv.imwrite(img, str(tmp_path / 'big.png'))
+        # a JPEG rotated by 90 degrees when decoded
+        exif = Image.Image().getexif()
+        exif[0x0112] = 6
+        Image.fromarray(img).save(str(tmp_path / 'rotated.jpg'), exif=exif)
+
+        def run(transforms, filename, reduced_decode, seed=0):
+            pipeline = Compose([
+                dict(type='LoadImageFromFile', reduced_decode=reduced_decode)
+            ] + transforms)
+            random.seed(seed)
+            return pipeline(
+                dict(
+                    img_prefix=str(tmp_path),
+                    img_info=dict(filename=filename)))
+
+        # the short side of 800 is decoded at 1/4 for 200, at 1/8 for 100
+        resize = [dict(type='Resize', size=(200, -1))]
+        results = run(resize, 'big.jpg', True)
+        expected = run(resize, 'big.jpg', False)
+        assert results['decode_scale'] == 4
+        assert results['ori_shape'] == (800, 1200, 3)
+        assert results['img'].shape == expected['img'].shape == (200, 300, 3)
+        assert np.abs(results['img'].astype(np.float32) -
+                      expected['img']).mean() < 8
+        assert run([dict(type='Resize', size=(100, -1))], 'big.jpg',
+                   True)['decode_scale'] == 8
+        assert run([dict(type='Resize', size=(500, 700))], 'big.jpg',
+                   True)['decode_scale'] == 1
+        results = run(resize, 'rotated.jpg', True)
+        assert results['ori_shape'] == (1200, 800, 3)
+        assert results['img'].shape == (300, 200, 3)
+
+        # the crop of RandomResizedCrop is sampled before decoding
+        crop = [dict(type='RandomResizedCrop', size=64, scale=(0.5, 1.0))]
+        for seed in range(3):
+            results = run(crop, 'big.jpg', True, seed)
+            expected = run(crop, 'big.jpg', False, seed)
+            assert results['decode_scale'] == 8
+            assert 'draft_crop' not in results
+            assert results['img'].shape == expected['img'].shape
+            assert np.abs(results['img'].astype(np.float32) -
+                          expected['img']).mean() < 8
+
+        # other images and pipelines are decoded at full size
+        assert 'decode_scale' not in run(resize, 'big.png', True)
+        assert 'decode_scale' not in run([], 'big.jpg', True)
+        assert 'decode_scale' not in run(resize, 'big.jpg', False)
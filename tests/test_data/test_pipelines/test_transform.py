@@ -1,7 +1,10 @@
 # Copyright (c) OpenMMLab. All rights reserved.
 import copy
+import errno
+import os
 import os.path as osp
 import random
+import shutil
 
 import mmcv
 import numpy as np
@@ -254,6 +257,7 @@ def test_pad():
     assert isinstance(repr(pad_module), str)
     assert np.equal(pad_result['img'], pad_result['img2']).all()
     assert pad_result['img_shape'] == (400, 400, 3)
+    assert pad_result['valid_shape'] == (300, 400)
     assert np.allclose(pad_result['img'][-100:, :, :], 0)
 
     # test if pad_to_square is valid
@@ -1287,3 +1291,158 @@ def test_albu_transform():
     results = normalize(results)
 
     assert results['img'].dtype == np.float32
+
+
+def test_cached_transforms(tmp_path, monkeypatch):
+    data_prefix = osp.join(osp.dirname(__file__), '../../data')
+    transforms = [
+        dict(type='LoadImageFromFile'),
+        dict(type='Resize', size=(64, -1)),
+        dict(type='CenterCrop', crop_size=32)
+    ]
+    cache_cfg = dict(
+        type='CachedTransforms',
+        transforms=transforms,
+        backend='disk',
+        cache_dir=str(tmp_path))
+    pipeline = build_from_cfg(cache_cfg, PIPELINES)
+
+    def sample(filename, img_prefix=data_prefix):
+        return dict(img_prefix=img_prefix, img_info=dict(filename=filename))
+
+    expected = Compose(transforms)(sample('color.jpg'))
+    for _ in range(2):
+        results = pipeline(sample('color.jpg'))
+        assert_array_equal(results['img'], expected['img'])
+        assert results['img_shape'] == (32, 32, 3)
+        assert results['filename'] == expected['filename']
+    assert pipeline.hits == 1 and pipeline.misses == 1
+
+    # only the outputs of the transforms are cached, the other fields of
+    # the sample are kept
+    results = pipeline(dict(sample('color.jpg'), gt_label=7))
+    assert results['gt_label'] == 7
+    assert_array_equal(results['img'], expected['img'])
+    results = pipeline(dict(sample('color.jpg'), gt_label=3))
+    assert results['gt_label'] == 3
+    assert pipeline.hits == 3
+
+    # a modified image is a new entry
+    shutil.copy(osp.join(data_prefix, 'color.jpg'), tmp_path / 'img.jpg')
+    assert pipeline(sample('img.jpg', str(tmp_path)))['img'].shape == \
+        (32, 32, 3)
+    shutil.copy(osp.join(data_prefix, 'gray.jpg'), tmp_path / 'img.jpg')
+    os.utime(tmp_path / 'img.jpg', ns=(1, 1))
+    assert_array_equal(
+        pipeline(sample('img.jpg', str(tmp_path)))['img'],
+        Compose(transforms)(sample('gray.jpg'))['img'])
+    assert pipeline.misses == 3
+
+    # other workers and later epochs share the directory
+    other = build_from_cfg(cache_cfg, PIPELINES)
+    # the image is not decoded again
+    other.transforms = Compose([])
+    assert_array_equal(other(sample('color.jpg'))['img'], expected['img'])
+    assert other.hits == 1
+
+    # the configs of the transforms are part of the key
+    other = build_from_cfg(
+        dict(cache_cfg, transforms=transforms[:2]), PIPELINES)
+    assert other(sample('color.jpg'))['img_shape'][0] == 64
+    assert other.misses == 1
+
+    # the least recently used entries are evicted beyond the bound
+    pipeline = build_from_cfg(
+        dict(cache_cfg, cache_dir=str(tmp_path / 'lru'), max_size=0.005),
+        PIPELINES)
+    pipeline(sample('color.jpg'))
+    os.utime(tmp_path / 'lru' / os.listdir(tmp_path / 'lru')[0], ns=(1, 1))
+    pipeline(sample('gray.jpg'))
+    assert len(os.listdir(tmp_path / 'lru')) == 1
+    pipeline(sample('gray.jpg'))
+    assert pipeline.hits == 1
+
+    # samples without file name bypass the cache
+    pipeline = build_from_cfg(
+        dict(cache_cfg, transforms=[dict(type='CenterCrop', crop_size=2)]),
+        PIPELINES)
+    results = pipeline(construct_toy_data())
+    assert results['img'].shape == (2, 2, 3)
+    assert pipeline.cache is None
+
+    # random transforms cannot be cached
+    with pytest.raises(ValueError):
+        build_from_cfg(
+            dict(
+                cache_cfg, transforms=[dict(type='RandomFlip',
+                                            flip_prob=0.5)]), PIPELINES)
+
+    # the cache in shared memory takes RAM, so its bound must be given
+    with pytest.raises(ValueError):
+        build_from_cfg(dict(cache_cfg, backend='shm'), PIPELINES)
+    assert build_from_cfg(dict(type='CachedTransforms', transforms=[]),
+                          PIPELINES).backend == 'disk'
+
+    # a full device skips the cache
+    def replace(src, dst):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    monkeypatch.setattr(os, 'replace', replace)
+    pipeline = build_from_cfg(
+        dict(cache_cfg, cache_dir=str(tmp_path / 'full')), PIPELINES)
+    assert_array_equal(pipeline(sample('color.jpg'))['img'], expected['img'])
+    assert os.listdir(tmp_path / 'full') == []
+
+
+def test_crop_flip_to_tensor():
+    from mmcls.models.utils import BatchPipeline
+
+    img_norm_cfg = dict(
+        mean=[123.675, 116.28, 103.53],
+        std=[58.395, 57.12, 57.375],
+        to_rgb=True)
+    img = np.random.randint(0, 256, size=(37, 50, 3), dtype=np.uint8)
+    for crop_size, direction in [(24, 'horizontal'), ((20, 31), 'vertical'),
+                                 ((64, 64), 'horizontal')]:
+        transforms = [
+            dict(type='CenterCrop', crop_size=crop_size),
+            dict(type='RandomFlip', flip_prob=0.5, direction=direction),
+            dict(type='Normalize', **img_norm_cfg),
+            dict(type='ImageToTensor', keys=['img']),
+            dict(type='ToTensor', keys=['gt_label']),
+            dict(type='Collect', keys=['img', 'gt_label'])
+        ]
+        fused = build_from_cfg(
+            dict(
+                type='CropFlipToTensor',
+                crop_size=crop_size,
+                flip_prob=0.5,
+                direction=direction), PIPELINES)
+        preprocessor = BatchPipeline([dict(type='Normalize', **img_norm_cfg)])
+        for seed in range(4):
+            np.random.seed(seed)
+            expected = Compose(transforms)(
+                dict(img=img.copy(), gt_label=np.array(3)))
+            np.random.seed(seed)
+            data = fused(dict(img=img.copy(), gt_label=np.array(3)))
+
+            assert data['img'].dtype == torch.uint8
+            assert data['img'].is_contiguous()
+            assert data['gt_label'] == expected['gt_label']
+            assert data['img_metas'].data == {
+                k: v
+                for k, v in expected['img_metas'].data.items()
+                if k != 'img_norm_cfg'
+            }
+            torch.testing.assert_close(
+                preprocessor(data['img'][None])[0],
+                expected['img'],
+                rtol=0,
+                atol=1e-5)
+
+    # grayscale images without crop or flip
+    fused = build_from_cfg(
+        dict(type='CropFlipToTensor', keys=['img']), PIPELINES)
+    data = fused(dict(img=img[..., 0]))
+    assert_array_equal(data['img'].numpy(), img[None, ..., 0])
+    assert 'flip' not in data['img_metas'].data
@@ -1,8 +1,15 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import numpy as np
 import pytest
 import torch
 
-from mmcls.core import average_performance, mAP
+from mmcls.core import (StreamingAccuracy, StreamingConfusionMatrix,
+                        StreamingEvaluator, StreamingMAP,
+                        StreamingMultiLabelPerformance,
+                        StreamingPrecisionRecallF1, average_performance,
+                        calculate_confusion_matrix, mAP, precision_recall_f1,
+                        single_label_metrics, support, topk_numpy)
+from mmcls.models.losses import accuracy
 
 
 def test_mAP():
@@ -55,3 +62,142 @@ def test_average_performance():
     assert average_performance(
         pred, target, k=2) == pytest.approx(
             (43.75, 50.00, 46.67, 40.00, 57.14, 47.06), rel=1e-2)
+
+
+def test_single_label_metrics():
+    rng = np.random.default_rng(0)
+    num_classes = 7
+    pred = rng.random((200, num_classes))
+    target = rng.integers(0, num_classes, 200)
+    thrs = (0., 0.5, 0.9)
+
+    # the reference with argsort and (N, C) masks
+    pred_label = np.argsort(pred, axis=1)[:, ::-1]
+    pred_score = np.sort(pred, axis=1)[:, ::-1]
+    confusion_matrix = np.zeros((num_classes, num_classes))
+    for t, p in zip(target, pred_label[:, 0]):
+        confusion_matrix[t, p] += 1
+    label = np.arange(num_classes)
+    expected = {}
+    for thr in thrs:
+        for k in (1, 3):
+            correct = (pred_label[:, :k] == target[:, None]) & (
+                pred_score[:, :k] > thr)
+            expected[(k, thr)] = correct.any(axis=1).mean() * 100
+        positive = (pred_label[:, :1] == label) & (pred_score[:, :1] > thr)
+        gt_positive = target[:, None] == label
+        tp = (positive & gt_positive).sum(0)
+        precision = tp / np.maximum(positive.sum(0), 1) * 100
+        recall = tp / gt_positive.sum(0) * 100
+        f1 = 2 * precision * recall / np.maximum(precision + recall, 1e-20)
+        expected[thr] = (precision, recall, f1)
+
+    score, topk_label = topk_numpy(pred, 3)
+    np.testing.assert_array_equal(topk_label, pred_label[:, :3])
+    np.testing.assert_array_equal(score, pred_score[:, :3])
+    score, topk_label = topk_numpy(pred, num_classes + 1)
+    np.testing.assert_array_equal(topk_label, pred_label)
+
+    np.testing.assert_array_equal(
+        calculate_confusion_matrix(pred, target).numpy(), confusion_matrix)
+    np.testing.assert_array_equal(
+        support(pred, target, average_mode='none'), confusion_matrix.sum(1))
+    assert support(torch.from_numpy(pred), torch.from_numpy(target)) == 200
+
+    acc = accuracy(pred, target, topk=(1, 3), thrs=thrs)
+    for i, k in enumerate((1, 3)):
+        for j, thr in enumerate(thrs):
+            assert acc[i][j] == pytest.approx(expected[(k, thr)])
+    assert accuracy(pred, target, topk=3) == pytest.approx(expected[(3, 0.)])
+
+    values = precision_recall_f1(pred, target, average_mode='none', thrs=thrs)
+    for i, thr in enumerate(thrs):
+        for value, expected_value in zip(values, expected[thr]):
+            np.testing.assert_allclose(value[i], expected_value)
+    precision, recall, f1 = precision_recall_f1(pred, target, thrs=0.5)
+    assert precision == pytest.approx(expected[0.5][0].mean())
+    assert recall == pytest.approx(expected[0.5][1].mean())
+    assert f1 == pytest.approx(expected[0.5][2].mean())
+
+    # all the metrics in one pass
+    res = single_label_metrics(pred, target, topk=(1, 3), thrs=thrs)
+    assert res['accuracy'] == acc
+    for key, i in [('precision', 0), ('recall', 1), ('f1_score', 2)]:
+        assert res[key] == pytest.approx(
+            [expected[thr][i].mean() for thr in thrs])
+    assert res['support'] == 200
+    res = single_label_metrics(pred, target, metrics=['recall'])
+    assert res.keys() == {'recall'}
+    assert res['recall'] == pytest.approx(expected[0.][1].mean())
+
+    with pytest.raises(ValueError):
+        single_label_metrics(pred, target, average_mode='micro')
+    with pytest.raises(TypeError):
+        single_label_metrics(pred, target, thrs='thr')
+
+
+def test_streaming_metrics():
+    rng = np.random.default_rng(0)
+    num_classes = 7
+    pred = rng.random((200, num_classes), dtype=np.float32)
+    target = rng.integers(0, num_classes, 200)
+    thrs = (0., 0.5, 0.9)
+
+    evaluator = StreamingEvaluator([
+        StreamingAccuracy(topk=(1, 3), thrs=thrs),
+        StreamingPrecisionRecallF1(num_classes, thrs=thrs),
+        StreamingConfusionMatrix(num_classes)
+    ])
+    # the batches are numpy rows or tensors
+    for i in range(0, 200, 64):
+        batch_pred = pred[i:i + 64]
+        if i % 128 == 0:
+            batch_pred = list(batch_pred)
+        evaluator.update(batch_pred, target[i:i + 64])
+    res = evaluator.compute()
+    expected = single_label_metrics(pred, target, topk=(1, 3), thrs=thrs)
+    np.testing.assert_allclose(res['accuracy'], expected['accuracy'])
+    for key in ['precision', 'recall', 'f1_score', 'support']:
+        assert res[key] == pytest.approx(expected[key])
+    np.testing.assert_array_equal(res['confusion_matrix'],
+                                  calculate_confusion_matrix(pred, target))
+
+    # the single formats and the averaging of single_label_metrics
+    evaluator = StreamingEvaluator([
+        StreamingAccuracy(topk=1, thrs=0.5),
+        StreamingPrecisionRecallF1(
+            num_classes, average_mode='none', metrics=['recall', 'support'])
+    ])
+    evaluator.update(torch.from_numpy(pred), torch.from_numpy(target))
+    res = evaluator.compute()
+    expected = single_label_metrics(
+        pred, target, thrs=0.5, average_mode='none')
+    assert res.keys() == {'accuracy', 'recall', 'support'}
+    assert res['accuracy'] == pytest.approx(expected['accuracy'])
+    np.testing.assert_allclose(res['recall'], expected['recall'])
+    np.testing.assert_array_equal(res['support'], expected['support'])
+    evaluator.reset()
+    evaluator.update(pred[:10], target[:10])
+    assert evaluator.compute()['support'].sum() == 10
+
+    with pytest.raises(ValueError):
+        StreamingPrecisionRecallF1(num_classes, average_mode='micro')
+
+    # multi-label metrics, with difficult labels
+    target = rng.choice([-1, 0, 0, 1], size=(200, num_classes))
+    evaluator = StreamingEvaluator([
+        StreamingMAP(num_classes, num_bins=10000),
+        StreamingMultiLabelPerformance(num_classes, thr=0.5)
+    ])
+    topk_performance = StreamingMultiLabelPerformance(num_classes, k=2)
+    for i in range(0, 200, 64):
+        evaluator.update(pred[i:i + 64], target[i:i + 64])
+        topk_performance.update(
+            torch.from_numpy(pred[i:i + 64]),
+            torch.from_numpy(target[i:i + 64]))
+    res = evaluator.compute()
+    assert res['mAP'] == pytest.approx(mAP(pred, target.copy()), abs=0.1)
+    assert [res[key] for key in ['CP', 'CR', 'CF1', 'OP', 'OR', 'OF1']] == \
+        pytest.approx(average_performance(pred, target.copy(), thr=0.5))
+    assert list(topk_performance.compute().values()) == pytest.approx(
+        average_performance(pred, target.copy(), k=2))
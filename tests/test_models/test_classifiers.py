@@ -73,6 +73,10 @@ def test_image_classifier():
     pred = model(single_img, return_loss=False, img_metas=None)
     assert isinstance(pred, list) and len(pred) == 1
 
+    # the scores are kept as a tensor without post processing
+    pred = model(imgs, return_loss=False, img_metas=None, post_process=False)
+    assert isinstance(pred, torch.Tensor) and pred.shape == (16, 10)
+
     # test pretrained
     # TODO remove deprecated pretrained
     with pytest.warns(UserWarning):
@@ -253,6 +257,58 @@ def test_image_classifier_with_augments():
     assert losses['loss'].item() > 0
 
 
+def test_image_classifier_with_data_preprocessor():
+    model_cfg = dict(
+        type='ImageClassifier',
+        backbone=dict(
+            type='ResNet_CIFAR',
+            depth=18,
+            num_stages=4,
+            out_indices=(3, ),
+            style='pytorch'),
+        neck=dict(type='GlobalAveragePooling'),
+        head=dict(
+            type='LinearClsHead',
+            num_classes=10,
+            in_channels=512,
+            loss=dict(type='CrossEntropyLoss')))
+    img_norm_cfg = dict(
+        mean=[123.675, 116.28, 103.53],
+        std=[58.395, 57.12, 57.375],
+        to_rgb=True)
+
+    imgs = torch.randint(0, 256, (4, 3, 32, 32), dtype=torch.uint8)
+    label = torch.randint(0, 10, (4, ))
+    normalized = (imgs.flip(1).float() - torch.tensor(
+        img_norm_cfg['mean']).view(1, 3, 1, 1)) / torch.tensor(
+            img_norm_cfg['std']).view(1, 3, 1, 1)
+
+    torch.manual_seed(0)
+    model = CLASSIFIERS.build(
+        dict(
+            model_cfg,
+            data_preprocessor=[dict(type='Normalize', **img_norm_cfg)]))
+    torch.manual_seed(0)
+    expected_model = CLASSIFIERS.build(model_cfg)
+    model.eval()
+    expected_model.eval()
+
+    # the uint8 batches are normalized by the model
+    outputs = model.train_step({'img': imgs, 'gt_label': label})
+    expected = expected_model.train_step({
+        'img': normalized,
+        'gt_label': label
+    })
+    torch.testing.assert_close(outputs['loss'], expected['loss'])
+
+    with torch.no_grad():
+        scores = model(imgs, return_loss=False, img_metas=None)
+        expected = expected_model(
+            normalized, return_loss=False, img_metas=None)
+    np.testing.assert_allclose(
+        np.array(scores), np.array(expected), rtol=1e-5, atol=1e-6)
+
+
 def test_image_classifier_return_tuple():
     model_cfg = ConfigDict(
         type='ImageClassifier',
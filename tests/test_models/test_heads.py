@@ -1,11 +1,14 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import copy
 from unittest.mock import patch
 
 import pytest
 import torch
+import torch.nn.functional as F
 
 from mmcls.models.heads import (ClsHead, LinearClsHead, MultiLabelClsHead,
                                 MultiLabelLinearClsHead, StackedLinearClsHead,
+                                SubCentroids_Head_Formal,
                                 VisionTransformerClsHead)
 
 
@@ -54,6 +57,8 @@ def test_linear_head(feat):
     head = LinearClsHead(10, 3)
     pred = head.simple_test(feat)
     assert isinstance(pred, list) and len(pred) == 4
+    pred = head.simple_test(feat, post_process=False)
+    assert isinstance(pred, torch.Tensor) and pred.shape == (4, 10)
 
     with patch('torch.onnx.is_in_onnx_export', return_value=True):
         head = LinearClsHead(10, 3)
@@ -157,3 +162,374 @@ def test_vit_head():
     # test assertion
     with pytest.raises(ValueError):
         VisionTransformerClsHead(-1, 100)
+
+
+def _argmax_one_hot(logits, tau=1, hard=False):
+    # deterministic stand-in for F.gumbel_softmax(hard=True)
+    return F.one_hot(logits.argmax(-1), logits.shape[-1]).to(logits.dtype)
+
+
+def test_subcentroids_head_batched_clustering():
+    torch.manual_seed(0)
+    feats = torch.randn(120, 16)
+    fake_gt_label = torch.randint(0, 5, (120, ))
+
+    head = SubCentroids_Head_Formal(num_classes=6, in_channels=16)
+    head.gamma = 0.5
+    head.is_only_cross_entropy = False
+    per_class_head = copy.deepcopy(head)
+    per_class_head.batched_clustering = False
+
+    with patch('torch.nn.functional.gumbel_softmax', _argmax_one_hot):
+        out_cls, logits, target = head(feats, gt_label=fake_gt_label)
+        _, _, per_class_target = per_class_head(
+            feats, gt_label=fake_gt_label)
+
+    assert out_cls.shape == (120, 6)
+    assert logits.shape == (120, 6 * head.max_subcentroids)
+    assert torch.equal(target, per_class_target)
+    assert torch.equal(head.optimal_subcentroids,
+                       per_class_head.optimal_subcentroids)
+    assert torch.allclose(
+        head.prototypes, per_class_head.prototypes, atol=1e-5)
+    # class 5 has no samples and must keep its prototypes
+    assert torch.equal(head.prototypes[5], per_class_head.prototypes[5])
+
+
+@pytest.mark.parametrize('sample_size', [None, 1000])
+def test_subcentroids_head_silhouette(sample_size):
+    from sklearn.metrics import silhouette_score
+
+    from mmcls.models.heads.SubCentroids_head_Formal import \
+        batched_cosine_silhouette
+
+    torch.manual_seed(0)
+    feats = torch.randn(200, 16)
+    cluster_labels = torch.stack(
+        [torch.randint(0, k, (200, )) for k in (2, 4, 6)])
+    # a singleton cluster scores 0 for its sample
+    cluster_labels[2, 0] = 7
+
+    scores = batched_cosine_silhouette(
+        feats, cluster_labels, 8, sample_size=sample_size)
+    for score, labels in zip(scores, cluster_labels):
+        expected = silhouette_score(
+            feats.numpy(), labels.numpy(), metric='cosine')
+        assert abs(score.item() - expected) < 1e-5
+
+    # a single cluster has no silhouette
+    single = torch.zeros(1, 200, dtype=torch.long)
+    assert batched_cosine_silhouette(feats, single, 2).item() == 0
+
+    # the sampled estimate only looks at a subset
+    sampled = batched_cosine_silhouette(
+        feats, cluster_labels, 8, sample_size=50)
+    assert sampled.shape == (3, )
+    assert (sampled.abs() <= 1).all()
+    # the subset follows the generator, e.g. seeded alike on all ranks
+    generators = [torch.Generator().manual_seed(3) for _ in range(2)]
+    torch.manual_seed(1)
+    sampled = batched_cosine_silhouette(
+        feats, cluster_labels, 8, sample_size=50, generator=generators[0])
+    torch.manual_seed(2)
+    assert torch.equal(
+        batched_cosine_silhouette(
+            feats, cluster_labels, 8, sample_size=50, generator=generators[1]),
+        sampled)
+
+    head = SubCentroids_Head_Formal(num_classes=3, in_channels=16)
+    best_k, best_score = head.find_optimal_subcentroids(
+        F.normalize(feats, dim=-1), 0)
+    assert best_k in head.candidate_subcentroids
+    assert -1 <= best_score <= 1
+
+    # the sampled search does not depend on the RNG of the rank
+    head.silhouette_sample_size = 50
+    results = []
+    for seed in range(2):
+        torch.manual_seed(seed)
+        results.append(
+            head.find_optimal_subcentroids(F.normalize(feats, dim=-1), 0))
+    assert results[0] == results[1]
+
+
+def test_subcentroids_head_search_schedule():
+    # the default schedule searches every class on every flush
+    head = SubCentroids_Head_Formal(num_classes=5, in_channels=16)
+    assert head.select_search_classes() == set(range(5))
+    assert head.select_search_classes() == set(range(5))
+
+    # search every other flush on a rotating window of 2 classes
+    head = SubCentroids_Head_Formal(
+        num_classes=5,
+        in_channels=16,
+        search_cfg=dict(interval=2, classes_per_flush=2))
+    assert head.select_search_classes() == {0, 1}
+    assert head.select_search_classes() == set()
+    assert head.select_search_classes() == {2, 3}
+    assert head.select_search_classes() == set()
+    assert head.select_search_classes() == {4, 0}
+
+    # the schedule state is saved with the other head states
+    state_dict = head.state_dict()
+    assert state_dict['search_flushes'].item() == 5
+    assert state_dict['search_cursor'].item() == 1
+    resumed = SubCentroids_Head_Formal(
+        num_classes=5,
+        in_channels=16,
+        search_cfg=dict(interval=2, classes_per_flush=2))
+    resumed.load_state_dict(state_dict)
+    assert resumed.select_search_classes() == set()
+    assert resumed.select_search_classes() == {1, 2}
+
+    # classes freeze once their score stops improving
+    torch.manual_seed(0)
+    head = SubCentroids_Head_Formal(
+        num_classes=2, in_channels=16, search_cfg=dict(patience=2))
+    feats = F.normalize(torch.randn(40, 16), dim=-1)
+    for _ in range(3):
+        assert 0 in head.select_search_classes()
+        head.update_optimal_subcentroids(feats, 0)
+    assert head.search_stale[0] == 2
+    assert head.select_search_classes() == {1}
+
+    # classes with too few samples are skipped without counting as stale
+    head = SubCentroids_Head_Formal(
+        num_classes=2,
+        in_channels=16,
+        search_cfg=dict(patience=2),
+        profile_cfg=dict())
+    feats = F.normalize(torch.randn(45, 16), dim=-1)
+    labels = torch.cat([torch.zeros(40), torch.ones(5)]).long()
+    masks, out_cls = head.compute_masks(feats)
+    mask = labels == out_cls.argmax(dim=1)
+    optimal_subcentroids = head.optimal_subcentroids.clone()
+    best_silhouette = head.best_silhouette.clone()
+    assert head.find_optimal_subcentroids(feats[40:], 1) is None
+    for _ in range(3):
+        head.batched_subcentroids_statistics(feats, labels, masks, mask,
+                                             head.select_search_classes())
+    assert head.profiler.calls['search'] == 3
+    assert head.search_stale[1] == 0
+    assert head.optimal_subcentroids[1] == optimal_subcentroids[1]
+    assert head.best_silhouette[1] == best_silhouette[1]
+    assert 1 in head.select_search_classes()
+
+
+def test_subcentroids_head_memory_bank():
+    from mmcls.models.heads.SubCentroids_head_Formal import MemoryBank
+
+    # capacity in samples, storage in half precision
+    bank = MemoryBank(num_samples=10, dtype='float16')
+    bank.enqueue(torch.rand(4, 8), torch.arange(4))
+    bank.enqueue(torch.rand(4, 8), torch.arange(4, 8))
+    assert len(bank) == 8 and bank.is_full()
+    feats, labels = bank.flush()
+    assert feats.dtype == torch.float16 and feats.shape == (8, 8)
+    assert torch.equal(labels, torch.arange(8))
+    # flushed samples are views of the preallocated storage
+    assert feats.data_ptr() == bank.features.data_ptr()
+    assert len(bank) == 0 and not bank.is_full()
+
+    # capacity in bytes: 8 float32 channels and an int64 label per sample
+    bank = MemoryBank(num_bytes=40 * 5)
+    bank.enqueue(torch.rand(2, 8), torch.zeros(2, dtype=torch.long))
+    assert bank.capacity == 5
+
+    # the head flushes once the bank holds `num_batches` batches
+    head = SubCentroids_Head_Formal(
+        num_classes=3,
+        in_channels=16,
+        memory_bank_cfg=dict(num_batches=3))
+    for _ in range(2):
+        losses = head.forward_train(
+            torch.rand(16, 16), torch.randint(0, 3, (16, )))
+        assert losses['loss'].item() > 0
+        assert head.is_only_cross_entropy
+    storage = head.memory_bank.features.data_ptr()
+    losses = head.forward_train(
+        torch.rand(16, 16), torch.randint(0, 3, (16, )))
+    assert losses['loss'].item() > 0
+    assert len(head.memory_bank) == 0
+    assert head.memory_bank.features.data_ptr() == storage
+
+
+def test_subcentroids_head_streaming():
+    torch.manual_seed(0)
+    head = SubCentroids_Head_Formal(
+        num_classes=3,
+        in_channels=16,
+        stream_cfg=dict(interval=2, momentum=0.5))
+    prototypes = F.normalize(head.prototypes.data, dim=-1)
+
+    feat = torch.rand(32, 16, requires_grad=True)
+    losses = head.forward_train(feat, torch.randint(0, 3, (32, )))
+    losses['loss'].backward()
+    assert feat.grad is not None
+    # statistics are accumulated without touching the prototypes
+    assert head.stream_sums.shape == head.prototypes.shape
+    assert head.stream_counts.sum() > 0
+    assert torch.allclose(head.prototypes, prototypes)
+    assert head.memory_bank.features is None
+
+    losses = head.forward_train(
+        torch.rand(32, 16), torch.randint(0, 3, (32, )))
+    assert losses['loss'].item() > 0
+    assert head.stream_counts.sum() == 0
+    assert not torch.allclose(head.prototypes, prototypes)
+    assert torch.allclose(
+        head.prototypes.norm(dim=-1), torch.ones(3, head.max_subcentroids))
+
+    # the count search only runs on the steps applying the update, on the
+    # classes with enough samples in the batch
+    head = SubCentroids_Head_Formal(
+        num_classes=3,
+        in_channels=16,
+        stream_cfg=dict(interval=2),
+        profile_cfg=dict())
+    gt_label = torch.cat([torch.zeros(30), torch.ones(2)]).long()
+    head.forward_train(torch.rand(32, 16), gt_label)
+    assert head.search_flushes.item() == 0
+    assert head.profiler.calls['search'] == 0
+    head.forward_train(torch.rand(32, 16), gt_label)
+    assert head.search_flushes.item() == 1
+    assert head.profiler.calls['search'] == 1
+
+
+@pytest.mark.parametrize('ot_cfg', [
+    dict(type='sinkhorn', tol=1e-3),
+    dict(type='apdagd', max_iter=50, dtype='bfloat16')
+])
+def test_subcentroids_head_ot_solver(ot_cfg):
+    torch.manual_seed(0)
+    feats = torch.randn(120, 16)
+    fake_gt_label = torch.randint(0, 5, (120, ))
+
+    head = SubCentroids_Head_Formal(
+        num_classes=5, in_channels=16, ot_cfg=ot_cfg)
+    head.is_only_cross_entropy = False
+    per_class_head = copy.deepcopy(head)
+    per_class_head.batched_clustering = False
+
+    _, _, target = head(feats, gt_label=fake_gt_label)
+    _, _, per_class_target = per_class_head(feats, gt_label=fake_gt_label)
+    # the log-domain solvers assign deterministically
+    assert torch.equal(target, per_class_target)
+    assert torch.allclose(
+        head.prototypes, per_class_head.prototypes, atol=1e-5)
+
+    with pytest.raises(AssertionError):
+        SubCentroids_Head_Formal(
+            num_classes=5, in_channels=16, ot_cfg=dict(type='emd'))
+
+
+def test_subcentroids_head_packed_prototypes():
+    torch.manual_seed(0)
+    head = SubCentroids_Head_Formal(num_classes=4, in_channels=16)
+    head.optimal_subcentroids[1] = 2
+    feats = torch.rand(8, 16)
+
+    def reference(feats):
+        x = F.normalize(head.feat_norm(feats), dim=-1)
+        prototypes = F.normalize(head.prototypes, dim=-1)
+        mask = torch.zeros_like(prototypes)
+        for k in range(head.num_classes):
+            mask[k, :int(head.optimal_subcentroids[k])] = 1
+        masks = torch.einsum('nd,kmd->nmk', x, prototypes * mask)
+        return head.mask_norm(torch.amax(masks, dim=1))
+
+    expected = reference(feats)
+    assert torch.allclose(head(feats), expected, atol=1e-6)
+
+    # the packed prototypes are reused while nothing changes
+    packed = head.packed_prototypes()
+    head(feats)
+    assert head.packed_prototypes() is packed
+    assert (packed.view(4, head.max_subcentroids, 16)[1, 2:] == 0).all()
+
+    # and rebuilt when the number of subcentroids changes
+    head.optimal_subcentroids[1] = 6
+    assert head.packed_prototypes() is not packed
+    assert torch.allclose(head(feats), reference(feats), atol=1e-6)
+
+    # or when the prototypes are replaced or loaded
+    packed = head.packed_prototypes()
+    head.set_prototypes(torch.rand_like(head.prototypes))
+    assert head.packed_prototypes() is not packed
+    packed = head.packed_prototypes()
+    head.load_state_dict(
+        SubCentroids_Head_Formal(num_classes=4, in_channels=16).state_dict())
+    assert head.packed_prototypes() is not packed
+    assert torch.allclose(head(feats), reference(feats), atol=1e-6)
+
+
+def test_subcentroids_head_variable_k_inference():
+    torch.manual_seed(0)
+    head = SubCentroids_Head_Formal(num_classes=6, in_channels=16)
+    head.optimal_subcentroids.copy_(torch.tensor([2., 10., 4., 2., 0., 8.]))
+    feats = torch.rand(8, 16)
+
+    # the dense masked path scores the training forward
+    dense = head(feats)
+    head.eval()
+    assert torch.allclose(head(feats), dense, atol=1e-6)
+
+    # only the active subcentroids are packed, grouped by their number
+    packed = head.packed_subcentroids()
+    assert packed.weight.shape == (26, 16)
+    assert packed.groups == [(0, 1), (2, 2), (4, 1), (8, 1), (10, 1)]
+    assert packed.offsets.tolist() == [0, 16, 4, 2, 0, 8]
+    prototypes = F.normalize(head.prototypes, dim=-1)
+    assert torch.allclose(packed.weight[16:26], prototypes[1])
+    assert head.packed_subcentroids() is packed
+    assert 'packed' not in ''.join(head.state_dict())
+
+    # the packed form is baked into the traced model
+    head.switch_to_deploy()
+    head.optimal_subcentroids[0] = 10
+    traced = torch.jit.trace(head, feats)
+    assert torch.allclose(traced(feats[:3]), dense[:3], atol=1e-6)
+    assert 'deploy_subcentroids.weight' in head.state_dict()
+
+
+def test_subcentroids_head_communication(tmp_path):
+    import torch.distributed as dist
+    from mmcls.models.heads.SubCentroids_head_Formal import FeatureGatherer
+
+    # async gathers reach the memory bank one step later
+    head = SubCentroids_Head_Formal(
+        num_classes=3,
+        in_channels=16,
+        memory_bank_cfg=dict(num_batches=2),
+        comm_cfg=dict(async_gather=True))
+    feats = [torch.rand(8, 16) for _ in range(3)]
+    labels = torch.randint(0, 3, (8, ))
+    assert head.dequeue_and_enqueue(feats[0], labels, 8) == 0
+    assert head.dequeue_and_enqueue(feats[1], labels, 8) == 8
+    assert torch.equal(head.memory_bank.features[:8], feats[0])
+
+    dist.init_process_group(
+        'gloo', init_method=f'file://{tmp_path}/store', rank=0, world_size=1)
+    try:
+        # features and labels travel in one float32 buffer if half precision
+        # cannot represent every label, and the two buffers alternate
+        gatherer = FeatureGatherer(num_classes=5000)
+        gatherer.start(feats[0].half(), torch.tensor([4999] * 8))
+        first_feats, first_labels = gatherer.wait()
+        assert first_feats.dtype == torch.float32
+        assert torch.equal(first_labels, torch.tensor([4999] * 8))
+        gatherer.start(feats[1].half(), labels)
+        gatherer.wait()
+        assert torch.equal(first_feats, feats[0].half().float())
+
+        # only changed subcentroids are synced, here in half precision
+        head = SubCentroids_Head_Formal(
+            num_classes=3, in_channels=16, comm_cfg=dict(sync_dtype='float16'))
+        centroids = head.prototypes.data.clone()
+        centroids[1, 2] = torch.rand(16)
+        head.set_prototypes(centroids)
+        expected = F.normalize(centroids, dim=-1)
+        assert torch.equal(head.prototypes[0], expected[0])
+        assert torch.allclose(head.prototypes[1, 2], expected[1, 2], atol=1e-3)
+    finally:
+        dist.destroy_process_group()
@@ -1,7 +1,15 @@
 # Copyright (c) OpenMMLab. All rights reserved.
+import random
+
+import mmcv
+import numpy as np
+import pytest
 import torch
+from mmcv.utils import build_from_cfg
 
-from mmcls.models.utils import Augments
+from mmcls.datasets import PIPELINES
+from mmcls.models.classifiers import ImageClassifier
+from mmcls.models.utils import Augments, BatchPipeline
 
 
 def test_augments():
@@ -50,3 +58,182 @@ def test_augments():
     mixed_imgs, mixed_labels = augs(imgs, labels)
     assert mixed_imgs.shape == torch.Size((4, 3, 32, 32))
     assert mixed_labels.shape == torch.Size((4, 10))
+
+
+def _assert_same_mean(cpu_values, batch_values, num_std=5):
+    cpu_values = np.asarray(cpu_values, dtype=np.float64)
+    batch_values = np.asarray(batch_values, dtype=np.float64)
+    stderr = np.sqrt(cpu_values.var() / len(cpu_values) +
+                     batch_values.var() / len(batch_values))
+    assert abs(cpu_values.mean() - batch_values.mean()) <= \
+        num_std * stderr + 1e-6
+
+
+def _cpu_outputs(transform_cfg, img, num):
+    transform = build_from_cfg(transform_cfg, PIPELINES)
+    outputs = [transform(dict(img=img.copy()))['img'] for _ in range(num)]
+    return np.stack(outputs).astype(np.float32)
+
+
+def _batch_outputs(transform_cfg, img, num):
+    imgs = torch.from_numpy(img.transpose(2, 0, 1)).repeat(num, 1, 1, 1)
+    outputs = BatchPipeline([transform_cfg])(imgs)
+    return outputs.permute(0, 2, 3, 1).numpy()
+
+
+def test_batch_pipeline():
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+    ys, xs = np.mgrid[0:48, 0:64]
+    img = np.stack([80 + 60 * np.sin(xs / (4 + c) + ys / 7) for c in range(3)],
+                   -1).astype(np.uint8)
+    num = 400
+
+    # the output is float32, or the floating point dtype of the input
+    imgs = torch.from_numpy(img.transpose(2, 0, 1)).repeat(4, 1, 1, 1)
+    pipeline = BatchPipeline([
+        dict(type='RandomResizedCrop', size=(24, 32)),
+        dict(type='RandomFlip', flip_prob=0.5),
+        dict(type='ColorJitter', brightness=0.4, contrast=0.4, saturation=0.4),
+        dict(type='RandomErasing', erase_prob=0.5, mode='rand'),
+        dict(type='Normalize', mean=[1, 2, 3], std=[4, 5, 6])
+    ])
+    assert pipeline(imgs).shape == (4, 3, 24, 32)
+    assert pipeline(imgs).dtype == torch.float32
+    assert pipeline(imgs.half()).dtype == torch.half
+    assert 'BatchRandomResizedCrop' in repr(pipeline)
+
+    # Normalize matches exactly
+    cfg = dict(type='Normalize', mean=[1, 2, 3], std=[4, 5, 6], to_rgb=True)
+    np.testing.assert_allclose(
+        _batch_outputs(cfg, img, 2)[0],
+        _cpu_outputs(cfg, img, 1)[0],
+        rtol=1e-5,
+        atol=1e-5)
+
+    # a crop of the whole image is a plain resize, as cv2.resize
+    cfg = dict(
+        type='RandomResizedCrop',
+        size=(24, 32),
+        scale=(1., 1.),
+        ratio=(4 / 3, 4 / 3))
+    resized = mmcv.imresize(img, (32, 24)).astype(np.float32)
+    assert np.abs(_batch_outputs(cfg, img, 2) - resized).max() <= 1
+
+    # the crops have the distribution of the CPU transform
+    for efficientnet_style in (False, True):
+        cfg = dict(
+            type='RandomResizedCrop',
+            size=24,
+            efficientnet_style=efficientnet_style)
+        cpu_transform = build_from_cfg(cfg, PIPELINES)
+        cpu_bboxes = np.array(
+            [cpu_transform.sample_bbox(img) for _ in range(num)])
+        batch_bboxes = BatchPipeline([cfg]).transforms[0].sample_bboxes(
+            num, 48, 64, 'cpu').numpy()
+        for bboxes in (cpu_bboxes, batch_bboxes):
+            assert (bboxes >= 0).all()
+            assert (bboxes[:, 2] < 48).all() and (bboxes[:, 3] < 64).all()
+        for i in range(4):
+            _assert_same_mean(cpu_bboxes[:, i], batch_bboxes[:, i])
+        _assert_same_mean((cpu_bboxes[:, 2] - cpu_bboxes[:, 0] + 1) *
+                          (cpu_bboxes[:, 3] - cpu_bboxes[:, 1] + 1),
+                          (batch_bboxes[:, 2] - batch_bboxes[:, 0] + 1) *
+                          (batch_bboxes[:, 3] - batch_bboxes[:, 1] + 1))
+    cfg = dict(type='RandomResizedCrop', size=24, max_attempts=0)
+    bboxes = BatchPipeline([cfg]).transforms[0].sample_bboxes(4, 48, 64, 'cpu')
+    assert bboxes.tolist() == [[0, 0, 47, 63]] * 4
+
+    # the crops of padded images are drawn within their unpadded size
+    cfg = dict(type='RandomResizedCrop', size=24)
+    valid_shape = torch.tensor([[48, 64], [30, 20]] * (num // 2))
+    bboxes = BatchPipeline([cfg]).transforms[0].sample_bboxes(
+        num, valid_shape[:, 0], valid_shape[:, 1], 'cpu')
+    assert (bboxes >= 0).all()
+    assert (bboxes[:, 2:] < valid_shape).all()
+    cpu_transform = build_from_cfg(cfg, PIPELINES)
+    cpu_bboxes = np.array(
+        [cpu_transform.sample_bbox(img[:30, :20]) for _ in range(num // 2)])
+    for i in range(4):
+        _assert_same_mean(cpu_bboxes[:, i], bboxes[1::2, i].numpy())
+    padded = np.zeros((64, 64, 3), dtype=np.uint8)
+    padded[:48] = img
+    imgs = torch.from_numpy(padded.transpose(2, 0, 1)).repeat(2, 1, 1, 1)
+    cfg = dict(
+        type='RandomResizedCrop',
+        size=(24, 32),
+        scale=(1., 1.),
+        ratio=(4 / 3, 4 / 3))
+    outputs = BatchPipeline([cfg])(imgs, torch.tensor([[48, 64]] * 2))
+    assert np.abs(outputs.permute(0, 2, 3, 1).numpy() - resized).max() <= 1
+    with pytest.raises(AssertionError):
+        BatchPipeline([dict(type='RandomFlip')])(imgs,
+                                                  torch.tensor([[48, 64]] * 2))
+
+    # the other transforms have the per-sample statistics of the CPU ones
+    transform_cfgs = [
+        dict(type='RandomFlip', flip_prob=0.3),
+        dict(type='RandomFlip', flip_prob=0.5, direction='vertical'),
+        dict(type='ColorJitter', brightness=0.5, contrast=0.5, saturation=0.5),
+        dict(
+            type='Lighting',
+            eigval=[55.46, 4.794, 1.148],
+            eigvec=[[-0.5675, 0.7192, 0.4009], [-0.5808, -0.0045, -0.8140],
+                    [-0.5836, -0.6948, 0.4203]],
+            alphastd=1.0),
+        dict(type='RandomErasing', erase_prob=0.5, fill_color=0.),
+        dict(
+            type='RandomErasing',
+            erase_prob=0.8,
+            mode='rand',
+            fill_color=(100, 120, 140),
+            fill_std=(10, 20, 30)),
+    ]
+    for cfg in transform_cfgs:
+        cpu_outputs = _cpu_outputs(cfg, img, num)
+        batch_outputs = _batch_outputs(cfg, img, num)
+        assert cpu_outputs.shape == batch_outputs.shape
+        stats = [
+            lambda x: x.mean(axis=(1, 2, 3)),
+            lambda x: x.std(axis=(1, 2, 3)),
+            lambda x: x.mean(axis=(1, 2))[:, 0],
+            lambda x: x.mean(axis=(1, 2))[:, 2],
+            lambda x: x[:, :24, :32].mean(axis=(1, 2, 3)),
+        ]
+        if cfg['type'] == 'RandomErasing':
+            # the fraction of erased pixels
+            stats.append(lambda x: (x != img).any(axis=3).mean(axis=(1, 2)))
+        for stat in stats:
+            _assert_same_mean(stat(cpu_outputs), stat(batch_outputs))
+
+
+def test_classifier_batch_pipeline():
+    model_cfg = dict(
+        backbone=dict(
+            type='ResNet_CIFAR',
+            depth=18,
+            num_stages=4,
+            out_indices=(3, ),
+            style='pytorch'),
+        neck=dict(type='GlobalAveragePooling'),
+        head=dict(
+            type='LinearClsHead',
+            num_classes=10,
+            in_channels=512,
+            loss=dict(type='CrossEntropyLoss')),
+        train_cfg=dict(batch_pipeline=[
+            dict(type='RandomResizedCrop', size=16),
+            dict(type='RandomFlip', flip_prob=0.5),
+            dict(type='Normalize', mean=[0, 0, 0], std=[255, 255, 255])
+        ]))
+    model = ImageClassifier(**model_cfg)
+    imgs = torch.randint(0, 256, (4, 3, 32, 32), dtype=torch.uint8)
+    losses = model(imgs, return_loss=True, gt_label=torch.arange(4))
+    assert losses['loss'].item() > 0
+    losses = model(
+        imgs,
+        return_loss=True,
+        gt_label=torch.arange(4),
+        valid_shape=torch.tensor([[32, 24]] * 4))
+    assert losses['loss'].item() > 0
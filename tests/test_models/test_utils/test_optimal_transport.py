@@ -0,0 +1,66 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import pytest
+import torch
+
+from mmcls.models.utils import log_apdagd, log_sinkhorn
+
+
+def _masked_problems():
+    torch.manual_seed(0)
+    M = torch.rand(4, 60, 8) * 2 - 1
+    sample_mask = torch.ones(4, 60, dtype=torch.bool)
+    sample_mask[1, 40:] = False
+    # the last problem has no samples at all
+    sample_mask[3] = False
+    centroid_mask = torch.ones(4, 8, dtype=torch.bool)
+    centroid_mask[2, 5:] = False
+    return M, sample_mask, centroid_mask
+
+
+def test_log_sinkhorn():
+    M, sample_mask, centroid_mask = _masked_problems()
+
+    plan, num_iter, err = log_sinkhorn(
+        M, sample_mask, centroid_mask, tol=1e-4, max_iter=500)
+    assert num_iter < 500 and (err < 1e-4).all()
+    assert not torch.isnan(plan).any()
+    assert torch.allclose(plan.sum(dim=(1, 2)), torch.tensor([1, 1, 1, 0.]))
+    # every valid sample gets 1/N, every active sub-centroid 1/K
+    assert torch.allclose(
+        plan[1].sum(1)[:40], torch.full((40, ), 1 / 40.), atol=1e-5)
+    assert torch.allclose(
+        plan[2].sum(0)[:5], torch.full((5, ), 1 / 5.), atol=1e-5)
+    assert (plan[1, 40:] == 0).all() and (plan[2, :, 5:] == 0).all()
+
+    # a tiny regularization does not overflow in float32
+    plan, _, _ = log_sinkhorn(M, reg=1e-3, tol=None, max_iter=20)
+    assert torch.isfinite(plan).all()
+
+    # float32 matches a float64 solve
+    plan32, _, _ = log_sinkhorn(M, sample_mask, centroid_mask, tol=None)
+    plan64, _, _ = log_sinkhorn(
+        M, sample_mask, centroid_mask, tol=None, dtype=torch.float64)
+    assert torch.allclose(plan32.double(), plan64, atol=1e-5)
+
+
+@pytest.mark.parametrize('dtype', [torch.float32, torch.bfloat16])
+def test_log_apdagd(dtype):
+    M, sample_mask, centroid_mask = _masked_problems()
+
+    plan, num_iter, err = log_apdagd(
+        M, sample_mask, centroid_mask, tol=None, max_iter=300, dtype=dtype)
+    # the averaged plan is accumulated in float32
+    assert plan.dtype == torch.float32 and num_iter == 300
+    assert torch.isfinite(plan).all()
+    assert (plan[3] == 0).all() and err[3] == 0
+    assert (plan[1, 40:] == 0).all() and (plan[2, :, 5:] == 0).all()
+
+    # the marginal error decreases with the number of iterations
+    _, _, err_long = log_apdagd(
+        M, sample_mask, centroid_mask, tol=None, max_iter=1000, dtype=dtype)
+    assert (err_long[:3] < err[:3]).all()
+
+    # early stopping
+    _, num_iter, err = log_apdagd(
+        M, sample_mask, centroid_mask, tol=10, max_iter=300, dtype=dtype)
+    assert num_iter == 10 and (err < 10).all()
@@ -5,6 +5,7 @@ import warnings
 from unittest.mock import MagicMock, patch
 
 import mmcv.runner
+import numpy as np
 import pytest
 import torch
 import torch.nn as nn
@@ -12,6 +13,7 @@ from mmcv.runner import obj_from_dict
 from torch.utils.data import DataLoader, Dataset
 
 from mmcls.apis import single_gpu_test
+from mmcls.datasets import BaseDataset
 
 # TODO import eval hooks from mmcv and delete them from mmcls
 try:
@@ -217,3 +219,121 @@ def test_dist_eval_hook_epoch():
                                                  logger=runner.logger)
         if use_mmcv_hook:
             p.stop()
+
+
+class ScoresDataset(Dataset):
+    """Samples whose single score is the label."""
+
+    CLASSES = None
+    evaluate = BaseDataset.evaluate
+    build_streaming_evaluator = BaseDataset.build_streaming_evaluator
+
+    def __getitem__(self, idx):
+        return dict(img=torch.tensor([idx % 3], dtype=torch.float32))
+
+    def __len__(self):
+        return 8
+
+    def get_gt_labels(self):
+        return np.arange(8) % 3
+
+
+class ScoresModel(nn.Module):
+
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Linear(1, 1)
+        nn.init.ones_(self.fc.weight)
+
+    def forward(self, img, return_loss=False, post_process=True, **kwargs):
+        # the score of the class of the input is the largest one
+        scores = (3 - (img - torch.arange(3)).abs()) * self.fc.weight
+        return scores if not post_process else list(scores.numpy())
+
+    def train_step(self, data_batch, optimizer):
+        self.fc.weight.data += 1
+        return dict()
+
+
+@pytest.mark.parametrize('by_epoch', [True, False])
+def test_async_eval_hook(by_epoch):
+    from mmcls.core import EvalHook as MMClsEvalHook
+    dataset = ScoresDataset()
+    data_loader = DataLoader(dataset, batch_size=3)
+    supports = []
+
+    def evaluate(results, **kwargs):
+        res = BaseDataset.evaluate(dataset, results, **kwargs)
+        supports.append(res['support'])
+        return res
+
+    dataset.evaluate = evaluate
+    with pytest.raises(ValueError):
+        MMClsEvalHook(data_loader, async_eval=True, snapshot='swa')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        eval_hook = MMClsEvalHook(
+            data_loader,
+            by_epoch=by_epoch,
+            async_eval=True,
+            subsample=0.5,
+            metric=['accuracy', 'support'],
+            metric_options=dict(topk=1))
+        runner_type = mmcv.runner.EpochBasedRunner if by_epoch else \
+            mmcv.runner.IterBasedRunner
+        model = ScoresModel()
+        runner = runner_type(
+            model=model,
+            work_dir=tmpdir,
+            logger=logging.getLogger(),
+            **{'max_epochs' if by_epoch else 'max_iters': 3})
+        runner.register_hook(eval_hook, priority='LOW')
+        runner.run([DataLoader(dataset, batch_size=8)], [('train', 1)])
+
+    # the intermediate evaluations use every other sample, the last one
+    # waits for the whole dataset
+    assert supports == [4, 4, 8]
+    assert runner.log_buffer.output['accuracy'] == 100
+    assert eval_hook._pending is None
+    # the snapshot of the last evaluation
+    assert eval_hook._eval_model.module.fc.weight.item() == \
+        model.fc.weight.item()
+
+
+def test_async_eval_hook_ema():
+    from mmcls.core import EvalHook as MMClsEvalHook
+    dataset = ScoresDataset()
+    dataset.evaluate = MagicMock(return_value=dict())
+    data_loader = DataLoader(dataset, batch_size=3)
+
+    for snapshot in ['ema', 'current']:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eval_hook = MMClsEvalHook(
+                data_loader, async_eval=True, snapshot=snapshot)
+            model = ScoresModel()
+            runner = mmcv.runner.EpochBasedRunner(
+                model=model,
+                work_dir=tmpdir,
+                logger=logging.getLogger(),
+                max_epochs=2)
+            runner.register_hook(mmcv.runner.EMAHook(momentum=0.5, warm_up=1))
+            runner.register_hook(eval_hook, priority='LOW')
+            runner.run([DataLoader(dataset, batch_size=8)], [('train', 1)])
+        # the parameters and the averages stay swapped after the last epoch
+        expected = model.fc.weight if snapshot == 'ema' else \
+            model.ema_fc_weight
+        assert eval_hook._eval_model.module.fc.weight.item() == \
+            expected.item()
+        assert model.fc.weight.item() != model.ema_fc_weight.item()
+
+    # the EMA snapshot needs the EMAHook
+    with tempfile.TemporaryDirectory() as tmpdir:
+        eval_hook = MMClsEvalHook(data_loader, async_eval=True, snapshot='ema')
+        runner = mmcv.runner.EpochBasedRunner(
+            model=ScoresModel(),
+            work_dir=tmpdir,
+            logger=logging.getLogger(),
+            max_epochs=1)
+        runner.register_hook(eval_hook, priority='LOW')
+        with pytest.raises(RuntimeError):
+            runner.run([DataLoader(dataset, batch_size=8)], [('train', 1)])
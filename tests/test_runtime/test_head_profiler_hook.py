@@ -0,0 +1,68 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import json
+import logging
+import os.path as osp
+import tempfile
+
+import mmcv.runner
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+
+from mmcls.core import HeadProfilerHook
+from mmcls.models.heads import SubCentroids_Head_Formal
+
+
+class ExampleDataset(Dataset):
+
+    def __getitem__(self, idx):
+        return dict(feat=torch.rand(16), gt_label=torch.tensor(idx % 3))
+
+    def __len__(self):
+        return 60
+
+
+class ExampleModel(nn.Module):
+
+    def __init__(self):
+        super(ExampleModel, self).__init__()
+        self.head = SubCentroids_Head_Formal(
+            num_classes=3,
+            in_channels=16,
+            memory_bank_cfg=dict(num_batches=2),
+            ot_cfg=dict(type='sinkhorn'),
+            profile_cfg=dict(trace=True))
+
+    def train_step(self, data_batch, optimizer):
+        losses = self.head.forward_train(data_batch['feat'],
+                                         data_batch['gt_label'])
+        return dict(loss=losses['loss'], log_vars={}, num_samples=20)
+
+
+def test_head_profiler_hook():
+    model = ExampleModel()
+    # every class has enough samples in a flush to be searched
+    loader = DataLoader(ExampleDataset(), batch_size=20)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        runner = mmcv.runner.IterBasedRunner(
+            model=model,
+            work_dir=tmpdir,
+            logger=logging.getLogger(),
+            max_iters=3)
+        runner.register_hook(HeadProfilerHook(trace_file='head.json'))
+        runner.run([loader], [('train', 1)])
+
+        # the bank of two batches is flushed at the second iteration
+        history = runner.log_buffer.val_history
+        assert history['head/gather_calls'] == [1, 1, 1]
+        assert history['head/flush_calls'] == [1]
+        assert history['head/search_calls'] == [3]
+        assert history['head/bank_occupancy'] == [0.5, 1.0, 0.5]
+        assert history['head/ot_iters'][0] > 0
+        assert history['head/flush_time'][0] >= \
+            history['head/clustering_time'][0]
+
+        with open(osp.join(tmpdir, 'head_head.json')) as f:
+            events = json.load(f)['traceEvents']
+        assert {'gather', 'flush', 'clustering', 'search', 'ot'} <= \
+            {event['name'] for event in events if event['ph'] == 'X'}
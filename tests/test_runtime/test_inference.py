@@ -0,0 +1,85 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor
+
+import mmcv
+import numpy as np
+import pytest
+
+from mmcls.apis import (inference_batch, inference_batch_iter, inference_model,
+                        init_model)
+
+IMG_NORM_CFG = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+
+
+def _build_model():
+    config = mmcv.Config(
+        dict(
+            model=dict(
+                type='ImageClassifier',
+                backbone=dict(
+                    type='ResNet_CIFAR',
+                    depth=18,
+                    num_stages=4,
+                    out_indices=(3, ),
+                    style='pytorch'),
+                neck=dict(type='GlobalAveragePooling'),
+                head=dict(
+                    type='LinearClsHead',
+                    num_classes=10,
+                    in_channels=512,
+                    loss=dict(type='CrossEntropyLoss'))),
+            data=dict(
+                test=dict(pipeline=[
+                    dict(type='LoadImageFromFile'),
+                    dict(type='Resize', size=(32, -1)),
+                    dict(type='CenterCrop', crop_size=32),
+                    dict(type='Normalize', **IMG_NORM_CFG),
+                    dict(type='ImageToTensor', keys=['img']),
+                    dict(type='Collect', keys=['img'])
+                ]))))
+    model = init_model(config, device='cpu')
+    model.CLASSES = [f'class_{i}' for i in range(10)]
+    return model
+
+
+def test_inference_batch(tmp_path):
+    model = _build_model()
+    pipeline = model.cfg.data.test.pipeline.copy()
+    rng = np.random.default_rng(0)
+    imgs = list(rng.integers(0, 256, size=(5, 40, 48, 3), dtype=np.uint8))
+    filename = osp.join(tmp_path, 'img.png')
+    mmcv.imwrite(imgs[0], filename)
+
+    expected = [inference_model(model, img) for img in imgs]
+    # the config is not changed for the loaded images
+    assert model.cfg.data.test.pipeline == pipeline
+
+    # the last batch is padded, the results follow the images
+    for num_workers in [0, 2]:
+        results = inference_batch(
+            model, imgs, batch_size=2, num_workers=num_workers)
+        assert len(results) == 5
+        for result, expected_result in zip(results, expected):
+            assert result['pred_label'] == expected_result['pred_label']
+            assert result['pred_class'] == expected_result['pred_class']
+            assert result['pred_score'] == pytest.approx(
+                expected_result['pred_score'], rel=1e-5)
+
+    # the top k results of files and of loaded images, from a generator
+    with ThreadPoolExecutor(1) as executor:
+        results = inference_batch_iter(
+            model,
+            iter([filename, imgs[0]]),
+            batch_size=4,
+            topk=3,
+            executor=executor)
+        results = list(results)
+    assert results[0]['pred_label'] == results[1]['pred_label']
+    assert results[0]['pred_label'][0] == expected[0]['pred_label']
+    assert len(results[0]['pred_class']) == 3
+    assert results[0]['pred_score'] == sorted(
+        results[0]['pred_score'], reverse=True)
+
+    assert inference_batch(model, []) == []
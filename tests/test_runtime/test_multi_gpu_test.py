@@ -0,0 +1,181 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import socket
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.utils.data import Dataset
+
+from mmcls.apis import multi_gpu_test, streaming_test
+from mmcls.core import single_label_metrics
+from mmcls.datasets import (BaseDataset, ShardedDataset, build_dataloader,
+                            write_shards)
+
+NUM_SAMPLES = 11
+NUM_CLASSES = 6
+
+
+class ScoresDataset(Dataset):
+
+    CLASSES = None
+    build_streaming_evaluator = BaseDataset.build_streaming_evaluator
+
+    def __init__(self, num_samples=NUM_SAMPLES):
+        rng = np.random.default_rng(0)
+        self.scores = rng.random((num_samples, NUM_CLASSES), dtype=np.float32)
+        self.gt_labels = rng.integers(0, NUM_CLASSES, num_samples)
+
+    def get_gt_labels(self):
+        return self.gt_labels
+
+    def __getitem__(self, idx):
+        return dict(img=torch.from_numpy(self.scores[idx]))
+
+    def __len__(self):
+        return len(self.scores)
+
+
+class ScoresModel(nn.Module):
+    """Return the input as the scores, like the heads, i.e. as a list of
+    arrays, or as a tensor without post processing."""
+
+    def forward(self, img, return_loss=False, post_process=True):
+        return list(img.numpy()) if post_process else img
+
+
+class ScoresShardedDataset(ShardedDataset):
+    """A sharded dataset returning the scores of ``ScoresDataset``."""
+
+    def prepare_data(self, idx):
+        return dict(img=torch.from_numpy(ScoresDataset().scores[idx]))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _run(rank, world_size, port, queue):
+    dist.init_process_group(
+        'gloo',
+        init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank,
+        world_size=world_size)
+    dataset = ScoresDataset()
+    # the ranks load 6 samples each, one of them padded
+    data_loader = build_dataloader(
+        dataset,
+        samples_per_gpu=4,
+        workers_per_gpu=0,
+        shuffle=False,
+        persistent_workers=False)
+    outputs = {}
+    for collect_topk in (None, 2):
+        outputs[collect_topk] = multi_gpu_test(
+            ScoresModel(),
+            data_loader,
+            tensor_collect=True,
+            collect_topk=collect_topk)
+    # the second rank samples nothing without the padding
+    single_loader = build_dataloader(
+        ScoresDataset(1),
+        samples_per_gpu=4,
+        workers_per_gpu=0,
+        shuffle=False,
+        round_up=False,
+        persistent_workers=False)
+    outputs['single'] = multi_gpu_test(
+        ScoresModel(), single_loader, tensor_collect=True, collect_topk=2)
+    # the states sized by the first batch are created on the second rank
+    outputs['streaming_single'] = streaming_test(
+        ScoresModel(), single_loader, metric='support').compute()
+    # the padded sample is not accumulated
+    outputs['streaming'] = streaming_test(
+        ScoresModel(),
+        data_loader,
+        metric=['accuracy', 'precision', 'support'],
+        metric_options=dict(topk=(1, 2), thrs=(0., 0.5))).compute()
+    if rank == 0:
+        queue.put(outputs)
+    dist.destroy_process_group()
+
+
+def test_multi_gpu_test_tensor_collect():
+    ctx = mp.get_context('spawn')
+    queue = ctx.SimpleQueue()
+    mp.spawn(_run, args=(2, _free_port(), queue), nprocs=2)
+    outputs = queue.get()
+
+    scores = ScoresDataset().scores
+    # the rows are ordered by the dataset indices
+    np.testing.assert_array_equal(outputs[None], scores)
+
+    # only the top k scores are collected
+    topk = np.full_like(scores, -np.inf)
+    labels = np.argsort(-scores, axis=1)[:, :2]
+    np.put_along_axis(topk, labels, np.take_along_axis(scores, labels, 1), 1)
+    np.testing.assert_array_equal(outputs[2], topk)
+    np.testing.assert_array_equal(outputs['single'], topk[:1])
+
+    # the metrics of all the ranks are merged
+    dataset = ScoresDataset()
+    expected = single_label_metrics(
+        scores,
+        dataset.gt_labels,
+        metrics=['accuracy', 'precision', 'support'],
+        topk=(1, 2),
+        thrs=(0., 0.5))
+    np.testing.assert_allclose(outputs['streaming']['accuracy'],
+                               expected['accuracy'])
+    np.testing.assert_allclose(outputs['streaming']['precision'],
+                               expected['precision'])
+    assert outputs['streaming']['support'] == NUM_SAMPLES
+    assert outputs['streaming_single']['support'] == 1
+
+
+def _run_sharded(rank, world_size, port, data_prefix, tmpdir, queue):
+    dist.init_process_group(
+        'gloo',
+        init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank,
+        world_size=world_size)
+    dataset = ScoresShardedDataset(data_prefix=data_prefix, pipeline=[])
+    data_loader = build_dataloader(
+        dataset,
+        samples_per_gpu=2,
+        workers_per_gpu=0,
+        shuffle=False,
+        persistent_workers=False)
+    # the default collection of the results
+    results = multi_gpu_test(ScoresModel(), data_loader, tmpdir=tmpdir)
+    if rank == 0:
+        queue.put((results, dataset.evaluate(results, metric='accuracy')))
+    dist.destroy_process_group()
+
+
+def test_multi_gpu_test_sharded(tmp_path):
+    scores = ScoresDataset().scores
+    gt_labels = ScoresDataset().gt_labels
+    samples = [(f'{i}.jpg', bytes(100), int(label))
+               for i, label in enumerate(gt_labels)]
+    write_shards(
+        samples,
+        str(tmp_path),
+        shard_size=2048,
+        classes=[str(i) for i in range(NUM_CLASSES)])
+    ctx = mp.get_context('spawn')
+    queue = ctx.SimpleQueue()
+    mp.spawn(
+        _run_sharded,
+        args=(2, _free_port(), str(tmp_path), str(tmp_path / 'parts'), queue),
+        nprocs=2)
+    results, eval_results = queue.get()
+
+    # the results of the ranks are in the dataset order
+    np.testing.assert_array_equal(np.stack(results), scores)
+    expected = single_label_metrics(scores, gt_labels, metrics=['accuracy'])
+    np.testing.assert_allclose(eval_results['accuracy_top-1'],
+                               expected['accuracy'])
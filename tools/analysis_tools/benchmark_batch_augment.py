@@ -0,0 +1,121 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mmcls.datasets.pipelines import Compose
+from mmcls.models.utils import BatchPipeline
+
+IMG_NORM_CFG = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+
+TRANSFORMS = [
+    dict(type='RandomResizedCrop', size=224),
+    dict(type='RandomFlip', flip_prob=0.5, direction='horizontal'),
+    dict(type='ColorJitter', brightness=0.4, contrast=0.4, saturation=0.4),
+    dict(
+        type='Lighting',
+        eigval=[55.4625, 4.7940, 1.1475],
+        eigvec=[[-0.5675, 0.7192, 0.4009], [-0.5808, -0.0045, -0.8140],
+                [-0.5836, -0.6948, 0.4203]],
+        alphastd=0.1,
+        to_rgb=False),
+    dict(
+        type='RandomErasing',
+        erase_prob=0.25,
+        mode='rand',
+        min_area_ratio=0.02,
+        max_area_ratio=1 / 3,
+        fill_color=IMG_NORM_CFG['mean'][::-1],
+        fill_std=IMG_NORM_CFG['std'][::-1]),
+    dict(type='Normalize', **IMG_NORM_CFG),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the train augmentations per sample on the CPU '
+        'against the batched ones on a device')
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        nargs=2,
+        default=[256, 256],
+        help='height and width of the decoded and cropped images')
+    parser.add_argument(
+        '--batch-size', type=int, default=256, help='batch size')
+    parser.add_argument(
+        '--num-cpu-images',
+        type=int,
+        default=256,
+        help='number of images augmented on the CPU')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device of the batched augmentations')
+    parser.add_argument(
+        '--repeat', type=int, default=5, help='number of timed runs')
+    args = parser.parse_args()
+    return args
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def best_time(func, repeat, device):
+    costs = []
+    for _ in range(repeat + 1):
+        synchronize(device)
+        start = time.perf_counter()
+        func()
+        synchronize(device)
+        costs.append(time.perf_counter() - start)
+    # the first run is a warm up
+    return min(costs[1:])
+
+
+def main():
+    args = parse_args()
+    h, w = args.image_size
+    rng = np.random.default_rng(0)
+    imgs = rng.integers(
+        0, 256, size=(args.batch_size, h, w, 3), dtype=np.uint8)
+    print(f'images of {h}x{w}, augmented to 224x224, with '
+          f'{", ".join(cfg["type"] for cfg in TRANSFORMS)}')
+
+    cpu_pipeline = Compose(TRANSFORMS)
+    num_cpu = min(args.num_cpu_images, args.batch_size)
+
+    def run_cpu():
+        for img in imgs[:num_cpu]:
+            cpu_pipeline(dict(img=img))
+
+    cost = best_time(run_cpu, max(args.repeat // 2, 1), 'cpu')
+    cpu_rate = num_cpu / cost
+    print(f'{"cpu, per sample":<32}{cpu_rate:10.1f} images/s per worker')
+
+    batch_pipeline = BatchPipeline(TRANSFORMS)
+    batch = torch.from_numpy(imgs).permute(0, 3, 1, 2).contiguous()
+    device_batch = batch.to(args.device)
+    cost = best_time(lambda: batch_pipeline(device_batch), args.repeat,
+                     args.device)
+    batch_rate = args.batch_size / cost
+    print(f'{args.device + ", batched":<32}{batch_rate:10.1f} images/s '
+          f'({batch_rate / cpu_rate:.1f}x, '
+          f'{cost / args.batch_size * 1e6:.1f} us per image)')
+
+    if torch.device(args.device).type == 'cuda':
+        # the uint8 batch is copied to the device by the training loop
+        cost = best_time(
+            lambda: batch_pipeline(batch.pin_memory().to(args.device)),
+            args.repeat, args.device)
+        print(f'{"with the host to device copy":<32}'
+              f'{args.batch_size / cost:10.1f} images/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import numpy as np
+
+from mmcls.core.evaluation import (calculate_confusion_matrix,
+                                   precision_recall_f1, support)
+from mmcls.datasets import BaseDataset
+from mmcls.models.losses import accuracy
+
+METRICS = ['accuracy', 'precision', 'recall', 'f1_score', 'support']
+
+
+class ScoredDataset(BaseDataset):
+    """A test dataset of random ground truth labels."""
+
+    def __init__(self, gt_labels):
+        self.gt_labels = gt_labels
+
+    def load_annotations(self):
+        pass
+
+    def get_gt_labels(self):
+        return self.gt_labels
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the single label evaluation metrics')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        default=10000,
+        help='number of predictions, e.g. 50000 for the ImageNet val set')
+    parser.add_argument(
+        '--num-classes',
+        type=int,
+        nargs='+',
+        default=[1000, 21843],
+        help='numbers of classes')
+    parser.add_argument(
+        '--thrs',
+        type=float,
+        nargs='+',
+        default=[0.],
+        help='score thresholds of the metrics')
+    parser.add_argument(
+        '--max-confusion-classes',
+        type=int,
+        default=10000,
+        help='the (C, C) confusion matrix is skipped for more classes')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='number of timed runs')
+    args = parser.parse_args()
+    return args
+
+
+def best_time(func, repeat):
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        costs.append(time.perf_counter() - start)
+    return min(costs)
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    thrs = tuple(args.thrs) if len(args.thrs) > 1 else args.thrs[0]
+    print(f'{args.num_samples} samples, thrs={thrs}')
+    for num_classes in args.num_classes:
+        pred = rng.random((args.num_samples, num_classes), dtype=np.float32)
+        target = rng.integers(0, num_classes, args.num_samples)
+        dataset = ScoredDataset(target)
+
+        funcs = {
+            'accuracy top-(1, 5)':
+            lambda: accuracy(pred, target, topk=(1, 5), thrs=thrs),
+            'precision_recall_f1':
+            lambda: precision_recall_f1(pred, target, thrs=thrs),
+            'support':
+            lambda: support(pred, target),
+            'evaluate, all metrics':
+            lambda: dataset.evaluate(
+                pred,
+                metric=METRICS,
+                metric_options=dict(topk=(1, 5), thrs=thrs)),
+        }
+        if num_classes <= args.max_confusion_classes:
+            funcs['calculate_confusion_matrix'] = \
+                lambda: calculate_confusion_matrix(pred, target)
+
+        print(f'C={num_classes}')
+        for name, func in funcs.items():
+            cost = best_time(func, args.repeat)
+            print(f'    {name:<30}{cost * 1000:10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from mmcls.datasets.pipelines import Compose
+from mmcls.models.utils import BatchPipeline
+
+IMG_NORM_CFG = dict(
+    mean=[123.675, 116.28, 103.53], std=[58.395, 57.12, 57.375], to_rgb=True)
+
+PIPELINES = dict(
+    test=dict(
+        standard=[
+            dict(type='CenterCrop', crop_size=224),
+            dict(type='Normalize', **IMG_NORM_CFG),
+            dict(type='ImageToTensor', keys=['img']),
+            dict(type='Collect', keys=['img'])
+        ],
+        fused=[dict(type='CropFlipToTensor', keys=['img'], crop_size=224)]),
+    train=dict(
+        standard=[
+            dict(type='RandomFlip', flip_prob=0.5, direction='horizontal'),
+            dict(type='Normalize', **IMG_NORM_CFG),
+            dict(type='ImageToTensor', keys=['img']),
+            dict(type='ToTensor', keys=['gt_label']),
+            dict(type='Collect', keys=['img', 'gt_label'])
+        ],
+        fused=[
+            dict(
+                type='CropFlipToTensor', flip_prob=0.5, direction='horizontal')
+        ]))
+
+
+class DecodedImages(Dataset):
+    """Decoded images, resized for the test pipelines and cropped for the
+    train ones, passed to the terminal transforms."""
+
+    def __init__(self, imgs, pipeline):
+        self.imgs = imgs
+        self.pipeline = Compose(pipeline)
+
+    def __len__(self):
+        return len(self.imgs)
+
+    def __getitem__(self, idx):
+        return self.pipeline(dict(img=self.imgs[idx], gt_label=np.array(0)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the fused uint8 terminal transform against '
+        'Normalize, ImageToTensor, ToTensor and Collect')
+    parser.add_argument(
+        '--num-images', type=int, default=256, help='number of images')
+    parser.add_argument(
+        '--batch-size', type=int, default=32, help='batch size')
+    parser.add_argument(
+        '--workers', type=int, default=2, help='number of DataLoader workers')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device of the normalization of the fused batches')
+    args = parser.parse_args()
+    return args
+
+
+def time_pipeline(pipeline, imgs):
+    pipeline = Compose(pipeline)
+    start = time.perf_counter()
+    for img in imgs:
+        data = pipeline(dict(img=img, gt_label=np.array(0)))
+    cost = time.perf_counter() - start
+    return len(imgs) / cost, data['img']
+
+
+def time_loader(args, imgs, pipeline, preprocessor=None):
+    from mmcv.parallel import collate
+    loader = DataLoader(
+        DecodedImages(imgs, pipeline),
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        collate_fn=collate,
+        pin_memory=torch.device(args.device).type == 'cuda')
+    num_bytes = 0
+    start = time.perf_counter()
+    for data in loader:
+        img = data['img']
+        num_bytes += img.numel() * img.element_size()
+        img = img.to(args.device, non_blocking=True)
+        if preprocessor is not None:
+            img = preprocessor(img)
+    if torch.device(args.device).type == 'cuda':
+        torch.cuda.synchronize()
+    cost = time.perf_counter() - start
+    return len(imgs) / cost, num_bytes / len(imgs)
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    preprocessor = BatchPipeline([dict(type='Normalize', **IMG_NORM_CFG)])
+    print(f'{"pipeline":<16}{"transform img/s":>16}{"loader img/s":>14}'
+          f'{"KiB/img":>10}')
+    for name, pipelines in PIPELINES.items():
+        size = (256, 341) if name == 'test' else (224, 224)
+        imgs = rng.integers(
+            0, 256, size=(args.num_images, *size, 3), dtype=np.uint8)
+        outputs = []
+        for kind, pipeline in pipelines.items():
+            rate, img = time_pipeline(pipeline, imgs)
+            outputs.append(img)
+            loader_rate, num_bytes = time_loader(
+                args, imgs, pipeline,
+                preprocessor if kind == 'fused' else None)
+            print(f'{name + ", " + kind:<16}{rate:>16.1f}'
+                  f'{loader_rate:>14.1f}{num_bytes / 1024:>10.1f}')
+        if name == 'test':
+            # the normalization on the device gives the same inputs
+            diff = (preprocessor(outputs[1][None])[0] - outputs[0]).abs()
+            print(f'max difference of the normalized images: '
+                  f'{diff.max().item():.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from mmcls.models.heads import SubCentroids_Head_Formal
+from mmcls.models.heads.SubCentroids_head_Formal import FeatureGatherer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the distributed traffic of the sub-centroid '
+        'head on a multi-process CPU gloo group')
+    parser.add_argument(
+        '--world-size', type=int, default=4, help='number of processes')
+    parser.add_argument(
+        '--batch-size', type=int, default=128, help='batch size per process')
+    parser.add_argument(
+        '--channels', type=int, default=512, help='feature dimension')
+    parser.add_argument(
+        '--num-classes', type=int, default=1000, help='number of classes')
+    parser.add_argument(
+        '--changed-ratio',
+        type=float,
+        default=0.1,
+        help='ratio of the sub-centroids changed by a prototype update')
+    parser.add_argument(
+        '--iters', type=int, default=50, help='number of timed iterations')
+    parser.add_argument('--port', type=int, default=29511)
+    args = parser.parse_args()
+    return args
+
+
+def legacy_gather(tensor):
+    # the former concat_all_gather
+    tensors_gather = [
+        torch.ones_like(tensor) for _ in range(dist.get_world_size())
+    ]
+    dist.all_gather(tensors_gather, tensor, async_op=False)
+    return torch.cat(tensors_gather, dim=0)
+
+
+def timed(func, iters):
+    func()
+    dist.barrier()
+    start = time.perf_counter()
+    for _ in range(iters):
+        func()
+    dist.barrier()
+    return (time.perf_counter() - start) / iters * 1000
+
+
+def run(rank, args):
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(args.port)
+    dist.init_process_group('gloo', rank=rank, world_size=args.world_size)
+    # keep the processes from competing for the cores
+    torch.set_num_threads(1)
+    torch.manual_seed(rank)
+
+    feats = torch.randn(args.batch_size, args.channels)
+    labels = torch.randint(0, args.num_classes, (args.batch_size, ))
+    gatherer = FeatureGatherer(args.num_classes)
+
+    def coalesced():
+        gatherer.start(feats, labels)
+        gatherer.wait()
+
+    results = [('gather: 2 x all_gather + cat',
+                timed(lambda: (legacy_gather(feats), legacy_gather(labels)),
+                      args.iters)),
+               ('gather: 1 coalesced all_gather',
+                timed(coalesced, args.iters))]
+
+    head = SubCentroids_Head_Formal(
+        num_classes=args.num_classes, in_channels=args.channels)
+    prototypes = head.prototypes.data
+    changed = torch.zeros(prototypes.shape[:2], dtype=torch.bool)
+    num_changed = int(changed.numel() * args.changed_ratio)
+    # the gathered memory banks, hence the changed sub-centroids, are the
+    # same on every process
+    generator = torch.Generator().manual_seed(0)
+    index = torch.randperm(changed.numel(), generator=generator)
+    changed.view(-1)[index[:num_changed]] = True
+    for name, cfg in [('sync: dense float32', dict(sparse_sync=False)),
+                      ('sync: changed float32', dict(sparse_sync=True)),
+                      ('sync: changed float16',
+                       dict(sparse_sync=True, sync_dtype=torch.float16))]:
+        head.comm_cfg.update(cfg)
+        centroids = prototypes.clone()
+        results.append(
+            (name,
+             timed(lambda: head.sync_prototypes(centroids, changed),
+                   args.iters)))
+
+    if rank == 0:
+        print(f'{args.world_size} processes, {args.batch_size} x '
+              f'{args.channels} features per process, '
+              f'{args.changed_ratio:.0%} of the sub-centroids changed')
+        for name, cost in results:
+            print(f'{name:>32}: {cost:>8.3f} ms')
+    dist.destroy_process_group()
+
+
+def main():
+    args = parse_args()
+    mp.spawn(run, args=(args, ), nprocs=args.world_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os.path as osp
+import tempfile
+import time
+
+import mmcv
+import numpy as np
+import torch
+
+from mmcls.apis import inference_batch, inference_model, init_model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the batched inference of image files against '
+        'the inference of one image per call')
+    parser.add_argument('config', help='config file of the model')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file')
+    parser.add_argument(
+        '--num-images', type=int, default=64, help='number of images')
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        nargs=2,
+        default=[375, 500],
+        help='height and width of the synthetic JPEGs')
+    parser.add_argument(
+        '--batch-size', type=int, default=16, help='batch size')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='number of preprocessing threads')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device of the model')
+    args = parser.parse_args()
+    return args
+
+
+def timed(func, num_images, device):
+    start = time.perf_counter()
+    results = func()
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize()
+    return num_images / (time.perf_counter() - start), results
+
+
+def main():
+    args = parse_args()
+    model = init_model(args.config, args.checkpoint, device=args.device)
+    if not hasattr(model, 'CLASSES'):
+        model.CLASSES = [str(i) for i in range(model.head.num_classes)]
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filenames = []
+        for i in range(args.num_images):
+            filename = osp.join(tmpdir, f'{i}.jpg')
+            mmcv.imwrite(
+                rng.integers(
+                    0, 256, size=(*args.image_size, 3), dtype=np.uint8),
+                filename)
+            filenames.append(filename)
+        # warm up
+        inference_batch(
+            model,
+            filenames[:args.batch_size],
+            batch_size=args.batch_size,
+            num_workers=args.workers)
+
+        single_rate, single_results = timed(
+            lambda: [inference_model(model, f) for f in filenames],
+            args.num_images, args.device)
+        batch_rate, batch_results = timed(
+            lambda: inference_batch(
+                model,
+                filenames,
+                batch_size=args.batch_size,
+                num_workers=args.workers), args.num_images, args.device)
+    same = sum(a['pred_label'] == b['pred_label']
+               for a, b in zip(single_results, batch_results))
+    print(f'{args.num_images} images of {args.image_size}, {args.device}')
+    print(f'{"inference":<40}{"img/s":>10}')
+    print(f'{"inference_model, one image per call":<40}{single_rate:>10.1f}')
+    print(f'{f"inference_batch, batch {args.batch_size}":<40}'
+          f'{batch_rate:>10.1f}')
+    print(f'same top-1 labels: {same}/{args.num_images}')
+
+
+if __name__ == '__main__':
+    main()
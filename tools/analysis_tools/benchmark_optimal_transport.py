@@ -0,0 +1,108 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import torch
+
+from mmcls.models.heads.SubCentroids_head_Formal import (agd_torch_no_grad_gpu,
+                                                         approx_ot)
+from mmcls.models.utils import log_apdagd, log_sinkhorn
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the sub-centroid optimal transport solvers')
+    parser.add_argument(
+        '--num-problems',
+        type=int,
+        default=100,
+        help='number of problems (classes) solved together')
+    parser.add_argument(
+        '--num-samples', type=int, default=256, help='samples per problem')
+    parser.add_argument(
+        '--num-centroids',
+        type=int,
+        default=10,
+        help='sub-centroids per problem')
+    parser.add_argument(
+        '--iters',
+        type=int,
+        nargs='+',
+        default=[10, 50, 100, 500],
+        help='iteration budgets of the convergence table')
+    parser.add_argument(
+        '--throughput-iters',
+        type=int,
+        default=20,
+        help='iterations of every solver in the throughput table')
+    parser.add_argument(
+        '--dtype',
+        default='float32',
+        choices=['float32', 'bfloat16', 'float64'],
+        help='compute dtype of the log-domain solvers')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device used for benchmark')
+    args = parser.parse_args()
+    return args
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def best_time(func, repeat, device):
+    costs = []
+    for _ in range(repeat + 1):
+        synchronize(device)
+        start = time.perf_counter()
+        func()
+        synchronize(device)
+        costs.append(time.perf_counter() - start)
+    # the first run is a warm up
+    return min(costs[1:])
+
+
+def main():
+    args = parse_args()
+    dtype = getattr(torch, args.dtype)
+    M = torch.rand(
+        args.num_problems,
+        args.num_samples,
+        args.num_centroids,
+        device=args.device) * 2 - 1
+
+    print('Convergence (max L1 marginal error over the problems)')
+    print(f'{"iters":>6} {"sinkhorn":>10} {"apdagd":>10}')
+    for num_iter in args.iters:
+        _, _, sinkhorn_err = log_sinkhorn(
+            M, max_iter=num_iter, tol=None, dtype=dtype)
+        _, _, apdagd_err = log_apdagd(
+            M, max_iter=num_iter, tol=None, dtype=dtype)
+        print(f'{num_iter:>6} {sinkhorn_err.max().item():>10.2e} '
+              f'{apdagd_err.max().item():>10.2e}')
+
+    max_iter = args.throughput_iters
+    print(f'\nThroughput ({args.num_problems} problems, {max_iter} '
+          'iterations without early stop)')
+    solvers = {
+        'legacy agd (per problem)':
+        lambda: [agd_torch_no_grad_gpu(m, max_iter=max_iter) for m in M],
+        'legacy sinkhorn (per problem)':
+        lambda: [approx_ot(m, max_iter=max_iter) for m in M],
+        'log_sinkhorn (batched)':
+        lambda: log_sinkhorn(M, max_iter=max_iter, tol=None, dtype=dtype),
+        'log_apdagd (batched)':
+        lambda: log_apdagd(M, max_iter=max_iter, tol=None, dtype=dtype),
+    }
+    for name, solve in solvers.items():
+        cost = best_time(solve, args.repeat, args.device)
+        print(f'{name:>30}: {args.num_problems / cost:>10.1f} problems/s')
+
+
+if __name__ == '__main__':
+    main()
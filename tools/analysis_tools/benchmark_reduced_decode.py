@@ -0,0 +1,160 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import copy
+import glob
+import os.path as osp
+import random
+import tempfile
+import time
+
+import mmcv
+import numpy as np
+import torch
+
+from mmcls.datasets.pipelines import Compose
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.JPG', '.JPEG')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the throughput and the fidelity of reduced '
+        'size JPEG decoding in LoadImageFromFile')
+    parser.add_argument(
+        '--img-dir',
+        default=None,
+        help='directory of JPEGs, searched recursively. Synthetic photos '
+        'are written to a temporary directory by default')
+    parser.add_argument(
+        '--num-images', type=int, default=50, help='number of images, at most')
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        nargs=2,
+        default=[3000, 4000],
+        help='height and width of the synthetic images')
+    parser.add_argument(
+        '--config',
+        default=None,
+        help='config of a model whose top-1 predictions on the test '
+        'pipeline are compared between both decodings')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device of the model')
+    args = parser.parse_args()
+    return args
+
+
+def make_images(root, num_images, image_size):
+    """Write smooth noisy JPEGs, whose size is close to natural photos."""
+    rng = np.random.default_rng(0)
+    h, w = image_size
+    ys, xs = np.mgrid[0:h, 0:w].astype(np.float32)
+    for i in range(num_images):
+        phase = rng.uniform(0, 2 * np.pi, size=3)
+        img = np.stack([
+            127 + 100 * np.sin(xs / (40 + 20 * c) + ys / 60 + phase[c])
+            for c in range(3)
+        ], -1)
+        img += rng.normal(0, 8, size=img.shape).astype(np.float32)
+        mmcv.imwrite(
+            np.clip(img, 0, 255).astype(np.uint8),
+            osp.join(root, f'{i:04d}.jpg'))
+
+
+def build_pipeline(transforms, reduced_decode):
+    transforms = copy.deepcopy(transforms)
+    assert transforms[0]['type'] == 'LoadImageFromFile'
+    transforms[0]['reduced_decode'] = reduced_decode
+    return Compose(transforms)
+
+
+def run(pipeline, filenames, seed=0):
+    outputs = []
+    random.seed(seed)
+    np.random.seed(seed)
+    start = time.perf_counter()
+    for filename in filenames:
+        outputs.append(
+            pipeline(dict(img_prefix=None, img_info=dict(filename=filename))))
+    return len(filenames) / (time.perf_counter() - start), outputs
+
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64))**2)
+    return float('inf') if mse == 0 else 10 * np.log10(255**2 / mse)
+
+
+def compare_predictions(args, filenames):
+    from mmcls.apis import init_model
+    from mmcv.parallel import collate, scatter
+
+    model = init_model(args.config, args.checkpoint, device=args.device)
+    transforms = model.cfg.data.test.pipeline
+    predictions = []
+    for reduced_decode in (False, True):
+        pipeline = build_pipeline(transforms, reduced_decode)
+        labels = []
+        for filename in filenames:
+            data = pipeline(
+                dict(img_prefix=None, img_info=dict(filename=filename)))
+            data = collate([data], samples_per_gpu=1)
+            if next(model.parameters()).is_cuda:
+                data = scatter(data, [args.device])[0]
+            with torch.no_grad():
+                scores = model(return_loss=False, **data)
+            labels.append(int(np.argmax(scores[0])))
+        predictions.append(np.array(labels))
+    return (predictions[0] == predictions[1]).mean()
+
+
+def main():
+    args = parse_args()
+    pipelines = dict(
+        test=[
+            dict(type='LoadImageFromFile'),
+            dict(type='Resize', size=(256, -1)),
+            dict(type='CenterCrop', crop_size=224)
+        ],
+        train=[
+            dict(type='LoadImageFromFile'),
+            dict(type='RandomResizedCrop', size=224)
+        ])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        img_dir = args.img_dir
+        if img_dir is None:
+            img_dir = tmpdir
+            make_images(img_dir, args.num_images, args.image_size)
+        filenames = sorted(
+            path for path in glob.glob(
+                osp.join(img_dir, '**', '*'), recursive=True)
+            if path.endswith(IMG_EXTENSIONS))[:args.num_images]
+        assert filenames, f'No JPEG found in {img_dir}'
+        h, w = mmcv.imread(filenames[0]).shape[:2]
+        print(f'{len(filenames)} images, the first one of {h}x{w}')
+
+        print(f'{"pipeline":<10}{"full img/s":>12}{"reduced img/s":>15}'
+              f'{"speedup":>9}{"PSNR dB":>9}{"mean scale":>12}')
+        for name, transforms in pipelines.items():
+            # the crops of both runs are sampled from the same seed
+            full_rate, full = run(build_pipeline(transforms, False), filenames)
+            reduced_rate, reduced = run(
+                build_pipeline(transforms, True), filenames)
+            quality = np.mean(
+                [psnr(a['img'], b['img']) for a, b in zip(full, reduced)])
+            scale = np.mean([b['decode_scale'] for b in reduced])
+            print(f'{name:<10}{full_rate:>12.1f}{reduced_rate:>15.1f}'
+                  f'{reduced_rate / full_rate:>8.2f}x{quality:>9.1f}'
+                  f'{scale:>12.1f}')
+
+        if args.config is not None:
+            agreement = compare_predictions(args, filenames)
+            print(f'top-1 agreement of full and reduced decoding on the '
+                  f'test pipeline: {agreement * 100:.2f}%')
+
+
+if __name__ == '__main__':
+    main()
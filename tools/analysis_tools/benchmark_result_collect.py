@@ -0,0 +1,113 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os.path as osp
+import pickle
+import socket
+import tempfile
+import time
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from mmcls.apis.test import (_init_result_part, _write_result_part,
+                             collect_results_cpu, collect_results_tensor)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the collection of the test results of the '
+        'ranks by pickles in a shared directory against tensors')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        default=50000,
+        help='number of samples of the dataset')
+    parser.add_argument(
+        '--num-classes', type=int, default=1000, help='number of classes')
+    parser.add_argument(
+        '--world-size', type=int, default=2, help='number of processes')
+    parser.add_argument(
+        '--backend',
+        default='nccl' if torch.cuda.is_available() else 'gloo',
+        help='backend of the process group')
+    parser.add_argument(
+        '--topk',
+        type=int,
+        default=5,
+        help='k of the collection of the top k scores')
+    args = parser.parse_args()
+    return args
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def timed(func):
+    dist.barrier()
+    start = time.perf_counter()
+    result = func()
+    dist.barrier()
+    return time.perf_counter() - start, result
+
+
+def run(rank, args, port, tmpdir, queue):
+    if args.backend == 'nccl':
+        torch.cuda.set_device(rank)
+    dist.init_process_group(
+        args.backend,
+        init_method=f'tcp://127.0.0.1:{port}',
+        rank=rank,
+        world_size=args.world_size)
+    # the samples of a rank, as ordered by DistributedSampler
+    indices = list(range(rank, args.num_samples, args.world_size))
+    rng = np.random.default_rng(rank)
+    scores = rng.random((len(indices), args.num_classes), dtype=np.float32)
+
+    costs = {}
+    costs['pickles in a directory'], _ = timed(lambda: collect_results_cpu(
+        list(scores), args.num_samples, osp.join(tmpdir, 'parts')))
+    costs['pickles in a directory, payload'] = len(pickle.dumps(list(scores)))
+    for name, topk in [('tensor', None),
+                       (f'tensor, top-{args.topk}', args.topk)]:
+
+        def collect():
+            # the rows are written batch by batch during the test
+            part = _init_result_part(indices, args.num_classes, topk)
+            _write_result_part(part, 0, torch.from_numpy(scores), topk)
+            return collect_results_tensor(part, args.num_samples,
+                                          args.num_classes, topk)
+
+        costs[name], _ = timed(collect)
+        costs[name + ', payload'] = _init_result_part(
+            indices, args.num_classes, topk).numel() * 4
+    if rank == 0:
+        queue.put(costs)
+    dist.destroy_process_group()
+
+
+def main():
+    args = parse_args()
+    queue = mp.get_context('spawn').SimpleQueue()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mp.spawn(
+            run,
+            args=(args, free_port(), tmpdir, queue),
+            nprocs=args.world_size)
+    costs = queue.get()
+    print(f'{args.num_samples} samples of {args.num_classes} classes on '
+          f'{args.world_size} ranks, {args.backend}')
+    print(f'{"collection":<32}{"seconds":>10}{"MB per rank":>14}')
+    for name in [
+            'pickles in a directory', 'tensor', f'tensor, top-{args.topk}'
+    ]:
+        print(f'{name:<32}{costs[name]:>10.2f}'
+              f'{costs[name + ", payload"] / 1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
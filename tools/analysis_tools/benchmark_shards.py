@@ -0,0 +1,163 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os
+import os.path as osp
+import subprocess
+import tempfile
+import time
+
+import mmcv
+import numpy as np
+
+from mmcls.datasets import (ImageNet, ShardedDataset, build_dataloader,
+                            write_shards)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the loading throughput of a folder dataset '
+        'and of its tar shards')
+    parser.add_argument(
+        '--data-prefix',
+        default=None,
+        help='ImageNet style folder to read, a synthetic one is generated '
+        'in a temporary directory by default')
+    parser.add_argument(
+        '--shard-dir',
+        default=None,
+        help='shards of --data-prefix packed by tools/misc/pack_shards.py, '
+        'packed in a temporary directory by default')
+    parser.add_argument(
+        '--num-images',
+        type=int,
+        default=5000,
+        help='number of synthetic images')
+    parser.add_argument(
+        '--num-classes',
+        type=int,
+        default=50,
+        help='number of synthetic classes')
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        nargs=2,
+        default=[375, 500],
+        help='height and width of the synthetic images')
+    parser.add_argument(
+        '--shard-size', type=float, default=256, help='shard size in MiB')
+    parser.add_argument(
+        '--batch-size', type=int, default=64, help='batch size')
+    parser.add_argument(
+        '--workers', type=int, default=4, help='number of loading workers')
+    parser.add_argument(
+        '--repeat', type=int, default=2, help='number of timed epochs')
+    parser.add_argument(
+        '--drop-caches',
+        action='store_true',
+        help='drop the page cache before every epoch to measure cold reads, '
+        'which needs root')
+    args = parser.parse_args()
+    return args
+
+
+def make_images(root, num_images, num_classes, image_size):
+    """Write smooth noisy JPEGs, whose size is close to natural images."""
+    rng = np.random.default_rng(0)
+    h, w = image_size
+    ys, xs = np.mgrid[0:h, 0:w]
+    for i in range(num_images):
+        folder = osp.join(root, f'class{i % num_classes:04d}')
+        os.makedirs(folder, exist_ok=True)
+        phase = rng.uniform(0, 2 * np.pi, size=3)
+        img = np.stack([
+            127 + 100 * np.sin(xs / (20 + 10 * c) + ys / 30 + phase[c])
+            for c in range(3)
+        ], -1)
+        img += rng.normal(0, 12, size=img.shape)
+        mmcv.imwrite(
+            np.clip(img, 0, 255).astype(np.uint8),
+            osp.join(folder, f'{i:08d}.JPEG'))
+
+
+def pack(dataset, out_dir, shard_size):
+    order = np.random.default_rng(0).permutation(len(dataset)).tolist()
+    gt_labels = dataset.get_gt_labels()
+
+    def samples():
+        for idx in order:
+            filename = dataset.data_infos.get_filename(idx)
+            with open(osp.join(dataset.data_prefix, filename), 'rb') as f:
+                yield filename, f.read(), int(gt_labels[idx])
+
+    write_shards(samples(), out_dir, shard_size=int(shard_size * (1 << 20)))
+
+
+def drop_caches():
+    subprocess.run(['sync'], check=True)
+    with open('/proc/sys/vm/drop_caches', 'w') as f:
+        f.write('3\n')
+
+
+def images_per_second(dataset, args):
+    data_loader = build_dataloader(
+        dataset,
+        args.batch_size,
+        args.workers,
+        dist=False,
+        shuffle=True,
+        persistent_workers=False)
+    rates = []
+    for epoch in range(args.repeat):
+        if hasattr(data_loader.sampler, 'set_epoch'):
+            data_loader.sampler.set_epoch(epoch)
+        if args.drop_caches:
+            drop_caches()
+        start = time.perf_counter()
+        for _ in data_loader:
+            pass
+        rates.append(len(dataset) / (time.perf_counter() - start))
+    return max(rates)
+
+
+def pipeline(load):
+    return [
+        dict(type=load),
+        dict(type='RandomResizedCrop', size=224),
+        dict(type='ImageToTensor', keys=['img']),
+        dict(type='ToTensor', keys=['gt_label']),
+        dict(type='Collect', keys=['img', 'gt_label'])
+    ]
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        data_prefix = args.data_prefix
+        if data_prefix is None:
+            data_prefix = osp.join(tmpdir, 'folder')
+            make_images(data_prefix, args.num_images, args.num_classes,
+                        args.image_size)
+        folder_dataset = ImageNet(
+            data_prefix=data_prefix,
+            pipeline=pipeline('LoadImageFromFile'),
+            scan_cfg=dict(cache=False))
+
+        shard_dir = args.shard_dir
+        if shard_dir is None:
+            shard_dir = osp.join(tmpdir, 'shards')
+            pack(folder_dataset, shard_dir, args.shard_size)
+        sharded_dataset = ShardedDataset(
+            data_prefix=shard_dir, pipeline=pipeline('LoadImageFromShard'))
+        num_shards = len(sharded_dataset.shards)
+
+        print(f'{len(folder_dataset)} images, {num_shards} shards, '
+              f'{args.workers} workers, batch size {args.batch_size}, '
+              f'{"cold" if args.drop_caches else "warm"} page cache')
+        for name, dataset in [('folder', folder_dataset),
+                              ('shards', sharded_dataset)]:
+            rate = images_per_second(dataset, args)
+            print(f'{name:<8} {rate:9.1f} images/s')
+
+
+if __name__ == '__main__':
+    main()
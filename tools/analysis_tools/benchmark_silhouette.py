@@ -0,0 +1,95 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import torch
+from sklearn.metrics import silhouette_score
+
+from mmcls.models.heads.SubCentroids_head_Formal import \
+    batched_cosine_silhouette
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark sklearn and torch cosine silhouette scoring')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        nargs='+',
+        default=[256, 1024, 4096],
+        help='numbers of samples of one class to benchmark')
+    parser.add_argument(
+        '--candidates',
+        type=int,
+        nargs='+',
+        default=[2, 4, 6, 8, 10],
+        help='candidate numbers of sub-centroids')
+    parser.add_argument(
+        '--channels', type=int, default=512, help='feature dimension')
+    parser.add_argument(
+        '--sample-size',
+        type=int,
+        default=None,
+        help='estimate the torch scores on this many samples')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device used for benchmark')
+    args = parser.parse_args()
+    return args
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def best_time(func, repeat, device):
+    costs = []
+    for _ in range(repeat + 1):
+        synchronize(device)
+        start = time.perf_counter()
+        result = func()
+        synchronize(device)
+        costs.append(time.perf_counter() - start)
+    # the first run is a warm up
+    return min(costs[1:]), result
+
+
+def main():
+    args = parse_args()
+    max_k = max(args.candidates)
+    print(f'{"samples":>8} {"sklearn (s)":>12} {"torch (s)":>10} '
+          f'{"speedup":>8} {"max |diff|":>11}')
+    for num_samples in args.num_samples:
+        feats = torch.randn(num_samples, args.channels, device=args.device)
+        cluster_labels = torch.stack([
+            torch.randint(0, k, (num_samples, ), device=args.device)
+            for k in args.candidates
+        ])
+
+        def run_sklearn():
+            # the original path: one device sync and CPU copy per candidate
+            return [
+                silhouette_score(
+                    feats.cpu().numpy(),
+                    labels.cpu().numpy(),
+                    metric='cosine') for labels in cluster_labels
+            ]
+
+        def run_torch():
+            return batched_cosine_silhouette(feats, cluster_labels, max_k,
+                                             args.sample_size).tolist()
+
+        sklearn_time, expected = best_time(run_sklearn, args.repeat,
+                                           args.device)
+        torch_time, scores = best_time(run_torch, args.repeat, args.device)
+        diff = max(abs(a - b) for a, b in zip(expected, scores))
+        print(f'{num_samples:>8} {sklearn_time:>12.4f} {torch_time:>10.4f} '
+              f'{sklearn_time / torch_time:>7.1f}x {diff:>11.2e}')
+
+
+if __name__ == '__main__':
+    main()
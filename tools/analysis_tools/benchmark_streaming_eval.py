@@ -0,0 +1,106 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from mmcls.datasets import BaseDataset
+
+METRICS = ['accuracy', 'precision', 'recall', 'f1_score', 'support']
+
+
+class ScoredDataset(BaseDataset):
+    """A test dataset of random ground truth labels."""
+
+    CLASSES = None
+
+    def __init__(self, gt_labels):
+        self.gt_labels = gt_labels
+
+    def load_annotations(self):
+        pass
+
+    def get_gt_labels(self):
+        return self.gt_labels
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the evaluation of the results kept for the '
+        'whole dataset against the streaming evaluation')
+    parser.add_argument(
+        '--num-samples',
+        type=int,
+        default=10000,
+        help='number of predictions, e.g. 50000 for the ImageNet val set')
+    parser.add_argument(
+        '--num-classes',
+        type=int,
+        nargs='+',
+        default=[1000, 21843],
+        help='numbers of classes')
+    parser.add_argument(
+        '--batch-size', type=int, default=256, help='batch size')
+    args = parser.parse_args()
+    return args
+
+
+def batches(args, num_classes):
+    rng = np.random.default_rng(0)
+    for _ in range(args.num_samples // args.batch_size):
+        yield rng.random((args.batch_size, num_classes), dtype=np.float32)
+
+
+def keep_results(args, dataset, num_classes, metric_options):
+    results = []
+    for scores in batches(args, num_classes):
+        results.extend(scores)
+    return dataset.evaluate(
+        results, metric=METRICS, metric_options=metric_options), 0
+
+
+def streaming(args, dataset, num_classes, metric_options):
+    evaluator = dataset.build_streaming_evaluator(METRICS, metric_options)
+    for i, scores in enumerate(batches(args, num_classes)):
+        start = i * args.batch_size
+        evaluator.update(scores, dataset.gt_labels[start:start + len(scores)])
+    state_bytes = sum(state.numel() * state.element_size()
+                      for metric in evaluator.metrics
+                      for state in metric.states.values())
+    return dataset.evaluate(
+        evaluator, metric=METRICS, metric_options=metric_options), state_bytes
+
+
+def main():
+    args = parse_args()
+    num_samples = args.num_samples // args.batch_size * args.batch_size
+    metric_options = dict(topk=(1, 5))
+    print(f'{num_samples} samples, batch size {args.batch_size}')
+    print(f'{"evaluation":<30}{"seconds":>10}{"peak MB":>10}')
+    for num_classes in args.num_classes:
+        rng = np.random.default_rng(1)
+        dataset = ScoredDataset(rng.integers(0, num_classes, num_samples))
+        eval_results = []
+        print(f'C={num_classes}')
+        for name, func in [('results kept', keep_results),
+                           ('streaming', streaming)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            eval_result, state_bytes = func(args, dataset, num_classes,
+                                            metric_options)
+            cost = time.perf_counter() - start
+            # the numpy arrays are traced, the states of the torch tensors
+            # are counted apart
+            peak = tracemalloc.get_traced_memory()[1] + state_bytes
+            tracemalloc.stop()
+            eval_results.append(eval_result)
+            print(f'    {name:<26}{cost:>10.2f}{peak / 1e6:>10.1f}')
+        diff = max(
+            abs(eval_results[0][key] - eval_results[1][key])
+            for key in eval_results[0])
+        print(f'    max difference of the metrics: {diff:.2e}')
+
+
+if __name__ == '__main__':
+    main()
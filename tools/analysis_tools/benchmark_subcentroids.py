@@ -0,0 +1,87 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from mmcls.models.heads import SubCentroids_Head_Formal
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark per-class and batched sub-centroid clustering')
+    parser.add_argument(
+        '--num-classes',
+        type=int,
+        nargs='+',
+        default=[10, 100, 1000],
+        help='numbers of classes to benchmark')
+    parser.add_argument(
+        '--samples-per-class',
+        type=int,
+        default=64,
+        help='average number of memory bank samples of every class')
+    parser.add_argument(
+        '--channels', type=int, default=512, help='feature dimension')
+    parser.add_argument(
+        '--repeat', type=int, default=3, help='number of timed runs')
+    parser.add_argument(
+        '--device',
+        default='cuda' if torch.cuda.is_available() else 'cpu',
+        help='device used for benchmark')
+    args = parser.parse_args()
+    return args
+
+
+def synchronize(device):
+    if torch.device(device).type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def time_update(head, update, inputs, repeat, device):
+    # no class is searched, only the clustering and prototype update are
+    # compared here
+    feats, labels, masks, mask = inputs
+    costs = []
+    for _ in range(repeat + 1):
+        centroids = head.prototypes.data.clone()
+        target = labels.clone().float()
+        synchronize(device)
+        start = time.perf_counter()
+        update(feats, labels, masks, mask, centroids, target)
+        synchronize(device)
+        costs.append(time.perf_counter() - start)
+    # the first run is a warm up
+    return min(costs[1:])
+
+
+def main():
+    args = parse_args()
+    print(f'{"classes":>8} {"per-class (s)":>14} {"batched (s)":>12} '
+          f'{"speedup":>8}')
+    for num_classes in args.num_classes:
+        head = SubCentroids_Head_Formal(
+            num_classes=num_classes, in_channels=args.channels).to(args.device)
+
+        num_samples = num_classes * args.samples_per_class
+        feats = F.normalize(
+            torch.randn(num_samples, args.channels, device=args.device),
+            dim=-1)
+        labels = torch.randint(
+            0, num_classes, (num_samples, ), device=args.device)
+        with torch.no_grad():
+            masks = torch.einsum('nd,kmd->nmk', feats, head.prototypes)
+        mask = torch.rand(num_samples, device=args.device) > 0.3
+        inputs = (feats, labels, masks, mask)
+
+        per_class = time_update(head, head.per_class_subcentroids_update,
+                                inputs, args.repeat, args.device)
+        batched = time_update(head, head.batched_subcentroids_update, inputs,
+                              args.repeat, args.device)
+        print(f'{num_classes:>8} {per_class:>14.4f} {batched:>12.4f} '
+              f'{per_class / batched:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import asyncio
+import json
+import time
+
+import cv2
+import numpy as np
+import torch
+from mmcls_server import InferenceServer, build_batcher
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the micro-batching inference server by '
+        'concurrent clients sending JPEGs')
+    parser.add_argument(
+        'config',
+        nargs='?',
+        default=None,
+        help='config file of the model served in the process of the '
+        'benchmark')
+    parser.add_argument(
+        '--inference-addr',
+        default=None,
+        help='address and port of a running server, instead of the config')
+    parser.add_argument(
+        '--checkpoint', default=None, help='checkpoint of the PyTorch model')
+    parser.add_argument(
+        '--backend',
+        default='pytorch',
+        choices=['pytorch', 'torchscript', 'onnxruntime'],
+        help='backend of the model')
+    parser.add_argument(
+        '--model-file',
+        default=None,
+        help='model exported by pytorch2torchscript.py or pytorch2onnx.py')
+    parser.add_argument(
+        '--device',
+        default='cuda:0' if torch.cuda.is_available() else 'cpu',
+        help='device of the model')
+    parser.add_argument(
+        '--max-batch-size',
+        type=int,
+        nargs='+',
+        default=[1, 8, 32],
+        help='maximum batch sizes of the servers in the process, 1 to '
+        'disable the batching')
+    parser.add_argument(
+        '--max-wait-ms',
+        type=float,
+        default=5.,
+        help='maximum wait for the images of a batch after its first one')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='number of preprocessing threads')
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        nargs='+',
+        default=[1, 16],
+        help='numbers of concurrent clients, each sending a request after '
+        'the result of the previous one')
+    parser.add_argument(
+        '--num-requests',
+        type=int,
+        default=128,
+        help='number of requests of a run')
+    parser.add_argument(
+        '--image-size',
+        type=int,
+        nargs=2,
+        default=[375, 500],
+        help='height and width of the synthetic JPEGs')
+    args = parser.parse_args()
+    if (args.config is None) == (args.inference_addr is None):
+        parser.error('Either the config or --inference-addr is needed.')
+    return args
+
+
+async def request(reader, writer, path, body=b''):
+    method = 'POST' if body else 'GET'
+    writer.write(f'{method} {path} HTTP/1.1\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        key, value = line.decode('latin-1').split(':', 1)
+        if key.strip().lower() == 'content-length':
+            length = int(value)
+    content = json.loads(await reader.readexactly(length))
+    if status != 200:
+        raise RuntimeError(f'{path}: {status} {content}')
+    return content
+
+
+async def client(host, port, images, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for image in images:
+            start = time.perf_counter()
+            await request(reader, writer, '/predictions/mmcls', image)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run(host, port, images, concurrency):
+    """Send the images by concurrent clients.
+
+    Returns:
+        tuple[float, ndarray]: The throughput in requests per second and the
+        latencies in milliseconds.
+    """
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, images[i::concurrency], latencies)
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    return len(images) / elapsed, np.array(latencies) * 1e3
+
+
+def print_run(name, throughput, latencies, server_stats=None):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    line = f'{name:<30}{throughput:>10.1f}{p50:>10.1f}{p99:>10.1f}'
+    if server_stats is not None:
+        line += f'{server_stats.get("batch_size_mean", 0):>10.1f}'
+    print(line)
+
+
+async def benchmark(args, images):
+    print(f'{args.num_requests} requests of {args.image_size} JPEGs')
+    print(f'{"server, clients":<30}{"req/s":>10}{"p50 ms":>10}'
+          f'{"p99 ms":>10}{"batch":>10}')
+    if args.inference_addr is not None:
+        host, port = args.inference_addr.rsplit(':', 1)
+        for concurrency in args.concurrency:
+            throughput, latencies = await run(host, int(port), images,
+                                              concurrency)
+            print_run(f'{args.inference_addr}, {concurrency}', throughput,
+                      latencies)
+        return
+    for max_batch_size in args.max_batch_size:
+        batcher = build_batcher(
+            args.config,
+            args.checkpoint,
+            backend=args.backend,
+            model_file=args.model_file,
+            device=args.device,
+            max_batch_size=max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+            num_workers=args.workers)
+        server = InferenceServer(batcher, port=0)
+        await server.start()
+        try:
+            # warm up
+            await run(server.host, server.port, images[:max_batch_size],
+                      max_batch_size)
+            for concurrency in args.concurrency:
+                batcher.stats.reset()
+                throughput, latencies = await run(server.host, server.port,
+                                                  images, concurrency)
+                print_run(f'batch {max_batch_size}, {concurrency}', throughput,
+                          latencies, batcher.stats.summary())
+        finally:
+            await server.stop()
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    images = [
+        cv2.imencode(
+            '.jpg',
+            rng.integers(0, 256, size=(*args.image_size, 3),
+                         dtype=np.uint8))[1].tobytes()
+        for _ in range(args.num_requests)
+    ]
+    asyncio.run(benchmark(args, images))
+
+
+if __name__ == '__main__':
+    main()
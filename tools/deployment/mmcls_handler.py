@@ -6,7 +6,7 @@ import mmcv
 import torch
 from ts.torch_handler.base_handler import BaseHandler
 
-from mmcls.apis import inference_model, init_model
+from mmcls.apis import inference_batch, init_model
 
 
 class MMclsHandler(BaseHandler):
@@ -40,10 +40,9 @@ class MMclsHandler(BaseHandler):
         return images
 
     def inference(self, data, *args, **kwargs):
-        results = []
-        for image in data:
-            results.append(inference_model(self.model, image))
-        return results
+        # the images of a request are inferred as one batch
+        return inference_batch(
+            self.model, data, batch_size=len(data), num_workers=0)
 
     def postprocess(self, data):
         for result in data:
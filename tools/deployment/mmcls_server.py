@@ -0,0 +1,522 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import mmcv
+import numpy as np
+import torch
+
+from mmcls.apis import build_test_pipeline, init_model
+from mmcls.datasets import DATASETS
+from mmcls.utils import get_root_logger
+
+
+class PyTorchBackend:
+    """Run the batches with a classifier of mmcls."""
+
+    def __init__(self, model):
+        self.model = model
+        self.device = next(model.parameters()).device
+        self.max_batch_size = None
+
+    def __call__(self, img):
+        with torch.no_grad():
+            return self.model(
+                img=img.to(self.device), return_loss=False,
+                post_process=False).cpu()
+
+
+class TorchScriptBackend:
+    """Run the batches with a model exported by ``pytorch2torchscript.py``."""
+
+    def __init__(self, model_file, device='cpu'):
+        self.model = torch.jit.load(model_file, map_location=device)
+        self.device = torch.device(device)
+        self.max_batch_size = None
+
+    def __call__(self, img):
+        with torch.no_grad():
+            return self.model(img.to(self.device)).cpu()
+
+
+class ONNXRuntimeBackend:
+    """Run the batches with a model exported by ``pytorch2onnx.py``.
+
+    The models exported without ``--dynamic-export`` have a fixed batch size,
+    the batches are padded to it.
+    """
+
+    def __init__(self, model_file, device='cpu'):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError('Please install onnxruntime to serve the ONNX '
+                              'models.')
+        providers = ['CPUExecutionProvider']
+        if torch.device(device).type == 'cuda':
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.sess = ort.InferenceSession(model_file, providers=providers)
+        self.input_name = self.sess.get_inputs()[0].name
+        batch_size = self.sess.get_inputs()[0].shape[0]
+        self.max_batch_size = batch_size if isinstance(batch_size,
+                                                       int) else None
+
+    def __call__(self, img):
+        num_samples = len(img)
+        if self.max_batch_size is not None:
+            img = torch.cat([
+                img, img[-1:].expand(self.max_batch_size - num_samples, -1, -1,
+                                     -1)
+            ])
+        scores = self.sess.run(None, {self.input_name: img.numpy()})[0]
+        return torch.from_numpy(scores[:num_samples])
+
+
+class ServerStats:
+    """Latency and throughput statistics of the last requests and batches.
+
+    Args:
+        window (int): The number of requests and of batches kept.
+            Defaults to 10000.
+    """
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.latencies = deque(maxlen=self.window)
+        self.queue_times = deque(maxlen=self.window)
+        self.batch_sizes = deque(maxlen=self.window)
+        self.batch_times = deque(maxlen=self.window)
+        self.num_requests = 0
+        self.num_errors = 0
+        self.start = None
+        self.last = None
+
+    def add_request(self, arrival, latency, queue_time):
+        if self.start is None:
+            self.start = arrival
+        self.last = arrival + latency
+        self.num_requests += 1
+        self.latencies.append(latency)
+        self.queue_times.append(queue_time)
+
+    def add_batch(self, batch_size, batch_time):
+        self.batch_sizes.append(batch_size)
+        self.batch_times.append(batch_time)
+
+    def summary(self):
+        """The statistics, with the times in milliseconds.
+
+        Returns:
+            dict: The number of requests and errors, the throughput in
+            requests per second, the mean and percentiles of the latency from
+            the arrival of a request to its result, the mean time in the
+            queue, and the mean size and inference time of the batches.
+        """
+        summary = dict(
+            num_requests=self.num_requests, num_errors=self.num_errors)
+        if self.num_requests == 0:
+            return summary
+        elapsed = self.last - self.start
+        if elapsed > 0:
+            summary['throughput'] = self.num_requests / elapsed
+        latencies = np.array(self.latencies) * 1e3
+        summary['latency_mean'] = float(latencies.mean())
+        for percentile in (50, 90, 99):
+            summary[f'latency_p{percentile}'] = float(
+                np.percentile(latencies, percentile))
+        summary['queue_time_mean'] = float(np.mean(self.queue_times) * 1e3)
+        if len(self.batch_sizes) > 0:
+            summary['batch_size_mean'] = float(np.mean(self.batch_sizes))
+            summary['batch_time_mean'] = float(np.mean(self.batch_times) * 1e3)
+        return summary
+
+
+class MicroBatcher:
+    """Gather the concurrent requests into dynamic micro-batches.
+
+    The images are decoded and preprocessed by a pool of threads, and queued.
+    A batch starts by the first image of the queue and takes the next ones,
+    until it has ``max_batch_size`` images or ``max_wait_ms`` milliseconds
+    passed. The batches are run one after the other in a thread apart from
+    the event loop, while the next requests are queued.
+
+    Args:
+        backend (callable): Compute the scores of a batch of images, e.g.
+            :class:`PyTorchBackend`.
+        pipeline (callable): The test pipeline of the loaded images, see
+            :func:`mmcls.apis.build_test_pipeline`.
+        max_batch_size (int): The maximum number of images of a batch.
+            Defaults to 32.
+        max_wait_ms (float): The maximum wait for the next images after the
+            first one of a batch. Defaults to 5.
+        topk (int): The number of predictions of an image. Defaults to 1.
+        classes (list[str], optional): The class names. Defaults to None.
+        num_workers (int): The number of preprocessing threads. Defaults to 4.
+        stats (:obj:`ServerStats`, optional): The statistics of the requests.
+            Defaults to None, i.e. a new one.
+    """
+
+    def __init__(self,
+                 backend,
+                 pipeline,
+                 max_batch_size=32,
+                 max_wait_ms=5.,
+                 topk=1,
+                 classes=None,
+                 num_workers=4,
+                 stats=None):
+        self.backend = backend
+        self.pipeline = pipeline
+        if getattr(backend, 'max_batch_size', None) is not None:
+            max_batch_size = min(max_batch_size, backend.max_batch_size)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self.topk = topk
+        self.classes = classes
+        self.num_workers = num_workers
+        self.stats = ServerStats() if stats is None else stats
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._preprocess_executor = ThreadPoolExecutor(self.num_workers)
+        self._infer_executor = ThreadPoolExecutor(1)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._preprocess_executor.shutdown()
+        self._infer_executor.shutdown()
+
+    def _preprocess(self, img):
+        if isinstance(img, bytes):
+            img = mmcv.imfrombytes(img)
+            if img is None:
+                raise ValueError('the image cannot be decoded')
+        return self.pipeline(dict(img=img))['img'].data
+
+    async def infer(self, img):
+        """Classify an image.
+
+        Args:
+            img (bytes | ndarray): The encoded or loaded image.
+
+        Returns:
+            dict: The classification result with the `pred_label`,
+            `pred_score` and `pred_class` of
+            :func:`mmcls.apis.inference_batch_iter`.
+        """
+        loop = asyncio.get_event_loop()
+        arrival = time.perf_counter()
+        try:
+            img = await loop.run_in_executor(self._preprocess_executor,
+                                             self._preprocess, img)
+            future = loop.create_future()
+            await self._queue.put((img, future, arrival, time.perf_counter()))
+            result, queue_time = await future
+        except Exception:
+            self.stats.num_errors += 1
+            raise
+        self.stats.add_request(arrival,
+                               time.perf_counter() - arrival, queue_time)
+        return result
+
+    async def _next_batch(self):
+        loop = asyncio.get_event_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(),
+                                                    timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _infer(self, imgs):
+        start = time.perf_counter()
+        scores = self.backend(torch.stack(imgs))
+        pred_score, pred_label = scores.topk(
+            min(self.topk, scores.size(1)), dim=1)
+        self.stats.add_batch(len(imgs), time.perf_counter() - start)
+        return pred_score.numpy(), pred_label.numpy(), start
+
+    def _result(self, scores, labels):
+        if self.topk == 1:
+            result = {
+                'pred_label': int(labels[0]),
+                'pred_score': float(scores[0])
+            }
+            if self.classes is not None:
+                result['pred_class'] = self.classes[labels[0]]
+        else:
+            result = {
+                'pred_label': labels.tolist(),
+                'pred_score': scores.tolist()
+            }
+            if self.classes is not None:
+                result['pred_class'] = [self.classes[i] for i in labels]
+        return result
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = await self._next_batch()
+            imgs, futures, _, queued = zip(*batch)
+            try:
+                pred_score, pred_label, start = await loop.run_in_executor(
+                    self._infer_executor, self._infer, imgs)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for future, scores, labels, queue_time in zip(
+                    futures, pred_score, pred_label, queued):
+                # the requests may be cancelled by their clients meanwhile
+                if not future.done():
+                    future.set_result(
+                        (self._result(scores, labels), start - queue_time))
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, value = line.decode('latin-1').split(':', 1)
+        headers[key.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, path, headers, body
+
+
+def _write_response(writer, status, content):
+    body = json.dumps(content).encode()
+    reason = {
+        200: 'OK',
+        400: 'Bad Request',
+        404: 'Not Found'
+    }.get(status, 'Internal Server Error')
+    writer.write(f'HTTP/1.1 {status} {reason}\r\n'
+                 'Content-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+
+
+class InferenceServer:
+    """An HTTP/1.1 server of a :class:`MicroBatcher`, with the routes of
+    TorchServe.
+
+    - ``POST /predictions/<model_name>``: classify the image of the body.
+    - ``GET /ping``: the health of the server.
+    - ``GET /stats``: the summary of :class:`ServerStats`.
+
+    Args:
+        batcher (:obj:`MicroBatcher`): The batcher of the requests.
+        host (str): The host of the server. Defaults to '127.0.0.1'.
+        port (int): The port of the server, 0 for any free one.
+            Defaults to 8080.
+    """
+
+    def __init__(self, batcher, host='127.0.0.1', port=8080):
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        await self.batcher.start()
+        self._server = await asyncio.start_server(self._handle, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        await self.batcher.stop()
+
+    async def _respond(self, method, path, body):
+        if method == 'GET' and path == '/ping':
+            return 200, {'status': 'Healthy'}
+        if method == 'GET' and path == '/stats':
+            return 200, self.batcher.stats.summary()
+        if method in ('POST', 'PUT') and (path == '/predictions'
+                                          or path.startswith('/predictions/')):
+            try:
+                return 200, await self.batcher.infer(body)
+            except (ValueError, TypeError, AttributeError) as e:
+                return 400, {'message': f'Invalid image: {e}'}
+        return 404, {'message': f'Unknown request {method} {path}'}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, content = await self._respond(method, path, body)
+                except Exception as e:
+                    status, content = 500, {'message': str(e)}
+                _write_response(writer, status, content)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def build_batcher(config,
+                  checkpoint=None,
+                  backend='pytorch',
+                  model_file=None,
+                  device='cpu',
+                  **kwargs):
+    """Build the batcher of a model.
+
+    Args:
+        config (str | :obj:`mmcv.Config`): The config of the model, for its
+            test pipeline.
+        checkpoint (str, optional): The checkpoint of the PyTorch model.
+            Defaults to None.
+        backend (str): 'pytorch', 'torchscript' or 'onnxruntime'.
+            Defaults to 'pytorch'.
+        model_file (str, optional): The exported model of the TorchScript and
+            ONNX Runtime backends. Defaults to None.
+        device (str): The device of the model. Defaults to 'cpu'.
+        **kwargs: The options of :class:`MicroBatcher`.
+
+    Returns:
+        :obj:`MicroBatcher`: The batcher.
+    """
+    if isinstance(config, str):
+        config = mmcv.Config.fromfile(config)
+    # the class names of the checkpoint, else the ones of the dataset
+    classes = getattr(DATASETS.get(config.data.test.type), 'CLASSES', None)
+    if backend == 'pytorch':
+        model = init_model(config, checkpoint, device=device)
+        classes = getattr(model, 'CLASSES', classes)
+        runner = PyTorchBackend(model)
+    else:
+        if model_file is None:
+            raise ValueError(f'The {backend} backend needs the model file.')
+        if backend == 'torchscript':
+            runner = TorchScriptBackend(model_file, device)
+        elif backend == 'onnxruntime':
+            runner = ONNXRuntimeBackend(model_file, device)
+        else:
+            raise ValueError(f'Unsupported backend {backend}.')
+    kwargs.setdefault('classes', classes)
+    return MicroBatcher(runner, build_test_pipeline(config, False), **kwargs)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Serve a classifier over HTTP, with dynamic '
+        'micro-batching of the concurrent requests')
+    parser.add_argument('config', help='config file of the model')
+    parser.add_argument(
+        '--checkpoint', default=None, help='checkpoint of the PyTorch model')
+    parser.add_argument(
+        '--backend',
+        default='pytorch',
+        choices=['pytorch', 'torchscript', 'onnxruntime'],
+        help='backend of the model')
+    parser.add_argument(
+        '--model-file',
+        default=None,
+        help='model exported by pytorch2torchscript.py or pytorch2onnx.py')
+    parser.add_argument(
+        '--device',
+        default='cuda:0' if torch.cuda.is_available() else 'cpu',
+        help='device of the model')
+    parser.add_argument('--host', default='127.0.0.1', help='server host')
+    parser.add_argument('--port', type=int, default=8080, help='server port')
+    parser.add_argument(
+        '--max-batch-size',
+        type=int,
+        default=32,
+        help='maximum number of images of a batch')
+    parser.add_argument(
+        '--max-wait-ms',
+        type=float,
+        default=5.,
+        help='maximum wait for the images of a batch after its first one')
+    parser.add_argument(
+        '--topk', type=int, default=1, help='number of predictions')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='number of preprocessing threads')
+    parser.add_argument(
+        '--stats-interval',
+        type=float,
+        default=60.,
+        help='interval in seconds of the statistics in the log, 0 to '
+        'disable them')
+    args = parser.parse_args()
+    return args
+
+
+async def serve(args):
+    logger = get_root_logger()
+    batcher = build_batcher(
+        args.config,
+        args.checkpoint,
+        backend=args.backend,
+        model_file=args.model_file,
+        device=args.device,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        topk=args.topk,
+        num_workers=args.workers)
+    server = InferenceServer(batcher, args.host, args.port)
+    await server.start()
+    logger.info(f'Serving the {args.backend} model on '
+                f'http://{args.host}:{server.port}/predictions')
+    try:
+        while True:
+            if args.stats_interval > 0:
+                await asyncio.sleep(args.stats_interval)
+                logger.info(f'Statistics: {batcher.stats.summary()}')
+            else:
+                await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -58,6 +58,9 @@ def pytorch2onnx(model,
             Default: False.
     """
     model.cpu().eval()
+    if hasattr(model.head, 'switch_to_deploy'):
+        # export the packed subcentroids of SubCentroids_Head_Formal
+        model.head.switch_to_deploy()
 
     if hasattr(model.head, 'num_classes'):
         num_classes = model.head.num_classes
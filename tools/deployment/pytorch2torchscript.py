@@ -52,6 +52,9 @@ def pytorch2torchscript(model: nn.Module, input_shape: tuple, output_file: str,
             and TorchScript through loading generated output_file.
     """
     model.cpu().eval()
+    if hasattr(model.head, 'switch_to_deploy'):
+        # export the packed subcentroids of SubCentroids_Head_Formal
+        model.head.switch_to_deploy()
 
     num_classes = model.head.num_classes
     mm_inputs = _demo_mm_inputs(input_shape, num_classes)
@@ -0,0 +1,126 @@
+# Copyright (c) OpenMMLab. All rights reserved.
+import argparse
+import os.path as osp
+from concurrent.futures import ThreadPoolExecutor
+
+import mmcv
+import numpy as np
+from mmcv import Config, DictAction
+
+from mmcls.datasets import build_dataset, write_shards
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Pack the images of a dataset into tar shards read by '
+        'ShardedDataset')
+    parser.add_argument('config', help='config file path')
+    parser.add_argument('out_dir', help='output directory of the shards')
+    parser.add_argument(
+        '--phase',
+        default='train',
+        type=str,
+        choices=['train', 'test', 'val'],
+        help='phase of dataset to pack, accept "train" "test" and "val".')
+    parser.add_argument(
+        '--shard-size',
+        type=float,
+        default=1024,
+        help='maximum size of a shard in MiB')
+    parser.add_argument(
+        '--seed',
+        type=int,
+        default=0,
+        help='seed of the order in which the images are packed')
+    parser.add_argument(
+        '--no-shuffle',
+        action='store_true',
+        help='pack the images in dataset order. The shards are read '
+        'sequentially, so the images should be shuffled for training')
+    parser.add_argument(
+        '--prefix',
+        default=None,
+        help='prefix of the shards, the phase by default')
+    parser.add_argument(
+        '--num-threads',
+        type=int,
+        default=16,
+        help='number of threads reading the images')
+    parser.add_argument(
+        '--cfg-options',
+        nargs='+',
+        action=DictAction,
+        help='override some settings in the used config, the key-value pair '
+        'in xxx=yyy format will be merged into config file. If the value to '
+        'be overwritten is a list, it should be like key="[a,b]" or key=a,b '
+        'It also allows nested list/tuple values, e.g. key="[(a,b),(c,d)]" '
+        'Note that the quotation marks are necessary and that no white space '
+        'is allowed.')
+    args = parser.parse_args()
+    return args
+
+
+def iter_samples(dataset, order, num_threads, chunk_size=1024):
+    """Yield the file name, bytes and label of the images in ``order``,
+    reading the next chunk while the current one is written."""
+    file_client = mmcv.FileClient(backend='disk')
+    gt_labels = dataset.get_gt_labels()
+
+    def read(idx):
+        info = dataset.data_infos[idx]
+        filename = info['img_info']['filename']
+        path = filename
+        if info['img_prefix'] is not None:
+            path = osp.join(info['img_prefix'], filename)
+        return filename, file_client.get(path), int(gt_labels[idx])
+
+    chunks = [
+        order[i:i + chunk_size] for i in range(0, len(order), chunk_size)
+    ]
+    with ThreadPoolExecutor(max(num_threads, 1)) as executor:
+        pending = executor.map(read, chunks[0]) if chunks else []
+        for i in range(len(chunks)):
+            samples = list(pending)
+            if i + 1 < len(chunks):
+                pending = executor.map(read, chunks[i + 1])
+            yield from samples
+
+
+def main():
+    args = parse_args()
+    cfg = Config.fromfile(args.config)
+    if args.cfg_options is not None:
+        cfg.merge_from_dict(args.cfg_options)
+
+    # only the annotations are needed
+    dataset_cfg = cfg.data[args.phase]
+    dataset_cfg.pipeline = []
+    dataset = build_dataset(dataset_cfg)
+    assert np.ndim(dataset.get_gt_labels()) == 1, \
+        'Only single-label datasets can be packed.'
+    assert len(dataset) > 0 and 'img_info' in dataset.data_infos[0], \
+        'This tool is only for datasets that load images from files.'
+
+    order = np.arange(len(dataset))
+    if not args.no_shuffle:
+        np.random.default_rng(args.seed).shuffle(order)
+    order = order.tolist()
+
+    prog_bar = mmcv.ProgressBar(len(order))
+
+    def progress(samples):
+        for sample in samples:
+            yield sample
+            prog_bar.update()
+
+    index_path = write_shards(
+        progress(iter_samples(dataset, order, args.num_threads)),
+        args.out_dir,
+        shard_size=int(args.shard_size * (1 << 20)),
+        prefix=args.prefix or args.phase,
+        classes=dataset.CLASSES)
+    print(f'\nSaved the index of {len(order)} images to {index_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,7 +11,7 @@ from mmcv import DictAction
 from mmcv.parallel import MMDataParallel, MMDistributedDataParallel
 from mmcv.runner import get_dist_info, init_dist, load_checkpoint
 
-from mmcls.apis import multi_gpu_test, single_gpu_test
+from mmcls.apis import multi_gpu_test, single_gpu_test, streaming_test
 from mmcls.datasets import build_dataloader, build_dataset
 from mmcls.models import build_classifier
 
@@ -56,6 +56,22 @@ def parse_args():
         action='store_true',
         help='whether to use gpu to collect results')
     parser.add_argument('--tmpdir', help='tmp dir for writing some results')
+    parser.add_argument(
+        '--tensor-collect',
+        action='store_true',
+        help='whether to collect results as tensors by one collective of '
+        'the process group, instead of pickles')
+    parser.add_argument(
+        '--collect-topk',
+        type=int,
+        default=None,
+        help='collect only the top k scores of every sample with '
+        '--tensor-collect, enough for the accuracy up to top-k')
+    parser.add_argument(
+        '--streaming',
+        action='store_true',
+        help='whether to accumulate the metrics batch by batch instead of '
+        'keeping the scores of all the samples, incompatible with --out')
     parser.add_argument(
         '--cfg-options',
         nargs='+',
@@ -127,6 +143,10 @@ def main():
 
     assert args.metrics or args.out, \
         'Please specify at least one of output path and evaluation metrics.'
+    assert not (args.streaming and (args.out or args.show or args.show_dir)),\
+        'The scores are not kept with --streaming.'
+    assert args.metrics or not args.streaming, \
+        'Please specify the evaluation metrics with --streaming.'
 
     # init distributed env first, since logger depends on the dist info.
     if args.launcher == 'none':
@@ -169,15 +189,30 @@ def main():
             model = MMDataParallel(model, device_ids=[0])
         model.CLASSES = CLASSES
         show_kwargs = {} if args.show_options is None else args.show_options
-        outputs = single_gpu_test(model, data_loader, args.show, args.show_dir,
-                                  **show_kwargs)
+        if args.streaming:
+            outputs = streaming_test(
+                model,
+                data_loader,
+                metric=args.metrics,
+                metric_options=args.metric_options)
+        else:
+            outputs = single_gpu_test(model, data_loader, args.show,
+                                      args.show_dir, **show_kwargs)
     else:
         model = MMDistributedDataParallel(
             model.cuda(),
             device_ids=[torch.cuda.current_device()],
             broadcast_buffers=False)
-        outputs = multi_gpu_test(model, data_loader, args.tmpdir,
-                                 args.gpu_collect)
+        if args.streaming:
+            outputs = streaming_test(
+                model,
+                data_loader,
+                metric=args.metrics,
+                metric_options=args.metric_options)
+        else:
+            outputs = multi_gpu_test(model, data_loader, args.tmpdir,
+                                     args.gpu_collect, args.tensor_collect,
+                                     args.collect_topk)
 
     rank, _ = get_dist_info()
     if rank == 0: